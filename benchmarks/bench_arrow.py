@@ -0,0 +1,113 @@
+"""The Arrow-backed mode (`src/cleaning/common/arrow.py`) against the default.
+
+Reads the raw files of every Flipkart and Ubuy cleaner (or of --site and
+--category) once per mode, with text columns as objects ('numpy') and as
+Arrow strings ('pyarrow'), and cleans them, keeping the best of --repeat
+runs. With --rows, the files are upscaled to that many rows in all, the same
+rows in both modes (`bench_suite.upscale`). Reports the read and clean times
+of each mode, the memory of the frames read, and whether both modes wrote
+the same CSV:
+
+    python -m benchmarks.bench_arrow
+    python -m benchmarks.bench_arrow --rows 1000000 --site ubuy
+
+The exit code is 1 if any output differs.
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+from benchmarks import bench_suite
+from src.cleaning import registry
+from src.cleaning.common import arrow
+from src.common import catalog
+
+SITES = ('flipkart', 'ubuy')
+MODES = ('numpy', 'pyarrow')
+
+
+@contextlib.contextmanager
+def backend(mode):
+    previous = arrow.BACKEND
+    arrow.BACKEND = mode
+    try:
+        yield
+    finally:
+        arrow.BACKEND = previous
+
+
+def load(cleaner, rows, seed):
+    """The inputs of `cleaner` in the current mode, the seconds it took to read them."""
+    paths = catalog.paths('raw', cleaner.site, cleaner.category)
+    start = time.perf_counter()
+    frames = [registry.read(cleaner, path) for path in paths]
+    seconds = time.perf_counter() - start
+    if rows is not None:
+        total = sum(len(df) for df in frames)
+        shares = [round(rows * len(df) / total) for df in frames]
+        shares[-1] += rows - sum(shares)
+        frames = [bench_suite.upscale(df, share, seed + number)
+                  for number, (df, share) in enumerate(zip(frames, shares)) if share > 0 and len(df)]
+    return frames, seconds
+
+
+def clean(module, frames, repeat):
+    """The cleaned frames as CSV, the best seconds of `repeat` runs."""
+    best = None
+    for _ in range(repeat):
+        copies = []
+        for df in frames:
+            copies.append(df.copy())
+            copies[-1].attrs = dict(df.attrs)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cleaned = [module.clean(df) for df in copies]
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return [df.to_csv(index=False) for df in cleaned], best
+
+
+def compare(cleaner, options):
+    """Reads and cleans the inputs of `cleaner` in both modes, prints the times; whether both gave the same CSV."""
+    module = registry.load(cleaner)
+    results = {}
+    for mode in MODES:
+        with backend(mode):
+            frames, read_seconds = load(cleaner, options.rows, options.seed)
+            memory = sum(df.memory_usage(deep=True).sum() for df in frames) / 2 ** 20
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(Exception):
+                module.clean(frames[0].head(bench_suite.WARM_UP_ROWS).copy())  # regexes, dictionaries
+            outputs, clean_seconds = clean(module, frames, options.repeat)
+        results[mode] = (outputs, read_seconds, clean_seconds, memory, sum(len(df) for df in frames))
+
+    (expected, numpy_read, numpy_clean, numpy_memory, rows), (actual, arrow_read, arrow_clean, arrow_memory, _) = \
+        results['numpy'], results['pyarrow']
+    identical = expected == actual
+    print(f"{cleaner.site + '/' + cleaner.category:<24} {rows:>9} rows  "
+          f"read {numpy_read:6.2f}s -> {arrow_read:6.2f}s  clean {numpy_clean:6.2f}s -> {arrow_clean:6.2f}s "
+          f"({numpy_clean / arrow_clean:.1f}x)  {numpy_memory:7.1f} -> {arrow_memory:7.1f} MiB  "
+          f"{'identical' if identical else 'DIFFERENT'}")
+    return identical
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_arrow',
+                                     description='Time the cleaners with text as objects and as Arrow strings.')
+    parser.add_argument('--site', action='append', choices=registry.SITES)
+    parser.add_argument('--category', action='append', choices=registry.CATEGORIES)
+    parser.add_argument('--rows', type=int, help='upscale the raw files of each cleaner to ROWS rows in all')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args(argv)
+
+    identical = True
+    for cleaner in registry.select(options.site or SITES, options.category):
+        if catalog.paths('raw', cleaner.site, cleaner.category):
+            identical &= compare(cleaner, options)
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
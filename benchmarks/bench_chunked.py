@@ -0,0 +1,111 @@
+"""Peak memory of cleaning a big raw file whole against in chunks.
+
+Resamples the rows of the raw eBay graphics card CSVs to a --rows row CSV,
+cleans it with `registry.clean_file` once whole and once --chunksize rows at
+a time, and reports the time and the peak of memory allocated by each
+(tracemalloc, which sees numpy and pandas buffers), and whether both wrote
+the same rows:
+
+    python -m benchmarks.bench_chunked --rows 1000000 --chunksize 50000
+
+With --check, it instead cleans every raw file of every cleaner that can
+run in chunks once whole and once at each of the given chunk sizes, and
+diffs the CSVs, which must be identical, row order included (exit code 1
+otherwise):
+
+    python -m benchmarks.bench_chunked --check 7,37,1000
+"""
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+from src.cleaning import registry
+from src.cleaning.common import chunked
+from src.common import catalog
+
+RAW_DIR = Path(__file__).resolve().parents[1] / 'data' / 'raw' / 'ebay' / 'graphics_cards'
+
+
+def write_sample(path, rows, seed=0):
+    df = pd.concat([pd.read_csv(raw) for raw in sorted(RAW_DIR.glob('*.csv'))], ignore_index=True)
+    df.sample(n=rows, replace=True, random_state=seed).to_csv(path, index=False)
+
+
+def measured(cleaner, path, chunksize):
+    tracemalloc.start()
+    start = time.perf_counter()
+    output = registry.clean_file(cleaner, path, chunksize).output
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return pd.read_csv(output), seconds, peak
+
+
+def same_rows(a, b):
+    a, b = a.astype(str), b.astype(str)
+    return a.sort_values(list(a.columns)).reset_index(drop=True).equals(b.sort_values(list(b.columns)).reset_index(drop=True))
+
+
+def check(chunksizes):
+    """Diffs the whole-file and chunked output of every raw file; the number of outputs that differ."""
+    differ = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for cleaner in registry.CLEANERS:
+            module = registry.load(cleaner)
+            if not chunked.supports(module):
+                continue
+            for path in catalog.paths('raw', cleaner.site, cleaner.category):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    expected = module.clean(registry.read(cleaner, path)).to_csv(index=False)
+                for chunksize in chunksizes:
+                    output = Path(directory) / f'{chunksize}.csv'
+                    try:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            chunked.clean_file(module, path, output, chunksize,
+                                               **getattr(module, 'READ_OPTIONS', {}))
+                        result = 'identical' if output.read_text(encoding='utf-8') == expected else 'DIFFERENT'
+                    except Exception as e:
+                        result = f'ERROR {type(e).__name__}: {e}'
+                    differ += result != 'identical'
+                    print(f"{cleaner.site}/{cleaner.category}/{path.name:<40} chunks of {chunksize:>6}  {result}")
+    return differ
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_chunked',
+                                     description='Peak memory of whole-file against chunked cleaning.')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--check', metavar='CHUNKSIZES',
+                        help='comma separated chunk sizes to diff against whole-file cleaning, on every raw file')
+    options = parser.parse_args(argv)
+
+    if options.check:
+        return 1 if check([int(size) for size in options.check.split(',')]) else 0
+
+    cleaner = registry.get('ebay', 'graphics_cards')
+    with tempfile.TemporaryDirectory() as directory:
+        # The output goes where the cleaner writes it, under data/cleaned: name the sample apart
+        path = Path(directory) / 'bench_chunked_sample.csv'
+        write_sample(path, options.rows, options.seed)
+        whole, whole_seconds, whole_peak = measured(cleaner, path, None)
+        chunks, chunked_seconds, chunked_peak = measured(cleaner, path, options.chunksize)
+        catalog.remove(registry.output_path(cleaner, path))
+
+    print(f"rows: {options.rows}  kept: {len(chunks)}  raw file: {path.name}")
+    print(f"whole:   {whole_seconds:8.2f}s  peak {whole_peak / 2 ** 20:8.1f} MiB")
+    print(f"chunked: {chunked_seconds:8.2f}s  peak {chunked_peak / 2 ** 20:8.1f} MiB  "
+          f"({options.chunksize} rows at a time)")
+    print(f"same rows: {'yes' if same_rows(whole, chunks) else 'NO'}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
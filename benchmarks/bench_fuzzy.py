@@ -0,0 +1,100 @@
+"""The batched fuzzy matching of `src/cleaning/common/fuzzy.py` against `extractOne`.
+
+Matches the values the eBay cleaners correct (watch brands, models and
+operating systems, graphics card brands) of every raw file, plus pairs
+whose best scores only tie once rounded, with `fuzzy.best_matches` and with
+`extractOne` called on one value at a time (fuzzywuzzy's, or its semantics
+on rapidfuzz's scorer: integer scores, the first entry among the ties), and
+counts the values where the two disagree:
+
+    python -m benchmarks.bench_fuzzy
+
+The fuzzy match cache is off. The exit code is 1 if any value disagrees.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+os.environ['PIPELINE_FUZZY_CACHE'] = ''  # before the cleaners open it
+
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+from src.cleaning import registry
+from src.cleaning.common import dictionary, fuzzy, imputation
+from src.cleaning.ebay import clean_gpu, clean_watches
+from src.common import catalog
+
+# (query, vocabulary) whose two scores differ by less than a point: the first entry wins, as in extractOne
+TIES = (
+    ('forerunner ultra galaxy', ('active max watch', 'pro samsung garmin')),
+    ('samsung apple', ('galaxy ultra garmin', 'ultra')),
+)
+
+
+def extract_one(query, vocabulary):
+    """`process.extractOne(query, vocabulary)`, on the scorer of the backend `fuzzy` uses."""
+    if fuzzy.rapid_process is not None:
+        scores = [round(fuzzy.rapid_fuzz.WRatio(query, entry, processor=fuzzy.rapid_utils.default_process))
+                  for entry in vocabulary]
+        best = int(np.argmax(scores))  # the first of the highest
+        return vocabulary[best], scores[best]
+    from fuzzywuzzy import process
+    return process.extractOne(query, vocabulary)
+
+
+def cases():
+    """(name, values, vocabulary, preprocess) of every match the eBay cleaners make on the raw files."""
+    watches = registry.get('ebay', 'smart_watches')
+    for path in catalog.paths('raw', 'ebay', 'smart_watches'):
+        df = registry.read(watches, path)
+        text = lambda value: unidecode(str(value))
+        yield f'{path.name} Brand', df['Brand'], dictionary.terms('brands', 'ebay/smart_watches'), text
+        yield f'{path.name} Operating System', df['Operating System'], clean_watches.OS_LIST, text
+        with contextlib.redirect_stdout(io.StringIO()):
+            values = imputation.exact(clean_watches.prepare(df.copy()), clean_watches.IMPUTATION)
+        yield f'{path.name} Model', df['Model'].where(df['Model'] != 'Does not apply'), values['Model'], text
+    cards = registry.get('ebay', 'graphics_cards')
+    for path in catalog.paths('raw', 'ebay', 'graphics_cards'):
+        df = clean_gpu.prepare(registry.read(cards, path))
+        yield f'{path.name} Brand', df['Brand'], imputation.exact(df, clean_gpu.IMPUTATION)['Brand'], None
+    for number, (query, vocabulary) in enumerate(TIES):
+        yield f'tie {number + 1}', pd.Series([query]), list(vocabulary), None
+
+
+def compare(name, values, vocabulary, preprocess):
+    """Matches `values` both ways, prints the times; the number of distinct values matched differently."""
+    vocabulary = fuzzy.clean_vocabulary(vocabulary)
+    start = time.perf_counter()
+    batched = fuzzy.best_matches(values, vocabulary, preprocess=preprocess)
+    batched_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    distinct = values.dropna().unique()
+    expected = {value: extract_one(preprocess(value) if preprocess else value, vocabulary) for value in distinct}
+    one_by_one_seconds = time.perf_counter() - start
+
+    actual = dict(zip(values, zip(batched['match'], batched['score'])))
+    differ = [value for value in distinct if (actual[value][0], int(actual[value][1])) != tuple(expected[value])]
+    print(f"{name:<50} {len(distinct):>6} values  one by one {one_by_one_seconds:7.2f}s  "
+          f"batched {batched_seconds:7.2f}s  {'same' if not differ else f'{len(differ)} DIFFERENT'}")
+    for value in differ[:5]:
+        print(f"    {value!r}: extractOne {expected[value]}, batched {actual[value]}")
+    return len(differ)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_fuzzy',
+                                     description='Check the batched fuzzy matching against extractOne.')
+    parser.parse_args(argv)
+    print(f"backend: {fuzzy.BACKEND}")
+    differ = sum(compare(*case) for case in cases())
+    return 1 if differ else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
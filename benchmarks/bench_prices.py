@@ -0,0 +1,136 @@
+"""Row-wise price parsing against `src/cleaning/common/prices.py`.
+
+Resamples the price column(s) of every raw CSV of a site and category to
+--rows rows, then times the parser each cleaner used to apply row by row
+(`benchmarks/legacy_prices.py`) against the vectorized one it calls now, and
+counts the rows where the two disagree:
+
+    python -m benchmarks.bench_prices --rows 1000000
+    python -m benchmarks.bench_prices --rows 200000 --case ebay/laptops --case ubuy/smart_watches
+
+Disagreements are expected for eBay laptops, where the old parser read
+"$1,425.00" as 1.425.
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import legacy_prices as legacy
+from src.cleaning.common import prices
+
+RAW_DIR = Path(__file__).resolve().parents[1] / 'data' / 'raw'
+
+
+def _flipkart_gpu_in_usd(price):
+    parsed = prices.parse_prices(price, default_currency='INR')
+    return prices.to_usd(parsed['amount'], parsed['currency'], {'INR': legacy.EXCHANGE_RATE_INR_TO_USD}, decimals=2)
+
+
+def _flipkart_in_usd(price):
+    parsed = prices.parse_prices(price)
+    return parsed['amount'].where(parsed['currency'] != 'INR', parsed['amount'] * 0.0125)
+
+
+def _ubuy_in_usd(price):
+    parsed = prices.parse_prices(price, default_currency='MAD')
+    return prices.to_usd(parsed['amount'], parsed['currency'], {'MAD': 10}, decimals=2)
+
+
+def _flipkart_laptop_in_usd(df):
+    sales_package_price = df['Sales Package'].astype('string').str.extract(r'₹(\d{1,3}(?:,\d{3})*\.\d{2})', expand=False)
+    price = df['price'].where(df['price'].notna(), sales_package_price)
+    return prices.parse_prices(price)['amount'] / 80
+
+
+# (site, category, price column, legacy parser of the DataFrame, vectorized parser of the DataFrame)
+CASES = [
+    ('ebay', 'graphics_cards', 'Price',
+     lambda df: df['Price'].apply(legacy.ebay_gpu_clean_price),
+     lambda df: prices.parse_prices(df['Price'])['amount']),
+    ('ebay', 'laptops', 'Price',
+     lambda df: df['Price'].apply(legacy.ebay_laptop_clean_price),
+     lambda df: prices.parse_prices(df['Price'])['amount']),
+    ('ebay', 'monitors', 'Price',
+     lambda df: df['Price'].apply(legacy.ebay_monitors_clean_price),
+     lambda df: prices.parse_prices(df['Price'])['amount']),
+    ('ebay', 'smart_watches', 'Price',
+     lambda df: df['Price'].apply(legacy.ebay_watches_clean_price),
+     lambda df: prices.parse_prices(df['Price'])['amount']),
+    ('flipkart', 'graphics_cards', 'price',
+     lambda df: df['price'].apply(legacy.flipkart_gpu_clean_price_and_convert_to_usd),
+     lambda df: _flipkart_gpu_in_usd(df['price'])),
+    ('flipkart', 'laptops', 'price',
+     lambda df: df.apply(legacy.flipkart_laptop_extract_price, axis=1),
+     _flipkart_laptop_in_usd),
+    ('flipkart', 'monitors', 'price',
+     lambda df: df['price'].apply(legacy.flipkart_clean_price),
+     lambda df: _flipkart_in_usd(df['price'])),
+    ('flipkart', 'smart_watches', 'price',
+     lambda df: df['price'].apply(legacy.flipkart_clean_price),
+     lambda df: _flipkart_in_usd(df['price'])),
+    ('ubuy', 'graphics_cards', 'price',
+     lambda df: df['price'].apply(legacy.ubuy_gpu_clean_price).apply(legacy.ubuy_convert_to_usd),
+     lambda df: _ubuy_in_usd(df['price'])),
+    ('ubuy', 'laptops', 'price',
+     lambda df: df['price'].apply(legacy.ubuy_laptops_clean_price).apply(legacy.ubuy_convert_to_usd),
+     lambda df: _ubuy_in_usd(df['price'])),
+    ('ubuy', 'smart_watches', 'price',
+     lambda df: df['price'].apply(legacy.ubuy_smartwatch_clean_price).apply(legacy.ubuy_convert_to_usd),
+     lambda df: _ubuy_in_usd(df['price'])),
+]
+
+
+def load_sample(site, category, column, rows, seed=0):
+    """The price columns of the raw CSVs of a category, resampled to `rows` rows."""
+    frames = []
+    for path in sorted((RAW_DIR / site / category).glob('*.csv')):
+        df = pd.read_csv(path, dtype=str)
+        if column in df.columns:
+            frames.append(df[[name for name in (column, 'Sales Package') if name in df.columns]])
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    return df.sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+
+
+def mismatches(expected, actual):
+    expected = pd.to_numeric(expected, errors='coerce').to_numpy(dtype='float64')
+    actual = pd.to_numeric(actual, errors='coerce').to_numpy(dtype='float64')
+    same = np.isclose(expected, actual, rtol=1e-9, atol=0) | (np.isnan(expected) & np.isnan(actual))
+    return int((~same).sum())
+
+
+def timed(function, df):
+    start = time.perf_counter()
+    result = function(df)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_prices',
+                                     description='Time the row-wise price parsers against the vectorized one.')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows per case')
+    parser.add_argument('--case', action='append', help='SITE/CATEGORY to run (repeatable, default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args(argv)
+
+    print(f"{'case':<26}{'rows':>10}{'row-wise s':>12}{'vectorized s':>14}{'speedup':>9}{'mismatches':>12}")
+    for site, category, column, legacy_parser, vectorized_parser in CASES:
+        name = f'{site}/{category}'
+        if options.case and name not in options.case:
+            continue
+        df = load_sample(site, category, column, options.rows, options.seed)
+        if df is None:
+            print(f"{name:<26}  no raw CSV with a {column!r} column")
+            continue
+        expected, legacy_seconds = timed(legacy_parser, df)
+        actual, vectorized_seconds = timed(vectorized_parser, df)
+        print(f"{name:<26}{len(df):>10}{legacy_seconds:>12.3f}{vectorized_seconds:>14.3f}"
+              f"{legacy_seconds / vectorized_seconds:>8.1f}x{mismatches(expected, actual):>12}")
+
+
+if __name__ == '__main__':
+    main()
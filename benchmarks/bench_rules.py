@@ -0,0 +1,71 @@
+"""The cleaners written as rules against the hand-written ones.
+
+Cleans every raw file of the categories that have a spec
+(`src/cleaning/specs.py`) with the hand-written cleaner and with the plan
+the spec compiles to (`src/cleaning/rules.py`), and checks that both give
+the same CSV. With --rows, does the same on the rows of each category's raw
+files resampled to that many, and reports the time of each:
+
+    python -m benchmarks.bench_rules
+    python -m benchmarks.bench_rules --rows 1000000 --plan
+
+The exit code is 1 if any output differs.
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from src.cleaning import registry, rules, specs
+from src.common import catalog
+
+
+def timed(function, df):
+    start = time.perf_counter()
+    result = function(df.copy())
+    return result, time.perf_counter() - start
+
+
+def compare(name, cleaner, spec, df):
+    """Cleans `df` both ways, prints the times; whether both gave the same CSV."""
+    expected, hand_seconds = timed(registry.load(cleaner).clean, df)
+    actual, rules_seconds = timed(lambda frame: rules.clean(spec, frame), df)
+    identical = expected.to_csv(index=False) == actual.to_csv(index=False)
+    print(f"{name:<45} {len(df):>9} rows  hand-written {hand_seconds:7.2f}s  rules {rules_seconds:7.2f}s  "
+          f"({hand_seconds / rules_seconds:.1f}x)  {'identical' if identical else 'DIFFERENT'}")
+    return identical
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_rules',
+                                     description='Check the cleaners written as rules against the hand-written ones.')
+    parser.add_argument('--site', action='append', choices=registry.SITES)
+    parser.add_argument('--category', action='append', choices=registry.CATEGORIES)
+    parser.add_argument('--rows', type=int, help='also clean the raw rows of each category resampled to ROWS')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--plan', action='store_true', help="print each file's compiled plan")
+    options = parser.parse_args(argv)
+
+    identical = True
+    for cleaner in registry.select(options.site, options.category):
+        spec = specs.SPECS.get((cleaner.site, cleaner.category))
+        if spec is None:
+            continue
+        frames = []
+        for path in catalog.paths('raw', cleaner.site, cleaner.category):
+            df = registry.read(cleaner, path)
+            if options.plan:
+                print(rules.compile(spec, tuple(df.columns)).describe())
+            identical &= compare(f'{cleaner.site}/{cleaner.category}/{path.name}', cleaner, spec, df)
+            frames.append(df)
+        if options.rows and frames:
+            sample = pd.concat(frames, ignore_index=True).sample(n=options.rows, replace=True,
+                                                                 random_state=options.seed)
+            identical &= compare(f'{cleaner.site}/{cleaner.category} resampled', cleaner, spec,
+                                 sample.reset_index(drop=True))
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
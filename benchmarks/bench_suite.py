@@ -0,0 +1,262 @@
+"""Throughput of every cleaner, saved as a baseline and compared against one.
+
+`run` times the `clean` function of every cleaner (or of --site and
+--category) on its raw files as scraped ('raw'), and on the same files
+upscaled to each of --sizes rows in all (`upscale`: rows drawn with
+replacement, a --perturb share of them with their numbers jittered and their
+title made new, so that the work done per distinct value stays realistic).
+Each case runs in a fresh process, after a warm-up on a few rows (regexes,
+the imputation pool), with the cleaners' own printing silenced, and keeps
+the best of --repeat runs. It records rows/s, the peak RSS of the process
+and how much cleaning added to it, and the wall time of each transform, from
+the cleaners' tracing spans. The results are written as JSON:
+
+    python -m benchmarks.bench_suite run --output benchmarks/baselines/main.json
+    python -m benchmarks.bench_suite run --sizes 10000,100000,1000000 --site ubuy --output current.json
+
+`compare` fails (exit code 1) when the rows/s of a case fell more than
+--threshold below the baseline's; `run --baseline` compares as it goes:
+
+    python -m benchmarks.bench_suite compare benchmarks/baselines/main.json current.json --threshold 0.25
+    python -m benchmarks.bench_suite run --site ebay --baseline benchmarks/baselines/main.json
+
+The fuzzy match cache is off while timing unless --fuzzy-cache is given, so
+that the results do not depend on what earlier runs cached.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.cleaning import registry
+from src.cleaning.common import arrow
+from src.common import catalog
+
+BASELINES_DIR = Path(__file__).resolve().parent / 'baselines'
+SIZES = (10_000, 100_000)
+WARM_UP_ROWS = 50
+
+
+def upscale(df, rows, seed=0, perturb=0.2):
+    """
+    `rows` rows drawn from `df` with replacement. In a `perturb` share of
+    them, float columns are scaled by up to 5% either way, and the text column
+    with the most distinct values (the title) gets a variant number appended.
+    """
+    rng = np.random.default_rng(seed)
+    sample = df.take(rng.integers(0, len(df), rows)).reset_index(drop=True)
+    sample.attrs = dict(df.attrs)
+    changed = rng.random(rows) < perturb
+    text = [column for column in sample.columns
+            if pd.api.types.is_object_dtype(sample[column]) or arrow.is_arrow(sample[column])]
+    for column in sample.columns:
+        if pd.api.types.is_float_dtype(sample[column]):
+            sample[column] = sample[column].where(~changed, sample[column] * rng.uniform(0.95, 1.05, rows))
+    if text:
+        title = max(text, key=lambda column: df[column].nunique())
+        variants = pd.Series(rng.integers(1, 1000, rows), index=sample.index).astype(str)
+        sample[title] = sample[title].where(~changed | sample[title].isna(), sample[title] + ' #' + variants)
+    return sample
+
+
+def _max_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _inputs(cleaner, size, seed, perturb):
+    """The raw files of `cleaner`, or each upscaled to its share of `size` rows."""
+    frames = [registry.read(cleaner, path) for path in catalog.paths('raw', cleaner.site, cleaner.category)]
+    if size is None:
+        return frames
+    total = sum(len(df) for df in frames)
+    shares = [round(size * len(df) / total) for df in frames]
+    shares[-1] += size - sum(shares)
+    return [upscale(df, share, seed + number, perturb)
+            for number, (df, share) in enumerate(zip(frames, shares)) if share > 0 and len(df)]
+
+
+def measure(cleaner, size, seed=0, perturb=0.2, repeat=3, fuzzy_cache=False):
+    """Runs in a fresh process: the results of cleaning the inputs of one case `repeat` times."""
+    if not fuzzy_cache:
+        os.environ['PIPELINE_FUZZY_CACHE'] = ''
+    from src.observability import tracing  # imported after the environment is set, like the cleaners
+
+    module = registry.load(cleaner)
+    inputs = _inputs(cleaner, size, seed, perturb)
+    if not inputs:
+        return {'error': 'no raw files'}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for df in inputs:
+            warm_up = df.head(WARM_UP_ROWS).copy()
+            warm_up.attrs = dict(df.attrs)
+            try:
+                module.clean(warm_up)
+            except Exception:
+                pass  # a few rows may lack what a cleaner insists on; the timed runs will tell
+
+    rss_before = _max_rss_mib()
+    best = None
+    for _ in range(repeat):
+        copies = []
+        for df in inputs:
+            copies.append(df.copy())
+            copies[-1].attrs = dict(df.attrs)
+        first_event = len(tracing.events())
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows_out = sum(len(module.clean(df)) for df in copies)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best[0]:
+            best = (seconds, rows_out, tracing.events()[first_event:])
+        del copies
+
+    seconds, rows_out, events = best
+    transforms = defaultdict(float)
+    for event in events:
+        transforms[event['name']] += event['dur'] / 1000
+    rows = sum(len(df) for df in inputs)
+    peak = _max_rss_mib()
+    return {
+        'rows': rows,
+        'rows_out': rows_out,
+        'files': len(inputs),
+        'seconds': round(seconds, 4),
+        'rows_per_s': round(rows / seconds, 1),
+        'peak_rss_mib': round(peak, 1),
+        'clean_rss_mib': round(peak - rss_before, 1),
+        'transforms_ms': {name: round(ms, 2) for name, ms in sorted(transforms.items(), key=lambda item: -item[1])},
+    }
+
+
+def case_name(cleaner, size):
+    return f"{cleaner.site}/{cleaner.category}@{'raw' if size is None else size}"
+
+
+def run_case(cleaner, size, options):
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        try:
+            return executor.submit(measure, cleaner, size, options.seed, options.perturb, options.repeat,
+                                   options.fuzzy_cache).result()
+        except Exception as e:
+            return {'error': f'{type(e).__name__}: {e}'}
+
+
+def _print_case(name, result):
+    if 'error' in result:
+        print(f"{name:<36} ERROR {result['error']}")
+        return
+    top = ', '.join(f'{span} {ms:.0f}ms' for span, ms in list(result['transforms_ms'].items())[:3])
+    print(f"{name:<36} {result['rows']:>9} rows  {result['rows_per_s']:>12,.0f} rows/s  "
+          f"peak {result['peak_rss_mib']:>7.1f} MiB (+{result['clean_rss_mib']:.1f})  {top}")
+
+
+def compare(baseline, current, threshold):
+    """Prints the change of every case in both; the names of the cases that regressed."""
+    regressions = []
+    for name, result in current['cases'].items():
+        before = baseline['cases'].get(name)
+        if before is None or 'error' in before:
+            print(f"{name:<36} no baseline")
+            continue
+        if 'error' in result:
+            print(f"{name:<36} ERROR {result['error']}")
+            regressions.append(name)
+            continue
+        ratio = result['rows_per_s'] / before['rows_per_s']
+        regressed = ratio < 1 - threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<36} {before['rows_per_s']:>12,.0f} -> {result['rows_per_s']:>12,.0f} rows/s "
+              f"({ratio - 1:+.0%})  peak {before['peak_rss_mib']:.0f} -> {result['peak_rss_mib']:.0f} MiB"
+              f"{'  REGRESSED' if regressed else ''}")
+    for name in baseline['cases'].keys() - current['cases'].keys():
+        print(f"{name:<36} not run")
+    return regressions
+
+
+def _report(regressions, threshold):
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline by more than {threshold:.0%}: "
+              f"{', '.join(regressions)}")
+        return 1
+    print('No regression.')
+    return 0
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_suite',
+                                     description='Benchmark the cleaners and compare against a baseline.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='time the cleaners')
+    run_parser.add_argument('--site', action='append', choices=registry.SITES)
+    run_parser.add_argument('--category', action='append', choices=registry.CATEGORIES)
+    run_parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                            help="comma separated row counts to upscale to ('' for the raw files only)")
+    run_parser.add_argument('--no-raw', action='store_true', help='skip the raw files as scraped')
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--perturb', type=float, default=0.2)
+    run_parser.add_argument('--fuzzy-cache', action='store_true', help='keep the fuzzy match cache on')
+    run_parser.add_argument('--output', type=Path,
+                            help=f'JSON file to write (default: {BASELINES_DIR.name}/<timestamp>.json)')
+    run_parser.add_argument('--baseline', type=Path, help='compare against this JSON file')
+    run_parser.add_argument('--threshold', type=float, default=0.25)
+
+    compare_parser = commands.add_parser('compare', help='compare two runs')
+    compare_parser.add_argument('baseline', type=Path)
+    compare_parser.add_argument('current', type=Path)
+    compare_parser.add_argument('--threshold', type=float, default=0.25,
+                                help='largest accepted drop of rows/s, as a fraction (default 0.25)')
+    options = parser.parse_args(argv)
+
+    if options.command == 'compare':
+        return _report(compare(load(options.baseline), load(options.current), options.threshold), options.threshold)
+
+    sizes = ([] if options.no_raw else [None]) + [int(size) for size in options.sizes.split(',') if size]
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'repeat': options.repeat,
+        'perturb': options.perturb,
+        'cases': {},
+    }
+    for cleaner in registry.select(options.site, options.category):
+        for size in sizes:
+            name = case_name(cleaner, size)
+            results['cases'][name] = run_case(cleaner, size, options)
+            _print_case(name, results['cases'][name])
+
+    output = options.output or BASELINES_DIR / f"{datetime.now().strftime('%Y_%m_%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    if options.baseline:
+        return _report(compare(load(options.baseline), results, options.threshold), options.threshold)
+    return 1 if any('error' in result for result in results['cases'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Row-wise against vectorized cleaning of Ubuy graphics cards.
+
+Resamples the rows of the raw Ubuy graphics card CSVs to --rows rows, cleans
+them with the row-wise functions the cleaner used before
+(`benchmarks/legacy_ubuy_gpu.py`) and with `src.cleaning.ubuy.clean_gpu.clean`,
+and checks that both write the same CSV:
+
+    python -m benchmarks.bench_ubuy_gpu --rows 1000000
+"""
+import argparse
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks import legacy_ubuy_gpu as legacy
+from src.cleaning.ubuy import clean_gpu
+
+RAW_DIR = Path(__file__).resolve().parents[1] / 'data' / 'raw' / 'ubuy' / 'graphics_cards'
+
+
+def load_sample(rows, seed=0):
+    # The row-wise cleaner needs every product-detail column, which the concatenation has
+    df = pd.concat([pd.read_csv(path) for path in sorted(RAW_DIR.glob('*.csv'))], ignore_index=True)
+    return df.sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+
+
+def timed(function, df):
+    start = time.perf_counter()
+    result = function(df.copy())
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_ubuy_gpu',
+                                     description='Time the row-wise Ubuy graphics card cleaning against the vectorized one.')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args(argv)
+
+    df = load_sample(options.rows, options.seed)
+    expected, legacy_seconds = timed(legacy.clean, df)
+    actual, vectorized_seconds = timed(clean_gpu.clean, df)
+    identical = expected.to_csv(index=False) == actual.to_csv(index=False)
+    print(f"rows: {len(df)}  kept: {len(actual)}")
+    print(f"row-wise:   {legacy_seconds:8.2f}s  {len(df) / legacy_seconds:>10,.0f} rows/s")
+    print(f"vectorized: {vectorized_seconds:8.2f}s  {len(df) / vectorized_seconds:>10,.0f} rows/s  "
+          f"({legacy_seconds / vectorized_seconds:.1f}x)")
+    print(f"identical output: {'yes' if identical else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Row-wise validation against `src/cleaning/common/validation.py`.
+
+Resamples the eBay smart watch rows as `prepare` and `finish` leave them
+(before validation) to --rows rows, then times the row filter the cleaner
+used before, `df.apply(lambda row: list(row).count('Unknown') < 2, axis=1)`,
+against `validation.validate` of the cleaner's rules, and checks that both
+keep the same rows:
+
+    python -m benchmarks.bench_validation --rows 1000000
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import pandas as pd
+
+from src.cleaning import registry
+from src.cleaning.common import imputation, validation
+from src.cleaning.ebay import clean_watches
+from src.common import catalog
+
+
+def load_sample(rows, seed=0):
+    cleaner = registry.get('ebay', 'smart_watches')
+    frames = []
+    for path in catalog.paths('raw', cleaner.site, cleaner.category):
+        df = clean_watches.prepare(registry.read(cleaner, path))
+        with contextlib.redirect_stdout(io.StringIO()), without_validation():
+            frames.append(clean_watches.finish(df, imputation.exact(df, clean_watches.IMPUTATION)))
+    df = pd.concat(frames, ignore_index=True)
+    return df.sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+
+
+@contextlib.contextmanager
+def without_validation():
+    # `finish` ends with the validation being measured: keep every row it gets
+    rules = clean_watches.VALIDATION
+    clean_watches.VALIDATION = ()
+    try:
+        yield
+    finally:
+        clean_watches.VALIDATION = rules
+
+
+def timed(function, df):
+    start = time.perf_counter()
+    result = function(df)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_validation',
+                                     description='Time the row-wise validation against the vectorized one.')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args(argv)
+
+    df = load_sample(options.rows, options.seed)
+    expected, row_wise_seconds = timed(lambda frame: frame[frame.apply(
+        lambda row: list(row).count('Unknown') < 2, axis=1)], df)
+    actual, vectorized_seconds = timed(lambda frame: validation.validate(frame, clean_watches.VALIDATION), df)
+    print(f"rows: {len(df)}  kept: {len(actual)}")
+    print(f"row-wise:   {row_wise_seconds * 1000:10.1f} ms")
+    print(f"vectorized: {vectorized_seconds * 1000:10.1f} ms  ({row_wise_seconds / vectorized_seconds:.0f}x)")
+    print(validation.format_report(actual.attrs['validation']))
+    print(f"same rows: {'yes' if expected.index.equals(actual.index) else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Row-wise extraction of the Flipkart laptop cleaner before it was vectorized.
+
+Kept verbatim as the reference for `benchmarks/bench_flipkart_laptops.py`;
+nothing in the pipeline imports it. The title is cleaned by the current
+`clean_title`, which did not change.
+"""
+import re
+
+import pandas as pd
+
+from src.cleaning.common import prices
+from src.cleaning.filkpart.clean_laptop import clean_title
+
+
+# Function to extract prices in USD, falling back on the price in the sales package
+def extract_price(df):
+    sales_package_price = df['Sales Package'].astype('string').str.extract(r'₹(\d{1,3}(?:,\d{3})*\.\d{2})', expand=False)
+    price = df['price'].where(df['price'].notna(), sales_package_price)
+    return prices.parse_prices(price)['amount'] / 80  # Convert to USD (approx ₹1 = $0.0125)
+
+
+def extract_ram(row):
+    ram = row['RAM']
+    if pd.isna(ram) and isinstance(row['Sales Package'], str):
+        match = re.search(r'(\d+)\s*GB', row['Sales Package'])
+        if match:
+            ram = match.group(1)
+    try:
+        ram = int(ram.replace('GB', '').strip())
+    except (ValueError, AttributeError):
+        ram = None
+    return ram
+
+def extract_storage(row):
+    storage = row['SSD Capacity']
+    if pd.isna(storage) and isinstance(row['Sales Package'], str):
+        match = re.search(r'(\d+)\s*GB', row['Sales Package'])
+        if match:
+            storage = match.group(1)
+        else:
+            match = re.search(r'(\d+)\s*TB', row['Sales Package'])
+            if match:
+                storage = int(match.group(1)) * 1024  # Convert TB to GB
+    try:
+        storage = int(storage.replace('GB', '').strip())
+    except (ValueError, AttributeError):
+        storage = None
+    return storage
+def extract_cpu(row):
+    cpu = row['Processor Name']
+    if pd.isna(cpu) and isinstance(row['Sales Package'], str):
+        match = re.search(r'(Intel\s*Core\s*i\d+|AMD\s*Ryzen\s*\d+)', row['Sales Package'])
+        if match:
+            cpu = match.group(0)
+    return cpu
+
+def extract_model(row):
+    model = row['Model Name']
+    if pd.isna(model) and isinstance(row['Sales Package'], str):
+        match = re.search(r'Model Name=\s*(.+)', row['Sales Package'])
+        if match:
+            model = match.group(1)
+    return model
+
+def extract_brand(row):
+    for col in ['title', 'Sales Package']:
+        value = row[col]
+        if isinstance(value, str):
+            match = re.search(r'(ASUS|Lenovo|HP|Samsung|Acer|MSI|Apple|Dell|Zebronics|Thomson|Infinix|Jio|Ultimus)', value, re.IGNORECASE)
+            if match:
+                return match.group(1)
+    return None
+
+def extract_gpu(row):
+    gpu = row['Graphic Processor']
+    if pd.isna(gpu) and isinstance(row['Sales Package'], str):
+        match = re.search(r'(NVIDIA\s*GeForce\s*.+?|Intel\s*Integrated\s*.+?)', row['Sales Package'])
+        if match:
+            gpu = match.group(0)
+    return gpu
+
+def extract_screen_size(row):
+    screen_size = row['Screen Size']
+    if pd.isna(screen_size) and isinstance(row['Sales Package'], str):
+        match = re.search(r'(\d+\.\d+)\s*inch', row['Sales Package'])
+        if match:
+            return float(match.group(1))
+    return screen_size
+
+
+def clean(df, collection_date):
+    df['Title'] = clean_title(df['title'])
+    df['Price'] = extract_price(df)
+    df['RAM'] = df.apply(extract_ram, axis=1)
+    df['CPU'] = df.apply(extract_cpu, axis=1)
+    df['Model'] = df.apply(extract_model, axis=1)
+    df['Brand'] = df.apply(extract_brand, axis=1)
+    df['GPU'] = df.apply(extract_gpu, axis=1)
+    df['Screen Size'] = df.apply(extract_screen_size, axis=1)
+    df['Storage'] = df.apply(extract_storage, axis=1)
+    df['Collection Date'] = collection_date
+    columns_to_keep = ['Title', 'Price', 'RAM', 'CPU', 'Model', 'Brand', 'GPU', 'Screen Size', 'Storage',
+                       'Collection Date']
+    df_cleaned = df[columns_to_keep].copy()
+    df_cleaned.dropna(inplace=True)
+    return df_cleaned
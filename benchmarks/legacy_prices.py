@@ -0,0 +1,155 @@
+"""Row-wise price parsers the cleaners used before `src/cleaning/common/prices.py`.
+
+Kept verbatim as the reference for `benchmarks/bench_prices.py`; nothing in the
+pipeline imports them.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# src/cleaning/ebay/clean_gpu.py
+def ebay_gpu_clean_price(price):
+    if isinstance(price, str):
+        price = re.sub(r'[^\d.,]', '', price)
+        if ',' in price and '.' in price:
+            if price.index(',') < price.index('.'):
+                price = price.replace(',', '')
+            else:
+                price = price.replace('.', '').replace(',', '.')
+        else:
+            price = price.replace(',', '.')
+    return float(price) if price else None
+
+
+# src/cleaning/ebay/clean_laptop.py
+def ebay_laptop_clean_price(price):
+    if isinstance(price, str):
+        cleaned = ''.join(c for c in price if c.isdigit() or c in {'.', ','})
+        cleaned = cleaned.replace(',', '.').replace(' ', '')
+        if '.' in cleaned:
+            parts = cleaned.split('.')
+            if len(parts) > 2:
+                cleaned = parts[0] + '.' + ''.join(parts[1:])
+        return float(cleaned) if cleaned else np.nan
+    return price
+
+
+# src/cleaning/ebay/clean_monitors.py
+def ebay_monitors_clean_price(price):
+    if isinstance(price, str):
+        cleaned = ''.join(filter(lambda x: x.isdigit() or x == '.', price))
+        return float(cleaned) if cleaned else np.nan
+    return price
+
+
+# src/cleaning/ebay/clean_watches.py
+def ebay_watches_clean_price(price):
+    if pd.isna(price):
+        return np.nan
+    price = str(price).replace(',', '').replace('$', '').replace('GBP', '').replace('US', '').replace('/ea', '').replace('AU', '').replace('EUR', '').strip()
+    try:
+        return float(price)
+    except ValueError:
+        return np.nan
+
+
+# src/cleaning/filkpart/clean_gpu.py
+EXCHANGE_RATE_INR_TO_USD = 83
+
+
+def flipkart_gpu_clean_price_and_convert_to_usd(price):
+    if pd.isna(price) or price == 'Data not available':
+        return None
+    # Remove non-numeric characters (e.g., '₹', ',')
+    price_inr = int(re.sub(r'[^\d]', '', price))
+    # Convert INR to USD
+    price_usd = round(price_inr / EXCHANGE_RATE_INR_TO_USD, 2)
+    return price_usd
+
+
+# src/cleaning/filkpart/clean_laptop.py
+def flipkart_laptop_extract_price(row):
+    price = row['price']
+    if pd.isna(price) and isinstance(row['Sales Package'], str):
+        match = re.search(r'₹(\d{1,3}(?:,\d{3})*\.\d{2})', row['Sales Package'])
+        if match:
+            price = match.group(1)
+
+    try:
+        if isinstance(price, str):
+            price = float(price.replace(',', '').replace('₹', '')) / 80  # Convert to USD (approx ₹1 = $0.0125)
+        else:
+            price = float(price) / 80
+    except ValueError:
+        price = None
+    return price
+
+
+# src/cleaning/filkpart/clean_monitors.py and clean_watches.py
+def flipkart_clean_price(price, conversion_rate=0.0125):
+    if isinstance(price, str):
+        price = price.strip().replace(" ", "")
+        if price.startswith("₹"):
+            try:
+                return float(price.replace("₹", "").replace(",", "")) * conversion_rate
+            except Exception:
+                return np.nan
+        elif price.startswith("$"):
+            try:
+                return float(price.replace("$", "").replace(",", ""))
+            except Exception:
+                return np.nan
+        else:
+            try:
+                return float(price)
+            except Exception:
+                return np.nan
+    return price
+
+
+# src/cleaning/ubuy/clean_gpu.py
+def ubuy_gpu_clean_price(price):
+    price = re.sub(r'MAD\s*', '', price)
+    price = re.sub(r'[^\d.]', '', price).strip()
+    try:
+        return float(price)
+    except ValueError:
+        return None
+
+
+# src/cleaning/ubuy/clean_laptops.py
+def ubuy_laptops_clean_price(price):
+    if not isinstance(price, str):
+        return None
+    price = re.sub(r'[^\d\.]', '', price)
+    try:
+        return float(price)
+    except ValueError:
+        return None
+
+
+# src/cleaning/ubuy/clean_smartwatch.py
+def ubuy_smartwatch_clean_price(price):
+    # Convert to string if it's not already
+    if isinstance(price, float):
+        price = str(price)
+
+    price = price.replace("\n", "").replace("\r", "").strip()  # Remove newlines and spaces
+    price = re.sub(r'\s+', '', price)  # Remove all unnecessary spaces
+
+    if price.startswith('MAD'):
+        price = price.replace('MAD', '').replace(',', '')
+
+    try:
+        return float(price)
+    except ValueError:
+        return None
+
+
+# src/cleaning/ubuy/*.py
+def ubuy_convert_to_usd(price_mad, exchange_rate=10):
+    if price_mad is None:
+        return None
+    return round(price_mad / exchange_rate, 2)
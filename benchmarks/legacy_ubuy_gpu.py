@@ -0,0 +1,162 @@
+"""Row-wise cleaning of the Ubuy graphics cards before it was vectorized.
+
+Kept verbatim as the reference for `benchmarks/bench_ubuy_gpu.py`; nothing in
+the pipeline imports it. The price is parsed by the current `clean_price` and the
+title terms are stripped by the current `TITLE_TERMS`, which did not change.
+"""
+import re
+from collections import defaultdict
+
+import pandas as pd
+
+from src.cleaning.ubuy.clean_gpu import TITLE_TERMS, clean_price
+from src.observability import tracing
+
+
+# Function to clean Brand
+def clean_brand(brand_name, title):
+    if pd.notna(brand_name):
+        return brand_name.strip()
+    else:
+        match = re.search(r'\b(?:AMD|NVIDIA|ZOTAC|ASUS|PNY|EVGA|SAPLOS|GALAX|VISIONTEK|YESTON)\b', title)
+        return match.group().strip() if match else None
+
+# Function to clean Memory Size
+def clean_memory_size(memory_ram, graphics_card_ram_size, title):
+    def sanitize(value):
+        if pd.notna(value):
+            value = re.sub(r'[^\d]', '', value)
+            return value.strip()
+        return None
+    memory_ram = sanitize(memory_ram)
+    graphics_card_ram_size = sanitize(graphics_card_ram_size)
+    try:
+        if memory_ram:
+            return int(memory_ram)
+        elif graphics_card_ram_size:
+            return int(graphics_card_ram_size)
+        else:
+            match = re.search(r'(\d+)\s*GB', title)
+            return int(match.group(1)) if match else None
+    except ValueError:
+        return None
+
+# Function to clean Memory Type
+def clean_memory_type(memory_speed, graphics_ram_type, title):
+    if pd.notna(memory_speed):
+        return 'GDDR6' if 'GDDR6' in memory_speed else 'GDDR5'
+    elif pd.notna(graphics_ram_type):
+        return graphics_ram_type.strip()
+    else:
+        match = re.search(r'(?:GDDR[56])', title)
+        return match.group().strip() if match else None
+
+# Function to clean Chipset/GPU Model
+def clean_chipset_gpu_model(graphics_processor_manufacturer, gpu_clock_speed, title):
+    if pd.notna(graphics_processor_manufacturer):
+        return graphics_processor_manufacturer.strip()
+    elif pd.notna(gpu_clock_speed):
+        match = re.search(r'(?:(?:AMD|NVIDIA)\s*Radeon|GeForce)\s*(\w+\s*\d+)', title)
+        return match.group().strip() if match else None
+    else:
+        match = re.search(r'(?:(?:AMD|NVIDIA)\s*Radeon|GeForce)\s*(\w+\s*\d+)', title)
+        return match.group().strip() if match else None
+
+# Function to clean Connectors
+def clean_connectors(video_output_interface, title):
+    if pd.notna(video_output_interface):
+        return video_output_interface.replace(',', ';').strip()
+    else:
+        match = re.search(r'(?:DisplayPort|DVI|HDMI|VGA)(?:,\s*(?:DisplayPort|DVI|HDMI|VGA))*', title)
+        return match.group().replace(',', ';').strip() if match else None
+
+# Function to clean Title
+def clean_title(df):
+    no_values = pd.Series('', index=df.index)
+    title = df.get("title", no_values)
+    clean_names = TITLE_TERMS.strip_series(title.where(title.notna(), "").astype(str).str.strip().str.lower())
+    clean_names = clean_names.str.replace(r"[^a-zA-Z0-9\s]", "", regex=True).str.strip()
+    clean_names = clean_names.str.replace(r"\s+", " ", regex=True)
+    return pd.Series([combine_title(clean_name, gpu_model, brand) for clean_name, gpu_model, brand
+                      in zip(clean_names, df.get("Chipset/GPU Model", no_values), df.get("Brand", no_values))],
+                     index=df.index)
+
+def combine_title(clean_name, gpu_model, brand):
+    gpu_model = str(gpu_model).strip() if pd.notna(gpu_model) else None
+    brand = str(brand).strip() if pd.notna(brand) else None
+    if gpu_model and gpu_model.lower() in clean_name and brand and brand.lower() in clean_name:
+        return f"{brand} {gpu_model}"
+    elif gpu_model and gpu_model.lower() in clean_name:
+        return gpu_model
+    elif brand and brand.lower() in clean_name:
+        return f"{brand} {clean_name}"
+    else:
+        return f"{brand} {gpu_model}" if brand and gpu_model else gpu_model or brand or clean_name
+
+
+def clean(df):
+    # Apply cleaning functions
+    with tracing.span('clean.price', rows=len(df)):
+        df['Price'] = clean_price(df['price'])
+    with tracing.span('clean.brand', rows=len(df)):
+        df['Brand'] = df.apply(lambda row: clean_brand(row['Brand Name'], row['title']), axis=1)
+    with tracing.span('clean.memory_size', rows=len(df)):
+        df['Memory Size'] = df.apply(lambda row: clean_memory_size(row['RAM'], row['Graphics Card Ram Size'], row['title']), axis=1)
+    with tracing.span('clean.memory_type', rows=len(df)):
+        df['Memory Type'] = df.apply(lambda row: clean_memory_type(row['Memory Speed'], row['Graphics RAM Type'], row['title']), axis=1)
+    with tracing.span('clean.gpu_model', rows=len(df)):
+        df['Chipset/GPU Model'] = df.apply(lambda row: clean_chipset_gpu_model(row['Graphics Processor Manufacturer'], row['GPU Clock Speed'], row['title']), axis=1)
+    with tracing.span('clean.connectors', rows=len(df)):
+        df['Connectors'] = df.apply(lambda row: clean_connectors(row['Video Output Interface'], row['title']), axis=1)
+    with tracing.span('clean.title', rows=len(df)):
+        df['Title'] = clean_title(df)
+
+    # Fill missing values using forward fill and backward fill
+    with tracing.span('clean.impute', rows=len(df)):
+        df.ffill(inplace=True)
+        df.bfill(inplace=True)
+
+    # Fill missing Memory Size using defaults
+    memory_size_defaults = defaultdict(lambda: None, {
+        'AMD Radeon RX 580': 8,
+        'NVIDIA GeForce GTX 1050 Ti': 4,
+        'NVIDIA GeForce GTX 1060': 6,
+        'NVIDIA GeForce GTX 1070 Ti': 8,
+        'NVIDIA GeForce GTX 1080 Ti': 11,
+        'NVIDIA GeForce RTX 3060': 12,
+        'NVIDIA GeForce RTX 3070': 8,
+        'NVIDIA GeForce RTX 3080': 10,
+        'NVIDIA GeForce RTX 3090': 24,
+        'NVIDIA GeForce RTX 4060 Ti': 8,
+        'NVIDIA GeForce RTX 4070': 12,
+        'NVIDIA GeForce RTX 4070 Ti': 12,
+        'NVIDIA GeForce RTX 4080': 16,
+        'NVIDIA GeForce RTX 4080 Ti': 16,
+        'AMD Radeon RX 550': 4,
+        'AMD Radeon RX 560': 4,
+        'AMD Radeon RX 5700 XT': 8,
+        'AMD Radeon RX 5500 XT': 8,
+        'AMD Radeon RX 590': 8,
+        'AMD Radeon RX 6600 XT': 8,
+        'AMD Radeon RX 6400': 4,
+        'AMD Radeon RX 7600 EVO': 8,
+        'AMD Radeon RX 7700 XT': 12
+    })
+
+    def fill_missing_memory_size(row):
+        if pd.isna(row['Memory Size']):
+            return memory_size_defaults[row['Chipset/GPU Model']]
+        else:
+            return row['Memory Size']
+
+    with tracing.span('clean.memory_size_defaults', rows=len(df)):
+        df['Memory Size'] = df.apply(fill_missing_memory_size, axis=1)
+
+    # Drop rows where Memory Size is still NaN
+    df.dropna(subset=['Memory Size'], inplace=True)
+
+    # Keep only necessary columns (including Collection Date)
+    columns_to_keep = ['Title', 'Price', 'Brand', 'Memory Size', 'Memory Type', 'Chipset/GPU Model', 'Connectors', 'Collection Date']
+    existing_columns = [col for col in columns_to_keep if col in df.columns]
+    df_cleaned = df[existing_columns]
+    return df_cleaned
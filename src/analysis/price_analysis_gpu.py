@@ -4,6 +4,9 @@ import seaborn as sns
 from pathlib import Path
 import re
 
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # Configure paths
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 CLEANED_DATA_PATH = PROJECT_ROOT / 'data' / 'cleaned'
@@ -45,8 +48,7 @@ def load_cleaned_data():
     dfs = []
     
     for platform in platforms:
-        path = CLEANED_DATA_PATH / platform / 'graphics_cards' / f'*.csv'
-        for file in path.parent.glob(path.name):
+        for file in catalog.paths('cleaned', platform, 'graphics_cards'):
             df = pd.read_csv(file)
             
             # Standardize column names
@@ -140,65 +142,72 @@ def analyze_price_differences(all_platforms_df: pd.DataFrame, two_platforms_df:
     
     # Plot column graphs for each product
     for product, data in grouped.groupby(level=[0, 1, 2]):
-        # Format Memory Size to remove decimals
-        memory_size = str(int(product[0])) if isinstance(product[0], (float, int)) else product[0]
+        with tracing.span('analysis.plot', product=str(product)):
+            # Format Memory Size to remove decimals
+            memory_size = str(int(product[0])) if isinstance(product[0], (float, int)) else product[0]
         
-        # Construct a default title using product specifications
-        product_title = f"{memory_size}_{product[1]}_{product[2]}"
+            # Construct a default title using product specifications
+            product_title = f"{memory_size}_{product[1]}_{product[2]}"
         
-        plt.figure(figsize=(12, 6))
+            plt.figure(figsize=(12, 6))
         
-        # Plot each platform's prices as columns
-        data.plot(kind='bar', figsize=(12, 6))
+            # Plot each platform's prices as columns
+            data.plot(kind='bar', figsize=(12, 6))
         
-        plt.title(f'Price Trends for {product_title}')
-        plt.xlabel('Collection Date')
-        plt.ylabel('Price (USD)')
+            plt.title(f'Price Trends for {product_title}')
+            plt.xlabel('Collection Date')
+            plt.ylabel('Price (USD)')
         
-        # Set x-ticks to only show dates
-        plt.xticks(range(len(data.index)), data.index.get_level_values('collection_date'), rotation=45, ha='right')
+            # Set x-ticks to only show dates
+            plt.xticks(range(len(data.index)), data.index.get_level_values('collection_date'), rotation=45, ha='right')
         
-        plt.legend(title='Platform')
-        plt.grid(True)
-        plt.tight_layout()
+            plt.legend(title='Platform')
+            plt.grid(True)
+            plt.tight_layout()
         
-        # Sanitize the title for file naming
-        sanitized_title = (
-            "_".join(product_title.split())
-            .replace("/", "_")
-            .replace("\\", "_")
-            .replace(":", "_")
-            .replace("*", "_")
-            .replace("?", "_")
-            .replace('"', "_")
-            .replace("<", "_")
-            .replace(">", "_")
-            .replace("|", "_")
-        )
+            # Sanitize the title for file naming
+            sanitized_title = (
+                "_".join(product_title.split())
+                .replace("/", "_")
+                .replace("\\", "_")
+                .replace(":", "_")
+                .replace("*", "_")
+                .replace("?", "_")
+                .replace('"', "_")
+                .replace("<", "_")
+                .replace(">", "_")
+                .replace("|", "_")
+            )
         
-        # Save the plot with dynamic file naming
-        file_name = f"Product{product_counter:02d}_{sanitized_title}.png"
-        plt.savefig(category_results / file_name)
-        plt.close()
+            # Save the plot with dynamic file naming
+            file_name = f"Product{product_counter:02d}_{sanitized_title}.png"
+            plt.savefig(category_results / file_name)
+            plt.close()
         
-        # Increment the counter for the next product
-        product_counter += 1
+            # Increment the counter for the next product
+            product_counter += 1
 
 if __name__ == "__main__":
+    tracing.start_run('price_analysis_gpu')
+    profiling.start_from_env('price_analysis_gpu')
     try:
         print("Analyzing graphics cards...")
         
         # Load cleaned data for graphics cards
-        df = load_cleaned_data()
+        with tracing.span('analysis.load') as load_span:
+            df = load_cleaned_data()
+            load_span.set(rows=len(df))
         
         # Filter products based on their availability across platforms
-        all_platforms_df, two_platforms_df = filter_products_by_platforms(df)
+        with tracing.span('analysis.group', rows=len(df)):
+            all_platforms_df, two_platforms_df = filter_products_by_platforms(df)
         
         # Print summary of identified products
         print(f"Products available on all platforms: {len(all_platforms_df)}")
         print(f"Products available on any two platforms: {len(two_platforms_df)}")
         
         # Analyze price differences
-        analyze_price_differences(all_platforms_df, two_platforms_df, df)
+        with tracing.span('analysis.plots'):
+            analyze_price_differences(all_platforms_df, two_platforms_df, df)
     except Exception as e:
         print(f"Error processing graphics cards: {str(e)}")
\ No newline at end of file
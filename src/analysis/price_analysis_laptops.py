@@ -5,6 +5,9 @@ from pathlib import Path
 import re
 import logging
 
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,7 +42,7 @@ def load_cleaned_data():
             logger.warning(f"Missing data directory: {data_dir}")
             continue
             
-        for file in data_dir.glob('*.csv'):
+        for file in catalog.paths('cleaned', platform, 'laptops'):
             try:
                 df = pd.read_csv(file)
                 df.columns = [col.strip().lower().replace(" ", "_") for col in df.columns]
@@ -95,37 +98,42 @@ def analyze_price_differences(filtered_df: pd.DataFrame):
     
     # Generate bar plots for each product
     for product_id, data in grouped.groupby(level=0):
-        plt.figure(figsize=(12, 6))
+        with tracing.span('analysis.plot', product=str(product_id)):
+            plt.figure(figsize=(12, 6))
         
-        # Plot bar graph
-        data.plot(kind='bar', figsize=(12, 6))
+            # Plot bar graph
+            data.plot(kind='bar', figsize=(12, 6))
         
-        # Set title and labels
-        plt.title(f"Price Trends for {product_id.replace('|', ' ')}")
-        plt.xlabel("Collection Date")
-        plt.ylabel("Price (USD)")
+            # Set title and labels
+            plt.title(f"Price Trends for {product_id.replace('|', ' ')}")
+            plt.xlabel("Collection Date")
+            plt.ylabel("Price (USD)")
         
-        # Format x-axis dates
-        plt.xticks(range(len(data.index)), data.index.get_level_values('collection_date'), rotation=45, ha='right')
+            # Format x-axis dates
+            plt.xticks(range(len(data.index)), data.index.get_level_values('collection_date'), rotation=45, ha='right')
         
-        # Add legend and grid
-        plt.legend(title='Platform')
-        plt.grid(True)
-        plt.tight_layout()
+            # Add legend and grid
+            plt.legend(title='Platform')
+            plt.grid(True)
+            plt.tight_layout()
         
-        # Save the plot
-        sanitized_title = re.sub(r"[^\w\s]", "_", product_id.replace("|", "_"))
-        file_name = f"Product_{sanitized_title}.png"
-        plt.savefig(RESULTS_PATH / 'laptops' / file_name)
-        plt.close()
+            # Save the plot
+            sanitized_title = re.sub(r"[^\w\s]", "_", product_id.replace("|", "_"))
+            file_name = f"Product_{sanitized_title}.png"
+            plt.savefig(RESULTS_PATH / 'laptops' / file_name)
+            plt.close()
 
 if __name__ == "__main__":
+    tracing.start_run('price_analysis_laptops')
+    profiling.start_from_env('price_analysis_laptops')
     RESULTS_PATH.mkdir(exist_ok=True)
     (RESULTS_PATH / 'laptops').mkdir(exist_ok=True)
     
     try:
         logger.info("Loading and processing laptop data...")
-        df = load_cleaned_data()
+        with tracing.span('analysis.load') as load_span:
+            df = load_cleaned_data()
+            load_span.set(rows=len(df))
         
         if df.empty:
             logger.error("No cleaned data found. Check data/cleaned directories.")
@@ -133,10 +141,12 @@ if __name__ == "__main__":
             
         logger.info(f"Loaded {len(df)} records from cleaned data")
         
-        filtered_df = filter_products_by_platforms(df)
+        with tracing.span('analysis.group', rows=len(df)):
+            filtered_df = filter_products_by_platforms(df)
         logger.info(f"Found {len(filtered_df)} cross-platform product entries")
         
-        analyze_price_differences(filtered_df)
+        with tracing.span('analysis.plots', rows=len(filtered_df)):
+            analyze_price_differences(filtered_df)
         
     except Exception as e:
         logger.error(f"Critical error: {str(e)}", exc_info=True)
\ No newline at end of file
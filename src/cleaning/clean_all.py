@@ -0,0 +1,181 @@
+"""Runs every cleaner over its raw files in parallel.
+
+Each (site, category, raw file) is one job (`registry.clean_file`), and the
+jobs run over --workers processes, one per core by default. The biggest files
+start first, so the whole stage takes about as long as its slowest file
+rather than the sum of all of them. Each cleaned file is logged with its
+validation report (how many rows each rule rejected or flagged); a failing
+job is logged and counted and the others go on. The run ends with the time,
+rows and outcome of every job, and exits with 1 if any failed.
+
+Only the raw files that are new or changed since their last cleaning, or
+whose cleaner changed, are cleaned again (see `manifest`); --force cleans
+them all. Cleaned files whose raw file is gone are deleted first, unless
+--keep-stale.
+
+    python -m src.cleaning.clean_all
+    python -m src.cleaning.clean_all --site ebay --category laptops --workers 2
+    python -m src.cleaning.clean_all --force
+    python -m src.cleaning.clean_all --chunksize 100000
+
+With --chunksize, the cleaners that support it read their raw files that many
+rows at a time, in memory that does not grow with the file (see
+`common/chunked.py`); the others load them whole.
+
+Once cleaned, the files are recorded in the store of listings seen across
+scrapes (`listings`), which tells their new and changed rows from those seen
+before.
+
+The per-file sketches of the statistics pooled over a category (`pool`) are
+brought up to date before the jobs start, so workers share them instead of
+each computing them.
+
+Workers are spawned rather than forked, so none inherits the parent's SQLite
+connections. Each one writes its own trace (clean_all_worker<pid>).
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.cleaning import listings, manifest, pool, registry
+from src.cleaning.common import validation
+from src.common import catalog
+from src.observability import logs, profiling, tracing
+
+Job = namedtuple('Job', 'site category path bytes chunksize')
+Result = namedtuple('Result', 'job rows_in rows_out output seconds error validation', defaults=(None,))
+
+logger = logging.getLogger('cleaning.clean_all')
+
+
+def plan_jobs(sites=None, categories=None, force=False, chunksize=None):
+    """The raw files of the selected cleaners not cleaned yet (all of them with `force`), biggest first."""
+    jobs = []
+    for cleaner in registry.select(sites, categories):
+        for path in catalog.paths('raw', cleaner.site, cleaner.category):
+            if force or not manifest.is_current(cleaner, path, chunksize):
+                jobs.append(Job(cleaner.site, cleaner.category, str(path), path.stat().st_size, chunksize))
+    return sorted(jobs, key=lambda job: job.bytes, reverse=True)
+
+
+def _start_worker():
+    name = f'clean_all_worker{os.getpid()}'
+    tracing.start_run(name)
+    profiling.start_from_env(name)
+
+
+def run_job(job):
+    """Cleans one raw file; runs in a worker process and never raises."""
+    start = time.perf_counter()
+    try:
+        with tracing.span('clean_all.job', site=job.site, category=job.category, file=os.path.basename(job.path)):
+            cleaned = registry.clean_file(registry.get(job.site, job.category), job.path, job.chunksize)
+        return Result(job, cleaned.rows_in, cleaned.rows_out, str(cleaned.output), time.perf_counter() - start, None,
+                      cleaned.validation)
+    except Exception as e:
+        error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        return Result(job, None, None, None, time.perf_counter() - start, error)
+
+
+def run(jobs, workers):
+    """Runs the jobs over `workers` processes and returns their results as they finish."""
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_start_worker) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            job = result.job
+            extra = {'site': job.site, 'category': job.category, 'file': job.path, 'seconds': round(result.seconds, 3)}
+            if result.error:
+                logs.summary.incr('jobs_failed', job.site)
+                logger.error("Cleaning %s failed after %.2fs: %s", job.path, result.seconds, result.error,
+                             extra={**extra, 'error': result.error})
+            else:
+                # Recorded here rather than in the workers: the manifest has one writer
+                manifest.record(registry.get(job.site, job.category), job.path, result.output, job.chunksize)
+                logs.summary.incr('jobs_done', job.site)
+                logger.info("Cleaned %s: %d -> %d rows in %.2fs", job.path, result.rows_in, result.rows_out,
+                            result.seconds, extra={**extra, 'rows_in': result.rows_in, 'rows_out': result.rows_out})
+                if result.validation is not None:
+                    logger.info("Validation of %s: %s", job.path, validation.format_report(result.validation),
+                                extra={**extra, 'validation': result.validation})
+    return results
+
+
+def report(results, elapsed):
+    """Prints one line per job, slowest first."""
+    print(f"{'site':<9}{'category':<16}{'seconds':>9}{'rows in':>9}{'rows out':>9}  file")
+    for result in sorted(results, key=lambda item: item.seconds, reverse=True):
+        job = result.job
+        rows_in = '-' if result.rows_in is None else result.rows_in
+        rows_out = 'FAILED' if result.error else result.rows_out
+        print(f"{job.site:<9}{job.category:<16}{result.seconds:>9.2f}{rows_in:>9}{rows_out:>9}  "
+              f"{os.path.basename(job.path)}")
+    slowest = max((result.seconds for result in results), default=0)
+    print(f"{len(results)} files in {elapsed:.2f}s (slowest file {slowest:.2f}s, "
+          f"sum of all files {sum(result.seconds for result in results):.2f}s)")
+
+
+def record_listings(cleaners):
+    """Records the cleaned files of `cleaners` not in the listings store yet."""
+    with tracing.span('clean_all.listings'):
+        recorded = listings.update(cleaners)
+    counts = {status: sum(counts[status] for counts in recorded.values()) for status in listings.STATUSES}
+    logger.info("Recorded %d cleaned files in the listings: %d new rows, %d changed, %d seen before", len(recorded),
+                counts['new'], counts['changed'], counts['seen'], extra={'files': len(recorded), **counts})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.cleaning.clean_all',
+                                     description='Clean the raw files of every site and category in parallel.')
+    parser.add_argument('--site', action='append', choices=registry.SITES, help='site to clean (repeatable, default: all)')
+    parser.add_argument('--category', action='append', choices=registry.CATEGORIES,
+                        help='category to clean (repeatable, default: all)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='cleaning processes (default: one per core)')
+    parser.add_argument('--force', action='store_true', help='clean every raw file, even those cleaned already')
+    parser.add_argument('--keep-stale', action='store_true',
+                        help='keep the cleaned files whose raw file is gone')
+    parser.add_argument('--chunksize', type=int,
+                        help='rows read at a time by the cleaners that support it (default: whole files)')
+    options = parser.parse_args(argv)
+
+    removed = [] if options.keep_stale else manifest.collect_garbage(registry.select(options.site, options.category))
+    jobs = plan_jobs(options.site, options.category, options.force, options.chunksize)
+    # Two lines per job (the cleaning and its validation report), however many there are
+    logs.setup('clean_all', rate_limit=logs.RateLimitFilter(burst=max(5, 2 * len(jobs), len(removed))))
+    tracing.start_run('clean_all')
+    for path in removed:
+        logs.summary.incr('stale_removed', path.parent.parent.name)
+        logger.info("Removed the stale cleaned file %s", path, extra={'file': str(path)})
+    if not jobs:
+        logger.info("Every cleaned file is up to date")
+        record_listings(registry.select(options.site, options.category))
+        return 0
+    for cleaner in dict.fromkeys(registry.get(job.site, job.category) for job in jobs):
+        if registry.uses_pool(cleaner):
+            with tracing.span('clean_all.pool', site=cleaner.site, category=cleaner.category):
+                pool.get().values(cleaner)
+    workers = max(1, min(options.workers, len(jobs)))
+    logger.info("Cleaning %d files over %d workers", len(jobs), workers, extra={'jobs': len(jobs), 'workers': workers})
+
+    start = time.perf_counter()
+    with tracing.span('clean_all', jobs=len(jobs), workers=workers):
+        results = run(jobs, workers)
+    report(results, time.perf_counter() - start)
+    record_listings(registry.select(options.site, options.category))
+    failed = sum(1 for result in results if result.error)
+    if failed:
+        logger.warning("%d of %d files failed to clean", failed, len(jobs))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
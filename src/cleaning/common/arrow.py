@@ -0,0 +1,183 @@
+"""The Arrow-backed cleaning mode (PIPELINE_DTYPE_BACKEND=pyarrow).
+
+Most of the cleaning is string work on titles, spec strings and prices. In
+this mode `schemas.read` loads raw files with `dtype_backend='pyarrow'`, so
+text columns are `ArrowDtype(string)` from the start, and pandas runs their
+`.str` methods with Arrow's compute kernels (C++) instead of a Python loop
+over objects. It needs pyarrow; the default ('numpy') keeps object columns.
+Only text stays Arrow-backed (`text_only`): numbers, dates and the
+categories of categoricals are read as in the default mode, so that a
+missing integer is still a float NaN and a mapped category still None.
+
+Row-wise steps (`.apply`) get `pd.NA` for a missing text, where the default
+mode gives them NaN; `as_str` is `astype(str)` with the default's 'nan'.
+
+Arrow's regexes are RE2's: no lookarounds or backreferences, and `\\b`,
+`\\w`, `\\d` and `\\s` only know ASCII. Arrow-backed Series also take no
+compiled pattern or flags. `replace`, `extract` and `contains` take the same
+(compiled) regex as the object path and pick: the Arrow kernel when RE2 can
+run the pattern and the values are ASCII (or the pattern has nothing that
+depends on it), or else Python's `re` over the values as objects, with the
+result turned back into Arrow strings. Either way the result is the one
+`re` gives. On object columns they are the plain `.str` calls.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.compute as pc
+except ImportError:  # optional: only the Arrow mode needs it
+    pyarrow = pc = None
+
+BACKEND = os.environ.get('PIPELINE_DTYPE_BACKEND', 'numpy')
+
+STRING = pd.ArrowDtype(pyarrow.string()) if pyarrow is not None else None
+
+# What Python's re has and RE2 lacks: lookarounds, atomic groups, conditionals and backreferences
+_NOT_RE2 = re.compile(r'\(\?(?:[=!>(]|<[=!]|P=)|\\[1-9]')
+# Classes and flags whose meaning RE2 restricts to ASCII
+_UNICODE_SENSITIVE = re.compile(r'\\[bBwWdDsS]')
+_FLAGS = {re.IGNORECASE: 'i', re.MULTILINE: 'm', re.DOTALL: 's'}
+
+
+def enabled():
+    return BACKEND == 'pyarrow'
+
+
+def read_options():
+    """The `pd.read_csv` options of the mode."""
+    if not enabled():
+        return {}
+    if pyarrow is None:
+        raise ImportError('PIPELINE_DTYPE_BACKEND=pyarrow needs pyarrow')
+    return {'dtype_backend': 'pyarrow'}
+
+
+def is_arrow(values):
+    return isinstance(values.dtype, pd.ArrowDtype)
+
+
+def _is_text_type(pa_type):
+    return pyarrow.types.is_string(pa_type) or pyarrow.types.is_large_string(pa_type)
+
+
+def text_only(df):
+    """`df` read with `read_options()`, with every column but the text ones as the default mode reads it."""
+    for column in df.columns:
+        values = df[column]
+        if is_arrow(values) and not _is_text_type(values.dtype.pyarrow_dtype):
+            df[column] = np.nan if pyarrow.types.is_null(values.dtype.pyarrow_dtype) else as_numpy(values)
+        elif isinstance(values.dtype, pd.CategoricalDtype) and is_arrow(values.cat.categories):
+            df[column] = values.cat.set_categories(values.cat.categories.astype(object), rename=True)
+    return df
+
+
+def as_numpy(values):
+    """Arrow-backed `values` as NumPy ones, as pandas gives them from objects: integers with NaN are floats."""
+    if not is_arrow(values):
+        return values
+    return pd.Series(pyarrow.array(values.array).to_pandas(), index=values.index, name=values.name)
+
+
+def to_numeric(values, errors='raise'):
+    """`pd.to_numeric(values, errors=errors)`, in NumPy dtypes whatever the backend of `values`."""
+    return as_numpy(pd.to_numeric(values, errors=errors))
+
+
+def as_str(values):
+    """`values.astype(str)`, with the 'nan' of the default mode for missing values, Arrow text staying Arrow."""
+    if is_arrow(values) and _is_text_type(values.dtype.pyarrow_dtype):
+        return values.fillna('nan')
+    if is_arrow(values):
+        return values.astype(object).where(values.notna(), np.nan).astype(str)
+    return values.astype(str)
+
+
+def _re2(regex, values):
+    """The pattern of `regex` for the Arrow kernels on `values`, or None when only Python's re gives its result."""
+    pattern, flags = (regex.pattern, regex.flags & ~re.UNICODE) if isinstance(regex, re.Pattern) else (regex, 0)
+    if not isinstance(pattern, str) or _NOT_RE2.search(pattern):
+        return None
+    letters = ''.join(letter for flag, letter in _FLAGS.items() if flags & flag)
+    if flags & ~sum(_FLAGS):
+        return None
+    if _UNICODE_SENSITIVE.search(pattern) or 'i' in letters:
+        if pc.all(pc.string_is_ascii(pyarrow.array(values.array))).as_py() is False:
+            return None
+    return f'(?{letters}){pattern}' if letters else pattern
+
+
+def replace(values, regex, repl=''):
+    """`values.str.replace(regex, repl, regex=True)`."""
+    if not is_arrow(values):
+        return values.str.replace(regex, repl, regex=True)
+    pattern = _re2(regex, values)
+    if pattern is not None and not callable(repl):
+        try:
+            return values.str.replace(pattern, repl, regex=True)
+        except (pyarrow.ArrowInvalid, NotImplementedError):
+            pass
+    return values.astype(object).str.replace(regex, repl, regex=True).astype(STRING)
+
+
+def _named_groups(pattern):
+    # Arrow's extract only takes named groups: the unnamed ones become (?P<_N>...), N their number
+    named, number, position, in_class = [], 0, 0, False
+    while position < len(pattern):
+        character = pattern[position]
+        if character == '\\':
+            named.append(pattern[position:position + 2])
+            position += 2
+            continue
+        if character == '[' and not in_class:
+            in_class = True
+        elif character == ']' and in_class:
+            in_class = False
+        elif character == '(' and not in_class:
+            if pattern.startswith('(?P<', position):
+                number += 1
+            elif not pattern.startswith('(?', position):
+                number += 1
+                character = f'(?P<_{number}>'
+        named.append(character)
+        position += 1
+    return ''.join(named)
+
+
+def extract(values, regex, expand=True):
+    """`values.str.extract(regex, expand=expand)`."""
+    if not is_arrow(values):
+        return values.str.extract(regex, expand=expand)
+    pattern = _re2(regex, values)
+    if pattern is not None:
+        compiled = re.compile(regex) if isinstance(regex, str) else regex
+        names = {number: name for name, number in compiled.groupindex.items()}
+        try:
+            found = values.str.extract(_named_groups(pattern), expand=expand)
+        except (pyarrow.ArrowInvalid, NotImplementedError):
+            pass
+        else:
+            # Named as the object path names them: by group name, else by position
+            if isinstance(found, pd.DataFrame):
+                found.columns = [names.get(number + 1, number) for number in range(compiled.groups)]
+            else:
+                found.name = names.get(1)
+            return found
+    return values.astype(object).str.extract(regex, expand=expand).astype(STRING)
+
+
+def contains(values, regex, na=False):
+    """`values.str.contains(regex, regex=True, na=na)`, as booleans."""
+    if not is_arrow(values):
+        return values.str.contains(regex, regex=True, na=na)
+    pattern = _re2(regex, values)
+    if pattern is not None:
+        try:
+            return values.str.contains(pattern, regex=True).fillna(na).astype(bool)
+        except (pyarrow.ArrowInvalid, NotImplementedError):
+            pass
+    return values.astype(object).str.contains(regex, regex=True, na=na).astype(bool)
@@ -0,0 +1,214 @@
+"""Cleaning a raw file chunk by chunk, in memory that does not grow with the file.
+
+A cleaner can be run this way when it splits its `clean(df)` into:
+
+- `prepare(df)`: what it does to each row on its own (parsing, extraction);
+- `IMPUTATION`: the file-wide statistics it needs, as `imputation.Rule`s;
+- `finish(df, values)`: the rest, given the values of those statistics;
+- optionally `deduplicator()`, a new `DropDuplicates` or `KeepMinimum`, and
+  `complete(df)`, applied to the rows the deduplicator keeps.
+
+`clean_file` reads the raw file twice, --chunksize rows at a time: the first
+pass feeds every prepared chunk to `imputation.Sketches`, the second
+prepares, finishes and deduplicates each chunk with the statistics of the
+whole file, and appends it to the output. Memory then depends on the chunk
+size and the sketches only, plus, with `KeepMinimum`, the rows kept so far
+(one per key, so no more than the output).
+
+Each chunk is read with the dtypes a read of the whole file gives its
+columns (`file_dtypes`, one more pass over the file), not those of its own
+rows: a text column that is empty in one chunk, or numbers in one chunk of a
+column with text further down, would otherwise reach the cleaner as floats.
+Likewise, a column `prepare` fills with integers is written as floats in
+every chunk when it has gaps anywhere in the file, as it is in one frame.
+
+The sketches are exact up to a couple of thousand values per column or
+group, so a file of that size gets the same fill values as when it is cleaned
+whole; a bigger one gets approximate medians and modes.
+"""
+import numpy as np
+import pandas as pd
+
+from src.cleaning.common import imputation, schemas, validation
+from src.observability import tracing
+
+CHUNKSIZE = 50_000
+
+
+def supports(module):
+    return all(hasattr(module, name) for name in ('prepare', 'IMPUTATION', 'finish'))
+
+
+def _file_dtype(dtypes):
+    # The dtype of a column over the whole file, from those of its chunks (None for a chunk where it is empty)
+    found = set(dtypes) - {None}
+    if not found:
+        return str  # empty throughout, which the pyarrow engine reads as missing text
+    if found <= {np.dtype('int64')} and None not in dtypes:
+        return np.dtype('int64')
+    if all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) for dtype in found):
+        return np.dtype('float64')
+    if found == {np.dtype('bool')}:
+        return None  # True/False with gaps: left to each chunk
+    return str
+
+
+def _see(seen, df):
+    # Adds the dtype of each column of `df` to those of the chunks before
+    for column in df.columns:
+        values = df[column]
+        seen.setdefault(column, []).append(None if values.isna().all() else values.dtype)
+
+
+def file_dtypes(path, chunksize, schema=None, **options):
+    """The dtype of each column in a read of the whole file, from a pass over its chunks; text is `str`."""
+    seen = {}
+    for chunk in schemas.read(path, schema, chunksize, **options):
+        _see(seen, chunk)
+    dtypes = {}
+    for column, chunk_dtypes in seen.items():
+        if any(isinstance(dtype, pd.CategoricalDtype) for dtype in chunk_dtypes):
+            continue  # declared by the schema, which `schemas.read` applies anyway
+        dtype = _file_dtype(chunk_dtypes)
+        if dtype is not None:
+            dtypes[column] = dtype
+    return dtypes
+
+
+def read_chunks(path, chunksize, schema=None, **options):
+    """
+    The chunks of a CSV, as `schemas.read(path, schema, chunksize)` gives
+    them, in the dtypes of the whole file unless `options` gives a `dtype`.
+    """
+    if 'dtype' not in options:
+        options['dtype'] = file_dtypes(path, chunksize, schema, **options)
+    for chunk in schemas.read(path, schema, chunksize, **options):
+        chunk.attrs['source'] = str(path)
+        yield chunk
+
+
+class DropDuplicates:
+    """Keeps the first row of every distinct `subset` (every column by default), chunk after chunk."""
+
+    def __init__(self, subset=None):
+        self.subset = subset
+        self._seen = set()
+
+    def add(self, df):
+        hashes = pd.util.hash_pandas_object(df if self.subset is None else df[self.subset], index=False)
+        new = ~hashes.duplicated() & ~hashes.isin(self._seen)
+        self._seen.update(hashes[new].tolist())
+        return df[new.to_numpy()]
+
+    def rest(self):
+        return None
+
+
+class KeepMinimum:
+    """
+    Keeps the row with the lowest `by` of every distinct `subset`, the first
+    one on a tie. Rows with a missing key are dropped unless `dropna` is
+    False. The rows come out at the end, ordered by key or, with
+    `sort='value'`, by `by`.
+    """
+
+    def __init__(self, subset, by, dropna=True, sort='keys'):
+        self.subset = list(subset)
+        self.by = by
+        self.dropna = dropna
+        self.sort = sort
+        self._kept = None
+
+    def add(self, df):
+        rows = df if self._kept is None else pd.concat([self._kept, df], ignore_index=True)
+        rows = rows.reset_index(drop=True)
+        best = rows.groupby(self.subset, dropna=self.dropna, sort=False)[self.by].idxmin().dropna()
+        self._kept = rows.loc[sorted(best.astype(int))]
+        return df.iloc[:0]
+
+    def rest(self):
+        if self._kept is None:
+            return None
+        order = self.subset if self.sort == 'keys' else [self.by]
+        return self._kept.sort_values(order, kind='stable').reset_index(drop=True)
+
+
+def sketches(module, path, chunksize=CHUNKSIZE, seen=None, **options):
+    """
+    The `imputation.Sketches` of the module's rules over the prepared rows of
+    the whole file. The dtypes of the prepared chunks are added to `seen`.
+    """
+    sketch = imputation.Sketches(module.IMPUTATION)
+    for chunk in read_chunks(path, chunksize, getattr(module, 'SCHEMA', None), **options):
+        part = imputation.Sketches(module.IMPUTATION)
+        prepared = module.prepare(chunk)
+        if seen is not None:
+            _see(seen, prepared)
+        part.update(prepared)
+        sketch.merge(part)
+    return sketch
+
+
+def _widened(seen):
+    # The prepared columns that are integers in some chunks and floats over the whole file
+    return [column for column, dtypes in seen.items()
+            if np.dtype('int64') in dtypes and _file_dtype(dtypes) == np.dtype('float64')]
+
+
+def statistics(module, path, chunksize=CHUNKSIZE, **options):
+    """First pass: the values of the module's rules over the whole file."""
+    return sketches(module, path, chunksize, **options).values()
+
+
+def clean_file(module, path, output_path, chunksize=CHUNKSIZE, **options):
+    """
+    Cleans the raw file `path` into `output_path` with `module`. Returns the
+    rows read, the rows written and the `validation` report of the file
+    (None when the cleaner validates nothing).
+    """
+    if 'dtype' not in options:  # once for both passes
+        options['dtype'] = file_dtypes(path, chunksize, getattr(module, 'SCHEMA', None), **options)
+    seen = {}
+    with tracing.span('clean.statistics', file=str(path)):
+        values = sketches(module, path, chunksize, seen=seen, **options).values()
+    widened = _widened(seen)
+    deduplicator = module.deduplicator() if hasattr(module, 'deduplicator') else None
+    complete = getattr(module, 'complete', None)
+    rows_in = rows_out = 0
+    columns = None
+    reports = []
+
+    def write(df):
+        nonlocal rows_out, columns
+        if complete is not None:
+            df = complete(df)
+            reports.append(df.attrs.pop('validation', None))
+        if columns is None:
+            columns = list(df.columns)
+            df.to_csv(output_path, index=False)
+        else:
+            df.reindex(columns=columns).to_csv(output_path, mode='a', header=False, index=False)
+        rows_out += len(df)
+
+    for chunk in read_chunks(path, chunksize, getattr(module, 'SCHEMA', None), **options):
+        rows_in += len(chunk)
+        with tracing.span('clean.chunk', rows=len(chunk)):
+            prepared = module.prepare(chunk)
+            for column in widened:
+                if pd.api.types.is_integer_dtype(prepared[column]):
+                    prepared[column] = prepared[column].astype('float64')
+            cleaned = module.finish(prepared, values)
+            reports.append(cleaned.attrs.pop('validation', None))
+            if deduplicator is not None:
+                cleaned = deduplicator.add(cleaned)
+            write(cleaned)
+    rest = deduplicator.rest() if deduplicator is not None else None
+    if rest is not None:
+        write(rest)
+    elif columns is None:  # no rows at all
+        empty = schemas.read(path, getattr(module, 'SCHEMA', None), **options)
+        empty.attrs['source'] = str(path)
+        empty = module.finish(module.prepare(empty), values)
+        reports.append(empty.attrs.pop('validation', None))
+        write(empty)
+    return rows_in, rows_out, validation.combine(report for report in reports if report is not None)
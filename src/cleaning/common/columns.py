@@ -0,0 +1,29 @@
+"""Helpers for cleaning functions that work on whole columns."""
+import numpy as np
+import pandas as pd
+
+
+def per_distinct(function, values):
+    """
+    Applies `function`, which takes and returns a Series (or returns a
+    DataFrame) on the same index, to the distinct values of `values` only and
+    spreads the result over the rows. Scraped columns repeat a lot (the same
+    listing every run, the same few sales packages), so this divides the work
+    by the repetition. Missing values are passed once, as a last NaN entry.
+    """
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    distinct = pd.Series(uniques).reindex(range(len(uniques) + 1))
+    result = function(distinct).take(np.where(codes < 0, len(uniques), codes))
+    result.index = values.index
+    return result
+
+
+def get(df, name):
+    """
+    The column `name` of `df`, or an all-missing one when the file has no such
+    column: a scrape only has the product-detail columns of the products it saw.
+    """
+    if name in df.columns:
+        return df[name]
+    return pd.Series(np.nan, index=df.index, dtype=object)
@@ -0,0 +1,70 @@
+"""Brand and model dictionary, and the matcher that finds its terms in titles.
+
+The known brands and models of every site and category live in brands.json
+next to this module, under a version number to bump on every edit (the
+cleaned files then differ for a reason that is written down). A list is in
+priority order: when a title contains several of its terms, the cleaners
+keep the one listed first, whatever its position in the title.
+
+`matcher(kind, name)` compiles a list once into a `TermMatcher`, which scans
+each title a single time: the terms are joined, in priority order, into one
+alternation inside a lookahead, so the regex engine reports at every position
+of the title the highest-priority term starting there, and the best of those
+is the highest-priority term anywhere in the title. Matching is on the
+lowercased title and terms, like `term.lower() in title.lower()`.
+"""
+import functools
+import json
+import re
+from pathlib import Path
+
+import pandas as pd
+
+DICTIONARY_PATH = Path(__file__).with_name('brands.json')
+
+
+@functools.lru_cache(maxsize=None)
+def load(path=DICTIONARY_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def version():
+    return load()['version']
+
+
+def terms(kind, name):
+    """The list `name` (e.g. 'ubuy/laptops') of `kind` ('brands' or 'models')."""
+    return list(load()[kind][name])
+
+
+class TermMatcher:
+    """Finds, in one pass per title, which terms of a priority-ordered list it contains."""
+
+    def __init__(self, terms):
+        # Terms equal once lowercased are one term, spelled as listed first
+        self.terms = {}
+        for term in terms:
+            self.terms.setdefault(term.lower(), term)
+        self.priority = {term: rank for rank, term in enumerate(self.terms)}
+        self._regex = re.compile('(?=(' + '|'.join(map(re.escape, self.terms)) + '))')
+
+    def _best(self, found, default):
+        if not isinstance(found, list) or not found:
+            return default
+        return self.terms[min(found, key=self.priority.__getitem__)]
+
+    def first(self, titles, default=None):
+        """The highest-priority term in each title of a Series, or `default`."""
+        found = titles.astype(object).str.lower().str.findall(self._regex)
+        return pd.Series([self._best(terms_found, default) for terms_found in found], index=titles.index, dtype=object)
+
+    def leftmost(self, titles, default=None):
+        """The term that starts first in each title (the highest-priority one on a tie), or `default`."""
+        found = titles.astype(object).str.lower().str.extract(self._regex, expand=False)
+        return found.map(self.terms).astype(object).where(found.notna(), default)
+
+
+@functools.lru_cache(maxsize=None)
+def matcher(kind, name):
+    return TermMatcher(terms(kind, name))
@@ -0,0 +1,148 @@
+"""Fuzzy matching of column values against a vocabulary (brands, models, OS).
+
+`best_matches(values, vocabulary)` gives, for every value of a Series, the
+closest entry of the vocabulary and its score, as `process.extractOne` with
+the default WRatio scorer would, but:
+
+- each distinct value is scored once, however many rows repeat it;
+- the distinct values are scored against the whole vocabulary in one
+  `rapidfuzz.process.cdist` call (C++, every core) when rapidfuzz is
+  installed, falling back on fuzzywuzzy otherwise;
+- results are kept in a SQLite cache (data/fuzzy_cache.sqlite, or
+  PIPELINE_FUZZY_CACHE; empty to disable), keyed by the vocabulary and the
+  library, so a rerun over the same files scores nothing again.
+
+Scores are rounded to integers like fuzzywuzzy's, and ties at the rounded
+score go to the first entry of the vocabulary, like `extractOne`. Missing
+vocabulary entries are dropped and the others matched as strings. rapidfuzz scores like fuzzywuzzy with
+python-Levenshtein; the pure-Python fallback of fuzzywuzzy (difflib) can
+differ by a point or two on some pairs, which is why the library is part of
+the cache key.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from rapidfuzz import fuzz as rapid_fuzz, process as rapid_process, utils as rapid_utils
+except ImportError:  # fuzzywuzzy is in requirements.txt
+    rapid_process = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+CACHE_PATH = os.environ.get('PIPELINE_FUZZY_CACHE', str(PROJECT_ROOT / 'data' / 'fuzzy_cache.sqlite'))
+BACKEND = 'rapidfuzz' if rapid_process is not None else 'fuzzywuzzy'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    vocabulary TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    query TEXT NOT NULL,
+    match TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    PRIMARY KEY (vocabulary, backend, query)
+);
+"""
+
+
+def clean_vocabulary(vocabulary):
+    """The entries of `vocabulary` as strings, in order, without the missing ones."""
+    return [entry if isinstance(entry, str) else str(entry) for entry in vocabulary if not pd.isna(entry)]
+
+
+def vocabulary_key(vocabulary):
+    """Digest of a vocabulary; the order counts, as it breaks ties."""
+    return hashlib.sha256('\n'.join(clean_vocabulary(vocabulary)).encode('utf-8')).hexdigest()
+
+
+class MatchCache:
+    """Best matches already computed, per vocabulary and backend."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._connection.executescript(_SCHEMA)
+
+    def get(self, vocabulary, queries):
+        """{query: (match, score)} of the queries that are cached."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(queries), 500):
+                chunk = queries[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT query, match, score FROM matches WHERE vocabulary = ? AND backend = ? "
+                    f"AND query IN ({','.join('?' * len(chunk))})", [vocabulary, BACKEND, *chunk])
+                found.update((query, (match, score)) for query, match, score in rows)
+        return found
+
+    def put(self, vocabulary, results):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO matches (vocabulary, backend, query, match, score) VALUES (?, ?, ?, ?, ?)',
+                [(vocabulary, BACKEND, query, match, score) for query, (match, score) in results.items()])
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The cache of this process, or None when PIPELINE_FUZZY_CACHE is empty."""
+    global _cache
+    with _cache_lock:
+        if _cache is None and CACHE_PATH:
+            _cache = MatchCache(CACHE_PATH)
+        return _cache
+
+
+def _score(queries, vocabulary):
+    """{query: (match, score)} of each query against the whole vocabulary."""
+    if rapid_process is not None:
+        scores = rapid_process.cdist(queries, vocabulary, scorer=rapid_fuzz.WRatio,
+                                     processor=rapid_utils.default_process, workers=-1)
+        # Rounded first, so that ties are those extractOne sees between its integer scores
+        scores = np.round(scores)
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(queries)), best].astype(int)
+        return {query: (vocabulary[index], int(score)) for query, index, score in zip(queries, best, best_scores)}
+
+    from fuzzywuzzy import process
+    return {query: process.extractOne(query, vocabulary) for query in queries}
+
+
+def best_matches(values, vocabulary, preprocess=None):
+    """
+    The closest vocabulary entry of every value of the Series `values`, as a
+    DataFrame with the columns `match` and `score` on the same index. Missing
+    values, and every value when the vocabulary is empty, get NaN in both.
+    `preprocess` (e.g. unidecode) is applied to each distinct value first.
+    """
+    values = pd.Series(values)
+    vocabulary = clean_vocabulary(vocabulary)
+    codes, uniques = pd.factorize(values)
+    queries = [preprocess(value) if preprocess else value for value in uniques]
+    results = {}
+    if vocabulary and queries:
+        key = vocabulary_key(vocabulary)
+        cache = get_cache()
+        pending = list(dict.fromkeys(queries))
+        if cache is not None:
+            results = cache.get(key, pending)
+            pending = [query for query in pending if query not in results]
+        if pending:
+            scored = _score(pending, vocabulary)
+            results.update(scored)
+            if cache is not None:
+                cache.put(key, scored)
+
+    distinct = pd.DataFrame([results.get(query, (np.nan, np.nan)) for query in queries] + [(np.nan, np.nan)],
+                            columns=['match', 'score'])
+    matches = distinct.take(np.where(codes < 0, len(uniques), codes))
+    matches.index = values.index
+    return matches
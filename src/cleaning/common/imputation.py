@@ -0,0 +1,208 @@
+"""File-wide statistics the cleaners fill missing values with.
+
+A cleaner lists what it needs as `Rule`s: the median, mean or mode of a
+column, over the whole file or per group of another column (`by`), and the
+`default` to use where there is no value to take it from (None leaves the
+gaps). A 'values' rule collects the distinct values of a column in order of
+appearance, for cleaners that match a column against its own vocabulary.
+
+A rule may list coarser levels to fall back on where its group has no value
+(`fallback`): other columns to group by, or None for the whole file, e.g.
+GPU model, then brand, then every GPU. As with `groupby().transform`, rows
+whose group is missing at every level get no value at all, and `default`
+fills what the last level leaves.
+
+`exact(df, rules)` computes them over a whole frame with pandas' own
+groupby aggregations (modes from `value_counts`, no Python per group);
+`Sketches(rules)` computes them chunk after chunk with the sketches of
+`sketches`, for files too big to load at once. Both return the same
+{column: value} mapping, with a tuple of one value per level for the
+median, mean and mode rules (a Series per group for grouped levels), which
+`impute` applies. `impute` also takes the values of the same rules over
+other files (`src/cleaning/pool.py`), tried after the file's own at every
+level.
+"""
+from collections import namedtuple
+
+import pandas as pd
+
+from src.cleaning.common import sketches
+
+Rule = namedtuple('Rule', 'column statistic by default fallback', defaults=(None, None, ()))
+STATISTICS = ('median', 'mean', 'mode', 'values')
+
+
+def levels(rule):
+    """The columns `rule` groups by, finest first; None stands for the whole file."""
+    return (rule.by,) + tuple(rule.fallback)
+
+
+def _exact(values, statistic):
+    if statistic == 'median':
+        return pd.to_numeric(values, errors='coerce').median()
+    if statistic == 'mean':
+        return pd.to_numeric(values, errors='coerce').mean()
+    if statistic == 'mode':
+        modes = values.mode()
+        return modes.iloc[0] if len(modes) else None
+    return list(values.dropna().unique())
+
+
+def _grouped_mode(values, keys):
+    # The most frequent value of every group, the smallest on a tie, as `Series.mode` gives it
+    counts = values.groupby(keys, observed=True, sort=False).value_counts()
+    top = counts[counts.eq(counts.groupby(level=0, observed=True, sort=False).transform('max'))]
+    return top.reset_index(level=-1).iloc[:, 0].groupby(level=0, observed=True, sort=False).min()
+
+
+def _exact_level(df, column, statistic, by):
+    if by is None:
+        return _exact(df[column], statistic)
+    if statistic == 'mode':
+        return _grouped_mode(df[column], df[by])
+    numbers = pd.to_numeric(df[column], errors='coerce').groupby(df[by], observed=True)
+    return numbers.median() if statistic == 'median' else numbers.mean()
+
+
+def exact(df, rules):
+    """The value of every rule over the whole of `df`."""
+    values = {}
+    for rule in rules:
+        if rule.statistic == 'values':
+            values[rule.column] = _exact(df[rule.column], rule.statistic)
+        else:
+            values[rule.column] = tuple(_exact_level(df, rule.column, rule.statistic, by) for by in levels(rule))
+    return values
+
+
+class _Distinct:
+    def __init__(self):
+        self.values = {}
+
+    def update(self, values):
+        self.values.update(dict.fromkeys(values.dropna().unique()))
+
+    def merge(self, other):
+        self.values.update(other.values)
+
+
+def _sketch(statistic):
+    if statistic == 'median':
+        return sketches.QuantileSketch()
+    if statistic == 'mean':
+        return sketches.MeanSketch()
+    if statistic == 'mode':
+        return sketches.FrequencySketch()
+    return _Distinct()
+
+
+def _result(sketch, statistic):
+    if statistic == 'median':
+        return sketch.median()
+    if statistic == 'mean':
+        return sketch.mean()
+    if statistic == 'mode':
+        return sketch.mode()
+    return list(sketch.values)
+
+
+class Sketches:
+    """The rules' values over a stream of chunks: `update` with each one, `merge` partial ones, then `values`."""
+
+    def __init__(self, rules):
+        for rule in rules:
+            if rule.statistic not in STATISTICS:
+                raise ValueError(f"Unknown statistic {rule.statistic!r} for {rule.column}")
+            if rule.statistic == 'values' and any(by is not None for by in levels(rule)):
+                raise ValueError(f"'values' of {rule.column} cannot be grouped")
+        self.rules = tuple(rules)
+        # One sketch per level of every rule, or one per group of a grouped level
+        self._sketches = [[{} if by is not None else _sketch(rule.statistic) for by in levels(rule)]
+                          for rule in self.rules]
+        self.rows = 0
+
+    def update(self, df):
+        self.rows += len(df)
+        for rule, rule_sketches in zip(self.rules, self._sketches):
+            for by, sketch in zip(levels(rule), rule_sketches):
+                if by is None:
+                    sketch.update(df[rule.column])
+                    continue
+                for key, group in df.groupby(by, observed=True, sort=False)[rule.column]:
+                    if key not in sketch:
+                        sketch[key] = _sketch(rule.statistic)
+                    sketch[key].update(group)
+
+    def merge(self, other):
+        self.rows += other.rows
+        for rule, rule_sketches, other_sketches in zip(self.rules, self._sketches, other._sketches):
+            for by, sketch, other_sketch in zip(levels(rule), rule_sketches, other_sketches):
+                if by is None:
+                    sketch.merge(other_sketch)
+                    continue
+                for key, group_sketch in other_sketch.items():
+                    if key not in sketch:
+                        sketch[key] = _sketch(rule.statistic)
+                    sketch[key].merge(group_sketch)
+
+    def values(self):
+        values = {}
+        for rule, rule_sketches in zip(self.rules, self._sketches):
+            level_values = []
+            for by, sketch in zip(levels(rule), rule_sketches):
+                if by is None:
+                    level_values.append(_result(sketch, rule.statistic))
+                else:
+                    level_values.append(pd.Series([_result(group_sketch, rule.statistic)
+                                                   for group_sketch in sketch.values()],
+                                                  index=list(sketch),
+                                                  dtype=object if rule.statistic == 'mode' else 'float64'))
+            values[rule.column] = level_values[0] if rule.statistic == 'values' else tuple(level_values)
+        return values
+
+
+def _fill(df, by, value):
+    """The fill value of every row of `df` at one level."""
+    if by is None:
+        return value
+    keys = df[by]
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        keys = keys.astype(object)  # mapped categories would stay categorical
+    return keys.map(value)
+
+
+def _fillna(column, fill):
+    # Objects filled with numbers become numbers, as pandas did silently (and warned it would stop doing)
+    with pd.option_context('future.no_silent_downcasting', True):
+        column = column.fillna(fill)
+    return column.infer_objects(copy=False) if column.dtype == object else column
+
+
+def impute(df, rules, values, pooled=None):
+    """
+    Fills the missing values of the columns of the median, mean and mode rules
+    of `df`: at each level, from `values` (the file's own), then from
+    `pooled` (those of other files, when given).
+    """
+    sources = [values] if pooled is None else [values, pooled]
+    for rule in rules:
+        if rule.statistic == 'values':
+            continue
+        column = df[rule.column]
+        grouped = [by for by in levels(rule) if by is not None]
+        # A row whose group is missing at every level is left out, as `groupby().transform` leaves it out
+        grouped_out = None
+        if len(grouped) == len(levels(rule)):
+            grouped_out = df[grouped].isna().all(axis=1)
+            column = column.where(~grouped_out)
+        for level, by in enumerate(levels(rule)):
+            for source in sources:
+                fill = _fill(df, by, source[rule.column][level])
+                if not isinstance(fill, pd.Series) and (fill is None or pd.isna(fill)):
+                    continue
+                column = _fillna(column, fill)
+        if rule.default is not None:
+            column = _fillna(column, rule.default) if grouped_out is None else column.mask(
+                column.isna() & ~grouped_out, rule.default)
+        df[rule.column] = column
+    return df
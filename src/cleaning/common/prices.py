@@ -0,0 +1,124 @@
+"""Vectorized price parsing shared by the cleaners.
+
+`parse_prices` turns a column of scraped price strings ("US $1,299.99/ea",
+"EUR 1.299,99", "₹1,29,999", "MAD 4599") into an `amount` and a `currency`
+column, plus a `per_unit` flag for "/ea"-style suffixes. Every step is a
+pandas string method over the distinct values of the column, so there is no
+Python call per row:
+
+- the currency comes from the text before the number (a symbol such as "$" or
+  "₹", a code such as "EUR", or both as in "US $"), or from a code after it;
+- the decimal separator is the last of "," and "." when both appear; a lone
+  separator followed by exactly three digits in every group ("1,299",
+  "1.299.999", "1,29,999") is a thousands separator, otherwise it is the
+  decimal one;
+- values that already are numbers are kept as they are.
+
+`to_usd` converts the amounts with a table of rates per currency.
+"""
+import re
+
+import pandas as pd
+
+from src.cleaning.common import arrow, columns
+
+# Currency markers before or after the amount, normalized to upper case without spaces
+CURRENCY_MARKERS = {
+    '$': 'USD', 'US$': 'USD', 'US': 'USD', 'USD': 'USD', 'USD$': 'USD',
+    'AU$': 'AUD', 'AU': 'AUD', 'AUD': 'AUD', 'A$': 'AUD',
+    'C$': 'CAD', 'CA$': 'CAD', 'CAD': 'CAD',
+    'R$': 'BRL', 'BRL': 'BRL',
+    '€': 'EUR', 'EUR': 'EUR',
+    '£': 'GBP', 'GBP': 'GBP',
+    '₹': 'INR', 'RS': 'INR', 'RS.': 'INR', 'INR': 'INR',
+    'MAD': 'MAD', 'DH': 'MAD', 'DHS': 'MAD',
+}
+
+_LEADING = re.compile(r'^\s*(?P<marker>[^\d.,\-]*?)\s*(?=[\d.,])')
+_NUMBER = re.compile(r'(?P<number>\d[\d.,\s]*\d|\d)')
+_TRAILING = re.compile(r'(?:\d)\s*(?P<marker>[A-Za-z€£₹$]{1,4})\.?\s*(?:/|$)')
+_PER_UNIT = re.compile(r'/\s*(?:ea|each|unit|pc|pcs)\b|\bper\s+(?:unit|piece)\b', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+# Groups of exactly three digits after the first one, Indian 2-digit groups included
+_THOUSANDS_COMMA = re.compile(r'^\d{1,3}(?:,\d{2})*,\d{3}$')
+_THOUSANDS_DOT = re.compile(r'^\d{1,3}(?:\.\d{3})+$')
+
+
+def _normalize_marker(markers):
+    return arrow.replace(markers.str.upper(), _SPACES).map(CURRENCY_MARKERS)
+
+
+def parse_amounts(text, decimal='auto'):
+    """
+    Parses the first number of every string in `text`. `decimal` is '.' or ','
+    to force the decimal separator, or 'auto' to detect it per value.
+    """
+    number = arrow.replace(arrow.extract(text, _NUMBER, expand=False), _SPACES)
+    last_comma = number.str.rfind(',')
+    last_dot = number.str.rfind('.')
+    if decimal == 'auto':
+        comma_thousands = arrow.contains(number, _THOUSANDS_COMMA)
+        dot_thousands = arrow.contains(number, _THOUSANDS_DOT)
+        # When both appear the last one is the decimal separator; a lone one is
+        # the decimal separator unless it groups digits by three
+        decimal_comma = ((last_comma > last_dot) & (last_dot >= 0)) | \
+                        ((last_comma >= 0) & (last_dot < 0) & ~comma_thousands)
+        thousands_dot = (last_dot >= 0) & (last_comma < 0) & dot_thousands
+    else:
+        decimal_comma = pd.Series(decimal == ',', index=number.index)
+        thousands_dot = pd.Series(False, index=number.index)
+
+    dot_decimal = number.str.replace(',', '', regex=False)
+    comma_decimal = number.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    grouped_dots = number.str.replace('.', '', regex=False)
+    normalized = dot_decimal.where(~decimal_comma, comma_decimal).where(~thousands_dot, grouped_dots)
+    return arrow.to_numeric(normalized, errors='coerce')
+
+
+def _parse_distinct(values, decimal, default_currency):
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        is_text = pd.Series(False, index=values.index)
+    else:
+        # .str.len() is NaN for anything that is not a string
+        is_text = values.str.len().notna()
+    text = values.where(is_text)
+    if not arrow.is_arrow(text):
+        text = text.astype('string')
+
+    amount = parse_amounts(text, decimal)
+    if not is_text.all():
+        # Numbers scraped or cleaned upstream are kept as they are
+        amount = amount.where(is_text, pd.to_numeric(values.where(~is_text), errors='coerce'))
+
+    currency = _normalize_marker(arrow.extract(text, _LEADING, expand=False))
+    trailing = _normalize_marker(arrow.extract(text, _TRAILING, expand=False))
+    currency = currency.where(currency.notna(), trailing)
+    if default_currency is not None:
+        currency = currency.where(currency.notna(), default_currency)
+
+    return pd.DataFrame({
+        'amount': amount.astype('float64'),
+        'currency': currency.astype(object).where(currency.notna(), None),
+        'per_unit': arrow.contains(text, _PER_UNIT),
+    }, index=values.index)
+
+
+def parse_prices(values, decimal='auto', default_currency=None):
+    """
+    Parses a Series of prices. Returns a DataFrame with the same index and the
+    columns `amount` (float), `currency` (ISO code or `default_currency` when
+    the text has none) and `per_unit` (bool).
+    """
+    # A price column holds few distinct strings: parse each of them once
+    return columns.per_distinct(lambda distinct: _parse_distinct(distinct, decimal, default_currency), values)
+
+
+def to_usd(amounts, currencies, rates, decimals=None):
+    """
+    Converts `amounts` to US dollars. `rates` maps a currency to the number of
+    units per dollar (e.g. {'INR': 83}); USD needs no entry. Amounts in other
+    currencies become NaN.
+    """
+    divisor = pd.Series(currencies, index=amounts.index).map({'USD': 1, **rates}).astype('float64')
+    usd = amounts / divisor
+    return usd.round(decimals) if decimals is not None else usd
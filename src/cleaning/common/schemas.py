@@ -0,0 +1,108 @@
+"""Input schemas of the cleaners, and the reader that applies them.
+
+A raw Flipkart file has about a hundred columns and a Ubuy one 30 to 60, of
+which a cleaner uses a handful. A cleaner's `SCHEMA` lists them, and `read`
+parses only those (`usecols`), with the dtypes it declares, so neither the
+parse time nor the frame grows with the columns nobody reads:
+
+- `columns`: the columns to read, by name; the ones a file lacks are
+  skipped. With `ignore_case`, names are matched lowercased and stripped,
+  for cleaners that normalize the header themselves;
+- `dtype`: dtypes of some of those columns (e.g. 'category');
+- `dates`: date columns and their formats, tried in order, e.g.
+  {'collection_date': ('%m/%d/%Y %H:%M', '%Y-%m-%d %H:%M:%S')}; values that
+  match none are NaT.
+
+Files are parsed by the pyarrow engine of `pd.read_csv` when pyarrow is
+installed, and by the C engine otherwise, or when reading in chunks, which
+pyarrow does not do. PIPELINE_CSV_ENGINE=c (or pyarrow) picks one. With
+PIPELINE_DTYPE_BACKEND=pyarrow, text columns are read Arrow-backed
+(`src/cleaning/common/arrow.py`).
+"""
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src.cleaning.common import arrow
+
+try:
+    import pyarrow
+except ImportError:  # optional: the C engine reads the same files
+    pyarrow = None
+
+ENGINE = os.environ.get('PIPELINE_CSV_ENGINE') or ('pyarrow' if pyarrow is not None else 'c')
+
+Schema = namedtuple('Schema', 'columns dtype dates ignore_case', defaults=(None, None, False))
+
+
+def _key(name, ignore_case):
+    return name.strip().lower() if ignore_case else name
+
+
+def _parse_dates(values, formats):
+    parsed = pd.to_datetime(values, format=formats[0], errors='coerce')
+    for date_format in formats[1:]:
+        missing = parsed.isna() & values.notna()
+        if not missing.any():
+            break
+        parsed = parsed.where(~missing, pd.to_datetime(values.where(missing), format=date_format, errors='coerce'))
+    return parsed
+
+
+def _with_dates(df, schema):
+    for column in df.columns:
+        formats = schema.dates.get(_key(column, schema.ignore_case))
+        if formats and (df[column].dtype == object or arrow.is_arrow(df[column])):
+            df[column] = _parse_dates(df[column], formats)
+    return df
+
+
+def _loaded(df):
+    return arrow.text_only(df) if arrow.enabled() else df
+
+
+def _missing_as_nan(df):
+    # The pyarrow engine leaves None in text columns where the C engine puts NaN, which `astype(str)` tells apart
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].fillna(np.nan)
+    return df
+
+
+def read(path, schema=None, chunksize=None, **options):
+    """
+    `pd.read_csv(path, **options)` of the columns of `schema` (every column
+    when it is None), or an iterator of chunks of `chunksize` rows. A
+    `dtype` in `options`, keyed by the file's names, yields to the schema's.
+    """
+    options = {**arrow.read_options(), **options}
+    if schema is None:
+        reader = pd.read_csv(path, chunksize=chunksize, **options)
+        return _loaded(reader) if chunksize is None else (_loaded(chunk) for chunk in reader)
+
+    pyarrow_engine = chunksize is None and ENGINE == 'pyarrow'
+    if schema.ignore_case or pyarrow_engine:
+        # The names as the file spells them: pyarrow takes no callable `usecols`, and dtypes are keyed by name
+        header = pd.read_csv(path, nrows=0, encoding=options.get('encoding')).columns
+        wanted = {_key(column, schema.ignore_case) for column in schema.columns}
+        usecols = [column for column in header if _key(column, schema.ignore_case) in wanted]
+        dtypes = {_key(column, schema.ignore_case): dtype for column, dtype in (schema.dtype or {}).items()}
+        dtype = {column: dtypes[_key(column, schema.ignore_case)] for column in usecols
+                 if _key(column, schema.ignore_case) in dtypes}
+    else:
+        usecols = set(schema.columns).__contains__
+        dtype = schema.dtype
+    dtype = {**(options.pop('dtype', None) or {}), **(dtype or {})}
+    schema = schema._replace(dates={_key(column, schema.ignore_case): formats
+                                    for column, formats in (schema.dates or {}).items()})
+
+    if pyarrow_engine:
+        options = {name: value for name, value in options.items() if name != 'low_memory'}
+        df = pd.read_csv(path, usecols=usecols, dtype=dtype or None, engine='pyarrow', **options)
+        return _with_dates(_missing_as_nan(_loaded(df)), schema)
+    reader = pd.read_csv(path, usecols=usecols, dtype=dtype or None, chunksize=chunksize, **options)
+    if chunksize is None:
+        return _with_dates(_loaded(reader), schema)
+    return (_with_dates(_loaded(chunk), schema) for chunk in reader)
@@ -0,0 +1,136 @@
+"""Mergeable summaries of a column, for statistics over files read in chunks.
+
+Each sketch is fed chunk after chunk with `update(values)` (missing values
+are skipped), can absorb another sketch of the same kind with `merge(other)`
+(so chunks can also be summarized apart and combined), and holds a bounded
+number of items however many values it has seen:
+
+- `QuantileSketch` keeps a stack of compactors, as in KLL: level h holds
+  values standing for 2**h values each, and a level past `capacity` items is
+  sorted and every other item moves up. Quantiles are exact until the first
+  compaction (the median then is pandas' own, middle values averaged), and
+  off by a rank error of about log2(n / capacity) / capacity after it. The
+  items to keep alternate between odd and even positions rather than being
+  drawn at random, so the same input always gives the same answer.
+- `FrequencySketch` counts values with Misra-Gries: when more than
+  `capacity` distinct values are counted, the smallest counts are subtracted
+  from all of them. Any value more frequent than n / (capacity + 1) stays,
+  and counts are exact as long as there are no more than `capacity` distinct
+  values. `mode()` breaks ties on the smallest value, like `Series.mode`.
+- `MeanSketch` keeps a sum and a count.
+"""
+import numpy as np
+import pandas as pd
+
+QUANTILE_CAPACITY = 2048
+FREQUENCY_CAPACITY = 1024
+
+
+class QuantileSketch:
+    """Approximate quantiles of a stream of numbers."""
+
+    def __init__(self, capacity=QUANTILE_CAPACITY):
+        self.capacity = capacity
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self._offset = 0
+
+    def update(self, values):
+        values = pd.to_numeric(pd.Series(values), errors='coerce').dropna().to_numpy(dtype='float64')
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity:
+                items = np.sort(items)
+                # An odd item out stays; the others pair up and one of each pair moves up
+                pairs, rest = items[:len(items) - len(items) % 2], items[len(items) - len(items) % 2:]
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], pairs[self._offset::2]])
+                self.levels[level] = rest
+                self._offset ^= 1
+            level += 1
+
+    @property
+    def is_exact(self):
+        return all(len(items) == 0 for items in self.levels[1:])
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        if self.is_exact:
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        rank = min(np.searchsorted(cumulative, q * cumulative[-1]), len(values) - 1)
+        return float(values[order][rank])
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+class FrequencySketch:
+    """Approximate counts of the most frequent values of a stream."""
+
+    def __init__(self, capacity=FREQUENCY_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+
+    def update(self, values):
+        other = FrequencySketch(self.capacity)
+        other.counts = pd.Series(values).value_counts(dropna=True, sort=False).to_dict()
+        self.merge(other)
+
+    def merge(self, other):
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        if len(self.counts) > self.capacity:
+            # Subtracting the (capacity + 1)-th largest count leaves at most `capacity` values
+            threshold = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {value: count - threshold for value, count in self.counts.items() if count > threshold}
+
+    def mode(self):
+        """The most frequent value, the smallest one on a tie; None when nothing was counted."""
+        if not self.counts:
+            return None
+        top = max(self.counts.values())
+        candidates = [value for value, count in self.counts.items() if count == top]
+        try:
+            return min(candidates)
+        except TypeError:  # values of several types: the first one counted
+            return candidates[0]
+
+
+class MeanSketch:
+    """Mean of a stream of numbers."""
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, values):
+        values = pd.to_numeric(pd.Series(values), errors='coerce').dropna()
+        self.total += float(values.sum())
+        self.count += len(values)
+
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
@@ -0,0 +1,94 @@
+"""Removal of lists of terms from product titles.
+
+The title cleaners strip long lists of words ("new", "gddr6", "smart watch",
+...) by calling `re.sub` once per term. `TermStripper` compiles such a list
+once and applies it over a whole column with as few passes as possible while
+giving exactly the result of the per-term loop:
+
+- a term of the form \\bliteral\\b (a literal starting and ending with a word
+  character) only ever matches whole runs of word characters, and removing it
+  leaves non-word characters on both sides, so it never creates or breaks a
+  match of another such term. Consecutive terms of this form are therefore
+  merged into one alternation, unless they share a word: "working" and "not
+  working" must still run in list order;
+- any other pattern runs in its own pass, at its place in the list.
+"""
+import re
+
+from src.cleaning.common import arrow
+
+_LITERAL_WORD_TERM = re.compile(r'^\\b((?:[^\\.^$*+?{}\[\]|()]|\\\W)+)\\b$')
+
+
+def word_patterns(words):
+    """The \\bword\\b pattern of every word of a list."""
+    return [rf'\b{re.escape(word)}\b' for word in words]
+
+
+def _literal(pattern):
+    """The literal matched by a \\bliteral\\b pattern, or None for any other pattern."""
+    match = _LITERAL_WORD_TERM.match(pattern)
+    if not match:
+        return None
+    literal = re.sub(r'\\(\W)', r'\1', match.group(1))
+    if not (re.match(r'\w', literal) and re.search(r'\w$', literal)):
+        return None
+    return literal
+
+
+def _literal_regex(pattern):
+    return re.escape(_literal(pattern))
+
+
+def plan_passes(patterns, flags=0):
+    """
+    Groups `patterns` into the regexes to apply one after the other. Each group
+    is a list of patterns that can be matched as a single alternation.
+    """
+    groups = []
+    words = None  # words of the group being built, None when it cannot be extended
+    seen = set()
+    for pattern in patterns:
+        literal = _literal(pattern)
+        if literal is None:
+            groups.append([pattern])
+            words = None
+            continue
+        if pattern in seen:
+            # Removing a whole-word literal never creates another match of it
+            continue
+        seen.add(pattern)
+        term_words = set(re.findall(r'\w+', literal.lower() if flags & re.IGNORECASE else literal))
+        if words is None or words & term_words:
+            groups.append([pattern])
+            words = set(term_words)
+        else:
+            groups[-1].append(pattern)
+            words |= term_words
+    return groups
+
+
+class TermStripper:
+    """Removes every match of a list of patterns, with the result of one `re.sub` per pattern in list order."""
+
+    def __init__(self, patterns, flags=0):
+        self.passes = [
+            re.compile(group[0] if len(group) == 1 else r'\b(?:' + '|'.join(_literal_regex(p) for p in group) + r')\b',
+                       flags)
+            for group in plan_passes(patterns, flags)
+        ]
+
+    @classmethod
+    def from_words(cls, words, flags=0):
+        return cls(word_patterns(words), flags)
+
+    def strip(self, text):
+        for regex in self.passes:
+            text = regex.sub('', text)
+        return text
+
+    def strip_series(self, titles):
+        """Applies the patterns to a Series of strings; missing values stay missing."""
+        for regex in self.passes:
+            titles = arrow.replace(titles, regex)
+        return titles
@@ -0,0 +1,158 @@
+"""Row checks of the cleaned data, run as boolean masks over whole columns.
+
+A cleaner lists its checks as rules:
+
+- `Range(column, low, high, strict)`: values between `low` and `high`
+  (either may be None), excluded with `strict`; missing values fail;
+- `Allowed(column, values, missing)`: values among `values`, missing ones
+  passing when `missing` is True;
+- `Sentinels(value, below, columns)`: rows holding `value` (e.g. 'Unknown')
+  in fewer than `below` of `columns` (every text column when None);
+- `Compare(column, op, other)`: a comparison of two columns of the same row,
+  e.g. storage above RAM; rows missing either pass.
+
+Every rule rejects the rows that fail it, or only counts them when its
+`reject` is False (e.g. the per-category price bands of `price_band`, which
+flag prices that look wrong without dropping them). `validate(df, rules)`
+evaluates each rule once over the frame as a NumPy mask, keeps the rows
+that pass the rejecting ones, and reports per rule how many rows failed it,
+in the kept rows' `df.attrs['validation']` and on the 'clean.validate' span.
+`combine` adds up the reports of the chunks of a file, and `format_report`
+gives the lines `clean_all` logs for each file.
+"""
+import operator
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src.observability import tracing
+
+Range = namedtuple('Range', 'column low high strict reject name', defaults=(None, None, False, True, None))
+Allowed = namedtuple('Allowed', 'column values missing reject name', defaults=(True, True, None))
+Sentinels = namedtuple('Sentinels', 'value below columns reject name', defaults=(None, True, None))
+Compare = namedtuple('Compare', 'column op other reject name', defaults=(True, None))
+
+COMPARISONS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '==': operator.eq,
+               '!=': operator.ne}
+
+# Prices in USD below or above which a listing of the category is most likely a part, a lot or a typo
+PRICE_BANDS = {
+    'graphics_cards': (20, 5_000),
+    'laptops': (90, 10_000),
+    'monitors': (40, 4_000),
+    'smart_watches': (10, 2_000),
+}
+
+
+def price_band(category, column='Price', reject=False):
+    """The `Range` rule of the price band of `category`, which only flags by default."""
+    low, high = PRICE_BANDS[category]
+    return Range(column, low, high, reject=reject, name=f'{column} in the {category} band')
+
+
+def label(rule):
+    """The name of `rule` in reports."""
+    if rule.name is not None:
+        return rule.name
+    if isinstance(rule, Range):
+        low = '' if rule.low is None else f"{rule.low} {'<' if rule.strict else '<='} "
+        high = '' if rule.high is None else f" {'<' if rule.strict else '<='} {rule.high}"
+        return f'{low}{rule.column}{high}'
+    if isinstance(rule, Allowed):
+        return f'{rule.column} allowed'
+    if isinstance(rule, Sentinels):
+        return f'{rule.value!r} in fewer than {rule.below} columns'
+    return f'{rule.column} {rule.op} {rule.other}'
+
+
+def _array(mask):
+    if isinstance(mask, pd.Series) and mask.dtype != bool:
+        mask = mask.fillna(False)
+    return np.asarray(mask, dtype=bool)
+
+
+def _is_text(values):
+    return pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values) \
+        or isinstance(values.dtype, pd.CategoricalDtype)
+
+
+def _equals(values, value):
+    # On the codes of a categorical, and element by element in NumPy for objects, without pandas' alignment
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        if value not in categories:
+            return np.zeros(len(values), dtype=bool)
+        return values.cat.codes.to_numpy() == categories.get_loc(value)
+    if pd.api.types.is_object_dtype(values):
+        return _array(values.to_numpy() == value)
+    return _array(values.eq(value))
+
+
+def passes(df, rule):
+    """The boolean NumPy mask of the rows of `df` that pass `rule`."""
+    if isinstance(rule, Sentinels):
+        columns = rule.columns if rule.columns is not None else [column for column in df.columns
+                                                                  if _is_text(df[column])]
+        counts = np.zeros(len(df), dtype=np.int64)
+        for column in columns:
+            if column in df.columns:
+                counts += _equals(df[column], rule.value)
+        return counts < rule.below
+    values = df[rule.column]
+    if isinstance(rule, Range):
+        mask = np.ones(len(df), dtype=bool)
+        if rule.low is not None:
+            mask &= _array(values.gt(rule.low) if rule.strict else values.ge(rule.low))
+        if rule.high is not None:
+            mask &= _array(values.lt(rule.high) if rule.strict else values.le(rule.high))
+        if rule.low is None and rule.high is None:
+            mask &= _array(values.notna())
+        return mask
+    if isinstance(rule, Allowed):
+        mask = _array(values.isin(list(rule.values)))
+        return mask | _array(values.isna()) if rule.missing else mask
+    other = df[rule.other]
+    return _array(COMPARISONS[rule.op](values, other)) | _array(values.isna() | other.isna())
+
+
+def validate(df, rules):
+    """The rows of `df` that pass every rejecting rule, with the per-rule report in `attrs['validation']`."""
+    with tracing.span('clean.validate', rows=len(df)) as validate_span:
+        keep = np.ones(len(df), dtype=bool)
+        failed, flagged = {}, {}
+        for rule in rules:
+            mask = passes(df, rule)
+            if rule.reject:
+                failed[label(rule)] = int(len(df) - mask.sum())
+                keep &= mask
+            else:
+                flagged[label(rule)] = int(len(df) - mask.sum())
+        report = {'rows': len(df), 'rejected': int(len(df) - keep.sum()), 'failed': failed, 'flagged': flagged}
+        df = df.take(np.flatnonzero(keep))  # not a slice of the cleaner's frame, which it may modify in place
+        df.attrs['validation'] = report
+        validate_span.set(rows_out=len(df), **{f'failed {name}': count for name, count in failed.items()},
+                          **{f'flagged {name}': count for name, count in flagged.items()})
+    return df
+
+
+def combine(reports):
+    """The report of a file from those of its chunks; None when there are none."""
+    total = None
+    for report in reports:
+        if total is None:
+            total = {'rows': 0, 'rejected': 0, 'failed': {}, 'flagged': {}}
+        total['rows'] += report['rows']
+        total['rejected'] += report['rejected']
+        for key in ('failed', 'flagged'):
+            for name, count in report[key].items():
+                total[key][name] = total[key].get(name, 0) + count
+    return total
+
+
+def format_report(report):
+    """One line per rule of a `validate` report."""
+    lines = [f"{report['rows']} rows, {report['rejected']} rejected"]
+    lines += [f'  rejected  {count:>8}  {name}' for name, count in report['failed'].items()]
+    lines += [f'  flagged   {count:>8}  {name}' for name, count in report['flagged'].items()]
+    return '\n'.join(lines)
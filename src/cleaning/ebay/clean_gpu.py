@@ -1,61 +1,50 @@
 import numpy as np
 import pandas as pd
 import re
-from fuzzywuzzy import process
 from pathlib import Path
 
+from src.cleaning import manifest, pool, registry
+from src.cleaning.common import chunked, fuzzy, imputation, prices, schemas, titles, validation
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # Define paths using relative paths
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # Root folder of the project
 RAW_DATA_DIR = BASE_DIR / 'data' / 'raw' / 'ebay' / 'graphics_cards'
 CLEANED_DATA_DIR = BASE_DIR / 'data' / 'cleaned' / 'ebay' / 'graphics_cards'
 
-# Ensure the cleaned data directory exists
-CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-# Debugging: Print paths
-print(f"Base directory: {BASE_DIR}")
-print(f"Raw data directory: {RAW_DATA_DIR}")
-print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
-
-# Check if raw data directory exists
-if not RAW_DATA_DIR.exists():
-    raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
-
-# Check if there are CSV files to process
-files = list(RAW_DATA_DIR.glob('*.csv'))
-if not files:
-    print(f"No CSV files found in {RAW_DATA_DIR}")
-else:
-    print(f"Found {len(files)} CSV files to process")
+SCHEMA = schemas.Schema(columns=['Title', 'Price', 'Brand', 'Memory Size', 'Memory Type', 'Chipset/GPU Model',
+                                 'Connectors', 'Collection Date'], dtype={'Brand': 'category'})
+
+# List of unwanted terms to remove
+TITLE_TERMS = titles.TermStripper([
+    r'\bnew\b', r'\bused\b', r'\bgraphics\b', r'\bcard\b', r'\bgpu\b', r'\bvideo\b', r'\bhdmi\b', r'\bvga\b',
+    r'\bdvi\b', r'\bdisplayport\b', r'\bminidisplayport\b', r'\busb-c\b', r'\boc\b', r'\bgddr5\b', r'\bgddr6\b',
+    r'\bgddr6x\b', r'\b256-bit\b', r'\b128-bit\b', r'\b512mb\b', r'\b1gb\b', r'\b2gb\b', r'\b4gb\b', r'\b8gb\b',
+    r'\b12gb\b', r'\b16gb\b', r'\b24gb\b', r'\b32gb\b', r'\b64gb\b', r'\b128mb\b', r'\b256mb\b', r'\b512mb\b',
+    r'\b1yr\b', r'\bwarranty\b', r'\bfast\b', r'\bship\b', r'\btested\b', r'\bworking\b', r'\bnot working\b',
+    r'\bexcellent\b', r'\bcondition\b', r'\brefurbished\b', r'\bgrade\b', r'\bwith box\b', r'\bwithout box\b',
+    r'\bbulk\b', r'\boem\b', r'\bretail\b', r'\bpackage\b', r'\bpackaging\b', r'\bmodel\b', r'\bseries\b',
+    r'\bversion\b', r'\bgen\b', r'\bgen\b', r'\bpcie\b', r'\bexpress\b', r'\bslot\b', r'\bconnector\b',
+    r'\binterface\b', r'\bdual\b', r'\bsingle\b', r'\btriple\b', r'\bquad\b', r'\bhex\b', r'\boct\b', r'\bcore\b',
+])
 
 # Function to clean titles
-def clean_title(row):
-    # Use GPU model and brand as the base
-    gpu_model = str(row["Chipset/GPU Model"]).strip()
-    brand = str(row["Brand"]).strip()
-
-    # List of unwanted terms to remove
-    unwanted_terms = [
-        r'\bnew\b', r'\bused\b', r'\bgraphics\b', r'\bcard\b', r'\bgpu\b', r'\bvideo\b', r'\bhdmi\b', r'\bvga\b',
-        r'\bdvi\b', r'\bdisplayport\b', r'\bminidisplayport\b', r'\busb-c\b', r'\boc\b', r'\bgddr5\b', r'\bgddr6\b',
-        r'\bgddr6x\b', r'\b256-bit\b', r'\b128-bit\b', r'\b512mb\b', r'\b1gb\b', r'\b2gb\b', r'\b4gb\b', r'\b8gb\b',
-        r'\b12gb\b', r'\b16gb\b', r'\b24gb\b', r'\b32gb\b', r'\b64gb\b', r'\b128mb\b', r'\b256mb\b', r'\b512mb\b',
-        r'\b1yr\b', r'\bwarranty\b', r'\bfast\b', r'\bship\b', r'\btested\b', r'\bworking\b', r'\bnot working\b',
-        r'\bexcellent\b', r'\bcondition\b', r'\brefurbished\b', r'\bgrade\b', r'\bwith box\b', r'\bwithout box\b',
-        r'\bbulk\b', r'\boem\b', r'\bretail\b', r'\bpackage\b', r'\bpackaging\b', r'\bmodel\b', r'\bseries\b',
-        r'\bversion\b', r'\bgen\b', r'\bgen\b', r'\bpcie\b', r'\bexpress\b', r'\bslot\b', r'\bconnector\b',
-        r'\binterface\b', r'\bdual\b', r'\bsingle\b', r'\btriple\b', r'\bquad\b', r'\bhex\b', r'\boct\b', r'\bcore\b',
-    ]
-
-    # Clean the original title
-    clean_name = row['Title'].lower()
-    for term in unwanted_terms:
-        clean_name = re.sub(term, "", clean_name)
+def clean_title(df):
+    # Clean the original titles
+    clean_names = TITLE_TERMS.strip_series(df['Title'].str.lower())
 
     # Remove multiple spaces and special characters
-    clean_name = re.sub(r"[^a-zA-Z0-9\s]", "", clean_name).strip()
-    clean_name = re.sub(r"\s+", " ", clean_name)
+    clean_names = clean_names.str.replace(r"[^a-zA-Z0-9\s]", "", regex=True).str.strip()
+    clean_names = clean_names.str.replace(r"\s+", " ", regex=True)
+
+    # Use GPU model and brand as the base
+    gpu_models = df["Chipset/GPU Model"].astype(str).str.strip()
+    brands = df["Brand"].astype(str).str.strip()
+    return pd.Series([combine_title(clean_name, gpu_model, brand)
+                      for clean_name, gpu_model, brand in zip(clean_names, gpu_models, brands)], index=df.index)
 
+def combine_title(clean_name, gpu_model, brand):
     # Include GPU model and brand
     if gpu_model.lower() in clean_name and brand.lower() in clean_name:
         return f"{brand} {gpu_model}"
@@ -67,28 +56,11 @@ def clean_title(row):
         return f"{brand} {gpu_model}" if brand != "nan" else gpu_model
 
 # Correct brands using fuzzy matching
-def correct_brands(df):
-    brands = df['Brand'].dropna().unique().tolist()
-    brand_mapping = {}
-    for brand in df['Brand']:
-        if pd.isna(brand): continue
-        match, score = process.extractOne(brand, brands)
-        brand_mapping[brand] = match if score > 85 else brand
-    df['Brand'] = df['Brand'].replace(brand_mapping)
+def correct_brands(df, brands):
+    matches = fuzzy.best_matches(df['Brand'], brands)
+    df['Brand'] = matches['match'].where(matches['score'] > 85, df['Brand'])
     return df
 
-# Normalize prices
-def clean_price(price):
-    if isinstance(price, str):
-        price = re.sub(r'[^\d.,]', '', price)
-        if ',' in price and '.' in price:
-            if price.index(',') < price.index('.'):
-                price = price.replace(',', '')
-            else:
-                price = price.replace('.', '').replace(',', '.')
-        else:
-            price = price.replace(',', '.')
-    return float(price) if price else None
 
 # Normalize memory size
 def convert_to_gb(value):
@@ -101,25 +73,35 @@ def convert_to_gb(value):
     except ValueError:
         return None
 
-# Impute missing values
-def fill_with_median_or_default(series):
-    if series.notna().any():
-        return series.fillna(series.median())
-    else:
-        return series.fillna(0)
-
-def fill_with_mode(series):
-    if series.notna().any():
-        return series.fillna(series.mode()[0])
-    else:
-        return series
+# Missing values are filled per GPU model, from the file then from every eBay GPU
+# scrape (`pool`); memory types and connectors then per brand
+POOLED = True
+IMPUTATION = (
+    imputation.Rule('Memory Size', 'median', by='Chipset/GPU Model', default=0),
+    imputation.Rule('Price', 'median', by='Chipset/GPU Model', default=0),
+    imputation.Rule('Memory Type', 'mode', by='Chipset/GPU Model', fallback=('Brand',)),
+    imputation.Rule('Connectors', 'mode', by='Chipset/GPU Model', fallback=('Brand',)),
+    # Brands are corrected against the brands of the file
+    imputation.Rule('Brand', 'values'),
+)
+
+# Rows kept after deduplication
+VALIDATION = (
+    validation.Range('Price', 0, strict=True),
+    validation.Range('Memory Size', 0.1, strict=True),
+    validation.price_band('graphics_cards'),
+)
 
 # Remove duplicates by keeping the row with the minimum price
+DUPLICATE_COLUMNS = ['Brand', 'Memory Size', 'Memory Type', 'Chipset/GPU Model']
+
 def remove_duplicates_with_min_price(df):
-    columns_for_duplicates = ['Brand', 'Memory Size', 'Memory Type', 'Chipset/GPU Model']
-    idx_min_price = df.groupby(columns_for_duplicates)['Price'].idxmin()
+    idx_min_price = df.groupby(DUPLICATE_COLUMNS)['Price'].idxmin()
     return df.loc[idx_min_price].reset_index(drop=True)
 
+def deduplicator():
+    return chunked.KeepMinimum(DUPLICATE_COLUMNS, 'Price')
+
 # Drop unnecessary columns and keep only the required ones
 def drop_unnecessary_columns(df):
     columns_to_keep = ['title', 'Price', 'Brand', 'Memory Size', 'Memory Type', 'Chipset/GPU Model', 'Connectors', 'Collection Date']
@@ -132,41 +114,92 @@ def rename_cleaned_title_column(df):
         df.rename(columns={'Cleaned Title': 'title'}, inplace=True)
     return df
 
-# Process all CSV files in the raw data directory
-try:
-    for file in RAW_DATA_DIR.glob('*.csv'):
-        print(f"Processing file: {file}")
-        df = pd.read_csv(file)
-        print(f"Loaded {len(df)} rows from {file.name}")
-        print(f"Columns in the file: {df.columns.tolist()}")
-
-        # Apply cleaning functions
-        df['Cleaned Title'] = df.apply(clean_title, axis=1)
-        df = correct_brands(df)
-        df['Price'] = df['Price'].apply(clean_price)
+# Row by row steps, which need nothing from the rest of the file
+def prepare(df):
+    with tracing.span('clean.title', rows=len(df)):
+        df['Cleaned Title'] = clean_title(df)
+    with tracing.span('clean.price', rows=len(df)):
+        df['Price'] = prices.parse_prices(df['Price'])['amount']
+    with tracing.span('clean.memory_size', rows=len(df)):
         df['Memory Size'] = df['Memory Size'].astype(str).apply(convert_to_gb)
-        df['Memory Size'] = df.groupby('Chipset/GPU Model')['Memory Size'].transform(fill_with_median_or_default)
-        df['Price'] = df.groupby('Chipset/GPU Model')['Price'].transform(fill_with_median_or_default)
-        df['Memory Type'] = df.groupby('Chipset/GPU Model')['Memory Type'].transform(fill_with_mode)
-        df['Connectors'] = df.groupby('Chipset/GPU Model')['Connectors'].transform(fill_with_mode)
+    return df
+
+# Steps that need the statistics of the whole file (`IMPUTATION`)
+def finish(df, values):
+    source = df.attrs.get('source')  # the pool stops at this scrape
+    if source is None:
+        raise ValueError("df.attrs['source'] is not set: read the raw file with registry.read, "
+                         "or the pool would fill it from every scrape")
+    with tracing.span('clean.brand', rows=len(df)):
+        df = correct_brands(df, values['Brand'])
+    with tracing.span('clean.impute', rows=len(df)):
+        df = imputation.impute(df, IMPUTATION, values, pool.values('ebay', 'graphics_cards', source))
+    return df
+
+# Steps on the deduplicated rows
+def complete(df):
+    # Validation of data
+    df = validation.validate(df, VALIDATION)
+
+    # Drop the original 'Title' column
+    if 'Title' in df.columns:
+        df.drop(columns=['Title'], inplace=True)
+
+    # Rename 'Cleaned Title' to 'title'
+    df = rename_cleaned_title_column(df)
+
+    # Drop unnecessary columns
+    df = drop_unnecessary_columns(df)
+    return df
+
+# Clean one raw file
+def clean(df):
+    df = prepare(df)
+    df = finish(df, imputation.exact(df, IMPUTATION))
+    with tracing.span('clean.dedup', rows=len(df)) as dedup_span:
         df = remove_duplicates_with_min_price(df)
+        dedup_span.set(rows_out=len(df))
+    return complete(df)
 
-        # Validation of data
-        df = df[(df['Price'] > 0) & (df['Memory Size'] > 0.1)]
+def main():
+    tracing.start_run('ebay_clean_gpu')
+    profiling.start_from_env('ebay_clean_gpu')
 
-        # Drop the original 'Title' column
-        if 'Title' in df.columns:
-            df.drop(columns=['Title'], inplace=True)
+    # Ensure the cleaned data directory exists
+    CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-        # Rename 'Cleaned Title' to 'title'
-        df = rename_cleaned_title_column(df)
+    # Debugging: Print paths
+    print(f"Base directory: {BASE_DIR}")
+    print(f"Raw data directory: {RAW_DATA_DIR}")
+    print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
 
-        # Drop unnecessary columns
-        df = drop_unnecessary_columns(df)
+    # Check if raw data directory exists
+    if not RAW_DATA_DIR.exists():
+        raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
 
-        # Save the cleaned DataFrame to a new CSV file
-        output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
-        df.to_csv(output_filename, index=False)
-        print(f"Cleaned data saved to {output_filename}")
-except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+    # Check if there are CSV files to process
+    files = catalog.paths('raw', 'ebay', 'graphics_cards')
+    if not files:
+        print(f"No CSV files found in {RAW_DATA_DIR}")
+    else:
+        print(f"Found {len(files)} CSV files to process")
+
+    # Process all CSV files in the raw data directory
+    cleaner = registry.get('ebay', 'graphics_cards')
+    try:
+        for file in files:
+            if manifest.is_current(cleaner, file):
+                print(f"Already cleaned: {file}")
+                continue
+            print(f"Processing file: {file}")
+            # The same path as clean_all: the frame carries its source, which the pool stops at
+            rows_in, rows_out, output_filename, _ = registry.clean_file(cleaner, file)
+            print(f"Cleaned {rows_in} rows into {rows_out}")
+            manifest.record(cleaner, file, output_filename)
+            print(f"Cleaned data saved to {output_filename}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+if __name__ == '__main__':
+    main()
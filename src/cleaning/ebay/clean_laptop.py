@@ -4,45 +4,24 @@ import numpy as np
 import re
 from pathlib import Path
 
+from src.cleaning import manifest, registry
+from src.cleaning.common import arrow, prices, schemas, validation
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # Define paths using relative paths
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # Root folder of the project
 RAW_DATA_DIR = BASE_DIR / 'data' / 'raw' / 'ebay' / 'laptops'
 CLEANED_DATA_DIR = BASE_DIR / 'data' / 'cleaned' / 'ebay' / 'laptops'
 
-# Ensure the cleaned data directory exists
-CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-# Debugging: Print paths
-print(f"Base directory: {BASE_DIR}")
-print(f"Raw data directory: {RAW_DATA_DIR}")
-print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
+SCHEMA = schemas.Schema(columns=['Title', 'Price', 'RAM', 'CPU', 'Model', 'Brand', 'GPU', 'Screen Size', 'Storage',
+                                 'Collection Date'], dtype={'Brand': 'category'})
 
-# Check if raw data directory exists
-if not RAW_DATA_DIR.exists():
-    raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
 def clean_cpu(cpu):
     if pd.isna(cpu):
         return np.nan
     match = re.search(r'(Core\s+i\d|Ryzen\s+\d|Snapdragon\s+\w+)', str(cpu), re.IGNORECASE)
     return match.group(0) if match else 'Unknown CPU'
-# Check if there are CSV files to process
-files = list(RAW_DATA_DIR.glob('*.csv'))
-if not files:
-    print(f"No CSV files found in {RAW_DATA_DIR}")
-else:
-    print(f"Found {len(files)} CSV files to process")
-
-# 2. Nettoyer la colonne Price
-def clean_price(price):
-    if isinstance(price, str):
-        cleaned = ''.join(c for c in price if c.isdigit() or c in {'.', ','})
-        cleaned = cleaned.replace(',', '.').replace(' ', '')
-        if '.' in cleaned:
-            parts = cleaned.split('.')
-            if len(parts) > 2:
-                cleaned = parts[0] + '.' + ''.join(parts[1:])
-        return float(cleaned) if cleaned else np.nan
-    return price
 
 # 3. Uniformisation des colonnes
 def convert_to_gb(value):
@@ -77,18 +56,27 @@ def impute_missing_values(df):
             df[col] = df[col].ffill()
     return df
 
+# Termes supprimés des titres
+TITLE_TERMS = re.compile(
+    r'(?i)\b(8GB|. |PC|Notebook|Ryzen|UHD|Graphics|DDR4|AMD|W11|Win11|Win|11|Cond|!!|LOADED|TouchBar|Mac OS|Black| i3StorageWin|Gaming|Laptop|Touchscreen|Pro|15.6|Windows|RTX|FHD|LaptopWin11|HDD| ,|French|13inch|'
+    r' - | /|macOS|VENTURA|FREE|SHIPPIN|i9|13.3|inches|TURBO|"|- | , |13INCH|EXCELLENT|'
+    r'REFURBISHED|NEW|MWTK2LL|Qwerty|Spanish|Keyboard|British|\d+GB|\d+TB|[\d\.]+ ?GHz| GB |'
+    r'rouge|Gray|BIG SUR|WEBCAM|WIFI|BLUETOOTHGB|TB|space gray|silver|gold|touch bar|GHz|'
+    r'Intel|Core|i7|th|Gen|GB|Very|RAM|i5| GB| TB|GB GB|.GHZ| CPU | GPU|-|SSD|256|512|Good|'
+    r'Condition|magic keyboard|✅|🔋|grade [A-B]|warranty\.\.\.)'
+)
+
 # 5. Nettoyer les titres
 def clean_title(title):
-    return re.sub(
-        r'(?i)\b(8GB|. |PC|Notebook|Ryzen|UHD|Graphics|DDR4|AMD|W11|Win11|Win|11|Cond|!!|LOADED|TouchBar|Mac OS|Black| i3StorageWin|Gaming|Laptop|Touchscreen|Pro|15.6|Windows|RTX|FHD|LaptopWin11|HDD| ,|French|13inch|'
-        r' - | /|macOS|VENTURA|FREE|SHIPPIN|i9|13.3|inches|TURBO|"|- | , |13INCH|EXCELLENT|'
-        r'REFURBISHED|NEW|MWTK2LL|Qwerty|Spanish|Keyboard|British|\d+GB|\d+TB|[\d\.]+ ?GHz| GB |'
-        r'rouge|Gray|BIG SUR|WEBCAM|WIFI|BLUETOOTHGB|TB|space gray|silver|gold|touch bar|GHz|'
-        r'Intel|Core|i7|th|Gen|GB|Very|RAM|i5| GB| TB|GB GB|.GHZ| CPU | GPU|-|SSD|256|512|Good|'
-        r'Condition|magic keyboard|✅|🔋|grade [A-B]|warranty\.\.\.)',
-        '',
-        str(title)
-    ).strip().replace('  ', '')
+    return title.astype(str).str.replace(TITLE_TERMS, '', regex=True).str.strip().str.replace('  ', '', regex=False)
+
+# Les annonces à moins de 90 $ sont des pièces ou des accessoires ; un stockage
+# qui ne dépasse pas la RAM est le plus souvent une erreur d'extraction, signalée
+VALIDATION = (
+    validation.Range('Price', 90),
+    validation.price_band('laptops'),
+    validation.Compare('Storage', '>', 'RAM', reject=False, name='Storage above RAM'),
+)
 
 # 6. Supprimer les doublons en conservant le prix minimum
 def remove_duplicates_keep_min_price(df):
@@ -100,33 +88,84 @@ def remove_duplicates_keep_min_price(df):
     df_cleaned = df.drop_duplicates(subset=key_columns, keep='first')
     return df_cleaned
 
-# Process all CSV files in the raw data directory
-try:
-    for file in RAW_DATA_DIR.glob('*.csv'):
-        print(f"Processing file: {file}")
-        df = pd.read_csv(file)
-        print(f"Loaded {len(df)} rows from {file.name}")
-        print(f"Columns in the file: {df.columns.tolist()}")  # Debugging: Print column names
-
-        # Appliquer les fonctions pour nettoyer et normaliser les données
-        df['Price'] = df['Price'].apply(clean_price)
+# Clean one raw file
+def clean(df):
+    # Appliquer les fonctions pour nettoyer et normaliser les données
+    with tracing.span('clean.price', rows=len(df)):
+        df['Price'] = prices.parse_prices(df['Price'])['amount']
+    with tracing.span('clean.capacity', rows=len(df)):
         for col in ['RAM', 'Storage']:
             df[col] = df[col].apply(convert_to_gb).astype(float)
-        df['Screen Size'] = df['Screen Size'].str.extract(r'(\d+\.?\d*)').astype(float)
+    with tracing.span('clean.screen_size', rows=len(df)):
+        df['Screen Size'] = arrow.extract(df['Screen Size'], r'(\d+\.?\d*)').astype(float)
+    with tracing.span('clean.impute', rows=len(df)):
         df = impute_missing_values(df)
         df['GPU'] = df['GPU'].fillna('Unknown Graphics')
+    with tracing.span('clean.cpu', rows=len(df)):
         df['CPU'] = df['CPU'].apply(clean_cpu)
-        df['Title'] = df['Title'].apply(clean_title)
+    with tracing.span('clean.title', rows=len(df)):
+        df['Title'] = clean_title(df['Title'])
+    with tracing.span('clean.model', rows=len(df)):
         df['Model'] = df['Model'].replace('', np.nan)  # Remplacer '' par NaN pour uniformité
         df['Model'] = df['Model'].fillna(df['Title'])  # Remplacer les NaN dans 'Model' par les valeurs de 'Title'
-        df['Storage'] = df['Storage'].round(2)
-        df = df[df['Price'] >= 90]
+    df['Storage'] = df['Storage'].round(2)
+    df = validation.validate(df, VALIDATION)
+    with tracing.span('clean.dedup', rows=len(df)) as dedup_span:
         df = remove_duplicates_keep_min_price(df)
+        dedup_span.set(rows_out=len(df))
+    return df
+
+def main():
+    tracing.start_run('ebay_clean_laptop')
+    profiling.start_from_env('ebay_clean_laptop')
+
+    # Ensure the cleaned data directory exists
+    CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Debugging: Print paths
+    print(f"Base directory: {BASE_DIR}")
+    print(f"Raw data directory: {RAW_DATA_DIR}")
+    print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
+
+    # Check if raw data directory exists
+    if not RAW_DATA_DIR.exists():
+        raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
+
+    # Check if there are CSV files to process
+    files = catalog.paths('raw', 'ebay', 'laptops')
+    if not files:
+        print(f"No CSV files found in {RAW_DATA_DIR}")
+    else:
+        print(f"Found {len(files)} CSV files to process")
+
+    # Process all CSV files in the raw data directory
+    cleaner = registry.get('ebay', 'laptops')
+    try:
+        for file in files:
+            if manifest.is_current(cleaner, file):
+                print(f"Already cleaned: {file}")
+                continue
+            print(f"Processing file: {file}")
+            with tracing.span('clean.read', file=file.name) as read_span:
+                df = schemas.read(file, SCHEMA)
+                read_span.set(rows=len(df))
+            print(f"Loaded {len(df)} rows from {file.name}")
+            print(f"Columns in the file: {df.columns.tolist()}")  # Debugging: Print column names
+
+            df = clean(df)
+
+            # Sauvegarder le DataFrame nettoyé dans un nouveau fichier CSV
+            output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
+            with tracing.span('clean.write', file=output_filename.name, rows=len(df)), \
+                    catalog.output(output_filename, 'cleaned', 'ebay', 'laptops', source=file) as output:
+                df.to_csv(output.tmp_path, index=False)
+                output.rows = len(df)
+            manifest.record(cleaner, file, output_filename)
+            print(f"Cleaned data saved to {output_filename}")
+            print(f"Shape final : {df.shape}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
 
-        # Sauvegarder le DataFrame nettoyé dans un nouveau fichier CSV
-        output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
-        df.to_csv(output_filename, index=False)
-        print(f"Cleaned data saved to {output_filename}")
-        print(f"Shape final : {df.shape}")
-except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -3,29 +3,35 @@ import pandas as pd
 import numpy as np
 import re
 
+from src.cleaning import manifest, registry
+from src.cleaning.common import imputation, prices, schemas
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # Définir les chemins relatifs pour eBay
 base_dir = os.path.dirname(os.path.abspath(__file__))
 raw_data_dir_ebay = os.path.join(base_dir, '..', '..', '..', 'data', 'raw', 'ebay', 'monitors')
 cleaned_data_dir_ebay = os.path.join(base_dir, '..', '..', '..', 'data', 'cleaned', 'ebay', 'monitors')
 
-# Créer les dossiers de sortie s'ils n'existent pas
-os.makedirs(cleaned_data_dir_ebay, exist_ok=True)
+SCHEMA = schemas.Schema(columns=['Title', 'Price', 'Screen Size', 'Maximum Resolution', 'Aspect Ratio', 'Refresh Rate',
+                                 'Response Time', 'Brand', 'Model', 'Collection Date'], dtype={'Brand': 'category'})
+
+
+IMPUTATION = (
+    imputation.Rule('Screen Size', 'median', by='Brand', fallback=(None,)),
+    imputation.Rule('Response Time', 'median'),
+)
 
 
 # Fonction pour nettoyer les moniteurs eBay
-def clean_monitors_ebay(df):
+def clean(df):
     # 1. Nettoyage de la colonne Price
     if 'Brand' not in df.columns:
         print(" La colonne 'Brand' est absente. Une valeur par défaut sera utilisée.")
         df['Brand'] = 'Unknown'
 
-    def clean_price(price):
-        if isinstance(price, str):
-            cleaned = ''.join(filter(lambda x: x.isdigit() or x == '.', price))
-            return float(cleaned) if cleaned else np.nan
-        return price
-
-    df['Price'] = df['Price'].apply(clean_price)
+    with tracing.span('clean.price', rows=len(df)):
+        df['Price'] = prices.parse_prices(df['Price'])['amount']
 
     # 2. Uniformisation de Screen Size
     def clean_screen_size(size):
@@ -35,11 +41,8 @@ def clean_monitors_ebay(df):
             return float(matches[0]) if matches else np.nan
         return size
 
-    df['Screen Size'] = df['Screen Size'].apply(clean_screen_size)
-    brand_avg_size = df.groupby('Brand')['Screen Size'].transform('median')
-    df['Screen Size'] = df['Screen Size'].fillna(brand_avg_size)
-    median_screen_size = df['Screen Size'].dropna().median()
-    df['Screen Size'] = df['Screen Size'].fillna(median_screen_size)
+    with tracing.span('clean.screen_size', rows=len(df)):
+        df['Screen Size'] = df['Screen Size'].apply(clean_screen_size)
 
     # Nettoyer la colonne "Response Time"
     def clean_response_time(response_time):
@@ -50,9 +53,12 @@ def clean_monitors_ebay(df):
             return float(response_time)
         return np.nan
 
-    df['Response Time'] = df['Response Time'].apply(clean_response_time)
-    median_response_time = df['Response Time'].dropna().median()
-    df['Response Time'] = df['Response Time'].fillna(median_response_time)
+    with tracing.span('clean.response_time', rows=len(df)):
+        df['Response Time'] = df['Response Time'].apply(clean_response_time)
+
+    # Valeurs manquantes : taille médiane de la marque, sinon de tout le fichier
+    with tracing.span('clean.impute', rows=len(df)):
+        df = imputation.impute(df, IMPUTATION, imputation.exact(df, IMPUTATION))
 
     # Extraction du Refresh Rate
     def extract_refresh_rate(row):
@@ -67,7 +73,8 @@ def clean_monitors_ebay(df):
             return int(re.search(r'(\d+)\s*HZ', row['Title'].upper()).group(1))
         return None
 
-    df['Refresh Rate'] = df.apply(extract_refresh_rate, axis=1)
+    with tracing.span('clean.refresh_rate', rows=len(df)):
+        df['Refresh Rate'] = df.apply(extract_refresh_rate, axis=1)
 
     # Renommer les colonnes
     new_columns = {
@@ -96,7 +103,8 @@ def clean_monitors_ebay(df):
         title = re.sub(r'\s+', ' ', title).strip()
         return title
 
-    df['Title'] = df['Title'].apply(clean_title_advanced)
+    with tracing.span('clean.title', rows=len(df)):
+        df['Title'] = df['Title'].apply(clean_title_advanced)
 
     # Suppression des doublons
     df = df.drop('Max_Resolution', axis=1)
@@ -108,17 +116,40 @@ def clean_monitors_ebay(df):
         return dataframe
 
     columns_to_check_for_duplicates = ['Brand', 'Model', 'Screen_Size_in', 'Refresh_Rate_Hz', 'Response_Time_ms']
-    df = remove_duplicates_with_min_price(df, columns_to_check_for_duplicates, 'Price')
+    with tracing.span('clean.dedup', rows=len(df)) as dedup_span:
+        df = remove_duplicates_with_min_price(df, columns_to_check_for_duplicates, 'Price')
+        dedup_span.set(rows_out=len(df))
     return df
 
 
-# Traiter les fichiers eBay
-for filename in os.listdir(raw_data_dir_ebay):
-    if filename.endswith('.csv'):
-        file_path = os.path.join(raw_data_dir_ebay, filename)
-        df = pd.read_csv(file_path)
-        cleaned_df = clean_monitors_ebay(df)
+def main():
+    tracing.start_run('ebay_clean_monitors')
+    profiling.start_from_env('ebay_clean_monitors')
+
+    # Créer les dossiers de sortie s'ils n'existent pas
+    os.makedirs(cleaned_data_dir_ebay, exist_ok=True)
+
+    # Traiter les fichiers eBay enregistrés dans le catalogue
+    cleaner = registry.get('ebay', 'monitors')
+    for file_path in catalog.paths('raw', 'ebay', 'monitors'):
+        if manifest.is_current(cleaner, file_path):
+            print(f"Déjà nettoyé : {file_path}")
+            continue
+        filename = file_path.name
+        with tracing.span('clean.read', file=filename) as read_span:
+            df = schemas.read(file_path, SCHEMA)
+            read_span.set(rows=len(df))
+        with tracing.span('clean.file', file=filename, rows=len(df)):
+            cleaned_df = clean(df)
         cleaned_filename = f"cleaned_{filename}"
         cleaned_file_path = os.path.join(cleaned_data_dir_ebay, cleaned_filename)
-        cleaned_df.to_csv(cleaned_file_path, index=False)
-        print(f"Fichier nettoyé (eBay) : {cleaned_file_path}")
\ No newline at end of file
+        with tracing.span('clean.write', file=cleaned_filename, rows=len(cleaned_df)), \
+                catalog.output(cleaned_file_path, 'cleaned', 'ebay', 'monitors', source=file_path) as output:
+            cleaned_df.to_csv(output.tmp_path, index=False)
+            output.rows = len(cleaned_df)
+        manifest.record(cleaner, file_path, cleaned_file_path)
+        print(f"Fichier nettoyé (eBay) : {cleaned_file_path}")
+
+
+if __name__ == '__main__':
+    main()
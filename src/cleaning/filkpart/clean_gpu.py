@@ -3,42 +3,26 @@ import re
 import os
 from pathlib import Path
 
+from src.cleaning import manifest, registry
+from src.cleaning.common import prices, schemas, validation
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # Define paths using relative paths
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # Root folder of the project
 RAW_DATA_DIR = BASE_DIR / 'data' / 'raw' / 'flipkart' / 'graphics_cards'
 CLEANED_DATA_DIR = BASE_DIR / 'data' / 'cleaned' / 'flipkart' / 'graphics_cards'
 
-# Debugging: Print paths
-print(f"Base directory: {BASE_DIR}")
-print(f"Raw data directory: {RAW_DATA_DIR}")
-print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
-
-# Ensure the cleaned data directory exists
-CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-# Check if raw data directory exists
-if not RAW_DATA_DIR.exists():
-    raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
-
-# Check if there are CSV files to process
-files = list(RAW_DATA_DIR.glob('*.csv'))
-if not files:
-    print(f"No CSV files found in {RAW_DATA_DIR}")
-else:
-    print(f"Found {len(files)} CSV files to process")
+SCHEMA = schemas.Schema(columns=['title', 'price', 'collection_date', 'Brand', 'Model ID', 'Memory',
+                                 'DVI and HDMI Interface'])
 
 # Exchange rate for INR to USD
 EXCHANGE_RATE_INR_TO_USD = 83  # Update this value as needed
 
-# Function to clean the price and convert it to USD
+# Function to clean the prices and convert them to USD
 def clean_price_and_convert_to_usd(price):
-    if pd.isna(price) or price == 'Data not available':
-        return None
-    # Remove non-numeric characters and convert to integer
-    price_inr = int(re.sub(r'[^\d]', '', price))
-    # Convert INR to USD
-    price_usd = round(price_inr / EXCHANGE_RATE_INR_TO_USD, 2)
-    return price_usd
+    parsed = prices.parse_prices(price, default_currency='INR')
+    return prices.to_usd(parsed['amount'], parsed['currency'], {'INR': EXCHANGE_RATE_INR_TO_USD}, decimals=2)
 
 # Function to extract the memory size
 def extract_memory_size(memory):
@@ -95,7 +79,7 @@ def drop_unnecessary_columns(df):
 # Handle missing values
 def fill_missing_values(df):
     if 'price' in df.columns:
-        df.loc[:, 'Price'] = df['price'].apply(clean_price_and_convert_to_usd)  # Convert price to USD
+        df.loc[:, 'Price'] = clean_price_and_convert_to_usd(df['price'])  # Convert price to USD
     if 'Brand' in df.columns:
         df.loc[:, 'Brand'] = df['Brand'].fillna('Unknown')
     if 'Memory Size' in df.columns:
@@ -112,10 +96,11 @@ def fill_missing_values(df):
 def save_cleaned_data(df, filename):
     df.to_csv(filename, index=False)
 
-# Remove rows with exactly three 'Unknown' values
-def remove_rows_with_three_unknowns(df):
-    unknown_counts = df.isin(['Unknown']).sum(axis=1)
-    return df[unknown_counts < 3]
+# Remove rows with three 'Unknown' values or more
+VALIDATION = (
+    validation.Sentinels('Unknown', below=3),
+    validation.price_band('graphics_cards'),
+)
 
 # Rename and drop the original price column
 def rename_and_drop_price_column(df):
@@ -130,29 +115,69 @@ def rename_collection_date_column(df):
     return df
 
 # Full data cleaning pipeline
-def clean_data(df):
+def clean(df):
     df = df.copy()
-    df = extract_missing_data(df)
-    df = fill_missing_values(df)  # Convert price to USD here
-    df = remove_rows_with_three_unknowns(df)
+    with tracing.span('clean.extract', rows=len(df)):
+        df = extract_missing_data(df)
+    with tracing.span('clean.impute', rows=len(df)):
+        df = fill_missing_values(df)  # Convert price to USD here
+    df = validation.validate(df, VALIDATION)
     df = rename_and_drop_price_column(df)  # Drop the old price column
     df = drop_unnecessary_columns(df)
     df = rename_collection_date_column(df)  # Rename 'collection_date' to 'Collection Date'
     return df
 
-# Process all CSV files in the raw data directory
-try:
-    for file in RAW_DATA_DIR.glob('*.csv'):
-        print(f"Processing file: {file}")
-        df = pd.read_csv(file)
-        print(f"Loaded {len(df)} rows from {file.name}")
-        print(f"Columns in the file: {df.columns.tolist()}")
+def main():
+    tracing.start_run('flipkart_clean_gpu')
+    profiling.start_from_env('flipkart_clean_gpu')
+
+    # Debugging: Print paths
+    print(f"Base directory: {BASE_DIR}")
+    print(f"Raw data directory: {RAW_DATA_DIR}")
+    print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
+
+    # Ensure the cleaned data directory exists
+    CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Check if raw data directory exists
+    if not RAW_DATA_DIR.exists():
+        raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
+
+    # Check if there are CSV files to process
+    files = catalog.paths('raw', 'flipkart', 'graphics_cards')
+    if not files:
+        print(f"No CSV files found in {RAW_DATA_DIR}")
+    else:
+        print(f"Found {len(files)} CSV files to process")
+
+    # Process all CSV files in the raw data directory
+    cleaner = registry.get('flipkart', 'graphics_cards')
+    try:
+        for file in files:
+            if manifest.is_current(cleaner, file):
+                print(f"Already cleaned: {file}")
+                continue
+            print(f"Processing file: {file}")
+            with tracing.span('clean.read', file=file.name) as read_span:
+                df = schemas.read(file, SCHEMA)
+                read_span.set(rows=len(df))
+            print(f"Loaded {len(df)} rows from {file.name}")
+            print(f"Columns in the file: {df.columns.tolist()}")
         
-        df_cleaned = clean_data(df)
-        print(f"Cleaned data has {len(df_cleaned)} rows")
+            with tracing.span('clean.file', file=file.name, rows=len(df)):
+                df_cleaned = clean(df)
+            print(f"Cleaned data has {len(df_cleaned)} rows")
         
-        output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
-        save_cleaned_data(df_cleaned, output_filename)
-        print(f"Cleaned data saved to {output_filename}")
-except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+            output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
+            with tracing.span('clean.write', file=output_filename.name, rows=len(df_cleaned)), \
+                    catalog.output(output_filename, 'cleaned', 'flipkart', 'graphics_cards', source=file) as output:
+                save_cleaned_data(df_cleaned, output.tmp_path)
+                output.rows = len(df_cleaned)
+            manifest.record(cleaner, file, output_filename)
+            print(f"Cleaned data saved to {output_filename}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+if __name__ == '__main__':
+    main()
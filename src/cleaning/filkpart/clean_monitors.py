@@ -8,13 +8,28 @@ from pathlib import Path
 from unidecode import unidecode
 from fuzzywuzzy import fuzz  # Si vous souhaitez étendre l'extraction de marque
 
+from src.cleaning import manifest, registry
+from src.cleaning.common import arrow, chunked, dictionary, imputation, prices, schemas
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # =============================================================================
 # Définition des répertoires
 # =============================================================================
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # Racine du projet
 RAW_DATA_DIR_MONITORS = BASE_DIR / 'data' / 'raw' / 'flipkart' / 'monitors'
 CLEANED_DATA_DIR_MONITORS = BASE_DIR / 'data' / 'cleaned' / 'flipkart' / 'monitors'
-CLEANED_DATA_DIR_MONITORS.mkdir(parents=True, exist_ok=True)
+
+# Les fichiers ne datent pas la collecte de la même façon
+COLLECTION_DATE = ('%m/%d/%Y %H:%M', '%Y-%m-%d %H:%M:%S')
+SCHEMA = schemas.Schema(
+    columns=['title', 'price', 'screen_size_in', 'aspect ratio', 'maximum refresh rate',
+             'refresh_rate_hz', 'response time', 'brand', 'model name', 'model', 'collection date',
+             'collection_date'],
+    dtype={'brand': 'category'},
+    dates={'collection date': COLLECTION_DATE, 'collection_date': COLLECTION_DATE},
+    ignore_case=True,
+)
 
 
 # =============================================================================
@@ -22,25 +37,12 @@ CLEANED_DATA_DIR_MONITORS.mkdir(parents=True, exist_ok=True)
 # =============================================================================
 
 def clean_price(price, conversion_rate=0.0125):
-
-    if isinstance(price, str):
-        price = price.strip().replace(" ", "")
-        if price.startswith("₹"):
-            try:
-                return float(price.replace("₹", "").replace(",", "")) * conversion_rate
-            except Exception:
-                return np.nan
-        elif price.startswith("$"):
-            try:
-                return float(price.replace("$", "").replace(",", ""))
-            except Exception:
-                return np.nan
-        else:
-            try:
-                return float(price)
-            except Exception:
-                return np.nan
-    return price
+    """
+    Convertit une colonne de prix en valeurs numériques en dollars.
+    Les montants en roupies ("₹") sont multipliés par conversion_rate.
+    """
+    parsed = prices.parse_prices(price)
+    return parsed['amount'].where(parsed['currency'] != 'INR', parsed['amount'] * conversion_rate)
 
 
 def extract_screen_size_in(title):
@@ -96,25 +98,40 @@ def extract_response_time(text):
     return np.nan
 
 
-def extract_brand(title, brand_list):
+def extract_brand(titles):
     """
-    Retourne la première marque présente dans le titre à partir d'une liste connue.
+    Retourne, pour chaque titre, la première marque connue (brands.json) qu'il contient.
     Sinon, retourne "Unknown".
     """
-    if isinstance(title, str):
-        for brand in brand_list:
-            if brand.lower() in title.lower():
-                return brand
-    return "Unknown"
+    return dictionary.matcher('brands', 'flipkart/monitors').first(titles, "Unknown")
 
 
 # =============================================================================
 # Fonction de traitement d'un fichier CSV (moniteurs)
 # =============================================================================
 
-def process_file(file_path: Path) -> pd.DataFrame:
+READ_OPTIONS = {'encoding': "utf-8", 'low_memory': False}
+
+
+def read(file_path: Path) -> pd.DataFrame:
+    """Charge le fichier CSV brut en s'assurant de lire tous les types correctement."""
+    with tracing.span('clean.read', file=file_path.name) as read_span:
+        df = schemas.read(file_path, SCHEMA, **READ_OPTIONS)
+        read_span.set(rows=len(df))
+    return df
+
+
+# Valeurs manquantes : médiane des colonnes numériques, mode des colonnes catégorielles
+IMPUTATION = tuple(
+    [imputation.Rule(col, 'median') for col in ["Price", "Screen_Size_in", "Refresh_Rate_Hz", "Response_Time_ms"]] +
+    [imputation.Rule(col, 'mode') for col in ["Title", "Aspect_Ratio", "Brand", "Model", "Collection Date"]]
+)
+
+
+def prepare(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Traite le fichier CSV brut et reconstruit un DataFrame ne conservant que :
+    Étapes ligne par ligne : nettoie un fichier CSV brut chargé par `read` et
+    reconstruit un DataFrame ne conservant que :
       - Title
       - Price
       - Screen_Size_in
@@ -125,64 +142,65 @@ def process_file(file_path: Path) -> pd.DataFrame:
       - Model
       - Collection Date
     """
-    # Charger le fichier CSV
-    df = pd.read_csv(file_path, encoding="utf-8", low_memory=False)
-
     # Normaliser les noms de colonnes (mettre en minuscules et supprimer les espaces superflus)
     df.columns = df.columns.str.strip().str.lower()
     df = df.copy()  # Pour éviter la fragmentation
 
-    # Définir la liste des marques connues pour les moniteurs
-    known_brands = ["HP", "Lenovo", "Sceptre", "Acer", "ASUS", "Samsung", "Frontech", "ZEBRONICS"]
-
     # --- Traitement du titre ---
-    if 'title' in df.columns:
-        df['title'] = df['title'].apply(lambda x: unidecode(x) if isinstance(x, str) else x)
-        df['title'] = df['title'].str.strip()
-    else:
-        df['title'] = np.nan
+    with tracing.span('clean.title', rows=len(df)):
+        if 'title' in df.columns:
+            df['title'] = df['title'].apply(lambda x: unidecode(x) if isinstance(x, str) else x)
+            df['title'] = df['title'].str.strip()
+        else:
+            df['title'] = np.nan
 
     # --- Traitement du prix ---
-    if 'price' in df.columns:
-        df['price'] = df['price'].apply(lambda x: clean_price(x, conversion_rate=0.0125))
-    else:
-        df['price'] = np.nan
+    with tracing.span('clean.price', rows=len(df)):
+        if 'price' in df.columns:
+            df['price'] = clean_price(df['price'], conversion_rate=0.0125)
+        else:
+            df['price'] = np.nan
 
     # --- Extraction de la taille de l'écran en pouces ---
     # Si la colonne "screen_size_in" existe déjà, on la convertit en numérique ; sinon, on l'extrait depuis le titre
-    if 'screen_size_in' in df.columns:
-        df['screen_size_in'] = pd.to_numeric(df['screen_size_in'], errors='coerce')
-    else:
-        df['screen_size_in'] = df['title'].apply(extract_screen_size_in)
+    with tracing.span('clean.screen_size', rows=len(df)):
+        if 'screen_size_in' in df.columns:
+            df['screen_size_in'] = arrow.to_numeric(df['screen_size_in'], errors='coerce')
+        else:
+            df['screen_size_in'] = df['title'].apply(extract_screen_size_in)
 
     # --- Aspect Ratio ---
     # Si la colonne "aspect ratio" existe, on la garde, sinon on tente de l'extraire depuis le titre
-    if 'aspect ratio' in df.columns:
-        df['aspect_ratio'] = df['aspect ratio']
-    else:
-        df['aspect_ratio'] = df['title'].apply(extract_aspect_ratio)
+    with tracing.span('clean.aspect_ratio', rows=len(df)):
+        if 'aspect ratio' in df.columns:
+            df['aspect_ratio'] = df['aspect ratio']
+        else:
+            df['aspect_ratio'] = df['title'].apply(extract_aspect_ratio)
 
     # --- Refresh Rate (Hz) ---
     # On recherche la colonne "maximum refresh rate" (si présente) ou "refresh_rate_hz"
-    if 'maximum refresh rate' in df.columns:
-        df['refresh_rate_hz'] = df['maximum refresh rate'].apply(extract_refresh_rate)
-    elif 'refresh_rate_hz' in df.columns:
-        df['refresh_rate_hz'] = df['refresh_rate_hz'].apply(extract_refresh_rate)
-    else:
-        df['refresh_rate_hz'] = np.nan
+    with tracing.span('clean.refresh_rate', rows=len(df)):
+        if 'maximum refresh rate' in df.columns:
+            df['refresh_rate_hz'] = df['maximum refresh rate'].apply(extract_refresh_rate)
+        elif 'refresh_rate_hz' in df.columns:
+            df['refresh_rate_hz'] = df['refresh_rate_hz'].apply(extract_refresh_rate)
+        else:
+            df['refresh_rate_hz'] = np.nan
 
     # --- Response Time (ms) ---
-    if 'response time' in df.columns:
-        df['response_time_ms'] = df['response time'].apply(extract_response_time)
-    else:
-        df['response_time_ms'] = np.nan
+    with tracing.span('clean.response_time', rows=len(df)):
+        if 'response time' in df.columns:
+            df['response_time_ms'] = df['response time'].apply(extract_response_time)
+        else:
+            df['response_time_ms'] = np.nan
 
     # --- Brand ---
     # Si la colonne "brand" existe, on l'utilise ; sinon, on l'extrait depuis le titre
-    if 'brand' in df.columns:
-        df['brand'] = df['brand'].fillna(df['title'].apply(lambda x: extract_brand(x, known_brands)))
-    else:
-        df['brand'] = df['title'].apply(lambda x: extract_brand(x, known_brands))
+    with tracing.span('clean.brand', rows=len(df)):
+        if 'brand' in df.columns:
+            df['brand'] = df['brand'].fillna(extract_brand(df['title']))
+        else:
+            df['brand'] = extract_brand(df['title'])
 
     # --- Model ---
     if 'model name' in df.columns:
@@ -193,12 +211,13 @@ def process_file(file_path: Path) -> pd.DataFrame:
         df['model'] = np.nan
 
     # --- Collection Date ---
-    if 'collection date' in df.columns:
-        df['collection date'] = pd.to_datetime(df['collection date'], errors='coerce')
-    elif 'collection_date' in df.columns:
-        df['collection date'] = pd.to_datetime(df['collection_date'], errors='coerce')
-    else:
-        df['collection date'] = pd.NaT
+    with tracing.span('clean.collection_date', rows=len(df)):
+        if 'collection date' in df.columns:
+            df['collection date'] = pd.to_datetime(df['collection date'], errors='coerce')
+        elif 'collection_date' in df.columns:
+            df['collection date'] = pd.to_datetime(df['collection_date'], errors='coerce')
+        else:
+            df['collection date'] = pd.NaT
 
     # =============================================================================
     # Constitution du DataFrame final avec les colonnes cibles
@@ -215,24 +234,29 @@ def process_file(file_path: Path) -> pd.DataFrame:
         "Collection Date": df['collection date']
     })
 
+    return final_df
+
+
+def finish(df: pd.DataFrame, values: dict) -> pd.DataFrame:
+    """Étapes qui demandent les statistiques de tout le fichier (`IMPUTATION`)."""
     # --- Imputation des valeurs manquantes ---
-    # Pour les colonnes numériques, utiliser la médiane
-    numeric_cols = ["Price", "Screen_Size_in", "Refresh_Rate_Hz", "Response_Time_ms"]
-    for col in numeric_cols:
-        if not final_df[col].isnull().all():
-            final_df[col] = final_df[col].fillna(final_df[col].median())
-
-    # Pour les colonnes catégorielles, utiliser le mode
-    categorical_cols = ["Title", "Aspect_Ratio", "Brand", "Model", "Collection Date"]
-    for col in categorical_cols:
-        if not final_df[col].isnull().all():
-            try:
-                final_df[col] = final_df[col].fillna(final_df[col].mode()[0])
-            except Exception:
-                pass
+    with tracing.span('clean.impute', rows=len(df)):
+        return imputation.impute(df, IMPUTATION, values)
+
+
+def deduplicator():
+    return chunked.DropDuplicates()
+
+
+def clean(df: pd.DataFrame) -> pd.DataFrame:
+    """Nettoie un fichier CSV brut chargé par `read` (voir `prepare`)."""
+    df = prepare(df)
+    final_df = finish(df, imputation.exact(df, IMPUTATION))
 
     # Suppression des doublons
-    final_df.drop_duplicates(inplace=True)
+    with tracing.span('clean.dedup', rows=len(final_df)) as dedup_span:
+        final_df.drop_duplicates(inplace=True)
+        dedup_span.set(rows_out=len(final_df))
 
     return final_df
 
@@ -242,17 +266,29 @@ def process_file(file_path: Path) -> pd.DataFrame:
 # =============================================================================
 
 def main():
-    csv_files = list(RAW_DATA_DIR_MONITORS.glob("*.csv"))
+    tracing.start_run('flipkart_clean_monitors')
+    profiling.start_from_env('flipkart_clean_monitors')
+    CLEANED_DATA_DIR_MONITORS.mkdir(parents=True, exist_ok=True)
+    csv_files = catalog.paths('raw', 'flipkart', 'monitors')
     if not csv_files:
         print("Aucun fichier CSV trouvé dans", RAW_DATA_DIR_MONITORS)
         return
 
+    cleaner = registry.get('flipkart', 'monitors')
     for file_path in csv_files:
+        if manifest.is_current(cleaner, file_path):
+            print(f"Déjà nettoyé : {file_path}")
+            continue
         print(f"Traitement de {file_path} ...")
         try:
-            cleaned_df = process_file(file_path)
+            with tracing.span('clean.file', file=file_path.name):
+                cleaned_df = clean(read(file_path))
             output_file = CLEANED_DATA_DIR_MONITORS / file_path.name
-            cleaned_df.to_csv(output_file, index=False, encoding="utf-8")
+            with tracing.span('clean.write', file=output_file.name, rows=len(cleaned_df)), \
+                    catalog.output(output_file, 'cleaned', 'flipkart', 'monitors', source=file_path) as output:
+                cleaned_df.to_csv(output.tmp_path, index=False, encoding="utf-8")
+                output.rows = len(cleaned_df)
+            manifest.record(cleaner, file_path, output_file)
             print(f"Fichier nettoyé enregistré sous {output_file}\n")
         except Exception as e:
             print(f"Erreur lors du traitement de {file_path} : {e}")
@@ -8,6 +8,11 @@ from pathlib import Path
 from fuzzywuzzy import fuzz
 from unidecode import unidecode
 
+from src.cleaning import manifest, registry
+from src.cleaning.common import dictionary, prices, schemas
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # =============================================================================
 # Définition des répertoires de travail
 # =============================================================================
@@ -15,8 +20,16 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # Racine du pro
 RAW_DATA_DIR_EBAY = BASE_DIR / 'data' / 'raw' / 'flipkart' / 'smart_watches'
 CLEANED_DATA_DIR_EBAY = BASE_DIR / 'data' / 'cleaned' / 'flipkart' / 'smart_watches'
 
-# Créer le dossier de données nettoyées s'il n'existe pas
-CLEANED_DATA_DIR_EBAY.mkdir(parents=True, exist_ok=True)
+# Les fichiers ne datent pas la collecte de la même façon
+COLLECTION_DATE = ('%m/%d/%Y %H:%M', '%Y-%m-%d %H:%M:%S')
+SCHEMA = schemas.Schema(
+    columns=['title', 'price', 'model name', 'model', 'operating system', 'internal memory',
+             'collection date', 'collection_date'],
+    dtype={'operating system': 'category'},
+    dates={'collection date': COLLECTION_DATE, 'collection_date': COLLECTION_DATE},
+    ignore_case=True,
+)
+
 
 # =============================================================================
 # Fonctions utilitaires de nettoyage
@@ -24,30 +37,12 @@ CLEANED_DATA_DIR_EBAY.mkdir(parents=True, exist_ok=True)
 
 def clean_price(price, conversion_rate=0.0125):
     """
-    Convertit une chaîne représentant un prix en une valeur numérique en dollars.
-    Si le prix commence par "₹", le symbole est retiré et le montant converti.
+    Convertit une colonne de prix en valeurs numériques en dollars.
+    Les montants en roupies ("₹") sont multipliés par conversion_rate.
     """
-    if isinstance(price, str):
-        price = price.strip().replace(" ", "")
-        if price.startswith("₹"):
-            price_num = price.replace("₹", "").replace(",", "")
-            try:
-                price_num = float(price_num) * conversion_rate
-            except Exception:
-                price_num = np.nan
-        elif price.startswith("$"):
-            price_num = price.replace("$", "").replace(",", "")
-            try:
-                price_num = float(price_num)
-            except Exception:
-                price_num = np.nan
-        else:
-            try:
-                price_num = float(price)
-            except Exception:
-                price_num = np.nan
-        return price_num
-    return price
+    parsed = prices.parse_prices(price)
+    return parsed['amount'].where(parsed['currency'] != 'INR', parsed['amount'] * conversion_rate)
+
 
 def extract_case_size(title):
     """
@@ -60,16 +55,12 @@ def extract_case_size(title):
             return float(match.group(1))
     return np.nan
 
-def extract_brand(title, brand_list):
+def extract_brand(titles):
     """
-    Parcourt la liste des marques et retourne la première présente dans le titre.
+    Retourne, pour chaque titre, la première marque connue (brands.json) qu'il contient.
     Sinon, retourne "Unknown".
     """
-    if isinstance(title, str):
-        for brand in brand_list:
-            if brand.lower() in title.lower():
-                return brand
-    return "Unknown"
+    return dictionary.matcher('brands', 'flipkart/smart_watches').first(titles, "Unknown")
 
 def extract_storage(memory_str):
     """
@@ -85,41 +76,45 @@ def extract_storage(memory_str):
 # Fonction de traitement d'un fichier CSV
 # =============================================================================
 
-def process_file(file_path: Path) -> pd.DataFrame:
+def read(file_path: Path) -> pd.DataFrame:
+    """Charge le fichier CSV brut en s'assurant de lire tous les types correctement."""
+    with tracing.span('clean.read', file=file_path.name) as read_span:
+        df = schemas.read(file_path, SCHEMA, encoding="utf-8", low_memory=False)
+        read_span.set(rows=len(df))
+    return df
+
+
+def clean(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Charge le CSV, normalise les colonnes et effectue le nettoyage :
+    Normalise les colonnes d'un CSV brut chargé par `read` et effectue le nettoyage :
       - Conversion du prix
       - Extraction de la taille du boitier depuis le titre
       - Extraction de la marque depuis le titre à partir d'une liste connue
       - Extraction du modèle, du système d'exploitation, du stockage, etc.
     Renvoie un DataFrame final avec les colonnes cibles.
     """
-    # Charger le CSV en s'assurant de lire tous les types correctement
-    df = pd.read_csv(file_path, encoding="utf-8", low_memory=False)
-
     # Normalisation des noms de colonnes : suppression des espaces et passage en minuscules
     df.columns = df.columns.str.strip().str.lower()
     df = df.copy()  # Pour défragmenter le DataFrame
 
-    # Définir la liste des marques connues
-    known_brands = ["Samsung", "Fastrack", "Yash Enterprises", "Apple", "AICase"]
-
     # --- Traitement du prix ---
-    if 'price' in df.columns:
-        df['price'] = df['price'].apply(lambda x: clean_price(x, conversion_rate=0.0125))
-    else:
-        print(f"Attention : la colonne 'price' n'est pas présente dans {file_path}")
+    with tracing.span('clean.price', rows=len(df)):
+        if 'price' in df.columns:
+            df['price'] = clean_price(df['price'], conversion_rate=0.0125)
+        else:
+            print(f"Attention : la colonne 'price' n'est pas présente dans {df.attrs.get('source', 'le fichier')}")
 
     # --- Traitement du titre et extraction d'informations depuis le titre ---
-    if 'title' in df.columns:
-        # Normaliser le texte : suppression des accents et espaces inutiles
-        df['title'] = df['title'].apply(lambda x: unidecode(x) if isinstance(x, str) else x)
-        df['title'] = df['title'].str.strip()
-        df['case size'] = df['title'].apply(extract_case_size)
-        df['brand'] = df['title'].apply(lambda x: extract_brand(x, known_brands))
-    else:
-        df['case size'] = np.nan
-        df['brand'] = "Unknown"
+    with tracing.span('clean.title', rows=len(df)):
+        if 'title' in df.columns:
+            # Normaliser le texte : suppression des accents et espaces inutiles
+            df['title'] = df['title'].apply(lambda x: unidecode(x) if isinstance(x, str) else x)
+            df['title'] = df['title'].str.strip()
+            df['case size'] = df['title'].apply(extract_case_size)
+            df['brand'] = extract_brand(df['title'])
+        else:
+            df['case size'] = np.nan
+            df['brand'] = "Unknown"
 
     # --- Extraction du modèle ---
     if 'model name' in df.columns:
@@ -134,21 +129,23 @@ def process_file(file_path: Path) -> pd.DataFrame:
         df['operating system'] = np.nan
 
     # --- Capacité de stockage ---
-    if 'internal memory' in df.columns:
-        df['storage capacity'] = df['internal memory'].apply(extract_storage)
-    else:
-        df['storage capacity'] = np.nan
+    with tracing.span('clean.storage_capacity', rows=len(df)):
+        if 'internal memory' in df.columns:
+            df['storage capacity'] = df['internal memory'].apply(extract_storage)
+        else:
+            df['storage capacity'] = np.nan
 
     # --- Batterie ---
     df['battery capacity'] = np.nan  # Pas d'information de batterie dans le CSV d'origine
 
     # --- Date de collecte ---
-    if 'collection date' in df.columns:
-        df['collection date'] = pd.to_datetime(df['collection date'], errors='coerce')
-    elif 'collection_date' in df.columns:
-        df['collection date'] = pd.to_datetime(df['collection_date'], errors='coerce')
-    else:
-        df['collection date'] = pd.NaT
+    with tracing.span('clean.collection_date', rows=len(df)):
+        if 'collection date' in df.columns:
+            df['collection date'] = pd.to_datetime(df['collection date'], errors='coerce')
+        elif 'collection_date' in df.columns:
+            df['collection date'] = pd.to_datetime(df['collection_date'], errors='coerce')
+        else:
+            df['collection date'] = pd.NaT
 
     # =============================================================================
     # Constitution du DataFrame final avec les colonnes cibles
@@ -169,19 +166,22 @@ def process_file(file_path: Path) -> pd.DataFrame:
     # --- Imputation des valeurs manquantes ---
 
     # Pour les colonnes numériques, imputer avec la médiane
-    numeric_cols = ["Price", "Case Size", "Battery Capacity", "Storage Capacity"]
-    for col in numeric_cols:
-        if not final_df[col].isnull().all():
-            final_df[col] = final_df[col].fillna(final_df[col].median())
-
-    # Pour les colonnes catégorielles, imputer avec le mode
-    categorical_cols = ["Title", "Brand", "Model", "Operating System", "Collection Date"]
-    for col in categorical_cols:
-        if not final_df[col].isnull().all():
-            final_df[col] = final_df[col].fillna(final_df[col].mode()[0])
+    with tracing.span('clean.impute', rows=len(final_df)):
+        numeric_cols = ["Price", "Case Size", "Battery Capacity", "Storage Capacity"]
+        for col in numeric_cols:
+            if not final_df[col].isnull().all():
+                final_df[col] = final_df[col].fillna(final_df[col].median())
+
+        # Pour les colonnes catégorielles, imputer avec le mode
+        categorical_cols = ["Title", "Brand", "Model", "Operating System", "Collection Date"]
+        for col in categorical_cols:
+            if not final_df[col].isnull().all():
+                final_df[col] = final_df[col].fillna(final_df[col].mode()[0])
 
     # Suppression des doublons
-    final_df.drop_duplicates(inplace=True)
+    with tracing.span('clean.dedup', rows=len(final_df)) as dedup_span:
+        final_df.drop_duplicates(inplace=True)
+        dedup_span.set(rows_out=len(final_df))
 
     return final_df
 
@@ -190,19 +190,32 @@ def process_file(file_path: Path) -> pd.DataFrame:
 # =============================================================================
 
 def main():
+    tracing.start_run('flipkart_clean_watches')
+    profiling.start_from_env('flipkart_clean_watches')
+    # Créer le dossier de données nettoyées s'il n'existe pas
+    CLEANED_DATA_DIR_EBAY.mkdir(parents=True, exist_ok=True)
     # Parcourir tous les fichiers CSV dans le dossier RAW_DATA_DIR_EBAY
-    csv_files = list(RAW_DATA_DIR_EBAY.glob("*.csv"))
+    csv_files = catalog.paths('raw', 'flipkart', 'smart_watches')
     if not csv_files:
         print("Aucun fichier CSV trouvé dans", RAW_DATA_DIR_EBAY)
         return
 
+    cleaner = registry.get('flipkart', 'smart_watches')
     for file_path in csv_files:
+        if manifest.is_current(cleaner, file_path):
+            print(f"Déjà nettoyé : {file_path}")
+            continue
         print(f"Traitement de {file_path} ...")
         try:
-            cleaned_df = process_file(file_path)
+            with tracing.span('clean.file', file=file_path.name):
+                cleaned_df = clean(read(file_path))
             # Enregistrer le fichier nettoyé dans le dossier CLEANED_DATA_DIR_EBAY
             output_file = CLEANED_DATA_DIR_EBAY / file_path.name
-            cleaned_df.to_csv(output_file, index=False, encoding="utf-8")
+            with tracing.span('clean.write', file=output_file.name, rows=len(cleaned_df)), \
+                    catalog.output(output_file, 'cleaned', 'flipkart', 'smart_watches', source=file_path) as output:
+                cleaned_df.to_csv(output.tmp_path, index=False, encoding="utf-8")
+                output.rows = len(cleaned_df)
+            manifest.record(cleaner, file_path, output_file)
             print(f"Fichier nettoyé enregistré sous {output_file}\n")
         except Exception as e:
             print(f"Erreur lors du traitement de {file_path} : {e}")
@@ -0,0 +1,347 @@
+"""Every listing seen across the cleaned files, and when and at what price.
+
+The same listings come back in scrape after scrape. Each cleaned file is
+deduplicated on its own, which keeps the price history the analyses draw
+from, but says nothing of which of its rows were already seen. This store
+does: one SQLite database (data/listings.sqlite, or PIPELINE_LISTINGS)
+holds a row per listing, with its first and last seen dates, its last price
+and number of observations, plus every (listing, cleaned file, date,
+price) observation.
+
+A listing is identified by its fingerprint, a 64-bit `hash_pandas_object`
+of its site, category, title (scrapes carry no item ID, so the title stands
+for one) and spec columns (`SPEC_COLUMNS`). Before hashing, text is
+lowercased with its whitespace collapsed, and numbers are rounded to three
+decimals. "Seen before?" is then one primary key lookup (`seen`).
+
+`update` records the cleaned files of the catalog that are new or changed
+since they were last recorded; `clean_all` calls it after cleaning. The date
+of a cleaned file's observations is the one in its name, or when the catalog
+finished writing it. `status` classifies each row of a cleaned file as 'new'
+(never seen on an earlier date), 'changed' (its last earlier price differs)
+or 'seen', and `record` keeps the counts of each file for the report:
+
+    python -m src.cleaning.listings update
+    python -m src.cleaning.listings report --site ebay
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, namedtuple
+from pathlib import Path
+
+import pandas as pd
+
+from src.cleaning import manifest, registry
+from src.common import catalog
+
+LISTINGS_PATH = Path(os.environ.get('PIPELINE_LISTINGS', catalog.DATA_DIR / 'listings.sqlite'))
+
+# Column names of the cleaned files, compared lowercased
+ITEM_COLUMN = 'title'
+PRICE_COLUMN = 'price'
+SPEC_COLUMNS = {
+    'graphics_cards': ('brand', 'memory size', 'memory type', 'chipset/gpu model', 'connectors'),
+    'laptops': ('brand', 'model', 'cpu', 'ram', 'storage', 'gpu', 'screen size'),
+    'monitors': ('brand', 'model', 'screen_size_in', 'aspect_ratio', 'refresh_rate_hz', 'response_time_ms'),
+    'smart_watches': ('brand', 'model', 'operating system', 'storage capacity', 'case size', 'battery capacity'),
+}
+STATUSES = ('new', 'changed', 'seen')
+
+Listing = namedtuple('Listing', 'fingerprint site category spec first_seen last_seen last_price observations')
+
+_FILE_DATE = re.compile(r'(\d{4})_(\d{2})_(\d{2})')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    fingerprint INTEGER PRIMARY KEY,
+    site TEXT NOT NULL,
+    category TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    first_seen TEXT,
+    last_seen TEXT,
+    last_price REAL,
+    observations INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS observations (
+    fingerprint INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    price REAL
+);
+CREATE INDEX IF NOT EXISTS observations_listing ON observations (fingerprint, observed_at);
+CREATE INDEX IF NOT EXISTS observations_source ON observations (source);
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    site TEXT NOT NULL,
+    category TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    new INTEGER NOT NULL,
+    changed INTEGER NOT NULL
+);
+"""
+
+_REFRESH = """
+UPDATE listings SET
+    first_seen = (SELECT MIN(observed_at) FROM observations o WHERE o.fingerprint = listings.fingerprint),
+    last_seen = (SELECT MAX(observed_at) FROM observations o WHERE o.fingerprint = listings.fingerprint),
+    last_price = (SELECT price FROM observations o WHERE o.fingerprint = listings.fingerprint
+                  ORDER BY observed_at DESC, rowid DESC LIMIT 1),
+    observations = (SELECT COUNT(*) FROM observations o WHERE o.fingerprint = listings.fingerprint)
+WHERE fingerprint IN (SELECT fingerprint FROM batch)
+"""
+
+# The last price of every listing of the batch on a date before ?, from another file than ?
+_PRIOR = """
+SELECT b.fingerprint,
+       (SELECT price FROM observations o
+        WHERE o.fingerprint = b.fingerprint AND o.observed_at < ? AND o.source != ?
+        ORDER BY o.observed_at DESC, o.rowid DESC LIMIT 1),
+       EXISTS (SELECT 1 FROM observations o
+               WHERE o.fingerprint = b.fingerprint AND o.observed_at < ? AND o.source != ?)
+FROM batch b
+"""
+
+
+def _normalized(values):
+    if pd.api.types.is_numeric_dtype(values):
+        text = values.round(3).map('{:g}'.format)
+    else:
+        text = values.astype(str).str.lower().str.split().str.join(' ')
+    return text.where(values.notna(), '')
+
+
+def _columns(df, category):
+    """The item and spec columns of a cleaned file, '' where the file lacks one."""
+    names = {column.strip().lower(): column for column in df.columns}
+    wanted = (ITEM_COLUMN,) + SPEC_COLUMNS[category]
+    return pd.DataFrame({name: _normalized(df[names[name]]) if name in names else '' for name in wanted},
+                        index=df.index)
+
+
+def fingerprints(site, category, df):
+    """The fingerprint of every row of the cleaned frame `df`, as signed 64-bit integers (SQLite's)."""
+    spec = _columns(df, category)
+    spec.insert(0, 'category', category)
+    spec.insert(0, 'site', site)
+    hashes = pd.util.hash_pandas_object(spec, index=False).to_numpy()
+    return pd.Series(hashes.view('int64'), index=df.index)
+
+
+def _prices(df):
+    names = {column.strip().lower(): column for column in df.columns}
+    if PRICE_COLUMN not in names:
+        return pd.Series(float('nan'), index=df.index)
+    return pd.to_numeric(df[names[PRICE_COLUMN]], errors='coerce')
+
+
+def observed_at(entry):
+    """The date of a cleaned file's observations: the one in its name, or when it was written."""
+    match = _FILE_DATE.search(Path(entry.path).name)
+    if match:
+        return '-'.join(match.groups())
+    return (entry.finished_at or entry.started_at)[:10]
+
+
+def _statuses(prior, prices):
+    status = pd.Series('seen', index=prices.index, dtype=object)
+    before = prior['price']
+    changed = (before != prices) & ~(before.isna() & prices.isna())
+    status[changed.to_numpy()] = 'changed'
+    status[~prior['seen'].astype(bool).to_numpy()] = 'new'
+    return status
+
+
+class Listings:
+    """The listings, observations and sources of one store. Safe to share between threads."""
+
+    def __init__(self, path=LISTINGS_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._connection.executescript(_SCHEMA)
+        self._connection.execute('CREATE TEMP TABLE batch (fingerprint INTEGER PRIMARY KEY)')
+
+    def close(self):
+        self._connection.close()
+
+    def _fill_batch(self, keys):
+        self._connection.execute('DELETE FROM batch')
+        self._connection.executemany('INSERT OR IGNORE INTO batch VALUES (?)', ((int(key),) for key in keys))
+
+    def seen(self, fingerprint):
+        with self._lock:
+            return self._connection.execute('SELECT 1 FROM listings WHERE fingerprint = ?',
+                                            (int(fingerprint),)).fetchone() is not None
+
+    def listing(self, fingerprint):
+        with self._lock:
+            row = self._connection.execute('SELECT * FROM listings WHERE fingerprint = ?',
+                                           (int(fingerprint),)).fetchone()
+        return Listing(*row) if row else None
+
+    def _prior(self, keys, date, source):
+        """The last earlier price of every fingerprint, and whether it was seen before at all."""
+        self._fill_batch(keys)
+        rows = self._connection.execute(_PRIOR, (date, source, date, source)).fetchall()
+        prior = pd.DataFrame(rows, columns=['fingerprint', 'price', 'seen']).set_index('fingerprint')
+        return prior.reindex(keys.to_numpy())
+
+    def status(self, site, category, df, date, source=None):
+        """'new', 'changed' or 'seen' for every row of the cleaned frame `df`, observed on `date`."""
+        keys = fingerprints(site, category, df)
+        with self._lock:
+            prior = self._prior(keys, date, '' if source is None else manifest.relative(source))
+        prior.index = df.index
+        return _statuses(prior, _prices(df))
+
+    def record(self, entry):
+        """
+        Records the observations of the cleaned file of the catalog `entry`,
+        replacing those of an earlier version of it. Returns its row counts by
+        status, or None when it was recorded already.
+        """
+        source = manifest.relative(entry.path)
+        with self._lock:
+            row = self._connection.execute('SELECT sha256 FROM sources WHERE source = ?', (source,)).fetchone()
+        if row is not None and row[0] == entry.sha256:
+            return None
+
+        df = pd.read_csv(entry.path)
+        date = observed_at(entry)
+        keys = fingerprints(entry.site, entry.category, df)
+        prices = _prices(df)
+        specs = _columns(df, entry.category)
+        with self._lock:
+            prior = self._prior(keys, date, source)
+            prior.index = df.index
+            counts = Counter(_statuses(prior, prices))
+            self._connection.execute('BEGIN')
+            try:
+                stale = [key for (key,) in self._connection.execute(
+                    'SELECT DISTINCT fingerprint FROM observations WHERE source = ?', (source,))]
+                self._connection.execute('DELETE FROM observations WHERE source = ?', (source,))
+                self._connection.executemany(
+                    'INSERT OR IGNORE INTO listings (fingerprint, site, category, spec) VALUES (?, ?, ?, ?)',
+                    ((int(key), entry.site, entry.category, json.dumps(list(spec)))
+                     for key, spec in zip(keys, specs.itertuples(index=False))))
+                self._connection.executemany(
+                    'INSERT INTO observations VALUES (?, ?, ?, ?)',
+                    ((int(key), source, date, None if pd.isna(price) else float(price))
+                     for key, price in zip(keys, prices)))
+                self._fill_batch(pd.Series(stale + keys.tolist(), dtype='int64'))
+                self._connection.execute(_REFRESH)
+                self._connection.execute('DELETE FROM listings WHERE observations = 0')
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (source, entry.sha256, entry.site, entry.category, date, len(df), counts['new'], counts['changed']))
+                self._connection.execute('COMMIT')
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+        return {status: counts[status] for status in STATUSES}
+
+    def update(self, cleaners=registry.CLEANERS):
+        """
+        Records every cleaned file of `cleaners` not recorded yet or changed
+        since, oldest first, and forgets the files gone from the catalog.
+        Returns {path: row counts by status} of the files recorded.
+        """
+        recorded = {}
+        for cleaner in cleaners:
+            entries = catalog.entries('cleaned', cleaner.site, cleaner.category)
+            for entry in sorted(entries, key=observed_at):
+                counts = self.record(entry)
+                if counts is not None:
+                    recorded[entry.path] = counts
+            self.forget_missing(cleaner, {manifest.relative(entry.path) for entry in entries})
+        return recorded
+
+    def forget_missing(self, cleaner, sources):
+        """Forgets the observations of the files of `cleaner` not in `sources`."""
+        with self._lock:
+            gone = [source for (source,) in self._connection.execute(
+                'SELECT source FROM sources WHERE site = ? AND category = ?', (cleaner.site, cleaner.category))
+                if source not in sources]
+            for source in gone:
+                stale = [key for (key,) in self._connection.execute(
+                    'SELECT DISTINCT fingerprint FROM observations WHERE source = ?', (source,))]
+                self._connection.execute('DELETE FROM observations WHERE source = ?', (source,))
+                self._connection.execute('DELETE FROM sources WHERE source = ?', (source,))
+                self._fill_batch(pd.Series(stale, dtype='int64'))
+                self._connection.execute(_REFRESH)
+                self._connection.execute('DELETE FROM listings WHERE observations = 0')
+        return gone
+
+    def report(self, site=None, category=None):
+        """Per site and category: listings, those seen in more than one file, observations."""
+        query = ('SELECT site, category, COUNT(*), SUM(observations > 1), SUM(observations) FROM listings'
+                 ' WHERE (? IS NULL OR site = ?) AND (? IS NULL OR category = ?) GROUP BY site, category'
+                 ' ORDER BY site, category')
+        with self._lock:
+            return self._connection.execute(query, (site, site, category, category)).fetchall()
+
+    def sources(self, site=None, category=None):
+        query = ('SELECT source, observed_at, rows, new, changed FROM sources'
+                 ' WHERE (? IS NULL OR site = ?) AND (? IS NULL OR category = ?) ORDER BY site, category, observed_at')
+        with self._lock:
+            return self._connection.execute(query, (site, site, category, category)).fetchall()
+
+
+_listings = None
+_listings_lock = threading.Lock()
+
+
+def get():
+    """The listings store of this process, opened on first use."""
+    global _listings
+    with _listings_lock:
+        if _listings is None:
+            _listings = Listings()
+        return _listings
+
+
+def seen(fingerprint):
+    return get().seen(fingerprint)
+
+
+def update(cleaners=registry.CLEANERS):
+    return get().update(cleaners)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.cleaning.listings',
+                                     description='Record and inspect the listings seen across the cleaned files.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('update', 'record the cleaned files not recorded yet'),
+                            ('report', 'listings and observations per site and category, and per file')):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument('--site', choices=registry.SITES)
+        subparser.add_argument('--category', choices=registry.CATEGORIES)
+    options = parser.parse_args(argv)
+
+    store = get()
+    if options.command == 'update':
+        recorded = store.update(registry.select([options.site] if options.site else None,
+                                                [options.category] if options.category else None))
+        for path, counts in recorded.items():
+            print(f"{manifest.relative(path)}: {counts['new']} new, {counts['changed']} changed, {counts['seen']} seen")
+        print(f"{len(recorded)} cleaned files recorded in {store.path}")
+        return
+    print(f"{'site':<9}{'category':<16}{'listings':>9}{'repeated':>9}{'observed':>9}")
+    for site, category, listings, repeated, observations in store.report(options.site, options.category):
+        print(f"{site:<9}{category:<16}{listings:>9}{repeated:>9}{observations:>9}")
+    print()
+    print(f"{'date':<12}{'rows':>6}{'new':>6}{'changed':>8}  file")
+    for source, date, rows, new, changed in store.sources(options.site, options.category):
+        print(f"{date:<12}{rows:>6}{new:>6}{changed:>8}  {source}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""What every cleaned file was made from, so unchanged inputs are not cleaned again.
+
+One SQLite database (data/clean_manifest.sqlite, or PIPELINE_CLEAN_MANIFEST)
+holds a row per cleaned file: the raw file it was cleaned from and that
+file's SHA-256, the version of the cleaner's code, the cleaner's parameters
+and the SHA-256 of the cleaned file as written. A cleaned file is current
+while all of these still hold, and cleaning its raw file again would write
+the same bytes, so `clean_all` and the cleaner modules skip it.
+
+The code version is a digest of the cleaner module, of the registry and of
+everything under src/cleaning/common (brands.json included): editing any of
+them re-cleans every file of the cleaners concerned. The parameters are the
+cleaner's registry entry and, for a cleaner that supports it, the chunk size
+it was run with, and for a cleaner that fills values from the statistics of
+its whole category (`pool`), the digest of the raw files it pools: those of
+the category up to its own in scrape order, so a later scrape leaves it as it
+is.
+
+Raw scrapes are never rewritten, so their SHA-256 is the one the catalog
+recorded when they were written; a raw file whose size no longer matches the
+catalog is hashed again. `collect_garbage` deletes the cleaned files whose raw
+file is gone, or which the registry now names differently.
+"""
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src.cleaning import registry
+from src.common import catalog
+
+MANIFEST_PATH = Path(os.environ.get('PIPELINE_CLEAN_MANIFEST', catalog.DATA_DIR / 'clean_manifest.sqlite'))
+CLEANING_DIR = Path(__file__).resolve().parent
+
+Record = namedtuple('Record', 'output site category source source_sha256 code_version params output_sha256 cleaned_at')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cleanings (
+    output TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    category TEXT NOT NULL,
+    source TEXT NOT NULL,
+    source_sha256 TEXT NOT NULL,
+    code_version TEXT NOT NULL,
+    params TEXT NOT NULL,
+    output_sha256 TEXT NOT NULL,
+    cleaned_at TEXT NOT NULL
+);
+"""
+
+
+def relative(path):
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(catalog.PROJECT_ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(cleaner):
+    """Digest of the source files the output of `cleaner` depends on."""
+    sources = [Path(importlib.util.find_spec(cleaner.module).origin), CLEANING_DIR / 'registry.py']
+    sources += sorted(path for path in (CLEANING_DIR / 'common').iterdir() if path.suffix in ('.py', '.json'))
+    digest = hashlib.sha256()
+    for path in sources:
+        digest.update(path.name.encode('utf-8') + b'\0' + path.read_bytes() + b'\0')
+    return digest.hexdigest()
+
+
+def source_digest(path):
+    """SHA-256 of a raw file, from the catalog unless the file changed size since."""
+    entry = catalog.entry_for(path)
+    if entry is not None and entry.sha256 and entry.bytes == os.path.getsize(path):
+        return entry.sha256
+    return catalog.file_digest(path)[1]
+
+
+def pooled_paths(cleaner, path=None):
+    """
+    The raw files of the cleaner's category up to `path` included, in scrape
+    order (all of them when `path` is None): no scrape sees a later one.
+    """
+    paths = catalog.paths('raw', cleaner.site, cleaner.category)
+    if path is None:
+        return paths
+    resolved = [Path(other).resolve() for other in paths]
+    if Path(path).resolve() in resolved:
+        return paths[:resolved.index(Path(path).resolve()) + 1]
+    number = catalog.scrape_number_of(path)  # a file the catalog does not know: by its number alone
+    return paths if number is None else [other for other in paths if (catalog.scrape_number_of(other) or 0) <= number]
+
+
+def category_digest(cleaner, path=None):
+    """Digest of the cleaner's code and of the raw files of its category it pools for `path`."""
+    digest = hashlib.sha256(code_version(cleaner).encode('utf-8'))
+    for raw in pooled_paths(cleaner, path):
+        digest.update(f"\0{relative(raw)}\0{source_digest(raw)}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def params(cleaner, chunksize=None, path=None):
+    options = cleaner._asdict()
+    if chunksize and registry.supports_chunks(cleaner):
+        options['chunksize'] = chunksize
+    if registry.uses_pool(cleaner):
+        options['pool'] = category_digest(cleaner, path)
+    return json.dumps(options, sort_keys=True)
+
+
+class Manifest:
+    """The cleanings table of one manifest database. Safe to share between threads."""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def record_for(self, output):
+        with self._lock:
+            row = self._connection.execute('SELECT * FROM cleanings WHERE output = ?', (relative(output),)).fetchone()
+        return Record(*row) if row else None
+
+    def records(self, site=None, category=None):
+        query = 'SELECT * FROM cleanings WHERE 1 = 1'
+        values = []
+        if site is not None:
+            query += ' AND site = ?'
+            values.append(site)
+        if category is not None:
+            query += ' AND category = ?'
+            values.append(category)
+        with self._lock:
+            return [Record(*row) for row in self._connection.execute(query + ' ORDER BY output', values)]
+
+    def is_current(self, cleaner, path, chunksize=None):
+        """Whether the cleaned file of the raw file `path` is there and up to date."""
+        output = registry.output_path(cleaner, path)
+        record = self.record_for(output)
+        if record is None or not output.exists():
+            return False
+        if record.code_version != code_version(cleaner) or record.params != params(cleaner, chunksize, path):
+            return False
+        entry = catalog.entry_for(output)
+        if entry is None or entry.sha256 != record.output_sha256:
+            return False
+        return record.source_sha256 == source_digest(path)
+
+    def record(self, cleaner, path, output, chunksize=None):
+        """Records that the raw file `path` was just cleaned into `output` (written through the catalog)."""
+        entry = catalog.entry_for(output)
+        if entry is None or not entry.sha256:
+            return
+        row = (relative(output), cleaner.site, cleaner.category, relative(path), source_digest(path),
+               code_version(cleaner), params(cleaner, chunksize, path), entry.sha256,
+               datetime.now(timezone.utc).isoformat(timespec='seconds'))
+        with self._lock:
+            self._connection.execute(f"INSERT OR REPLACE INTO cleanings VALUES ({', '.join('?' * len(row))})", row)
+
+    def forget(self, output):
+        with self._lock:
+            self._connection.execute('DELETE FROM cleanings WHERE output = ?', (relative(output),))
+
+    def collect_garbage(self, cleaners):
+        """
+        Deletes the cleaned files of `cleaners` whose raw file is gone or which
+        the registry now names differently, and forgets them. Files the
+        manifest never recorded are left alone. Returns the deleted paths.
+        """
+        removed = []
+        for cleaner in cleaners:
+            for record in self.records(cleaner.site, cleaner.category):
+                output = catalog.PROJECT_ROOT / record.output
+                source = catalog.PROJECT_ROOT / record.source
+                if source.exists() and registry.output_path(cleaner, source) == output:
+                    continue
+                if output.exists():
+                    removed.append(output)
+                catalog.remove(output)
+                self.forget(output)
+        return removed
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get():
+    """The manifest of this process, opened on first use."""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = Manifest()
+        return _manifest
+
+
+def is_current(cleaner, path, chunksize=None):
+    return get().is_current(cleaner, path, chunksize)
+
+
+def record(cleaner, path, output, chunksize=None):
+    return get().record(cleaner, path, output, chunksize)
+
+
+def collect_garbage(cleaners):
+    return get().collect_garbage(cleaners)
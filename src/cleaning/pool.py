@@ -0,0 +1,115 @@
+"""Imputation statistics pooled over every raw file of a category.
+
+A cleaner fills a missing value from the statistics of its own file first
+(`imputation.exact`). Where the file has none, e.g. for a GPU model listed
+once and without its memory size, a cleaner with `POOLED = True` falls back
+on the same statistics over the raw files of its category up to its own, in
+scrape order, which `values(site, category, source)` gives: a file is never
+filled from a scrape made after it.
+
+They are merged from one `imputation.Sketches` per raw file, of the rows the
+cleaner's `prepare` gives, read `chunked.CHUNKSIZE` rows at a time. The
+sketches are kept in one SQLite database (data/imputation_pool.sqlite, or
+PIPELINE_IMPUTATION_POOL) with the SHA-256 of their raw file and the version
+of the cleaner's code, so a new or changed raw file is read once and the
+others never again. A cleaned file then depends on the raw files of its
+category up to its own: the manifest re-cleans it when one of them is added
+or changes, and leaves it when a later scrape comes in.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src.cleaning import manifest, registry
+from src.cleaning.common import chunked, imputation
+from src.common import catalog
+from src.observability import tracing
+
+POOL_PATH = Path(os.environ.get('PIPELINE_IMPUTATION_POOL', catalog.DATA_DIR / 'imputation_pool.sqlite'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sketches (
+    source TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    category TEXT NOT NULL,
+    source_sha256 TEXT NOT NULL,
+    code_version TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    sketches BLOB NOT NULL,
+    computed_at TEXT NOT NULL
+);
+"""
+
+
+class Pool:
+    """The sketches of one pool database. Safe to share between threads."""
+
+    def __init__(self, path=POOL_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._connection.executescript(_SCHEMA)
+        self._values = {}
+
+    def close(self):
+        self._connection.close()
+
+    def sketches(self, cleaner, path):
+        """The `imputation.Sketches` of the raw file `path`, computed unless stored already."""
+        source = manifest.relative(path)
+        source_sha256, code_version = manifest.source_digest(path), manifest.code_version(cleaner)
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT source_sha256, code_version, sketches FROM sketches WHERE source = ?', (source,)).fetchone()
+        if row is not None and row[:2] == (source_sha256, code_version):
+            return pickle.loads(row[2])
+
+        module = registry.load(cleaner)
+        with tracing.span('clean.pool', file=Path(path).name) as pool_span:
+            sketches = chunked.sketches(module, path, chunked.CHUNKSIZE, **getattr(module, 'READ_OPTIONS', {}))
+            pool_span.set(rows=sketches.rows)
+        row = (source, cleaner.site, cleaner.category, source_sha256, code_version, sketches.rows,
+               pickle.dumps(sketches), datetime.now(timezone.utc).isoformat(timespec='seconds'))
+        with self._lock:
+            self._connection.execute(f"INSERT OR REPLACE INTO sketches VALUES ({', '.join('?' * len(row))})", row)
+        return sketches
+
+    def values(self, cleaner, source=None):
+        """
+        The values of the imputation rules of `cleaner` over the raw files of
+        its category up to `source` (every one when it is None).
+        """
+        paths = manifest.pooled_paths(cleaner, source)
+        version = manifest.category_digest(cleaner, source)
+        with self._lock:
+            cached = self._values.get(version)
+        if cached is not None:
+            return cached
+        pooled = imputation.Sketches(registry.load(cleaner).IMPUTATION)
+        for path in paths:
+            pooled.merge(self.sketches(cleaner, path))
+        values = pooled.values()
+        with self._lock:
+            self._values[version] = values
+        return values
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get():
+    """The pool of this process, opened on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = Pool()
+        return _pool
+
+
+def values(site, category, source=None):
+    return get().values(registry.get(site, category), source)
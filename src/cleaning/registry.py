@@ -0,0 +1,117 @@
+"""The cleaner of every site and category.
+
+Each cleaner module exposes `clean(df)`, which takes a raw scrape as read from
+its CSV and returns the cleaned rows without touching the disk. Raw files are
+read with the module's `SCHEMA` (`schemas.read`: only the columns it uses, with
+its dtypes and date formats), or by its `read(path)` when it has one.
+Importing a module has no side effects; running it (python -m
+src.cleaning.ebay.clean_gpu) still cleans every raw file of its category one
+after the other, and `src/cleaning/clean_all.py` runs all of them over a
+process pool.
+
+`clean_file` is one unit of that work: it reads a raw file, cleans it and
+writes the result where the module's own run would, through the catalog. The
+path of the raw file is left in `df.attrs['source']` for cleaners that take
+something from the file name. Given a `chunksize`, the cleaners that support
+it (`chunked.supports`) clean the file that many rows at a time instead of
+loading it whole.
+"""
+import importlib
+from collections import namedtuple
+from pathlib import Path
+
+from src.cleaning.common import chunked, schemas
+from src.common import catalog
+from src.observability import tracing
+
+# `output_name` is formatted with the raw file's `stem` and `name`
+Cleaner = namedtuple('Cleaner', 'site category module output_name')
+# What `clean_file` did: `validation` is the report of `validation.validate`, None if the cleaner has none
+Cleaned = namedtuple('Cleaned', 'rows_in rows_out output validation')
+
+CLEANERS = (
+    Cleaner('ebay', 'graphics_cards', 'src.cleaning.ebay.clean_gpu', '{stem}_cleaned.csv'),
+    Cleaner('ebay', 'laptops', 'src.cleaning.ebay.clean_laptop', '{stem}_cleaned.csv'),
+    Cleaner('ebay', 'monitors', 'src.cleaning.ebay.clean_monitors', 'cleaned_{name}'),
+    Cleaner('ebay', 'smart_watches', 'src.cleaning.ebay.clean_watches', '{stem}_cleaned.csv'),
+    Cleaner('flipkart', 'graphics_cards', 'src.cleaning.filkpart.clean_gpu', '{stem}_cleaned.csv'),
+    Cleaner('flipkart', 'laptops', 'src.cleaning.filkpart.clean_laptop', '{stem}_cleaned.csv'),
+    Cleaner('flipkart', 'monitors', 'src.cleaning.filkpart.clean_monitors', '{name}'),
+    Cleaner('flipkart', 'smart_watches', 'src.cleaning.filkpart.clean_watches', '{name}'),
+    Cleaner('ubuy', 'graphics_cards', 'src.cleaning.ubuy.clean_gpu', '{stem}_cleaned.csv'),
+    Cleaner('ubuy', 'laptops', 'src.cleaning.ubuy.clean_laptops', '{stem}_cleaned.csv'),
+    Cleaner('ubuy', 'monitors', 'src.cleaning.ubuy.monitors', '{stem}_cleaned.csv'),
+    Cleaner('ubuy', 'smart_watches', 'src.cleaning.ubuy.clean_smartwatch', '{stem}_cleaned.csv'),
+)
+SITES = tuple(dict.fromkeys(cleaner.site for cleaner in CLEANERS))
+CATEGORIES = tuple(dict.fromkeys(cleaner.category for cleaner in CLEANERS))
+
+
+def get(site, category):
+    for cleaner in CLEANERS:
+        if cleaner.site == site and cleaner.category == category:
+            return cleaner
+    raise KeyError(f"No cleaner for {site} {category}")
+
+
+def select(sites=None, categories=None):
+    """The cleaners of the given sites and categories (all of them by default)."""
+    return [cleaner for cleaner in CLEANERS
+            if (not sites or cleaner.site in sites) and (not categories or cleaner.category in categories)]
+
+
+def load(cleaner):
+    return importlib.import_module(cleaner.module)
+
+
+def supports_chunks(cleaner):
+    return chunked.supports(load(cleaner))
+
+
+def uses_pool(cleaner):
+    """Whether the cleaner fills values from the statistics of its whole category (`pool`)."""
+    return getattr(load(cleaner), 'POOLED', False)
+
+
+def output_path(cleaner, path):
+    path = Path(path)
+    return catalog.DATA_DIR / 'cleaned' / cleaner.site / cleaner.category / cleaner.output_name.format(
+        stem=path.stem, name=path.name)
+
+
+def read(cleaner, path):
+    path = Path(path)
+    module = load(cleaner)
+    if hasattr(module, 'read'):
+        df = module.read(path)
+    else:
+        with tracing.span('clean.read', file=path.name) as read_span:
+            df = schemas.read(path, getattr(module, 'SCHEMA', None))
+            read_span.set(rows=len(df))
+    df.attrs['source'] = str(path)
+    return df
+
+
+def clean_file(cleaner, path, chunksize=None):
+    """Cleans the raw file `path` and writes the result. Returns a `Cleaned`."""
+    path = Path(path)
+    module = load(cleaner)
+    if chunksize and chunked.supports(module):
+        output_filename = output_path(cleaner, path)
+        with tracing.span('clean.file', file=path.name, chunksize=chunksize), \
+                catalog.output(output_filename, 'cleaned', cleaner.site, cleaner.category, source=path) as output:
+            rows_in, rows_out, report = chunked.clean_file(module, path, output.tmp_path, chunksize,
+                                                           **getattr(module, 'READ_OPTIONS', {}))
+            output.rows = rows_out
+        return Cleaned(rows_in, rows_out, output_filename, report)
+
+    df = read(cleaner, path)
+    rows_in = len(df)
+    with tracing.span('clean.file', file=path.name, rows=rows_in):
+        cleaned = module.clean(df)
+    output_filename = output_path(cleaner, path)
+    with tracing.span('clean.write', file=output_filename.name, rows=len(cleaned)), \
+            catalog.output(output_filename, 'cleaned', cleaner.site, cleaner.category, source=path) as output:
+        cleaned.to_csv(output.tmp_path, index=False)
+        output.rows = len(cleaned)
+    return Cleaned(rows_in, len(cleaned), output_filename, cleaned.attrs.get('validation'))
@@ -0,0 +1,439 @@
+"""Cleaners described as rules, and the compiler that turns them into plans.
+
+The cleaners are variations on the same few operations: pick a column among
+the names a file may give it, clean up text, extract a number or a token
+with a regex, parse prices and dates, fill a column from the brand
+dictionary, compute the file's imputation statistics, fuzzy-correct against
+them, impute, deduplicate, filter and keep some columns. A `Spec` lists
+those operations as steps, in the order a hand-written cleaner would run
+them (`src/cleaning/specs.py` has the specs):
+
+- `LowerHeader()`: strips and lowercases the column names;
+- `First(target, sources)`: the first of `sources` the file has, or an
+  all-missing column;
+- `IfColumn(column, then, otherwise)`: the steps `then` if the frame has
+  `column` at that point, `otherwise` if not;
+- `Text`, `Extract`, `Numeric`, `Price`, `Date`, `Match` and `Derive`:
+  whole-column transformations of one row at a time, into `target`, from
+  `source` (`target` itself when None). Text and extractions run once per
+  distinct value. `Derive(target, function, inputs)`
+  takes a function of the frame, which must only use vectorized operations
+  on the `inputs` columns;
+- `Statistics(rules, pooled)`: `imputation.exact` of the rules over the
+  frame, and their pooled values over the category up to the frame's own
+  scrape (`pool`); then
+  `Correct(column, threshold)` replaces the values with their best fuzzy
+  match among the column's 'values', and `Impute()` fills the gaps;
+- `Filter(column, op, value)`, `KeepMinimum(subset, by)`,
+  `DropDuplicates(subset)`, `Rename(old, new)` and `Select(columns)`.
+
+`compile(spec, header)` resolves the `IfColumn`s for a file's header, and
+optimizes the steps before they run:
+
+- a filter moves up before the row-wise steps that do not write the column
+  it tests, so they run on fewer rows; consecutive filters become one mask,
+  the cheap comparisons first, and the regex ones only on the rows those
+  kept;
+- the extractions from the same source column become one `str.extract` of a
+  fused pattern (one optional lookahead per pattern, which finds what
+  `re.search` of each would).
+
+`clean(spec, df)` runs the plan of `df`'s header, compiled once per header
+and spec. The specs give the same rows as the cleaners they describe:
+
+    python -m benchmarks.bench_rules
+"""
+import functools
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+from src.cleaning import pool
+from src.cleaning.common import arrow, columns, dictionary, fuzzy, imputation, prices
+from src.observability import tracing
+
+Spec = namedtuple('Spec', 'site category steps')
+
+LowerHeader = namedtuple('LowerHeader', '')
+First = namedtuple('First', 'target sources')
+IfColumn = namedtuple('IfColumn', 'column then otherwise', defaults=((),))
+Text = namedtuple('Text', 'target source lower transliterate terms remove strip squeeze',
+                  defaults=(None, False, False, None, None, True, False))
+Extract = namedtuple('Extract', 'target pattern source flags numeric', defaults=(None, 0, False))
+Numeric = namedtuple('Numeric', 'target source', defaults=(None,))
+# `rates`: ((currency, rate), ...) to convert amounts with
+Price = namedtuple('Price', 'target source rates', defaults=(None, ()))
+Date = namedtuple('Date', 'target source', defaults=(None,))
+# Fills the gaps of `target` with the first dictionary term of kind `kind` and list `name` found in `source`
+Match = namedtuple('Match', 'target source kind name default', defaults=(None,))
+Derive = namedtuple('Derive', 'target function inputs')
+Statistics = namedtuple('Statistics', 'rules pooled', defaults=(False,))
+Correct = namedtuple('Correct', 'column threshold')
+Impute = namedtuple('Impute', '')
+Filter = namedtuple('Filter', 'column op value', defaults=(None,))
+KeepMinimum = namedtuple('KeepMinimum', 'subset by')
+DropDuplicates = namedtuple('DropDuplicates', 'subset', defaults=(None,))
+Rename = namedtuple('Rename', 'old new')
+Select = namedtuple('Select', 'columns')
+
+ROW_WISE = (First, Text, Extract, Numeric, Price, Date, Match, Derive, Filter)
+
+# Filter operators, and what they cost per row
+COMPARISONS = {'>': 'gt', '>=': 'ge', '<': 'lt', '<=': 'le', '==': 'eq', '!=': 'ne'}
+FILTER_COST = {**dict.fromkeys(COMPARISONS, 0), 'notna': 0, 'in': 1, 'matches': 2}
+
+_FLAGS = {re.IGNORECASE: 'i', re.MULTILINE: 'm', re.DOTALL: 's', re.VERBOSE: 'x'}
+
+
+def _source(step):
+    return step.target if step.source is None else step.source
+
+
+def _reads(step):
+    if isinstance(step, First):
+        return set(step.sources)
+    if isinstance(step, Match):
+        return {step.target, step.source}
+    if isinstance(step, Derive):
+        return set(step.inputs)
+    if isinstance(step, Filter):
+        return {step.column}
+    return {_source(step)}
+
+
+def _writes(step):
+    return set() if isinstance(step, Filter) else {step.target}
+
+
+# =============================================================================
+# Compilation
+# =============================================================================
+
+def _resolve(steps, header):
+    """The steps with their `IfColumn`s resolved, following the columns of the frame from `header` on."""
+    resolved = []
+    header = list(header)
+    for step in steps:
+        if isinstance(step, IfColumn):
+            branch = step.then if step.column in header else step.otherwise
+            branch_steps, header = _resolve(branch, header)
+            resolved.extend(branch_steps)
+            continue
+        resolved.append(step)
+        if isinstance(step, LowerHeader):
+            header = [column.strip().lower() for column in header]
+        elif isinstance(step, Rename):
+            header = [step.new if column == step.old else column for column in header]
+        elif isinstance(step, Select):
+            header = [column for column in step.columns if column in header]
+        elif isinstance(step, ROW_WISE) and not isinstance(step, Filter) and step.target not in header:
+            header.append(step.target)
+    return resolved, header
+
+
+def _can_pass(step, earlier):
+    """Whether `step` may run before the row-wise step `earlier` with the same result."""
+    if not isinstance(earlier, ROW_WISE) or isinstance(earlier, Filter):
+        return False
+    return not (_writes(earlier) & (_reads(step) | _writes(step))) and not (_reads(earlier) & _writes(step))
+
+
+def _push_filters(steps):
+    ordered = []
+    for step in steps:
+        position = len(ordered)
+        if isinstance(step, Filter):
+            while position and _can_pass(step, ordered[position - 1]):
+                position -= 1
+        ordered.insert(position, step)
+    return ordered
+
+
+def _extraction_group(grouped, step):
+    """The earlier extractions from the source of `step` it can join, past the row-wise steps between, or None."""
+    for earlier in reversed(grouped):
+        if not isinstance(earlier, list):
+            if not _can_pass(step, earlier):
+                return None
+        elif not isinstance(earlier[0], Extract):
+            return None
+        elif _source(earlier[0]) == _source(step) \
+                and not any(_writes(extraction) & (_reads(step) | _writes(step)) for extraction in earlier):
+            return earlier
+        elif not all(_can_pass(step, extraction) for extraction in earlier):
+            return None
+    return None
+
+
+def _group(steps):
+    """The steps, with the extractions from one source column and consecutive filters gathered in lists."""
+    grouped = []
+    for step in steps:
+        if isinstance(step, Filter) and grouped and isinstance(grouped[-1], list) \
+                and isinstance(grouped[-1][0], Filter):
+            grouped[-1].append(step)
+        elif isinstance(step, Extract) and _extraction_group(grouped, step) is not None:
+            _extraction_group(grouped, step).append(step)
+        else:
+            grouped.append([step] if isinstance(step, (Filter, Extract)) else step)
+    return grouped
+
+
+Operation = namedtuple('Operation', 'name steps run')
+
+
+class Plan:
+    """The operations one spec runs on the files of one header."""
+
+    def __init__(self, spec, operations):
+        self.spec = spec
+        self.operations = tuple(operations)
+
+    def run(self, df):
+        state = {}
+        for operation in self.operations:
+            with tracing.span(f'clean.{operation.name}', rows=len(df)) as span:
+                df = operation.run(df, state)
+                span.set(rows_out=len(df))
+        return df
+
+    def describe(self):
+        return '\n'.join(f"{number:>3}. {operation.name:<14} {'; '.join(map(_describe, operation.steps))}"
+                         for number, operation in enumerate(self.operations, 1))
+
+
+def _describe(step):
+    fields = ', '.join(f'{name}={value!r}' for name, value in step._asdict().items()
+                       if name not in ('function', 'terms', 'rules'))
+    return f'{type(step).__name__}({fields})'
+
+
+@functools.lru_cache(maxsize=None)
+def compile(spec, header):
+    """The `Plan` of `spec` for the frames whose columns are `header` (a tuple)."""
+    steps, _ = _resolve(spec.steps, header)
+    operations = []
+    for item in _group(_push_filters(steps)):
+        if isinstance(item, list) and isinstance(item[0], Filter):
+            operations.append(Operation('filter', tuple(item), _filters(item)))
+        elif isinstance(item, list):
+            operations.append(Operation('extract', tuple(item), _extractions(item)))
+        else:
+            operations.append(Operation(type(item).__name__.lower(), (item,), _OPERATIONS[type(item)](spec, item)))
+    return Plan(spec, operations)
+
+
+def clean(spec, df):
+    """Cleans one raw file as the cleaner `spec` describes."""
+    return compile(spec, tuple(df.columns)).run(df)
+
+
+# =============================================================================
+# Operations
+# =============================================================================
+
+def _is_text(values):
+    return pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values) \
+        or isinstance(values.dtype, pd.CategoricalDtype)
+
+
+def _scoped(step):
+    letters = ''.join(letter for flag, letter in _FLAGS.items() if step.flags & flag)
+    return f'(?{letters}:{step.pattern})' if letters else step.pattern
+
+
+def _extractions(steps):
+    if len(steps) == 1:
+        regex = re.compile(steps[0].pattern, steps[0].flags)
+        offsets = [0]
+    else:
+        # One lookahead per pattern, each of which is optional and looks from the start of the text
+        regex = re.compile(''.join(f'(?=(?s:.*?){_scoped(step)})?' for step in steps))
+        offsets = list(np.cumsum([0] + [re.compile(step.pattern).groups for step in steps[:-1]]))
+
+    def run(df, state):
+        values = df[_source(steps[0])]
+        if not _is_text(values):
+            for step in steps:
+                df[step.target] = np.nan
+            return df
+        found = columns.per_distinct(lambda distinct: arrow.extract(distinct, regex), values)
+        for step, offset in zip(steps, offsets):
+            extracted = found.iloc[:, offset]
+            df[step.target] = arrow.to_numeric(extracted, errors='coerce') if step.numeric else extracted
+        return df
+    return run
+
+
+def _condition(df, step):
+    values = df[step.column]
+    if step.op in COMPARISONS:
+        return getattr(values, COMPARISONS[step.op])(step.value)
+    if step.op == 'notna':
+        return values.notna()
+    if step.op == 'in':
+        return values.isin(step.value)
+    if step.op == 'matches':
+        return values.str.contains(step.value, regex=True, na=False)
+    raise ValueError(f"Unknown filter {step.op!r} on {step.column}")
+
+
+def _filters(steps):
+    steps = sorted(steps, key=lambda step: FILTER_COST[step.op])
+    cheap = [step for step in steps if FILTER_COST[step.op] == 0]
+    costly = [step for step in steps if FILTER_COST[step.op] > 0]
+
+    def run(df, state):
+        if cheap:
+            df = df[functools.reduce(lambda mask, step: mask & _condition(df, step), cheap[1:],
+                                     _condition(df, cheap[0]))]
+        for step in costly:
+            df = df[_condition(df, step)]
+        return df
+    return run
+
+
+def _lower_header(spec, step):
+    def run(df, state):
+        df.columns = df.columns.str.strip().str.lower()
+        return df
+    return run
+
+
+def _first(spec, step):
+    def run(df, state):
+        present = [source for source in step.sources if source in df.columns]
+        df[step.target] = columns.get(df, present[0] if present else None)
+        return df
+    return run
+
+
+def _transliterate(values):
+    return values.map(lambda value: unidecode(value) if isinstance(value, str) else value)
+
+
+def _text(spec, step):
+    def clean_text(values):
+        if step.transliterate:
+            values = _transliterate(values)
+        if step.lower:
+            values = values.str.lower()
+        if step.terms is not None:
+            values = step.terms.strip_series(values)
+        if step.remove is not None:
+            values = values.str.replace(step.remove, '', regex=True)
+        if step.strip:
+            values = values.str.strip()
+        if step.squeeze:
+            values = values.str.replace(r'\s+', ' ', regex=True)
+        return values
+
+    def run(df, state):
+        df[step.target] = columns.per_distinct(clean_text, df[_source(step)])
+        return df
+    return run
+
+
+def _numeric(spec, step):
+    def run(df, state):
+        df[step.target] = arrow.to_numeric(df[_source(step)], errors='coerce')
+        return df
+    return run
+
+
+def _price(spec, step):
+    def run(df, state):
+        parsed = prices.parse_prices(df[_source(step)])
+        amounts = parsed['amount']
+        for currency, rate in step.rates:
+            amounts = amounts.where(parsed['currency'] != currency, amounts * rate)
+        df[step.target] = amounts
+        return df
+    return run
+
+
+def _date(spec, step):
+    def run(df, state):
+        df[step.target] = pd.to_datetime(df[_source(step)], errors='coerce')
+        return df
+    return run
+
+
+def _match(spec, step):
+    matcher = dictionary.matcher(step.kind, step.name)
+
+    def run(df, state):
+        values = df[step.target]
+        missing = values.isna()
+        # Only the titles of the rows that need a value are searched
+        df[step.target] = values.fillna(matcher.first(df.loc[missing, step.source], step.default))
+        return df
+    return run
+
+
+def _derive(spec, step):
+    def run(df, state):
+        df[step.target] = step.function(df)
+        return df
+    return run
+
+
+def _statistics(spec, step):
+    def run(df, state):
+        state['rules'] = step.rules
+        state['values'] = imputation.exact(df, step.rules)
+        state['pooled'] = None
+        if step.pooled:
+            if df.attrs.get('source') is None:
+                raise ValueError(f"{spec.site}/{spec.category}: df.attrs['source'] is not set, which the pool needs")
+            state['pooled'] = pool.values(spec.site, spec.category, df.attrs['source'])
+        return df
+    return run
+
+
+def _correct(spec, step):
+    def run(df, state):
+        matches = fuzzy.best_matches(df[step.column], state['values'][step.column])
+        df[step.column] = matches['match'].where(matches['score'] > step.threshold, df[step.column])
+        return df
+    return run
+
+
+def _impute(spec, step):
+    def run(df, state):
+        return imputation.impute(df, state['rules'], state['values'], state['pooled'])
+    return run
+
+
+def _keep_minimum(spec, step):
+    def run(df, state):
+        return df.loc[df.groupby(list(step.subset))[step.by].idxmin()].reset_index(drop=True)
+    return run
+
+
+def _drop_duplicates(spec, step):
+    def run(df, state):
+        return df.drop_duplicates(None if step.subset is None else list(step.subset))
+    return run
+
+
+def _rename(spec, step):
+    def run(df, state):
+        return df.rename(columns={step.old: step.new})
+    return run
+
+
+def _select(spec, step):
+    def run(df, state):
+        return df[[column for column in step.columns if column in df.columns]].copy()
+    return run
+
+
+_OPERATIONS = {
+    LowerHeader: _lower_header, First: _first, Text: _text, Numeric: _numeric, Price: _price, Date: _date,
+    Match: _match, Derive: _derive, Statistics: _statistics, Correct: _correct, Impute: _impute,
+    KeepMinimum: _keep_minimum, DropDuplicates: _drop_duplicates, Rename: _rename, Select: _select,
+}
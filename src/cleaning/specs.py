@@ -0,0 +1,92 @@
+"""The cleaners written as rules (`src/cleaning/rules.py`).
+
+Each spec gives the same rows as the hand-written cleaner of its site and
+category, which `python -m benchmarks.bench_rules` checks on every raw file.
+The functions here are the steps no rule covers, on whole columns.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from src.cleaning import rules
+from src.cleaning.common import columns
+from src.cleaning.ebay import clean_gpu as ebay_gpu
+from src.cleaning.filkpart import clean_monitors as flipkart_monitors
+
+NUMBER = r'(\d+(?:\.\d+)?)'
+
+
+def gpu_title(df):
+    """The brand and GPU model, plus what else the cleaned title says when it names the brand only."""
+    names = df['Cleaned Title'].to_numpy(dtype=str)
+    models = df['Chipset/GPU Model'].astype(str).str.strip()
+    brands = df['Brand'].astype(str).str.strip()
+    has_model = np.char.find(names, models.str.lower().to_numpy(dtype=str)) >= 0
+    has_brand = np.char.find(names, brands.str.lower().to_numpy(dtype=str)) >= 0
+    brand_model = brands + ' ' + models
+    return pd.Series(np.select(
+        [has_model & has_brand, has_model, has_brand],
+        [brand_model, models, brands + ' ' + df['Cleaned Title']],
+        brand_model.where(brands != 'nan', models)), index=df.index, dtype=object)
+
+
+def _gigabytes(values):
+    upper = values.str.upper()
+    megabytes = pd.to_numeric(upper.str.replace('MB', '', regex=False).str.strip(), errors='coerce') / 1024
+    gigabytes = pd.to_numeric(values.str.replace(r'[^\d.]', '', regex=True), errors='coerce')
+    return megabytes.where(upper.str.contains('MB', regex=False), gigabytes)
+
+
+def memory_gb(df):
+    """Memory sizes in GB: "512 MB" is 0.5, anything else its digits and dots; None when that is no number."""
+    return columns.per_distinct(_gigabytes, df['Memory Size'].astype(str))
+
+
+EBAY_GRAPHICS_CARDS = rules.Spec('ebay', 'graphics_cards', (
+    rules.Text('Cleaned Title', 'Title', lower=True, terms=ebay_gpu.TITLE_TERMS, remove=r'[^a-zA-Z0-9\s]',
+               squeeze=True),
+    rules.Derive('Cleaned Title', gpu_title, ('Cleaned Title', 'Chipset/GPU Model', 'Brand')),
+    rules.Price('Price'),
+    rules.Derive('Memory Size', memory_gb, ('Memory Size',)),
+    rules.Statistics(ebay_gpu.IMPUTATION, pooled=True),
+    rules.Correct('Brand', 85),
+    rules.Impute(),
+    rules.KeepMinimum(tuple(ebay_gpu.DUPLICATE_COLUMNS), 'Price'),
+    rules.Filter('Price', '>', 0),
+    rules.Filter('Memory Size', '>', 0.1),
+    rules.Rename('Cleaned Title', 'title'),
+    rules.Select(('title', 'Price', 'Brand', 'Memory Size', 'Memory Type', 'Chipset/GPU Model', 'Connectors',
+                  'Collection Date')),
+))
+
+FLIPKART_MONITORS = rules.Spec('flipkart', 'monitors', (
+    rules.LowerHeader(),
+    rules.First('Title', ('title',)),
+    rules.Text('Title', transliterate=True),
+    rules.First('Price', ('price',)),
+    rules.Price('Price', rates=(('INR', 0.0125),)),
+    rules.IfColumn('screen_size_in',
+                   then=(rules.Numeric('Screen_Size_in', 'screen_size_in'),),
+                   otherwise=(rules.Extract('Screen_Size_in', r'\((\d+(?:\.\d+)?)\s*(?:in|inch)', 'Title',
+                                            re.IGNORECASE, numeric=True),)),
+    rules.IfColumn('aspect ratio',
+                   then=(rules.First('Aspect_Ratio', ('aspect ratio',)),),
+                   otherwise=(rules.Extract('Aspect_Ratio', r'(\d+:\d+)', 'Title'),)),
+    rules.First('Refresh_Rate_Hz', ('maximum refresh rate', 'refresh_rate_hz')),
+    rules.Extract('Refresh_Rate_Hz', NUMBER, numeric=True),
+    rules.First('Response_Time_ms', ('response time',)),
+    rules.Extract('Response_Time_ms', NUMBER, numeric=True),
+    rules.First('Brand', ('brand',)),
+    rules.Match('Brand', 'Title', 'brands', 'flipkart/monitors', 'Unknown'),
+    rules.First('Model', ('model name', 'model')),
+    rules.First('Collection Date', ('collection date', 'collection_date')),
+    rules.Date('Collection Date'),
+    rules.Select(('Title', 'Price', 'Screen_Size_in', 'Aspect_Ratio', 'Refresh_Rate_Hz', 'Response_Time_ms',
+                  'Brand', 'Model', 'Collection Date')),
+    rules.Statistics(flipkart_monitors.IMPUTATION),
+    rules.Impute(),
+    rules.DropDuplicates(),
+))
+
+SPECS = {(spec.site, spec.category): spec for spec in (EBAY_GRAPHICS_CARDS, FLIPKART_MONITORS)}
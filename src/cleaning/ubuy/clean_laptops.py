@@ -2,56 +2,37 @@ import pandas as pd
 import re
 from pathlib import Path
 
+from src.cleaning import manifest, registry
+from src.cleaning.common import arrow, dictionary, prices, schemas
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # Define paths using relative paths
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # Root folder of the project
 RAW_DATA_DIR = BASE_DIR / 'data' / 'raw' / 'ubuy' / 'laptops'
 CLEANED_DATA_DIR = BASE_DIR / 'data' / 'cleaned' / 'ubuy' / 'laptops'
 
-# Ensure the cleaned data directory exists
-CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-# Debugging: Print paths
-print(f"Base directory: {BASE_DIR}")
-print(f"Raw data directory: {RAW_DATA_DIR}")
-print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
-
-# Check if raw data directory exists
-if not RAW_DATA_DIR.exists():
-    raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
-
-# Check if there are CSV files to process
-files = list(RAW_DATA_DIR.glob('*.csv'))
-if not files:
-    print(f"No CSV files found in {RAW_DATA_DIR}")
-else:
-    print(f"Found {len(files)} CSV files to process")
+SCHEMA = schemas.Schema(columns=['title', 'price', 'Graphics Coprocessor', 'Screen Size', 'CPU Model',
+                                 'Ram Memory Installed Size', 'Hard Disk Size'])
 
 # Fonctions de nettoyage
+# Termes supprimés des titres
+TITLE_TERMS = re.compile(
+    r'(?i)\b(8GB|. |PC|Notebook|Ryzen|UHD|Graphics|DDR4|AMD|W11|Win11|Win|11|Cond|!!|LOADED|TouchBar|Mac OS|Black| i3StorageWin|Gaming|Laptop|Touchscreen|Pro|15.6|Windows|RTX|FHD|LaptopWin11|HDD| ,|French|13inch|'
+    r' - | /|macOS|VENTURA|FREE|SHIPPIN|i9|13.3|inches|TURBO|"|- | , |13INCH|EXCELLENT|'
+    r'REFURBISHED|NEW|MWTK2LL|Qwerty|Spanish|Keyboard|British|\d+GB|\d+TB|[\d\.]+ ?GHz| GB |'
+    r'rouge|Gray|BIG SUR|WEBCAM|WIFI|BLUETOOTHGB|TB|space gray|silver|gold|touch bar|GHz|'
+    r'Intel|Core|i7|th|Gen|GB|Very|RAM|i5| GB| TB|GB GB|.GHZ| CPU | GPU|-|SSD|256|512|Good|'
+    r'Condition|magic keyboard|✅|🔋|grade [A-B]|warranty\.\.\.)'
+)
+
 def clean_title(title):
-    return re.sub(
-        r'(?i)\b(8GB|. |PC|Notebook|Ryzen|UHD|Graphics|DDR4|AMD|W11|Win11|Win|11|Cond|!!|LOADED|TouchBar|Mac OS|Black| i3StorageWin|Gaming|Laptop|Touchscreen|Pro|15.6|Windows|RTX|FHD|LaptopWin11|HDD| ,|French|13inch|'
-        r' - | /|macOS|VENTURA|FREE|SHIPPIN|i9|13.3|inches|TURBO|"|- | , |13INCH|EXCELLENT|'
-        r'REFURBISHED|NEW|MWTK2LL|Qwerty|Spanish|Keyboard|British|\d+GB|\d+TB|[\d\.]+ ?GHz| GB |'
-        r'rouge|Gray|BIG SUR|WEBCAM|WIFI|BLUETOOTHGB|TB|space gray|silver|gold|touch bar|GHz|'
-        r'Intel|Core|i7|th|Gen|GB|Very|RAM|i5| GB| TB|GB GB|.GHZ| CPU | GPU|-|SSD|256|512|Good|'
-        r'Condition|magic keyboard|✅|🔋|grade [A-B]|warranty\.\.\.)',
-        '',
-        str(title)
-    ).strip().replace('  ', '')
-
-def clean_price(price):
-    if not isinstance(price, str):
-        return None
-    price = re.sub(r'[^\d\.]', '', price)
-    try:
-        return float(price)
-    except ValueError:
-        return None
+    return arrow.replace(arrow.as_str(title), TITLE_TERMS).str.strip().str.replace('  ', '', regex=False)
 
-def convert_to_usd(price_mad, exchange_rate=10):
-    if price_mad is None:
-        return None
-    return round(price_mad / exchange_rate, 2)
+def clean_price(price, exchange_rate=10):
+    """Parses the MAD prices and converts them to USD."""
+    parsed = prices.parse_prices(price, default_currency='MAD')
+    return prices.to_usd(parsed['amount'], parsed['currency'], {'MAD': exchange_rate}, decimals=2)
 
 def clean_ram(ram):
     if not isinstance(ram, str):
@@ -76,13 +57,11 @@ def clean_model(title):
 
 VALID_BRANDS = ["hp", "dell", "lenovo", "acer", "msi", "asus"]
 
+FIRST_WORD = re.compile(r'^\s*(\S+)')
+
 def clean_brand(title):
-    brands = ['HP', 'Lenovo', 'Dell', 'ASUS', 'Acer', 'MSI', 'Alienware']
-    if pd.isna(title): return None
-    for brand in brands:
-        if brand.lower() in title.lower():
-            return brand
-    return title.split()[0].strip()
+    brand = dictionary.matcher('brands', 'ubuy/laptops').first(title)
+    return brand.where(brand.notna(), arrow.extract(title, FIRST_WORD, expand=False))
 
 def clean_gpu(gpu):
     if not isinstance(gpu, str):
@@ -114,30 +93,80 @@ def clean_storage(storage):
             return int(match.group(1))
     return None
 
-# Process all CSV files in the raw data directory
-try:
-    for file in RAW_DATA_DIR.glob('*.csv'):
-        print(f"Processing file: {file}")
-        df = pd.read_csv(file)
-
-        # Appliquer les fonctions de nettoyage
-        df['Title'] = df['title'].apply(clean_title)
-        df['Price'] = df['price'].apply(clean_price)
-        df['Price'] = df['Price'].apply(convert_to_usd)
+# Clean one raw file
+def clean(df):
+    # Appliquer les fonctions de nettoyage
+    with tracing.span('clean.title', rows=len(df)):
+        df['Title'] = clean_title(df['title'])
+    with tracing.span('clean.price', rows=len(df)):
+        df['Price'] = clean_price(df['price'])
+    with tracing.span('clean.ram', rows=len(df)):
         df['RAM'] = df['Ram Memory Installed Size'].apply(clean_ram)
+    with tracing.span('clean.cpu', rows=len(df)):
         df['CPU'] = df['CPU Model'].apply(clean_cpu)
+    with tracing.span('clean.model', rows=len(df)):
         df['Model'] = df['title'].apply(clean_model)
-        df['Brand'] = df['title'].apply(clean_brand)
+    with tracing.span('clean.brand', rows=len(df)):
+        df['Brand'] = clean_brand(df['title'])
+    with tracing.span('clean.gpu', rows=len(df)):
         df['GPU'] = df['Graphics Coprocessor'].apply(clean_gpu)
+    with tracing.span('clean.screen_size', rows=len(df)):
         df['Screen Size'] = df['Screen Size'].apply(clean_screen_size)
+    with tracing.span('clean.storage', rows=len(df)):
         df['Storage'] = df['Hard Disk Size'].apply(clean_storage)
 
-        # Sélectionner les colonnes nécessaires
-        cleaned_df = df[['Title', 'Price', 'RAM', 'CPU', 'Model', 'Brand', 'GPU', 'Screen Size', 'Storage']]
+    # Sélectionner les colonnes nécessaires
+    cleaned_df = df[['Title', 'Price', 'RAM', 'CPU', 'Model', 'Brand', 'GPU', 'Screen Size', 'Storage']]
+    return cleaned_df
+
+def main():
+    tracing.start_run('ubuy_clean_laptops')
+    profiling.start_from_env('ubuy_clean_laptops')
+
+    # Ensure the cleaned data directory exists
+    CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-        # Sauvegarder le résultat nettoyé
-        output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
-        cleaned_df.to_csv(output_filename, index=False)
-        print(f"Cleaned data saved to {output_filename}")
-except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+    # Debugging: Print paths
+    print(f"Base directory: {BASE_DIR}")
+    print(f"Raw data directory: {RAW_DATA_DIR}")
+    print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
+
+    # Check if raw data directory exists
+    if not RAW_DATA_DIR.exists():
+        raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
+
+    # Check if there are CSV files to process
+    files = catalog.paths('raw', 'ubuy', 'laptops')
+    if not files:
+        print(f"No CSV files found in {RAW_DATA_DIR}")
+    else:
+        print(f"Found {len(files)} CSV files to process")
+
+    # Process all CSV files in the raw data directory
+    cleaner = registry.get('ubuy', 'laptops')
+    try:
+        for file in files:
+            if manifest.is_current(cleaner, file):
+                print(f"Already cleaned: {file}")
+                continue
+            print(f"Processing file: {file}")
+            with tracing.span('clean.read', file=file.name) as read_span:
+                df = schemas.read(file, SCHEMA)
+                read_span.set(rows=len(df))
+
+            cleaned_df = clean(df)
+
+            # Sauvegarder le résultat nettoyé
+            output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
+            with tracing.span('clean.write', file=output_filename.name, rows=len(cleaned_df)), \
+                    catalog.output(output_filename, 'cleaned', 'ubuy', 'laptops', source=file) as output:
+                cleaned_df.to_csv(output.tmp_path, index=False)
+                output.rows = len(cleaned_df)
+            manifest.record(cleaner, file, output_filename)
+            print(f"Cleaned data saved to {output_filename}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,29 @@
 import pandas as pd
 import re
-from sklearn.impute import SimpleImputer
 from pathlib import Path
 
+from src.cleaning import manifest, registry
+from src.cleaning.common import arrow, dictionary, imputation, prices, schemas
+from src.common import catalog
+from src.observability import profiling, tracing
+
 # Define paths using relative paths
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # Root folder of the project
 RAW_DATA_DIR = BASE_DIR / 'data' / 'raw' / 'ubuy' / 'smart_watches'
 CLEANED_DATA_DIR = BASE_DIR / 'data' / 'cleaned' / 'ubuy' / 'smart_watches'
 
-# Ensure the cleaned data directory exists
-CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-# Debugging: Print paths
-print(f"Base directory: {BASE_DIR}")
-print(f"Raw data directory: {RAW_DATA_DIR}")
-print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
-
-# Check if raw data directory exists
-if not RAW_DATA_DIR.exists():
-    raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
-
-# Check if there are CSV files to process
-files = list(RAW_DATA_DIR.glob('*.csv'))
-if not files:
-    print(f"No CSV files found in {RAW_DATA_DIR}")
-else:
-    print(f"Found {len(files)} CSV files to process")
+SCHEMA = schemas.Schema(columns=['title', 'price', 'Memory Storage Capacity', 'Operating System', 'Battery Capacity'],
+                        dtype={'Operating System': 'category'})
 
 # Fonctions de nettoyage
-def clean_title(title):
-    if isinstance(title, str):  # Ensure the title is a string
-        return title.strip()
-    return str(title).strip()  # Convert non-string values to string before stripping
-
-def clean_price(price):
-    # Convert to string if it's not already
-    if isinstance(price, float):
-        price = str(price)
-
-    price = price.replace("\n", "").replace("\r", "").strip()  # Remove newlines and spaces
-    price = re.sub(r'\s+', '', price)  # Remove all unnecessary spaces
-
-    if price.startswith('MAD'):
-        price = price.replace('MAD', '').replace(',', '')
+def clean_title(titles):
+    # Convert non-string values to string before stripping
+    return arrow.as_str(titles).str.strip()
 
-    try:
-        return float(price)
-    except ValueError:
-        return None
-
-def convert_to_usd(price_mad, exchange_rate=10):
-    if price_mad is None:
-        return None
-    return round(price_mad / exchange_rate, 2)
+def clean_price(price, exchange_rate=10):
+    """Parses the MAD prices and converts them to USD."""
+    parsed = prices.parse_prices(price, default_currency='MAD')
+    return prices.to_usd(parsed['amount'], parsed['currency'], {'MAD': exchange_rate}, decimals=2)
 
 def extract_case_size(title):
     match = re.search(r'(\d+(\.\d+)?)\s*"', title)
@@ -76,19 +47,10 @@ def extract_battery_capacity(battery_capacity_str):
     return None
 
 def extract_brand(title):
-    brands = ['Masis', 'motsfit', 'LOJUSIMEH', 'Joautrial', 'WalkerFit', 'SGDDFIT', 'Erkwei', 'KEEPONFIT', 'rowatch',
-              'IOWODO', 'Bemtava']
-    for brand in brands:
-        if brand.lower() in title.lower():
-            return brand
-    return None
+    return dictionary.matcher('brands', 'ubuy/smart_watches').first(title)
 
 def extract_model(title):
-    models = ['KCBK80', 'T19P', 'HY2473B3', 'ST2-A PRO-XYX', 'K35 Black', 'rowatch F12', 'ZL73E', 'A2 Pro', 'R30 Pro']
-    for model in models:
-        if model.lower() in title.lower():
-            return model
-    return None
+    return dictionary.matcher('models', 'ubuy/smart_watches').first(title)
 
 def extract_os(os_str):
     if isinstance(os_str, float) or pd.isna(os_str):
@@ -117,54 +79,98 @@ def extract_storage(storage_str):
         return int(match.group(1))  # Keep value in GB (unchanged)
     return None
 
-def clean_data(df):
-    df['Title'] = df['title'].apply(clean_title)
-    df['Price'] = df['price'].apply(clean_price)
-    df['Price'] = df['Price'].apply(convert_to_usd)
-    df['Case Size'] = df['Title'].apply(extract_case_size)
-    df['Battery Capacity'] = df['Battery Capacity'].apply(extract_battery_capacity)
-    df['Brand'] = df['Title'].apply(extract_brand)
-    df['Model'] = df['Title'].apply(extract_model)
-    df['Operating System'] = df['Operating System'].apply(extract_os)
-    df['Storage Capacity'] = df['Memory Storage Capacity'].apply(extract_storage)
-
-    # Handle missing values with imputers
-    imputer_case_size = SimpleImputer(strategy='median')
-    df['Case Size'] = imputer_case_size.fit_transform(df[['Case Size']]).ravel()
-
-    imputer_battery_capacity = SimpleImputer(strategy='median')
-    df['Battery Capacity'] = imputer_battery_capacity.fit_transform(df[['Battery Capacity']]).ravel()
-
-    imputer_brand = SimpleImputer(strategy='most_frequent')
-    df['Brand'] = imputer_brand.fit_transform(df[['Brand']]).ravel()
-
-    imputer_model = SimpleImputer(strategy='most_frequent')
-    df['Model'] = imputer_model.fit_transform(df[['Model']]).ravel()
-
-    imputer_os = SimpleImputer(strategy='most_frequent')
-    df['Operating System'] = imputer_os.fit_transform(df[['Operating System']]).ravel()
-
-    imputer_storage = SimpleImputer(strategy='median')
-    df['Storage Capacity'] = imputer_storage.fit_transform(df[['Storage Capacity']]).ravel()
-
-    columns_to_keep = ['Title', 'Price', 'Case Size', 'Battery Capacity', 'Brand', 'Model', 'Operating System',
-                       'Storage Capacity']
-    df_cleaned = df[columns_to_keep]
-
-    return df_cleaned
-
-# Process all CSV files in the raw data directory
-try:
-    for file in RAW_DATA_DIR.glob('*.csv'):
-        print(f"Processing file: {file}")
-        df = pd.read_csv(file)
-
-        # Clean the data
-        df_cleaned = clean_data(df)
-
-        # Save the cleaned DataFrame
-        output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
-        df_cleaned.to_csv(output_filename, index=False)
-        print(f"Cleaned data saved to {output_filename}")
-except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+# Missing sizes and capacities get the median of the file. Brand, Model and
+# Operating System are left as they are: a value not found is None, which is
+# not a missing value to a most-frequent imputer
+IMPUTATION = (
+    imputation.Rule('Case Size', 'median'),
+    imputation.Rule('Battery Capacity', 'median'),
+    imputation.Rule('Storage Capacity', 'median'),
+)
+
+COLUMNS_TO_KEEP = ['Title', 'Price', 'Case Size', 'Battery Capacity', 'Brand', 'Model', 'Operating System',
+                   'Storage Capacity']
+
+# Row by row steps, which need nothing from the rest of the file
+def prepare(df):
+    with tracing.span('clean.title', rows=len(df)):
+        df['Title'] = clean_title(df['title'])
+    with tracing.span('clean.price', rows=len(df)):
+        df['Price'] = clean_price(df['price'])
+    with tracing.span('clean.case_size', rows=len(df)):
+        df['Case Size'] = df['Title'].apply(extract_case_size)
+    with tracing.span('clean.battery_capacity', rows=len(df)):
+        df['Battery Capacity'] = df['Battery Capacity'].apply(extract_battery_capacity)
+    with tracing.span('clean.brand', rows=len(df)):
+        df['Brand'] = extract_brand(df['Title'])
+    with tracing.span('clean.model', rows=len(df)):
+        df['Model'] = extract_model(df['Title'])
+    with tracing.span('clean.os', rows=len(df)):
+        df['Operating System'] = df['Operating System'].apply(extract_os)
+    with tracing.span('clean.storage_capacity', rows=len(df)):
+        df['Storage Capacity'] = df['Memory Storage Capacity'].apply(extract_storage)
+    return df
+
+# Steps that need the statistics of the whole file (`IMPUTATION`)
+def finish(df, values):
+    with tracing.span('clean.impute', rows=len(df)):
+        df = imputation.impute(df, IMPUTATION, values)
+    return df[COLUMNS_TO_KEEP]
+
+def clean(df):
+    df = prepare(df)
+    return finish(df, imputation.exact(df, IMPUTATION))
+
+def main():
+    tracing.start_run('ubuy_clean_smartwatch')
+    profiling.start_from_env('ubuy_clean_smartwatch')
+
+    # Ensure the cleaned data directory exists
+    CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Debugging: Print paths
+    print(f"Base directory: {BASE_DIR}")
+    print(f"Raw data directory: {RAW_DATA_DIR}")
+    print(f"Cleaned data directory: {CLEANED_DATA_DIR}")
+
+    # Check if raw data directory exists
+    if not RAW_DATA_DIR.exists():
+        raise FileNotFoundError(f"Raw data directory not found: {RAW_DATA_DIR}")
+
+    # Check if there are CSV files to process
+    files = catalog.paths('raw', 'ubuy', 'smart_watches')
+    if not files:
+        print(f"No CSV files found in {RAW_DATA_DIR}")
+    else:
+        print(f"Found {len(files)} CSV files to process")
+
+    # Process all CSV files in the raw data directory
+    cleaner = registry.get('ubuy', 'smart_watches')
+    try:
+        for file in files:
+            if manifest.is_current(cleaner, file):
+                print(f"Already cleaned: {file}")
+                continue
+            print(f"Processing file: {file}")
+            with tracing.span('clean.read', file=file.name) as read_span:
+                df = schemas.read(file, SCHEMA)
+                read_span.set(rows=len(df))
+
+            # Clean the data
+            with tracing.span('clean.file', file=file.name, rows=len(df)):
+                df_cleaned = clean(df)
+
+            # Save the cleaned DataFrame
+            output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
+            with tracing.span('clean.write', file=output_filename.name, rows=len(df_cleaned)), \
+                    catalog.output(output_filename, 'cleaned', 'ubuy', 'smart_watches', source=file) as output:
+                df_cleaned.to_csv(output.tmp_path, index=False)
+                output.rows = len(df_cleaned)
+            manifest.record(cleaner, file, output_filename)
+            print(f"Cleaned data saved to {output_filename}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,22 @@
 import pandas as pd
 import re
+from pathlib import Path
 
+from src.cleaning import manifest, registry
+from src.cleaning.common import schemas
+from src.common import catalog
+from src.observability import profiling, tracing
 
-def clean_data(df):
+# Définir les chemins relatifs
+BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # Racine du projet
+RAW_DATA_DIR = BASE_DIR / 'data' / 'raw' / 'ubuy' / 'monitors'
+CLEANED_DATA_DIR = BASE_DIR / 'data' / 'cleaned' / 'ubuy' / 'monitors'
+
+SCHEMA = schemas.Schema(columns=['title', 'price', 'Brand', 'Aspect Ratio', 'Standing screen display size',
+                                 'Item model number'], dtype={'Brand': 'category'})
+
+
+def clean(df):
     # Garder uniquement les colonnes nécessaires
     cols_to_keep = ['title', 'price', 'Standing screen display size',
                     'Aspect Ratio', 'Brand', 'Item model number']
@@ -14,6 +28,8 @@ def clean_data(df):
 
     # Fonction de nettoyage pour chaque colonne
     def clean_title(title):
+        if not isinstance(title, str):  # Titre absent
+            return title
 
         terms_to_remove = [
             r'\bGaming Monitor\b',
@@ -71,21 +87,30 @@ def clean_data(df):
         return re.sub(r'[^\w\s-]', '', str(model)).strip() if not pd.isna(model) else 'Unknown'
 
     # Application des fonctions de nettoyage
-    df['Title'] = df['Title'].apply(clean_title)
-    df['Price'] = df['Price'].apply(extract_price)
-    df['Price'] = df['Price'].apply(convert_to_usd)
-    df['Screen_Size_in'] = df['Screen_Size_in'].apply(extract_screen_size)
-    df['Aspect_Ratio'] = df['Aspect_Ratio'].apply(clean_aspect_ratio)
-    df['Refresh_Rate_Hz'] = df['Title'].apply(extract_refresh_rate)
-    df['Response_Time_ms'] = df['Title'].apply(extract_response_time)
-    df['Brand'] = df['Brand'].apply(clean_brand)
-    df['Model'] = df['Model'].apply(clean_model)
+    with tracing.span('clean.title', rows=len(df)):
+        df['Title'] = df['Title'].apply(clean_title)
+    with tracing.span('clean.price', rows=len(df)):
+        df['Price'] = df['Price'].apply(extract_price)
+        df['Price'] = df['Price'].apply(convert_to_usd)
+    with tracing.span('clean.screen_size', rows=len(df)):
+        df['Screen_Size_in'] = df['Screen_Size_in'].apply(extract_screen_size)
+    with tracing.span('clean.aspect_ratio', rows=len(df)):
+        df['Aspect_Ratio'] = df['Aspect_Ratio'].apply(clean_aspect_ratio)
+    with tracing.span('clean.refresh_rate', rows=len(df)):
+        df['Refresh_Rate_Hz'] = df['Title'].apply(extract_refresh_rate)
+    with tracing.span('clean.response_time', rows=len(df)):
+        df['Response_Time_ms'] = df['Title'].apply(extract_response_time)
+    with tracing.span('clean.brand', rows=len(df)):
+        df['Brand'] = df['Brand'].apply(clean_brand)
+    with tracing.span('clean.model', rows=len(df)):
+        df['Model'] = df['Model'].apply(clean_model)
 
     # Suppression de la colonne Response_Time_ms
     df = df.drop(columns=['Response_Time_ms'])
 
     # Gestion des marques manquantes
-    df['Brand'] = df.apply(lambda x: x['Brand'] or re.search(r'^([A-Z][a-z]+)', x['Title']).group(1), axis=1)
+    with tracing.span('clean.brand_fallback', rows=len(df)):
+        df['Brand'] = df.apply(lambda x: x['Brand'] or re.search(r'^([A-Z][a-z]+)', x['Title']).group(1), axis=1)
 
     # Réorganisation des colonnes
     final_columns = ['Title', 'Price', 'Screen_Size_in', 'Aspect_Ratio',
@@ -93,15 +118,38 @@ def clean_data(df):
 
     return df[final_columns].dropna(subset=['Price', 'Screen_Size_in'])
 
-# Chargement et nettoyage des données
-df = pd.read_csv(r'C:\Users\AdMin\Desktop\ecommerce_scraper\data\raw\ubuy\monitors\monitors_2025_01_30_scrape1.csv')
-cleaned_df = clean_data(df)
-
-# Vérification des résultats
-print(cleaned_df.head())
-print(f"\nNombre total d'entrées après nettoyage : {len(cleaned_df)}")
-print("\nValeurs manquantes par colonne :")
-print(cleaned_df.isnull().sum())
-
-# Sauvegarde
-cleaned_df.to_csv('cleaned_monitors.csv', index=False)
\ No newline at end of file
+def main():
+    tracing.start_run('ubuy_clean_monitors')
+    profiling.start_from_env('ubuy_clean_monitors')
+    CLEANED_DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Chargement et nettoyage des fichiers enregistrés dans le catalogue
+    cleaner = registry.get('ubuy', 'monitors')
+    for file in catalog.paths('raw', 'ubuy', 'monitors'):
+        if manifest.is_current(cleaner, file):
+            print(f"Déjà nettoyé : {file}")
+            continue
+        with tracing.span('clean.read', file=file.name) as read_span:
+            df = schemas.read(file, SCHEMA)
+            read_span.set(rows=len(df))
+        with tracing.span('clean.file', file=file.name, rows=len(df)):
+            cleaned_df = clean(df)
+
+        # Vérification des résultats
+        print(cleaned_df.head())
+        print(f"\nNombre total d'entrées après nettoyage : {len(cleaned_df)}")
+        print("\nValeurs manquantes par colonne :")
+        print(cleaned_df.isnull().sum())
+
+        # Sauvegarde
+        output_filename = CLEANED_DATA_DIR / f"{file.stem}_cleaned.csv"
+        with tracing.span('clean.write', file=output_filename.name, rows=len(cleaned_df)), \
+                catalog.output(output_filename, 'cleaned', 'ubuy', 'monitors', source=file) as output:
+            cleaned_df.to_csv(output.tmp_path, index=False)
+            output.rows = len(cleaned_df)
+        manifest.record(cleaner, file, output_filename)
+        print(f"Fichier nettoyé enregistré sous {output_filename}")
+
+
+if __name__ == '__main__':
+    main()
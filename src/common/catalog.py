@@ -0,0 +1,321 @@
+"""Catalog of the CSV files produced by every pipeline stage.
+
+One SQLite database (data/catalog.sqlite, or PIPELINE_CATALOG) records each
+raw scrape and cleaned file: stage, site, category, scrape number, row count,
+size, SHA-256 of the content and when it was started and finished. Scrapers
+take their next scrape number from it instead of listing the output
+directory, and cleaners and analyses get their input files from it instead of
+globbing.
+
+Files are written to a temporary name next to their final path and renamed
+once complete, so a reader never sees half a CSV and the catalog only lists
+finished files. When the catalog does not exist yet, the files already in the
+output tree are registered on first use: data/raw and data/cleaned, or only
+SCRAPER_OUTPUT_DIR when it replaces data/raw. A catalog elsewhere than the
+default with no SCRAPER_OUTPUT_DIR starts empty. After copying files in by
+hand, run
+
+    python -m src.common.catalog sync
+"""
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = PROJECT_ROOT / 'data'
+DEFAULT_CATALOG_PATH = DATA_DIR / 'catalog.sqlite'
+CATALOG_PATH = Path(os.environ.get('PIPELINE_CATALOG', DEFAULT_CATALOG_PATH))
+STAGES = ('raw', 'cleaned')
+
+Entry = namedtuple('Entry', 'id stage site category scrape_number path rows bytes sha256 source_id started_at finished_at')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    stage TEXT NOT NULL,
+    site TEXT NOT NULL,
+    category TEXT NOT NULL,
+    scrape_number INTEGER,
+    path TEXT NOT NULL UNIQUE,
+    rows INTEGER,
+    bytes INTEGER,
+    sha256 TEXT,
+    source_id INTEGER REFERENCES files (id),
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS files_slice ON files (stage, site, category, scrape_number);
+"""
+
+_SCRAPE_NUMBER = re.compile(r'_scrape(\d+)')
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def _relative(path):
+    """Paths inside the project are stored relative to it, so the catalog survives a move."""
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(PROJECT_ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def stage_dirs():
+    """The folder of each stage's <site>/<category>/ folders; SCRAPER_OUTPUT_DIR replaces data/raw."""
+    output_dir = os.environ.get('SCRAPER_OUTPUT_DIR')
+    if output_dir:
+        return {'raw': Path(output_dir)}
+    return {stage: DATA_DIR / stage for stage in STAGES}
+
+
+def scrape_number_of(path):
+    match = _SCRAPE_NUMBER.search(Path(path).name)
+    return int(match.group(1)) if match else None
+
+
+def file_digest(path):
+    """Size and SHA-256 of a file."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+            size += len(block)
+    return size, digest.hexdigest()
+
+
+def count_csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig', errors='replace') as csvfile:
+        return max(0, sum(1 for _ in csv.reader(csvfile)) - 1)
+
+
+class Output:
+    """A catalog entry being written: write to `tmp_path`, set `rows`, and it is published on exit."""
+
+    def __init__(self, entry_id, path, scrape_number=None):
+        self.id = entry_id
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + '.tmp')
+        self.scrape_number = scrape_number
+        self.rows = None
+
+
+class Catalog:
+    """The files table of one catalog database. Safe to share between threads."""
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not self.path.exists()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._connection.executescript(_SCHEMA)
+        if is_new and (self.path.resolve() == DEFAULT_CATALOG_PATH.resolve() or os.environ.get('SCRAPER_OUTPUT_DIR')):
+            self.sync()
+
+    def close(self):
+        self._connection.close()
+
+    def _entry(self, row):
+        entry = Entry(*row)
+        return entry._replace(path=str(PROJECT_ROOT / entry.path))
+
+    def entries(self, stage, site=None, category=None):
+        """Finished files of a stage, optionally of one site and category, in scrape order."""
+        query = 'SELECT * FROM files WHERE stage = ? AND finished_at IS NOT NULL'
+        params = [stage]
+        if site is not None:
+            query += ' AND site = ?'
+            params.append(site)
+        if category is not None:
+            query += ' AND category = ?'
+            params.append(category)
+        query += ' ORDER BY site, category, scrape_number, path'
+        with self._lock:
+            return [self._entry(row) for row in self._connection.execute(query, params)]
+
+    def paths(self, stage, site=None, category=None):
+        """Paths of the finished files that still exist, in scrape order."""
+        return [Path(entry.path) for entry in self.entries(stage, site, category) if os.path.exists(entry.path)]
+
+    def entry_for(self, path):
+        with self._lock:
+            row = self._connection.execute('SELECT * FROM files WHERE path = ?', (_relative(path),)).fetchone()
+        return self._entry(row) if row else None
+
+    def _reserve(self, stage, site, category, path=None, directory=None, date=None, source=None):
+        with self._lock:
+            connection = self._connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                scrape_number = None
+                if path is None:
+                    # The next number of the category, counting unfinished scrapes so
+                    # concurrent writers never get the same one
+                    (last,) = connection.execute(
+                        'SELECT MAX(scrape_number) FROM files WHERE stage = ? AND site = ? AND category = ?',
+                        (stage, site, category)).fetchone()
+                    scrape_number = (last or 0) + 1
+                    date = date or datetime.today().strftime('%Y_%m_%d')
+                    path = Path(directory) / f"{category}_{date}_scrape{scrape_number}.csv"
+                else:
+                    scrape_number = scrape_number_of(path)
+                source_id = None
+                if source is not None:
+                    source_row = connection.execute('SELECT id FROM files WHERE path = ?', (_relative(source),)).fetchone()
+                    source_id = source_row[0] if source_row else None
+                relative = _relative(path)
+                connection.execute('DELETE FROM files WHERE path = ?', (relative,))
+                cursor = connection.execute(
+                    'INSERT INTO files (stage, site, category, scrape_number, path, source_id, started_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (stage, site, category, scrape_number, relative, source_id, _now()))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return Output(cursor.lastrowid, path, scrape_number)
+
+    def _finish(self, output):
+        os.replace(output.tmp_path, output.path)
+        size, sha256 = file_digest(output.path)
+        rows = output.rows if output.rows is not None else count_csv_rows(output.path)
+        with self._lock:
+            self._connection.execute('UPDATE files SET rows = ?, bytes = ?, sha256 = ?, finished_at = ? WHERE id = ?',
+                                     (rows, size, sha256, _now(), output.id))
+
+    def _abandon(self, output):
+        if output.tmp_path.exists():
+            output.tmp_path.unlink()
+        with self._lock:
+            self._connection.execute('DELETE FROM files WHERE id = ?', (output.id,))
+
+    @contextmanager
+    def _writing(self, output):
+        output.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            yield output
+        except BaseException:
+            self._abandon(output)
+            raise
+        self._finish(output)
+
+    def new_scrape(self, site, category, directory, date=None):
+        """
+        Context manager for a new raw scrape of `category`, named
+        <category>_<date>_scrapeN.csv in `directory` with the next scrape number.
+        """
+        return self._writing(self._reserve('raw', site, category, directory=directory, date=date))
+
+    def output(self, path, stage, site, category, source=None):
+        """Context manager for a file of `stage` at `path`, derived from the file `source`."""
+        return self._writing(self._reserve(stage, site, category, path=path, source=source))
+
+    def register(self, path, stage, site, category, source=None):
+        """Records an existing, complete file."""
+        output = self._reserve(stage, site, category, path=path, source=source)
+        size, sha256 = file_digest(path)
+        with self._lock:
+            self._connection.execute('UPDATE files SET rows = ?, bytes = ?, sha256 = ?, finished_at = ? WHERE id = ?',
+                                     (count_csv_rows(path), size, sha256, _now(), output.id))
+
+    def remove(self, path):
+        """Deletes a file, if it still exists, and forgets it."""
+        path = Path(path)
+        if path.exists():
+            path.unlink()
+        with self._lock:
+            self._connection.execute('DELETE FROM files WHERE path = ?', (_relative(path),))
+
+    def sync(self, directories=None):
+        """
+        Registers the CSVs under <stage directory>/<site>/<category>/ (those of
+        `stage_dirs()` by default) that are not in the catalog or changed since,
+        and forgets entries whose file is gone. Returns the number of files
+        added or updated.
+        """
+        changed = 0
+        for stage, directory in (directories or stage_dirs()).items():
+            for path in sorted(Path(directory).glob('*/*/*.csv')):
+                entry = self.entry_for(path)
+                if entry is not None and entry.bytes == path.stat().st_size and entry.finished_at is not None:
+                    continue
+                site, category = path.parent.parent.name, path.parent.name
+                self.register(path, stage, site, category)
+                changed += 1
+        with self._lock:
+            rows = self._connection.execute('SELECT id, path FROM files WHERE finished_at IS NOT NULL').fetchall()
+            missing = [(entry_id,) for entry_id, path in rows if not (PROJECT_ROOT / path).exists()]
+            self._connection.executemany('DELETE FROM files WHERE id = ?', missing)
+        return changed
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get():
+    """The catalog of this process, opened on first use."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = Catalog()
+        return _catalog
+
+
+def new_scrape(site, category, directory, date=None):
+    return get().new_scrape(site, category, directory, date)
+
+
+def output(path, stage, site, category, source=None):
+    return get().output(path, stage, site, category, source)
+
+
+def entries(stage, site=None, category=None):
+    return get().entries(stage, site, category)
+
+
+def entry_for(path):
+    return get().entry_for(path)
+
+
+def remove(path):
+    return get().remove(path)
+
+
+def paths(stage, site=None, category=None):
+    return get().paths(stage, site, category)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.common.catalog', description='Inspect or rebuild the file catalog.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('sync', help='register files added by hand and forget deleted ones')
+    list_parser = subparsers.add_parser('list', help='list the finished files of a stage')
+    list_parser.add_argument('stage', choices=STAGES)
+    list_parser.add_argument('--site')
+    list_parser.add_argument('--category')
+    options = parser.parse_args(argv)
+
+    catalog = get()
+    if options.command == 'sync':
+        print(f"{catalog.sync()} files registered or updated in {catalog.path}")
+    else:
+        for entry in catalog.entries(options.stage, options.site, options.category):
+            print(f"{entry.site:<9}{entry.category:<16}{entry.scrape_number or '-':>4}{entry.rows:>7}{entry.bytes:>10}  "
+                  f"{entry.sha256[:12]}  {entry.finished_at}  {_relative(entry.path)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Structured, non-blocking logging for the scrapers.
+
+`setup` routes every log record through a `QueueHandler`, so the scraping
+threads and event loop only enqueue records; a `QueueListener` thread does the
+formatting I/O. Records go to the console and, as JSON lines, to
+logs/runs/<run>_<timestamp>.jsonl. Keyword fields passed with `extra=` end up
+as JSON keys.
+
+Repetitive INFO and DEBUG messages are rate limited per logger and message
+template (the unformatted `msg`): after a short burst only one record in
+`sample_every` is kept. Warnings and errors are never dropped. Per-item
+events are counted in a `RunSummary` instead of being logged, and the
+summary, with the number of suppressed records, is logged once when the
+process exits.
+
+SCRAPER_LOG_LEVEL sets the level (INFO by default) and SCRAPER_LOG_FORMAT=json
+also switches the console to JSON.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+RUN_LOGS_DIR = PROJECT_ROOT / 'logs' / 'runs'
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through the first `burst` records of each (logger, template) pair per
+    `window` seconds, then one in `sample_every`. Only INFO and below are
+    limited: every warning and error gets through.
+    """
+
+    def __init__(self, burst=5, window=10.0, sample_every=100):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sample_every = sample_every
+        self.suppressed = Counter()
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            started, seen = self._windows.get(key, (now, 0))
+            if now - started >= self.window:
+                started, seen = now, 0
+            seen += 1
+            self._windows[key] = (started, seen)
+            if seen <= self.burst or (seen - self.burst) % self.sample_every == 0:
+                return True
+            self.suppressed[key] += 1
+            return False
+
+
+class RunSummary:
+    """Counts per-item events (scraped, failed, ...) by category for the end-of-run summary."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def incr(self, event, category=None, amount=1):
+        with self._lock:
+            self.counts[(event, category)] += amount
+
+    def as_dict(self):
+        summary = {}
+        with self._lock:
+            for (event, category), count in sorted(self.counts.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+                summary.setdefault(event, {})[category or 'all'] = count
+        return summary
+
+
+summary = RunSummary()
+_listener = None
+_rate_limit = None
+
+
+def setup(run_name, level=None, console_json=None, rate_limit=None):
+    """
+    Installs the queue-based handlers on the root logger for this run and
+    returns the path of its JSON log. Calling it again is a no-op.
+    """
+    global _listener, _rate_limit
+    if _listener is not None:
+        return None
+
+    level = level or os.environ.get('SCRAPER_LOG_LEVEL', 'INFO').upper()
+    if console_json is None:
+        console_json = os.environ.get('SCRAPER_LOG_FORMAT', '').lower() == 'json'
+
+    RUN_LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    path = RUN_LOGS_DIR / f"{run_name}_{datetime.now().strftime('%Y_%m_%d_%H%M%S')}.jsonl"
+    file_handler = logging.FileHandler(path, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(JsonFormatter() if console_json else
+                                 logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    _rate_limit = rate_limit or RateLimitFilter()
+    record_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(record_queue)
+    queue_handler.addFilter(_rate_limit)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(record_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown, run_name)
+    return path
+
+
+def shutdown(run_name=None):
+    """Logs the run summary, then drains the queue and stops the listener thread."""
+    global _listener
+    if _listener is None:
+        return
+    suppressed = {f"{name}: {template}": count for (name, template), count in _rate_limit.suppressed.most_common(10)}
+    logging.getLogger('summary').info(
+        "Run summary for %s: %s (%d repetitive records suppressed)", run_name or 'run',
+        json.dumps(summary.as_dict()), sum(_rate_limit.suppressed.values()),
+        extra={
+            'run': run_name,
+            'elapsed_s': round(time.perf_counter() - summary.started, 3),
+            'counts': summary.as_dict(),
+            'suppressed': suppressed,
+        },
+    )
+    _listener.stop()
+    _listener = None
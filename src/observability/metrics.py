@@ -0,0 +1,294 @@
+"""In-process metrics registry for the scrapers.
+
+Counters, gauges and histograms are labelled by site, category and stage.
+The registry can be served on a local HTTP endpoint in the Prometheus text
+format and is dumped as JSON at the end of every scraper run.
+"""
+import atexit
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+METRICS_DIR = PROJECT_ROOT / 'logs' / 'metrics'
+
+# Latency buckets in seconds, tuned for page fetches and BeautifulSoup parsing
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class _Metric:
+    """Base class holding one child per distinct label combination."""
+    kind = None
+
+    def __init__(self, name, help_text, labelnames, lock):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = lock
+        self._children = {}
+
+    def labels(self, **labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """Yields (label dict, child) pairs in a stable order."""
+        for key in sorted(self._children):
+            yield dict(zip(self.labelnames, key)), self._children[key]
+
+
+class _CounterChild:
+    def __init__(self, lock):
+        self._lock = lock
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self.value = float(value)
+
+
+class _HistogramChild:
+    def __init__(self, lock, buckets):
+        self._lock = lock
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observes the wall time spent inside the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def cumulative_counts(self):
+        total = 0
+        for upper, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            yield upper, total
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild(self._lock)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild(self._lock)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames, lock, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self._lock, self.buckets)
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them for export."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, labelnames, threading.Lock(), **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def to_prometheus(self):
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, child in metric.samples():
+                if metric.kind == 'histogram':
+                    for upper, total in child.cumulative_counts():
+                        bucket_labels = {**labels, 'le': _format_value(upper)}
+                        lines.append(f"{metric.name}_bucket{_format_labels(bucket_labels)} {total}")
+                    lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+                    lines.append(f"{metric.name}_count{_format_labels(labels)} {child.count}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(child.value)}")
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        """Returns a JSON-serialisable snapshot of all metrics."""
+        snapshot = {}
+        for metric in self._metrics.values():
+            samples = []
+            for labels, child in metric.samples():
+                if metric.kind == 'histogram':
+                    samples.append({
+                        'labels': labels,
+                        'count': child.count,
+                        'sum': child.sum,
+                        'buckets': {_format_value(upper): total for upper, total in child.cumulative_counts()},
+                    })
+                else:
+                    samples.append({'labels': labels, 'value': child.value})
+            snapshot[metric.name] = {'type': metric.kind, 'help': metric.help_text, 'samples': samples}
+        return snapshot
+
+    def dump_json(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serves /metrics on a background thread and returns the server."""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] == '/metrics':
+                    body = registry.to_prometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path.split('?')[0] == '/metrics.json':
+                    body = json.dumps(registry.to_dict()).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+        thread.start()
+        return server
+
+
+REGISTRY = MetricsRegistry()
+
+# Scraper metrics shared by the eBay, Flipkart and Ubuy scrapers
+STAGE_LABELS = ('site', 'category', 'stage')
+REQUESTS = REGISTRY.counter('scraper_requests_total', 'Requests sent, by response status', STAGE_LABELS + ('status',))
+RESPONSE_BYTES = REGISTRY.counter('scraper_response_bytes_total', 'Response body bytes received', STAGE_LABELS)
+FETCH_SECONDS = REGISTRY.histogram('scraper_fetch_seconds', 'Time spent fetching a page', STAGE_LABELS)
+PARSE_SECONDS = REGISTRY.histogram('scraper_parse_seconds', 'Time spent parsing a page', STAGE_LABELS)
+CAPTCHA_HITS = REGISTRY.counter('scraper_captcha_total', 'CAPTCHA pages encountered', STAGE_LABELS)
+ROWS_WRITTEN = REGISTRY.counter('scraper_rows_written_total', 'Rows written to raw CSV files', ('site', 'category'))
+QUEUE_DEPTH = REGISTRY.gauge('scraper_queue_depth', 'Pages waiting to be fetched', ('site', 'category'))
+
+
+def observe_fetch(site, category, stage, status, nbytes, seconds):
+    """Records one completed request: its status, body size and latency."""
+    REQUESTS.labels(site=site, category=category, stage=stage, status=status).inc()
+    if nbytes:
+        RESPONSE_BYTES.labels(site=site, category=category, stage=stage).inc(nbytes)
+    FETCH_SECONDS.labels(site=site, category=category, stage=stage).observe(seconds)
+
+
+def parse_timer(site, category, stage):
+    """Context manager timing the parse of one page."""
+    return PARSE_SECONDS.labels(site=site, category=category, stage=stage).time()
+
+
+def start_run(site, registry=REGISTRY):
+    """
+    Prepares metrics export for a scraper run.
+    Serves the registry on SCRAPER_METRICS_PORT if it is set, and dumps it as
+    JSON to logs/metrics/<site>_<timestamp>.json when the process exits.
+    """
+    server = None
+    port = os.environ.get('SCRAPER_METRICS_PORT')
+    if port:
+        server = registry.serve(int(port), os.environ.get('SCRAPER_METRICS_HOST', '127.0.0.1'))
+        print(f"Serving metrics on http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+
+    timestamp = datetime.now().strftime('%Y_%m_%d_%H%M%S')
+    path = METRICS_DIR / f"{site}_{timestamp}.json"
+    atexit.register(registry.dump_json, path)
+    return server
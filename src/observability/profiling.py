@@ -0,0 +1,228 @@
+"""Opt-in profiling of any pipeline stage.
+
+Profiling is off unless requested, either through the environment of a normal
+run (the scrapers, cleaners and analysis scripts call `start_from_env`):
+
+    PIPELINE_PROFILE=sample python -m src.cleaning.ebay.clean_gpu
+
+or by launching the stage through this module, which also covers the import
+time side effects of the cleaners:
+
+    python -m src.observability.profiling --mode all --tracemalloc 25 src.cleaning.ebay.clean_gpu
+
+Modes are `cprofile` (deterministic, writes a .pstats file), `sample` (a
+stack sampler thread, writes a .collapsed file for flamegraph.pl or
+speedscope) and `all`. Files are written to
+logs/profiles/<stage>_<timestamp>.*; with a tracemalloc top-N the largest
+allocation sites are written next to them as .tracemalloc.txt.
+"""
+import argparse
+import atexit
+import cProfile
+import os
+import runpy
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+PROFILES_DIR = PROJECT_ROOT / 'logs' / 'profiles'
+
+MODES = ('cprofile', 'sample', 'all')
+DEFAULT_INTERVAL_MS = 5.0
+
+_active = None
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    filename = code.co_filename
+    try:
+        filename = str(Path(filename).resolve().relative_to(PROJECT_ROOT))
+    except ValueError:
+        filename = Path(filename).name
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the Python stacks of every other thread at a fixed interval."""
+
+    def __init__(self, interval_ms=DEFAULT_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        labels = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(frame)
+                    stack.append(label)
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_collapsed(self, path):
+        """Writes one `frame;frame;frame count` line per distinct stack."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """Runs the requested profilers for one stage and writes their output files."""
+
+    def __init__(self, stage, mode='cprofile', interval_ms=DEFAULT_INTERVAL_MS, tracemalloc_top=0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {', '.join(MODES)}")
+        self.stage = stage
+        self.mode = mode
+        self.tracemalloc_top = tracemalloc_top
+        self.profile = cProfile.Profile() if mode in ('cprofile', 'all') else None
+        self.sampler = StackSampler(interval_ms) if mode in ('sample', 'all') else None
+        self._stopped = False
+
+    def start(self):
+        if self.tracemalloc_top and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.sampler is not None:
+            self.sampler.start()
+        if self.profile is not None:
+            self.profile.enable()
+        return self
+
+    def stop(self):
+        """Stops profiling and writes the output files; returns their paths."""
+        if self._stopped:
+            return []
+        self._stopped = True
+        if self.profile is not None:
+            self.profile.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        base = PROFILES_DIR / f"{self.stage}_{datetime.now().strftime('%Y_%m_%d_%H%M%S')}"
+        written = []
+        if self.profile is not None:
+            path = base.with_suffix('.pstats')
+            self.profile.dump_stats(path)
+            written.append(path)
+        if self.sampler is not None:
+            path = base.with_suffix('.collapsed')
+            self.sampler.write_collapsed(path)
+            written.append(path)
+        if self.tracemalloc_top and tracemalloc.is_tracing():
+            path = base.with_suffix('.tracemalloc.txt')
+            self._write_tracemalloc(path)
+            written.append(path)
+        for path in written:
+            print(f"Profile written to {path}", file=sys.stderr)
+        return written
+
+    def _write_tracemalloc(self, path):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = snapshot.statistics('lineno')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"current={current / 1024:.1f} KiB peak={peak / 1024:.1f} KiB\n")
+            for stat in stats[:self.tracemalloc_top]:
+                f.write(f"{stat}\n")
+
+
+def start(stage, mode='cprofile', interval_ms=DEFAULT_INTERVAL_MS, tracemalloc_top=0):
+    """
+    Starts profiling the current process as `stage` and writes the results when
+    it exits. Only one profiler runs per process; later calls return the active one.
+    """
+    global _active
+    if _active is not None:
+        return _active
+    _active = Profiler(stage, mode, interval_ms, tracemalloc_top).start()
+    atexit.register(_active.stop)
+    return _active
+
+
+def start_from_env(stage):
+    """
+    Starts profiling if PIPELINE_PROFILE is set to cprofile, sample or all.
+    PIPELINE_PROFILE_INTERVAL_MS sets the sampling interval and
+    PIPELINE_PROFILE_TRACEMALLOC=N records the top N allocation sites.
+    """
+    mode = os.environ.get('PIPELINE_PROFILE', '').strip().lower()
+    if not mode or mode in ('0', 'off'):
+        return None
+    return start(
+        stage,
+        mode=mode,
+        interval_ms=float(os.environ.get('PIPELINE_PROFILE_INTERVAL_MS', DEFAULT_INTERVAL_MS)),
+        tracemalloc_top=int(os.environ.get('PIPELINE_PROFILE_TRACEMALLOC', '0')),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m src.observability.profiling',
+        description='Run a pipeline module or script under a profiler.',
+    )
+    parser.add_argument('--mode', choices=MODES, default='all')
+    parser.add_argument('--interval-ms', type=float, default=DEFAULT_INTERVAL_MS,
+                        help='sampling interval for the sample mode')
+    parser.add_argument('--tracemalloc', type=int, default=0, metavar='N',
+                        help='record the top N allocation sites')
+    parser.add_argument('--stage', help='name used for the output files (default: derived from the target)')
+    parser.add_argument('target', help='module name (src.cleaning.ebay.clean_gpu) or path to a .py file')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='arguments passed to the target')
+    options = parser.parse_args(argv)
+
+    is_path = options.target.endswith('.py')
+    if options.stage:
+        stage = options.stage
+    elif is_path:
+        target = Path(options.target)
+        stage = f"{target.parent.name}_{target.stem}"
+    else:
+        # src.cleaning.ebay.clean_gpu -> ebay_clean_gpu
+        stage = '_'.join(options.target.split('.')[-2:])
+    sys.argv = [options.target, *options.args]
+    profiler = start(stage, options.mode, options.interval_ms, options.tracemalloc)
+    try:
+        if is_path:
+            runpy.run_path(options.target, run_name='__main__')
+        else:
+            runpy.run_module(options.target, run_name='__main__', alter_sys=True)
+    finally:
+        profiler.stop()
+
+
+if __name__ == '__main__':
+    # Run through the imported module so the target's own start_from_env call
+    # sees the profiler started here instead of starting a second one
+    from src.observability.profiling import main as _main
+    _main()
@@ -0,0 +1,162 @@
+"""Lightweight tracing of scrape, clean and analysis stages.
+
+Spans are opened with the `span` context manager or the `traced` decorator.
+They nest, record wall time, CPU time and optional row counts, and are
+written as a Chrome trace JSON file (open it in chrome://tracing or
+ui.perfetto.dev) at the end of each run.
+
+CPU time is that of the thread, so it is only recorded for spans opened
+outside an asyncio task: a span around an `await` would count the CPU of
+every other task the loop ran meanwhile.
+"""
+import asyncio
+import atexit
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+TRACES_DIR = PROJECT_ROOT / 'logs' / 'traces'
+
+# Set PIPELINE_TRACE=0 to turn span recording off entirely
+TRACING_ENABLED = os.environ.get('PIPELINE_TRACE', '1') != '0'
+
+_events = []
+_events_lock = threading.Lock()
+_current_span = contextvars.ContextVar('current_span', default=None)
+_track_ids = {}
+_track_counter = itertools.count(1)
+_run_name = None
+
+
+class Span:
+    """A running span; extra arguments such as row counts can be attached with `set`."""
+    __slots__ = ('name', 'args', 'parent')
+
+    def __init__(self, name, args, parent):
+        self.name = name
+        self.args = args
+        self.parent = parent
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:  # no running event loop
+        return None
+
+
+def _track_id(task):
+    """
+    Chrome traces require spans on one track to nest, so each asyncio task
+    gets its own track; otherwise spans are grouped by thread.
+    """
+    key = ('task', id(task)) if task is not None else ('thread', threading.get_ident())
+    track = _track_ids.get(key)
+    if track is None:
+        track = _track_ids.setdefault(key, next(_track_counter))
+    return track
+
+
+@contextmanager
+def span(name, **args):
+    """Records the block as a span named `name`; keyword arguments become span args."""
+    if not TRACING_ENABLED:
+        yield Span(name, args, None)
+        return
+
+    current = Span(name, args, _current_span.get())
+    token = _current_span.set(current)
+    task = _current_task()
+    track = _track_id(task)
+    start_wall = time.perf_counter_ns()
+    start_cpu = time.thread_time_ns() if task is None else None
+    try:
+        yield current
+    finally:
+        wall_ns = time.perf_counter_ns() - start_wall
+        _current_span.reset(token)
+        event_args = {key: value if isinstance(value, (int, float, bool)) or value is None else str(value)
+                      for key, value in current.args.items()}
+        if start_cpu is not None:
+            event_args['cpu_ms'] = round((time.thread_time_ns() - start_cpu) / 1e6, 3)
+        if current.parent is not None:
+            event_args['parent'] = current.parent.name
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': start_wall / 1000,
+            'dur': wall_ns / 1000,
+            'pid': os.getpid(),
+            'tid': track,
+            'args': event_args,
+        }
+        with _events_lock:
+            _events.append(event)
+
+
+def traced(name=None):
+    """Decorator recording every call of the function as a span."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def events():
+    """Returns a copy of the spans recorded so far."""
+    with _events_lock:
+        return list(_events)
+
+
+def write_trace(path):
+    """Writes the recorded spans to `path` in the Chrome trace event format."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    trace = {
+        'traceEvents': [
+            {'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': _run_name or 'pipeline'}},
+            *events(),
+        ],
+        'displayTimeUnit': 'ms',
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f)
+    return path
+
+
+def start_run(name):
+    """
+    Names the current run and writes its trace to
+    logs/traces/<name>_<timestamp>.json when the process exits.
+    """
+    global _run_name
+    _run_name = name
+    if not TRACING_ENABLED:
+        return None
+    timestamp = datetime.now().strftime('%Y_%m_%d_%H%M%S')
+    path = TRACES_DIR / f"{name}_{timestamp}.json"
+    atexit.register(write_trace, path)
+    return path
@@ -0,0 +1,214 @@
+"""Append-only archive of every page fetched by the scrapers.
+
+Each page is stored as one independently compressed frame (zstd when the
+`zstandard` package is installed, zlib otherwise) in a segment file under
+data/archive/<site>/. A frame holds a JSON header line (url, fetch time,
+status, category, stage, and the URL requested when a redirect led to
+`url`) followed by the HTML, in the spirit of a WARC record. An SQLite
+index maps every record to its segment, offset and length, so a slice of
+the archive can be selected by site, category, URL, run or fetch time and
+read back without scanning the segments.
+
+Archiving is on by default; set SCRAPER_ARCHIVE=0 to turn it off.
+"""
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available
+    zstandard = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+ARCHIVE_DIR = Path(os.environ.get('SCRAPER_ARCHIVE_DIR', PROJECT_ROOT / 'data' / 'archive'))
+INDEX_NAME = 'index.sqlite'
+
+ARCHIVE_ENABLED = os.environ.get('SCRAPER_ARCHIVE', '1') != '0'
+
+# Segments are rotated once they reach this size
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+ZSTD_LEVEL = 10
+
+Record = namedtuple('Record', 'id site category stage url fetched_at run_id status segment offset length codec '
+                               'requested_url')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    site TEXT NOT NULL,
+    category TEXT,
+    stage TEXT,
+    url TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    status INTEGER,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    requested_url TEXT
+);
+CREATE INDEX IF NOT EXISTS records_url ON records (url, fetched_at);
+CREATE INDEX IF NOT EXISTS records_slice ON records (site, category, fetched_at);
+CREATE INDEX IF NOT EXISTS records_run ON records (run_id);
+"""
+
+
+def _compress(payload):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    return 'zlib', zlib.compress(payload, 6)
+
+
+def _decompress(codec, frame):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This record is zstd compressed; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(frame)
+    if codec == 'zlib':
+        return zlib.decompress(frame)
+    raise ValueError(f"Unknown archive codec {codec!r}")
+
+
+def connect_index(archive_dir=ARCHIVE_DIR):
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(archive_dir / INDEX_NAME, check_same_thread=False, timeout=30)
+    connection.executescript(_SCHEMA)
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(records)")}
+    if 'requested_url' not in columns:  # indexes created before it was recorded
+        connection.execute("ALTER TABLE records ADD COLUMN requested_url TEXT")
+    return connection
+
+
+class ArchiveWriter:
+    """
+    Appends the pages of one scraper run to the archive.
+    Safe to share between threads; the scrapers use one writer per process.
+    """
+
+    def __init__(self, site, archive_dir=ARCHIVE_DIR, run_id=None):
+        self.site = site
+        self.archive_dir = Path(archive_dir)
+        self.run_id = run_id or datetime.now().strftime('%Y_%m_%d_%H%M%S')
+        self._lock = threading.Lock()
+        self._segment_number = 0
+        self._segment = None
+        self._segment_path = None
+        self._index = connect_index(self.archive_dir)
+
+    def _open_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+        self._segment_number += 1
+        site_dir = self.archive_dir / self.site
+        site_dir.mkdir(parents=True, exist_ok=True)
+        self._segment_path = site_dir / f"{self.run_id}_{os.getpid()}_{self._segment_number:03d}.seg"
+        self._segment = open(self._segment_path, 'ab')
+
+    def store(self, url, html, category=None, stage=None, status=None, fetched_at=None, requested_url=None):
+        """
+        Archives one fetched page and returns its record id. `url` is where the
+        page was fetched from, `requested_url` the URL asked for, when different.
+        """
+        fetched_at = fetched_at or datetime.now()
+        requested_url = str(requested_url) if requested_url is not None and str(requested_url) != str(url) else None
+        header = {
+            'url': str(url),
+            'requested_url': requested_url,
+            'fetched_at': fetched_at.isoformat(timespec='seconds'),
+            'site': self.site,
+            'category': category,
+            'stage': stage,
+            'status': status,
+        }
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        codec, frame = _compress(json.dumps(header).encode('utf-8') + b'\n' + html)
+
+        with self._lock:
+            if self._segment is None or self._segment.tell() >= SEGMENT_MAX_BYTES:
+                self._open_segment()
+            offset = self._segment.tell()
+            self._segment.write(frame)
+            self._segment.flush()
+            cursor = self._index.execute(
+                "INSERT INTO records (site, category, stage, url, fetched_at, run_id, status, segment, offset, length,"
+                " codec, requested_url) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.site, category, stage, header['url'], header['fetched_at'], self.run_id, status,
+                 self._segment_path.relative_to(self.archive_dir).as_posix(), offset, len(frame), codec, requested_url),
+            )
+            self._index.commit()
+            return cursor.lastrowid
+
+    def close(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            self._index.close()
+
+
+_writer = None
+
+
+def start_run(site):
+    """Opens the archive writer for a scraper run, unless SCRAPER_ARCHIVE=0."""
+    global _writer
+    if ARCHIVE_ENABLED and _writer is None:
+        _writer = ArchiveWriter(site)
+    return _writer
+
+
+def store(url, html, category=None, stage=None, status=None, requested_url=None):
+    """Archives a page in the current run; a no-op when archiving is off."""
+    if _writer is None:
+        return None
+    return _writer.store(url, html, category=category, stage=stage, status=status, requested_url=requested_url)
+
+
+def requested(record):
+    """The URL the scraper asked for to get the page of `record`, before any redirect."""
+    return record.requested_url or record.url
+
+
+def select(site=None, category=None, stage=None, url=None, run_id=None, since=None, until=None,
+           archive_dir=ARCHIVE_DIR):
+    """
+    Returns the index records matching every given filter, in fetch order.
+    `since` and `until` are ISO dates or datetimes (until is exclusive).
+    """
+    filters = {'site': site, 'category': category, 'stage': stage, 'url': url, 'run_id': run_id}
+    clauses = [f"{column} = ?" for column, value in filters.items() if value is not None]
+    params = [value for value in filters.values() if value is not None]
+    if since is not None:
+        clauses.append("fetched_at >= ?")
+        params.append(str(since))
+    if until is not None:
+        clauses.append("fetched_at < ?")
+        params.append(str(until))
+    query = f"SELECT {', '.join(Record._fields)} FROM records"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY fetched_at, id"
+
+    connection = connect_index(archive_dir)
+    try:
+        return [Record(*row) for row in connection.execute(query, params)]
+    finally:
+        connection.close()
+
+
+def read(record, archive_dir=ARCHIVE_DIR):
+    """Returns the (header, html) pair stored for an index record."""
+    with open(Path(archive_dir) / record.segment, 'rb') as segment:
+        segment.seek(record.offset)
+        frame = segment.read(record.length)
+    header, _, body = _decompress(record.codec, frame).partition(b'\n')
+    return json.loads(header), body.decode('utf-8')
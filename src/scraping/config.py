@@ -0,0 +1,54 @@
+"""Runtime settings shared by the scrapers.
+
+The defaults reproduce a normal run against the real sites. Every setting can
+be overridden from the environment, which is how the load-test harness points
+the scrapers at the local mock marketplace (`src/scraping/mock_marketplace.py`):
+
+- <SITE>_BASE_URL, e.g. EBAY_BASE_URL=http://127.0.0.1:8080
+- SCRAPER_DELAY_SCALE multiplies every politeness delay (0 disables them)
+- SCRAPER_MAX_PAGES caps the number of listing pages per category
+- SCRAPER_CONCURRENCY and SCRAPER_CONNECTION_LIMIT bound concurrent requests
+- SCRAPER_HOST_INTERVAL spaces requests to one host (see `politeness.py`)
+- SCRAPER_OUTPUT_DIR replaces data/raw as the root of the raw CSVs
+"""
+import os
+import random
+
+DEFAULT_BASE_URLS = {
+    'ebay': 'https://www.ebay.com',
+    'flipkart': 'https://www.flipkart.com',
+    'ubuy': 'https://www.ubuy.ma',
+}
+
+DELAY_SCALE = float(os.environ.get('SCRAPER_DELAY_SCALE', '1'))
+
+
+def base_url(site):
+    """Scheme and host the scraper for `site` should talk to, without a trailing slash."""
+    return os.environ.get(f'{site.upper()}_BASE_URL', DEFAULT_BASE_URLS[site]).rstrip('/')
+
+
+def delay(min_time, max_time):
+    """A random politeness delay in seconds, scaled by SCRAPER_DELAY_SCALE."""
+    return random.uniform(min_time, max_time) * DELAY_SCALE
+
+
+def max_pages(default):
+    return int(os.environ.get('SCRAPER_MAX_PAGES', default))
+
+
+def concurrency(default):
+    return int(os.environ.get('SCRAPER_CONCURRENCY', default))
+
+
+def connection_limit(default):
+    return int(os.environ.get('SCRAPER_CONNECTION_LIMIT', default))
+
+
+def host_interval(default):
+    """Minimum seconds between two requests to the same host, scaled like the delays."""
+    return float(os.environ.get('SCRAPER_HOST_INTERVAL', default)) * DELAY_SCALE
+
+
+def raw_dir(site):
+    return os.path.join(os.environ.get('SCRAPER_OUTPUT_DIR', 'data/raw'), site)
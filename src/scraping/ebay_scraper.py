@@ -1,202 +1,290 @@
 import aiohttp
+import argparse
 import asyncio
+import logging
 from bs4 import BeautifulSoup
 import csv
-import random
-from fake_useragent import UserAgent
 from datetime import datetime
 import os
-
-# Initialize UserAgent for rotating headers
-ua = UserAgent()
-
-# Define headers with rotating User-Agent
-def get_headers():
+import time
+
+from src.common import catalog
+from src.observability import logs, metrics, profiling, tracing
+from src.scraping import archive, config, politeness, shards
+from src.scraping.identity import IdentityPool
+
+# Search query for each category
+CATEGORIES = {
+    "Laptops": "laptop",
+    "Monitors": "monitor",
+    "Smart Watches": "smart watch",
+    "Graphics Cards": "graphics card"
+}
+
+# CSV columns written for each category
+CATEGORY_FIELDS = {
+    "Laptops": ['Title', 'Price', 'RAM', 'CPU', 'Model', 'Brand', 'GPU', 'Screen Size', 'Storage', 'Collection Date'],
+    "Monitors": ['Title', 'Price', 'Screen Size', 'Maximum Resolution', 'Aspect Ratio', 'Refresh Rate', 'Response Time', 'Brand', 'Model', 'Collection Date'],
+    "Smart Watches": ['Title', 'Price', 'Case Size', 'Battery Capacity', 'Brand', 'Model', 'Operating System', 'Storage Capacity', 'Collection Date'],
+    "Graphics Cards": ['Title', 'Price', 'Brand', 'Memory Size', 'Memory Type', 'Chipset/GPU Model', 'Connectors', 'Collection Date']
+}
+
+logger = logging.getLogger('scraper.ebay')
+
+# Proxy, User-Agent and cookie identities, picked by health for every request
+identity_pool = IdentityPool.from_env('ebay')
+
+# Define headers for the identity making the request
+def get_headers(identity):
     return {
-        'User-Agent': ua.random,
+        'User-Agent': identity.user_agent,
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
         'Accept-Encoding': 'gzip, deflate, br',
         'Connection': 'keep-alive',
-        'Referer': 'https://www.ebay.com/',
+        'Referer': f'{config.base_url("ebay")}/',
         'DNT': '1'
     }
 
+def is_captcha_page(response):
+    """eBay redirects blocked clients to its splash CAPTCHA page."""
+    return 'captcha' in str(response.url).lower()
+
+async def fetch_page(session, url, category, stage, params=None, **span_args):
+    """
+    GETs a page through the healthiest identity of the pool and returns its HTML.
+    Records status, size, latency and CAPTCHA blocks, and archives the page.
+    """
+    # A round trip to the manager shared by the shards: in a thread, so the loop keeps serving other fetches
+    await asyncio.sleep(await asyncio.to_thread(politeness.reserve, url))
+    identity = identity_pool.acquire()
+    status = None
+    blocked = False
+    cookies = None
+    start = time.perf_counter()
+    try:
+        with tracing.span('ebay.fetch', category=category, stage=stage, **span_args) as fetch_span:
+            async with session.get(url, params=params, headers=get_headers(identity), proxy=identity.proxy,
+                                   cookies=identity.cookies) as response:
+                body = await response.read()
+                status = response.status
+                cookies = {name: morsel.value for name, morsel in response.cookies.items()}
+                metrics.observe_fetch('ebay', category, stage, status, len(body), time.perf_counter() - start)
+                fetch_span.set(status=status, bytes=len(body), identity=identity.name)
+                if is_captcha_page(response):
+                    blocked = True
+                    metrics.CAPTCHA_HITS.labels(site='ebay', category=category, stage=stage).inc()
+                response.raise_for_status()
+                html = await response.text()
+                if not blocked:
+                    # Compressing and committing the page would hold up every other fetch of the loop
+                    await asyncio.to_thread(archive.store, str(response.url), html, category=category, stage=stage,
+                                            status=status, requested_url=response.request_info.url)
+                return html
+    except Exception:
+        if status is None:
+            metrics.REQUESTS.labels(site='ebay', category=category, stage=stage, status='error').inc()
+        raise
+    finally:
+        identity_pool.report(identity, status, time.perf_counter() - start, blocked, cookies)
+
 async def scrape_product_details(session, product_url, category):
     try:
-        await asyncio.sleep(random.uniform(2, 5))
-        headers = get_headers()
-
-        async with session.get(product_url, headers=headers) as response:
-            response.raise_for_status()
-            soup = BeautifulSoup(await response.text(), 'html.parser')
-
-            title = soup.find('h1', class_='x-item-title__mainTitle')
-            title = title.text.strip() if title else 'N/A'
-
-            price = soup.find('div', class_='x-price-primary')
-            price = price.text.strip() if price else 'N/A'
-
-            specs = {}
-            for spec in soup.find_all('div', class_='ux-labels-values__labels'):
-                key = spec.text.strip()
-                value = spec.find_next('div', class_='ux-labels-values__values').text.strip()
-                specs[key] = value
-
-            product_details = {
-                'Title': title,
-                'Price': price,
-                'Collection Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-
-            if category == "Laptops":
-                product_details.update({
-                    'RAM': specs.get('RAM Size', 'N/A'),
-                    'CPU': specs.get('Processor', 'N/A'),
-                    'Model': specs.get('Model', 'N/A'),
-                    'Brand': specs.get('Brand', 'N/A'),
-                    'GPU': specs.get('GPU', 'N/A'),
-                    'Screen Size': specs.get('Screen Size', 'N/A'),
-                    'Storage': specs.get('SSD Capacity', 'N/A'),
-                })
-            elif category == "Monitors":
-                product_details.update({
-                    'Screen Size': specs.get('Screen Size', 'N/A'),
-                    'Maximum Resolution': specs.get('Resolution', 'N/A'),
-                    'Aspect Ratio': specs.get('Aspect Ratio', 'N/A'),
-                    'Refresh Rate': specs.get('Refresh Rate', 'N/A'),
-                    'Response Time': specs.get('Response Time', 'N/A'),
-                    'Brand': specs.get('Brand', 'N/A'),
-                    'Model': specs.get('Model', 'N/A'),
-                })
-            elif category == "Smart Watches":
-                product_details.update({
-                    'Case Size': specs.get('Case Size', 'N/A'),
-                    'Battery Capacity': specs.get('Battery Capacity', 'N/A'),
-                    'Brand': specs.get('Brand', 'N/A'),
-                    'Model': specs.get('Model', 'N/A'),
-                    'Operating System': specs.get('Operating System', 'N/A'),
-                    'Storage Capacity': specs.get('Storage Capacity', 'N/A')
-                })
-            elif category == "Graphics Cards":
-                product_details.update({
-                    'Brand': specs.get('Brand', 'N/A'),
-                    'Memory Size': specs.get('Memory Size', 'N/A'),
-                    'Memory Type': specs.get('Memory Type', 'N/A'),
-                    'Chipset/GPU Model': specs.get('Chipset/GPU Model', 'N/A'),
-                    'Connectors': specs.get('Connectors', 'N/A')
-                })
-
-            print(f"Successfully scraped {category}: {title[:50]}...")
-            return product_details
+        await asyncio.sleep(config.delay(2, 5))
+        html = await fetch_page(session, product_url, category, 'product')
+
+        with tracing.span('ebay.parse', category=category, stage='product'), \
+                metrics.parse_timer('ebay', category, 'product'):
+            product_details = parse_product_page(html, category)
+
+        logs.summary.incr('products_scraped', category)
+        logger.debug("Scraped %s: %s", category, product_details['Title'][:50], extra={'category': category, 'url': product_url})
+        return product_details
 
     except Exception as e:
-        print(f"Error scraping {product_url}: {str(e)}")
+        logs.summary.incr('product_errors', category)
+        logger.warning("Error scraping product: %s", e,
+                       extra={'category': category, 'url': product_url, 'status': getattr(e, 'status', None)})
         return None
+    finally:
+        metrics.QUEUE_DEPTH.labels(site='ebay', category=category).dec()
+
+def parse_product_page(html, category, collection_date=None):
+    """
+    Extracts the title, price and category specific specs from an item page.
+    `collection_date` defaults to now; re-extraction passes the archived fetch time.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.find('h1', class_='x-item-title__mainTitle')
+    title = title.text.strip() if title else 'N/A'
+
+    price = soup.find('div', class_='x-price-primary')
+    price = price.text.strip() if price else 'N/A'
+
+    specs = {}
+    for spec in soup.find_all('div', class_='ux-labels-values__labels'):
+        key = spec.text.strip()
+        value = spec.find_next('div', class_='ux-labels-values__values').text.strip()
+        specs[key] = value
+
+    product_details = {
+        'Title': title,
+        'Price': price,
+        'Collection Date': (collection_date or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+    if category == "Laptops":
+        product_details.update({
+            'RAM': specs.get('RAM Size', 'N/A'),
+            'CPU': specs.get('Processor', 'N/A'),
+            'Model': specs.get('Model', 'N/A'),
+            'Brand': specs.get('Brand', 'N/A'),
+            'GPU': specs.get('GPU', 'N/A'),
+            'Screen Size': specs.get('Screen Size', 'N/A'),
+            'Storage': specs.get('SSD Capacity', 'N/A'),
+        })
+    elif category == "Monitors":
+        product_details.update({
+            'Screen Size': specs.get('Screen Size', 'N/A'),
+            'Maximum Resolution': specs.get('Resolution', 'N/A'),
+            'Aspect Ratio': specs.get('Aspect Ratio', 'N/A'),
+            'Refresh Rate': specs.get('Refresh Rate', 'N/A'),
+            'Response Time': specs.get('Response Time', 'N/A'),
+            'Brand': specs.get('Brand', 'N/A'),
+            'Model': specs.get('Model', 'N/A'),
+        })
+    elif category == "Smart Watches":
+        product_details.update({
+            'Case Size': specs.get('Case Size', 'N/A'),
+            'Battery Capacity': specs.get('Battery Capacity', 'N/A'),
+            'Brand': specs.get('Brand', 'N/A'),
+            'Model': specs.get('Model', 'N/A'),
+            'Operating System': specs.get('Operating System', 'N/A'),
+            'Storage Capacity': specs.get('Storage Capacity', 'N/A')
+        })
+    elif category == "Graphics Cards":
+        product_details.update({
+            'Brand': specs.get('Brand', 'N/A'),
+            'Memory Size': specs.get('Memory Size', 'N/A'),
+            'Memory Type': specs.get('Memory Type', 'N/A'),
+            'Chipset/GPU Model': specs.get('Chipset/GPU Model', 'N/A'),
+            'Connectors': specs.get('Connectors', 'N/A')
+        })
+    return product_details
 
 async def scrape_search_page(session, query, page, semaphore, category):
     async with semaphore:
         try:
-            base_url = "https://www.ebay.com/sch/i.html"
+            base_url = f"{config.base_url('ebay')}/sch/i.html"
             params = {'_nkw': query, '_sacat': 0, '_from': 'R40', '_pgn': page}
+            html = await fetch_page(session, base_url, category, 'search', params=params, page=page)
 
-            headers = get_headers()
-            async with session.get(base_url, params=params, headers=headers) as response:
-                response.raise_for_status()
-                soup = BeautifulSoup(await response.text(), 'html.parser')
-
-                items = soup.find_all('div', class_='s-item__wrapper')
-                product_urls = [item.find('a', class_='s-item__link')['href'] for item in items if item.find('a', class_='s-item__link')]
+            with tracing.span('ebay.parse', category=category, stage='search', page=page) as parse_span, \
+                    metrics.parse_timer('ebay', category, 'search'):
+                product_urls = parse_search_page(html)
+                parse_span.set(rows=len(product_urls))
 
-                print(f"Scraped page {page} for {category} ({len(product_urls)} products)")
-                return product_urls
+            logs.summary.incr('search_pages', category)
+            logger.debug("Scraped page %d for %s (%d products)", page, category, len(product_urls),
+                         extra={'category': category, 'page': page, 'rows': len(product_urls)})
+            return product_urls
 
         except Exception as e:
-            print(f"Error scraping page {page} for {category}: {str(e)}")
+            logs.summary.incr('search_errors', category)
+            logger.warning("Error scraping search page: %s", e,
+                           extra={'category': category, 'page': page, 'status': getattr(e, 'status', None)})
             return []
+        finally:
+            metrics.QUEUE_DEPTH.labels(site='ebay', category=category).dec()
 
-async def scrape_ebay_search(categories, max_pages=1):
+def parse_search_page(html):
+    """Returns the item URLs listed on a search results page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    items = soup.find_all('div', class_='s-item__wrapper')
+    return [item.find('a', class_='s-item__link')['href'] for item in items if item.find('a', class_='s-item__link')]
+
+async def scrape_ebay_search(categories, max_pages=1, first_page=1):
     all_products = {}
-    semaphore = asyncio.Semaphore(2)
+    semaphore = asyncio.Semaphore(config.concurrency(2))
+    connector = aiohttp.TCPConnector(limit=config.connection_limit(100))
 
-    async with aiohttp.ClientSession() as session:
+    # Cookies are kept per identity, so the session itself must not share a jar
+    async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar()) as session:
         for category, query in categories.items():
-            print(f"\n{'=' * 30}\nStarting {category} scraping\n{'=' * 30}")
-            tasks = [scrape_search_page(session, query, page, semaphore, category) for page in range(1, max_pages + 1)]
+            logger.info("Starting %s scraping", category, extra={'category': category})
+            with tracing.span('ebay.category', category=category) as category_span:
+                queue_depth = metrics.QUEUE_DEPTH.labels(site='ebay', category=category)
+                pages = range(first_page, max_pages + 1)
+                queue_depth.inc(len(pages))
+                tasks = [scrape_search_page(session, query, page, semaphore, category) for page in pages]
 
-            search_results = await asyncio.gather(*tasks)
-            product_urls = [url for sublist in search_results for url in sublist]
+                search_results = await asyncio.gather(*tasks)
+                product_urls = [url for sublist in search_results for url in sublist]
 
-            product_tasks = [scrape_product_details(session, url, category) for url in product_urls]
-            products = await asyncio.gather(*product_tasks)
+                queue_depth.inc(len(product_urls))
+                product_tasks = [scrape_product_details(session, url, category) for url in product_urls]
+                products = await asyncio.gather(*product_tasks)
 
-            all_products[category] = [p for p in products if p]
-            print(f"\n{'=' * 30}\nCompleted {category} ({len(all_products[category])} items)\n{'=' * 30}")
+                all_products[category] = [p for p in products if p]
+                category_span.set(rows=len(all_products[category]))
+            logger.info("Completed %s (%d items)", category, len(all_products[category]),
+                        extra={'category': category, 'rows': len(all_products[category])})
 
     return all_products
 
-def get_next_scrape_number(save_directory, category):
-    """Determine the next scrape number globally, regardless of the date."""
-    scrape_number = 1
-    for filename in os.listdir(save_directory):
-        if filename.startswith(f"{category}_") and filename.endswith(".csv"):
-            try:
-                # Extract the scrape number from the filename
-                current_number = int(filename.split('_scrape')[-1].split('.')[0])
-                if current_number >= scrape_number:
-                    scrape_number = current_number + 1
-            except ValueError:
-                continue
-    return scrape_number
-
 def save_to_csv(data, category, save_directory, fieldnames):
     # Format category name for folder and filename
     category_folder = category.lower().replace(' ', '_')
-    category_filename = category_folder
-    today_date = datetime.now().strftime('%Y_%m_%d')
-
-    # Create the category folder if it doesn't exist
     category_directory = os.path.join(save_directory, category_folder)
-    os.makedirs(category_directory, exist_ok=True)
-
-    # Determine the next scrape number globally
-    scrape_number = get_next_scrape_number(category_directory, category_filename)
-
-    # Generate filename
-    filename = os.path.join(category_directory, f"{category_filename}_{today_date}_scrape{scrape_number}.csv")
 
-    # Save data to CSV
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+    # The catalog gives the next scrape number and publishes the file once it is complete
+    with tracing.span('ebay.write', category=category, rows=len(data)), \
+            catalog.new_scrape('ebay', category_folder, category_directory) as output, \
+            open(output.tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(data)
+        output.rows = len(data)
+    filename = str(output.path)
+    metrics.ROWS_WRITTEN.labels(site='ebay', category=category).inc(len(data))
 
-    print(f"Saved {len(data)} {category} items to {filename}")
+    logger.info("Saved %d %s items to %s", len(data), category, filename,
+                extra={'category': category, 'rows': len(data), 'path': filename})
 
-async def main():
-    categories = {
-        "Laptops": "laptop",
-        "Monitors": "monitor",
-        "Smart Watches": "smart watch",
-        "Graphics Cards": "graphics card"
-    }
+def category_pages(category):
+    """Number of search pages scraped for `category`."""
+    return config.max_pages(18)
 
-    max_pages = 18
-    save_directory = "data/raw/ebay"
+def merge_shards(category, rows):
+    """Writes the merged rows of a sharded run as the usual CSV."""
+    save_to_csv(rows, category, config.raw_dir('ebay'), CATEGORY_FIELDS[category])
 
-    print("\nStarting eBay scraping...")
-    all_products = await scrape_ebay_search(categories, max_pages)
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape eBay search results and product pages.')
+    shards.add_shard_arguments(parser, CATEGORIES)
+    options = parser.parse_args(argv)
 
-    category_fields = {
-        "Laptops": ['Title', 'Price', 'RAM', 'CPU', 'Model', 'Brand', 'GPU', 'Screen Size', 'Storage', 'Collection Date'],
-        "Monitors": ['Title', 'Price', 'Screen Size', 'Maximum Resolution', 'Aspect Ratio', 'Refresh Rate', 'Response Time', 'Brand', 'Model', 'Collection Date'],
-        "Smart Watches": ['Title', 'Price', 'Case Size', 'Battery Capacity', 'Brand', 'Model', 'Operating System', 'Storage Capacity', 'Collection Date'],
-        "Graphics Cards": ['Title', 'Price', 'Brand', 'Memory Size', 'Memory Type', 'Chipset/GPU Model', 'Connectors', 'Collection Date']
-    }
+    run_name = shards.run_name('ebay_scraper', options)
+    logs.setup(run_name)
+    metrics.start_run(shards.run_name('ebay', options))
+    tracing.start_run(run_name)
+    profiling.start_from_env(run_name)
+    archive.start_run('ebay')
+    categories = shards.selected_categories(options, CATEGORIES)
+
+    first_page, max_pages = options.pages or (1, config.max_pages(18))
+    save_directory = config.raw_dir('ebay')
+
+    logger.info("Starting eBay scraping...")
+    all_products = await scrape_ebay_search(categories, max_pages, first_page)
+
+    if options.shard_output:
+        shards.write_shard(options.shard_output, all_products)
+        return
 
     for category, products in all_products.items():
         if products:
-            save_to_csv(products, category, save_directory, category_fields[category])
+            save_to_csv(products, category, save_directory, CATEGORY_FIELDS[category])
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
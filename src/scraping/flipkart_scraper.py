@@ -1,3 +1,5 @@
+import argparse
+import logging
 import os
 import time
 import random
@@ -7,16 +9,19 @@ import pandas as pd
 from datetime import datetime
 import re
 
+from src.common import catalog
+from src.observability import logs, metrics, profiling, tracing
+from src.scraping import archive, config, politeness, shards
+from src.scraping.identity import IdentityPool
+
+logger = logging.getLogger('scraper.flipkart')
+
 # Constants
-USER_AGENTS = [
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Mozilla/5.0 (iPhone; CPU iPhone OS 14_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Mobile/15E148 Safari/604.1',
-]
 DEFAULT_HEADERS = {
-    'User-Agent': random.choice(USER_AGENTS),
     'Accept-Language': 'en-US, en;q=0.5'
 }
+# Proxy, User-Agent and cookie identities, picked by health for every request
+identity_pool = IdentityPool.from_env('flipkart')
 
 # Helper Functions
 def get_text_or_default(element, default="Data not available"):
@@ -25,8 +30,8 @@ def get_text_or_default(element, default="Data not available"):
 
 def wait_random(min_time=3, max_time=7):
     """Wait for a random number of seconds to avoid detection."""
-    delay = random.randint(min_time, max_time)
-    print(f"Waiting {delay} seconds...")
+    delay = random.randint(min_time, max_time) * config.DELAY_SCALE
+    logger.debug("Waiting %s seconds...", delay)
     time.sleep(delay)
 
 def extract_specifications(soup):
@@ -52,178 +57,256 @@ def extract_specifications(soup):
 
     return specifications
 
-def scrape_flipkart_product(product_url):
-    """Scrapes detailed information (including ratings and reviews) for a single product."""
-    headers = DEFAULT_HEADERS
-    try:
-        response = requests.get(product_url, headers=headers, timeout=10)
+def fetch_page(url, category_name, stage):
+    """GETs a page through the healthiest identity and records its status, size and latency."""
+    politeness.wait(url)
+    with identity_pool.lease() as (identity, outcome):
+        start = time.perf_counter()
+        with tracing.span('flipkart.fetch', category=category_name, stage=stage) as fetch_span:
+            try:
+                response = requests.get(url, headers={**DEFAULT_HEADERS, 'User-Agent': identity.user_agent},
+                                        proxies=identity.proxies(), cookies=identity.cookies, timeout=10)
+            except requests.exceptions.RequestException:
+                metrics.REQUESTS.labels(site='flipkart', category=category_name, stage=stage, status='error').inc()
+                raise
+            fetch_span.set(status=response.status_code, bytes=len(response.content), identity=identity.name)
+        metrics.observe_fetch('flipkart', category_name, stage, response.status_code, len(response.content),
+                              time.perf_counter() - start)
+        outcome.update(status=response.status_code, cookies=response.cookies.get_dict())
+        if 'captcha' in response.url.lower():
+            outcome['blocked'] = True
+            metrics.CAPTCHA_HITS.labels(site='flipkart', category=category_name, stage=stage).inc()
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        if not outcome.get('blocked'):  # a CAPTCHA page is no listing to re-extract
+            archive.store(response.url, response.text, category=category_name, stage=stage,
+                          status=response.status_code, requested_url=url)
+        return response
 
-        specifications = extract_specifications(soup)
+def parse_flipkart_product(html):
+    """Extracts rating, review count and specifications from a product page."""
+    soup = BeautifulSoup(html, 'html.parser')
 
-        rating_element = soup.find('div', class_='_3LWZlK')
-        rating = get_text_or_default(rating_element)
+    specifications = extract_specifications(soup)
 
-        reviews_element = soup.find('span', class_='_2_R_DZ')
-        reviews_text = get_text_or_default(reviews_element)
+    rating_element = soup.find('div', class_='_3LWZlK')
+    rating = get_text_or_default(rating_element)
 
-        reviews_match = re.search(r'\d+', reviews_text.replace(',', ''))
-        reviews = reviews_match.group() if reviews_match else "Data not available"
+    reviews_element = soup.find('span', class_='_2_R_DZ')
+    reviews_text = get_text_or_default(reviews_element)
 
-        return {
-            "rating": rating,
-            "reviews": reviews,
-            **specifications,
-        }
+    reviews_match = re.search(r'\d+', reviews_text.replace(',', ''))
+    reviews = reviews_match.group() if reviews_match else "Data not available"
+
+    return {
+        "rating": rating,
+        "reviews": reviews,
+        **specifications,
+    }
+
+def scrape_flipkart_product(product_url, category_name):
+    """Scrapes detailed information (including ratings and reviews) for a single product."""
+    try:
+        response = fetch_page(product_url, category_name, 'product')
+        with tracing.span('flipkart.parse', category=category_name, stage='product'), \
+                metrics.parse_timer('flipkart', category_name, 'product'):
+            return parse_flipkart_product(response.text)
 
     except requests.exceptions.RequestException as e:
-        print(f"Error occurred while scraping product {product_url}: {e}")
+        logs.summary.incr('product_errors', category_name)
+        logger.warning("Error occurred while scraping product: %s", e, extra={'category': category_name, 'url': product_url})
         return {"rating": "Data not available", "reviews": "Data not available"}
 
+def parse_flipkart_listing(html, category_name, collection_date):
+    """Extracts the product cards of a listing page, without their specifications."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    product_blocks = soup.find_all('div', class_='cPHDOP col-12-12')
+    listings = []
+
+    for product in product_blocks:
+        if category_name == "graphics_cards":
+            title_element = product.find('a', class_='wjcEIp')
+            price_element = product.find('div', class_='Nx9bqj')
+            rating_element = product.find('div', class_='XQDdHH')
+            reviews_element = product.find('span', class_='Wphh3N')
+            image_element = product.find('img', class_='DByuf4')
+            link_element = product.find('a', class_='VJA3rP')
+        elif category_name == "laptops":
+            title_element = product.find('div', class_='KzDlHZ')
+            price_element = product.find('div', class_='Nx9bqj _4b5DiR')
+            rating_element = product.find('div', class_='XQDdHH')
+            reviews_element = product.find('span', class_='Wphh3N')
+            image_element = product.find('img', class_='DByuf4')
+            link_element = product.find('a', class_='CGtC98')
+        elif category_name == "monitors":
+            title_element = product.find('div', class_='KzDlHZ')
+            price_element = product.find('div', class_='Nx9bqj _4b5DiR')
+            rating_element = product.find('div', class_='XQDdHH')
+            reviews_element = product.find('span', class_='Wphh3N')
+            image_element = product.find('img', class_='DByuf4')
+            link_element = product.find('a', class_='CGtC98')
+        elif category_name == "smart_watches":
+            title_element = product.find('a', class_='WKTcLC')
+            price_element = product.find('div', class_='Nx9bqj')
+            rating_element = product.find('div', class_='XQDdHH')
+            reviews_element = product.find('span', class_='Wphh3N')
+            image_element = product.find('img', class_='_53J4C-')
+            link_element = product.find('a', class_='rPDeLR')
+
+        title = get_text_or_default(title_element)
+        price = get_text_or_default(price_element)
+        rating = get_text_or_default(rating_element)
+        reviews = get_text_or_default(reviews_element)
+        image_url = image_element['src'] if image_element else "Image not available"
+        product_url = f"{config.base_url('flipkart')}{link_element['href']}" if link_element else "URL not available"
+
+        listings.append({
+            "title": title,
+            "price": price,
+            "rating": rating,
+            "reviews": reviews,
+            "image_url": image_url,
+            "product_url": product_url,
+            "collection_date": collection_date,
+        })
+
+    return listings
+
 def scrape_flipkart_page(url, category_name):
-    headers = DEFAULT_HEADERS
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        response = fetch_page(url, category_name, 'listing')
+        collection_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with tracing.span('flipkart.parse', category=category_name, stage='listing') as parse_span, \
+                metrics.parse_timer('flipkart', category_name, 'listing'):
+            listings = parse_flipkart_listing(response.text, category_name, collection_date)
+            parse_span.set(rows=len(listings))
 
-        product_blocks = soup.find_all('div', class_='cPHDOP col-12-12')
-        if not product_blocks:
-            print("No product blocks found on this page.")
+        if not listings:
+            logger.info("No product blocks found on this page.", extra={'category': category_name, 'url': url})
             return []
 
         scraped_items = []
-        collection_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        queue_depth = metrics.QUEUE_DEPTH.labels(site='flipkart', category=category_name)
+        queue_depth.inc(len(listings))
 
-        for product in product_blocks:
-            if category_name == "graphics_cards":
-                title_element = product.find('a', class_='wjcEIp')
-                price_element = product.find('div', class_='Nx9bqj')
-                rating_element = product.find('div', class_='XQDdHH')
-                reviews_element = product.find('span', class_='Wphh3N')
-                image_element = product.find('img', class_='DByuf4')
-                link_element = product.find('a', class_='VJA3rP')
-            elif category_name == "laptops":
-                title_element = product.find('div', class_='KzDlHZ')
-                price_element = product.find('div', class_='Nx9bqj _4b5DiR')
-                rating_element = product.find('div', class_='XQDdHH')
-                reviews_element = product.find('span', class_='Wphh3N')
-                image_element = product.find('img', class_='DByuf4')
-                link_element = product.find('a', class_='CGtC98')
-            elif category_name == "monitors":
-                title_element = product.find('div', class_='KzDlHZ')
-                price_element = product.find('div', class_='Nx9bqj _4b5DiR')
-                rating_element = product.find('div', class_='XQDdHH')
-                reviews_element = product.find('span', class_='Wphh3N')
-                image_element = product.find('img', class_='DByuf4')
-                link_element = product.find('a', class_='CGtC98')
-            elif category_name == "smart_watches":
-                title_element = product.find('a', class_='WKTcLC')
-                price_element = product.find('div', class_='Nx9bqj')
-                rating_element = product.find('div', class_='XQDdHH')
-                reviews_element = product.find('span', class_='Wphh3N')
-                image_element = product.find('img', class_='_53J4C-')
-                link_element = product.find('a', class_='rPDeLR')
-
-            title = get_text_or_default(title_element)
-            price = get_text_or_default(price_element)
-            rating = get_text_or_default(rating_element)
-            reviews = get_text_or_default(reviews_element)
-            image_url = image_element['src'] if image_element else "Image not available"
-            product_url = f"https://www.flipkart.com{link_element['href']}" if link_element else "URL not available"
-
-            specifications = scrape_flipkart_product(product_url) if product_url != "URL not available" else {}
+        for listing in listings:
+            product_url = listing["product_url"]
+            specifications = scrape_flipkart_product(product_url, category_name) if product_url != "URL not available" else {}
+            queue_depth.dec()
 
             scraped_items.append({
-                "title": title,
-                "price": price,
-                "rating": rating,
-                "reviews": reviews,
-                "image_url": image_url,
-                "product_url": product_url,
-                "collection_date": collection_date,
+                **listing,
                 **specifications,
             })
 
         return scraped_items
 
     except requests.exceptions.RequestException as e:
-        print(f"Error occurred while scraping {url}: {e}")
+        logs.summary.incr('listing_errors', category_name)
+        logger.warning("Error occurred while scraping listing: %s", e, extra={'category': category_name, 'url': url})
         return []
 
-def get_next_scrape_number(output_dir, category_name):
-    """Determine the next scrape number globally, regardless of the date."""
-    scrape_number = 1
-    for filename in os.listdir(output_dir):
-        if filename.startswith(f"{category_name}_") and filename.endswith(".csv"):
-            try:
-                # Extract the scrape number from the filename
-                current_number = int(filename.split('_scrape')[-1].split('.')[0])
-                if current_number >= scrape_number:
-                    scrape_number = current_number + 1
-            except ValueError:
-                continue
-    return scrape_number
-
-def scrape_flipkart(category_url, num_pages, category_name, output_dir="data/raw/flipkart"):
-
+def scrape_flipkart_pages(category_url, category_name, first_page, last_page):
+    """Scrapes listing pages first_page..last_page, stopping at the first empty one."""
     aggregated_results = []
-    for page in range(1, num_pages + 1):
-        print(f"Scraping page {page}...")
+    for page in range(first_page, last_page + 1):
+        logger.debug("Scraping page %d...", page, extra={'category': category_name, 'page': page})
         page_url = f"{category_url}&page={page}"
         page_results = scrape_flipkart_page(page_url, category_name)
 
         if not page_results:
-            print("No more products found. Stopping.")
+            logger.info("No more products found. Stopping.", extra={'category': category_name, 'page': page})
             break
 
         aggregated_results.extend(page_results)
+        logs.summary.incr('listing_pages', category_name)
+        logs.summary.incr('products_scraped', category_name, len(page_results))
         wait_random()
 
-    if aggregated_results:
-        today = datetime.today()
-        formatted_date = today.strftime("%Y_%m_%d")
-
-        # Create category-specific directory
-        category_directory = os.path.join(output_dir, category_name)
-        os.makedirs(category_directory, exist_ok=True)
+    return aggregated_results
 
-        # Determine the next scrape number globally
-        scrape_number = get_next_scrape_number(category_directory, category_name)
+def save_to_csv(aggregated_results, category_name, output_dir=None):
+    output_dir = output_dir or config.raw_dir('flipkart')
 
-        filename = f"{category_name}_{formatted_date}_scrape{scrape_number}.csv"
-        output_path = os.path.join(category_directory, filename)
+    category_directory = os.path.join(output_dir, category_name)
 
+    # The catalog gives the next scrape number and publishes the file once it is complete
+    with tracing.span('flipkart.write', category=category_name, rows=len(aggregated_results)), \
+            catalog.new_scrape('flipkart', category_name, category_directory) as output:
         df = pd.DataFrame(aggregated_results)
-        df.to_csv(output_path, index=False, encoding='utf-8-sig')
-        print(f"Data saved to {output_path}")
+        df.to_csv(output.tmp_path, index=False, encoding='utf-8-sig')
+        output.rows = len(df)
+    output_path = str(output.path)
+    metrics.ROWS_WRITTEN.labels(site='flipkart', category=category_name).inc(len(df))
+    logger.info("Data saved to %s", output_path, extra={'category': category_name, 'rows': len(df), 'path': output_path})
+
+def scrape_flipkart(category_url, num_pages, category_name, output_dir=None):
+    aggregated_results = scrape_flipkart_pages(category_url, category_name, 1, num_pages)
+
+    if aggregated_results:
+        save_to_csv(aggregated_results, category_name, output_dir)
     else:
-        print("No data scraped.")
+        logger.info("No data scraped.", extra={'category': category_name})
 
     return aggregated_results
 
-# Main script
-if __name__ == "__main__":
-    categories = {
-        "graphics_cards": {
-            "url": "https://www.flipkart.com/gaming-components/graphic-cards/pr?sid=4rr,tin,6zn&q=graphics+card&otracker=categorytree",
-            "num_pages": 18
-        },
-        "laptops": {
-            "url": "https://www.flipkart.com/laptops/pr?sid=6bo,b5g&q=laptop&otracker=categorytree",
-            "num_pages": 18
-        },
-        "monitors": {
-            "url": "https://www.flipkart.com/search?q=monitor&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off",
-            "num_pages": 18
-        },
-        "smart_watches": {
-            "url": "https://www.flipkart.com/wearable-smart-devices/smart-watches/pr?sid=ajy,buh&q=smart+watches&otracker=categorytree",
-            "num_pages": 18
-        }
+base_url = config.base_url('flipkart')
+CATEGORIES = {
+    "graphics_cards": {
+        "url": f"{base_url}/gaming-components/graphic-cards/pr?sid=4rr,tin,6zn&q=graphics+card&otracker=categorytree",
+        "num_pages": config.max_pages(18)
+    },
+    "laptops": {
+        "url": f"{base_url}/laptops/pr?sid=6bo,b5g&q=laptop&otracker=categorytree",
+        "num_pages": config.max_pages(18)
+    },
+    "monitors": {
+        "url": f"{base_url}/search?q=monitor&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off",
+        "num_pages": config.max_pages(18)
+    },
+    "smart_watches": {
+        "url": f"{base_url}/wearable-smart-devices/smart-watches/pr?sid=ajy,buh&q=smart+watches&otracker=categorytree",
+        "num_pages": config.max_pages(18)
     }
+}
+
+def category_pages(category_name):
+    """Number of listing pages scraped for `category_name`."""
+    return CATEGORIES[category_name]["num_pages"]
+
+def merge_shards(category_name, rows):
+    """Writes the merged rows of a sharded run as the usual CSV."""
+    save_to_csv(rows, category_name)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape Flipkart listing and product pages.')
+    shards.add_shard_arguments(parser, CATEGORIES)
+    options = parser.parse_args(argv)
+
+    run_name = shards.run_name('flipkart_scraper', options)
+    logs.setup(run_name)
+    metrics.start_run(shards.run_name('flipkart', options))
+    tracing.start_run(run_name)
+    profiling.start_from_env(run_name)
+    archive.start_run('flipkart')
+
+    shard_rows = {}
+    for category_name, category_config in shards.selected_categories(options, CATEGORIES).items():
+        logger.info("Scraping %s...", category_name, extra={'category': category_name})
+        first_page, last_page = options.pages or (1, category_config["num_pages"])
+        with tracing.span('flipkart.category', category=category_name):
+            rows = scrape_flipkart_pages(category_config["url"], category_name, first_page, last_page)
+
+        if options.shard_output:
+            shard_rows[category_name] = rows
+        elif rows:
+            save_to_csv(rows, category_name)
+        else:
+            logger.info("No data scraped.", extra={'category': category_name})
+
+    if options.shard_output:
+        shards.write_shard(options.shard_output, shard_rows)
 
-    for category_name, config in categories.items():
-        print(f"Scraping {category_name}...")
-        scrape_flipkart(config["url"], config["num_pages"], category_name)
\ No newline at end of file
+# Main script
+if __name__ == "__main__":
+    main()
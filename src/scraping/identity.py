@@ -0,0 +1,168 @@
+"""Pool of scraping identities (proxy, User-Agent, cookie jar) with health scores.
+
+Every identity tracks its success rate, block rate (CAPTCHA, 403, 429) and
+latency. `IdentityPool.acquire` hands out the healthiest identity that is not
+cooling down, discounted by the requests it already has in flight, so traffic
+spreads over the pool instead of hammering a single IP. A block puts the
+identity in an exponentially growing cooldown.
+
+User-Agents are drawn at random by fake_useragent, one per identity.
+Proxies come from SCRAPER_PROXIES (comma separated URLs) or SCRAPER_PROXY_FILE
+(one URL per line), each with `user_agents_per_proxy` identities; without
+either, the pool has `direct_identities` direct-connection identities, each
+with its own User-Agent and cookies.
+"""
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from fake_useragent import UserAgent
+
+from src.observability.metrics import REGISTRY
+
+# Source of the User-Agents of the identities
+ua = UserAgent()
+
+BLOCK_STATUSES = (403, 429)
+COOLDOWN_SECONDS = 60.0
+MAX_COOLDOWN_SECONDS = 30 * 60.0
+# Latency at which an identity's score is halved
+REFERENCE_LATENCY = 2.0
+# Weight of the newest sample in the latency moving average
+LATENCY_ALPHA = 0.2
+
+IDENTITY_HEALTH = REGISTRY.gauge('scraper_identity_health', 'Health score of each scraping identity', ('site', 'identity'))
+IDENTITY_BLOCKS = REGISTRY.counter('scraper_identity_blocks_total', 'Blocks (CAPTCHA, 403, 429) per identity', ('site', 'identity'))
+
+
+class Identity:
+    """One proxy + User-Agent + cookie jar combination and its health statistics."""
+
+    def __init__(self, name, proxy=None, user_agent=None):
+        self.name = name
+        self.proxy = proxy
+        self.user_agent = user_agent or ua.random
+        self.cookies = {}
+        self.successes = 0
+        self.failures = 0
+        self.blocks = 0
+        self.consecutive_blocks = 0
+        self.latency = None
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def requests(self):
+        return self.successes + self.failures + self.blocks
+
+    def score(self):
+        """Health in [0, 1]: smoothed success rate, discounted by blocks and latency."""
+        success_rate = (self.successes + 1) / (self.requests + 2)
+        block_rate = self.blocks / (self.requests + 2)
+        latency_factor = 1.0 if self.latency is None else REFERENCE_LATENCY / (REFERENCE_LATENCY + self.latency)
+        return success_rate * (1 - block_rate) * latency_factor
+
+    def proxies(self):
+        """The proxy in the form `requests` expects."""
+        return {'http': self.proxy, 'https': self.proxy} if self.proxy else None
+
+    def __repr__(self):
+        return f"Identity({self.name!r}, score={self.score():.3f})"
+
+
+class IdentityPool:
+    """Routes requests to the healthiest identity and records their outcomes."""
+
+    def __init__(self, identities, site='all'):
+        if not identities:
+            raise ValueError("An identity pool needs at least one identity")
+        self.identities = list(identities)
+        self.site = site
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, site, user_agents_per_proxy=2, direct_identities=8):
+        proxies = load_proxies()
+        identities = []
+        if not proxies:
+            for _ in range(direct_identities):
+                identities.append(Identity(f"direct-{len(identities)}"))
+        for proxy_number, proxy in enumerate(proxies):
+            for _ in range(user_agents_per_proxy):
+                identities.append(Identity(f"proxy{proxy_number}-{len(identities)}", proxy))
+        return cls(identities, site)
+
+    def acquire(self):
+        """
+        Returns the identity to use for the next request. When every identity is
+        cooling down, the one whose cooldown ends first is used anyway.
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = [identity for identity in self.identities if identity.cooldown_until <= now]
+            if available:
+                identity = max(available, key=lambda item: (item.score() / (1 + item.in_flight), random.random()))
+            else:
+                identity = min(self.identities, key=lambda item: item.cooldown_until)
+            identity.in_flight += 1
+            return identity
+
+    def report(self, identity, status=None, latency=None, blocked=False, cookies=None, release=True):
+        """
+        Records the outcome of a request made with `identity`. A missing status
+        means the request failed before a response arrived. Pass release=False
+        when the identity stays in use afterwards (e.g. bound to a browser) and
+        call `release` once done with it.
+        """
+        blocked = blocked or status in BLOCK_STATUSES
+        with self._lock:
+            if release:
+                identity.in_flight = max(0, identity.in_flight - 1)
+            if latency is not None:
+                identity.latency = latency if identity.latency is None else \
+                    LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * identity.latency
+            if cookies:
+                identity.cookies.update(cookies)
+            if blocked:
+                identity.blocks += 1
+                identity.consecutive_blocks += 1
+                cooldown = min(MAX_COOLDOWN_SECONDS, COOLDOWN_SECONDS * 2 ** (identity.consecutive_blocks - 1))
+                identity.cooldown_until = time.monotonic() + cooldown
+                IDENTITY_BLOCKS.labels(site=self.site, identity=identity.name).inc()
+            elif status is not None and status < 400:
+                identity.successes += 1
+                identity.consecutive_blocks = 0
+            else:
+                identity.failures += 1
+            IDENTITY_HEALTH.labels(site=self.site, identity=identity.name).set(identity.score())
+
+    def release(self, identity):
+        with self._lock:
+            identity.in_flight = max(0, identity.in_flight - 1)
+
+    @contextmanager
+    def lease(self):
+        """
+        Acquires an identity for one request. The caller fills in the yielded
+        dict (status, blocked, cookies); the outcome and latency are reported on exit.
+        """
+        identity = self.acquire()
+        outcome = {}
+        start = time.perf_counter()
+        try:
+            yield identity, outcome
+        finally:
+            self.report(identity, outcome.get('status'), time.perf_counter() - start,
+                        outcome.get('blocked', False), outcome.get('cookies'))
+
+
+def load_proxies():
+    """Proxy URLs from SCRAPER_PROXIES or the file named by SCRAPER_PROXY_FILE."""
+    proxies = [proxy.strip() for proxy in os.environ.get('SCRAPER_PROXIES', '').split(',') if proxy.strip()]
+    proxy_file = os.environ.get('SCRAPER_PROXY_FILE')
+    if proxy_file:
+        with open(proxy_file, encoding='utf-8') as f:
+            proxies.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return proxies
@@ -0,0 +1,147 @@
+"""Runs the scrapers as shards over several worker processes.
+
+The work is split into shards of one site, one category and a range of
+listing pages (`src/scraping/shards.py`), and up to --workers scraper
+processes run at a time. Requests to a host stay at least --host-interval
+seconds apart across all the processes: the launcher serves one shared
+throttle (`src/scraping/politeness.py`) that every scraper consults before
+fetching a page.
+
+Each shard writes its rows under <raw dir>/.shards/<run>/; once every shard
+is done, the shards of a category are merged in page order into the usual
+<category>_<date>_scrapeN.csv, so the result does not depend on which shard
+finished first. If any shard fails, nothing is merged: a partial category
+would otherwise be recorded as a complete scrape. The shards are kept in
+the staging directory, which the run logs, and the exit code is 1.
+
+    python -m src.scraping.launcher --site ebay --site flipkart --workers 6 --pages-per-shard 3
+"""
+import argparse
+import importlib
+import logging
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from src.common import catalog
+from src.observability import logs, tracing
+from src.scraping import config, politeness, shards
+
+PROJECT_ROOT = catalog.PROJECT_ROOT
+SITES = ('ebay', 'flipkart', 'ubuy')
+
+logger = logging.getLogger('scraper.launcher')
+
+
+def scraper_module(site):
+    return importlib.import_module(f'src.scraping.{site}_scraper')
+
+
+def plan_shards(sites, categories=None, pages_per_shard=3, max_pages=None):
+    """Splits the listing pages of every selected category into shards of `pages_per_shard` pages."""
+    plan = []
+    for site in sites:
+        module = scraper_module(site)
+        for category in module.CATEGORIES:
+            if categories and category not in categories:
+                continue
+            last_page = max_pages or module.category_pages(category)
+            for first_page in range(1, last_page + 1, pages_per_shard):
+                plan.append(shards.Shard(site, category, first_page, min(first_page + pages_per_shard - 1, last_page)))
+    return plan
+
+
+def shard_path(staging_dir, shard):
+    category = shard.category.lower().replace(' ', '_')
+    return Path(staging_dir) / shard.site / f"{category}_p{shard.first_page:03d}-{shard.last_page:03d}.jsonl"
+
+
+def run_shard(shard, path, env):
+    """Runs one shard in a scraper process and returns its exit code."""
+    command = [sys.executable, '-m', f'src.scraping.{shard.site}_scraper', '--category', shard.category,
+               '--pages', f'{shard.first_page}-{shard.last_page}', '--shard-output', str(path)]
+    with tracing.span('launcher.shard', site=shard.site, category=shard.category,
+                      first_page=shard.first_page, last_page=shard.last_page) as shard_span:
+        completed = subprocess.run(command, cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE, text=True)
+        shard_span.set(returncode=completed.returncode)
+    if completed.returncode != 0 or not path.exists():
+        logs.summary.incr('shards_failed', shard.site)
+        logger.error("Shard %s %s pages %d-%d failed: %s", shard.site, shard.category, shard.first_page,
+                     shard.last_page, completed.stderr[-2000:],
+                     extra={'site': shard.site, 'category': shard.category, 'returncode': completed.returncode})
+        return completed.returncode or 1
+    logs.summary.incr('shards_done', shard.site)
+    return 0
+
+
+def merge(plan, staging_dir):
+    """Merges the shard files of each category in page order and writes the usual CSVs."""
+    by_category = {}
+    for shard in plan:
+        by_category.setdefault((shard.site, shard.category), []).append(shard)
+
+    for (site, category), category_shards in by_category.items():
+        rows = []
+        for shard in sorted(category_shards, key=lambda item: item.first_page):
+            path = shard_path(staging_dir, shard)
+            if path.exists():
+                rows.extend(shards.read_shard(path).get(category, []))
+        if not rows:
+            logger.info("No data scraped for %s %s.", site, category, extra={'site': site, 'category': category})
+            continue
+        with tracing.span('launcher.merge', site=site, category=category, rows=len(rows)):
+            scraper_module(site).merge_shards(category, rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.scraping.launcher',
+                                     description='Run the scrapers as page-range shards over several processes.')
+    parser.add_argument('--site', action='append', choices=SITES, help='site to scrape (repeatable, default: all)')
+    parser.add_argument('--category', action='append', help='category to scrape (repeatable, default: all)')
+    parser.add_argument('--workers', type=int, default=4, help='scraper processes running at a time')
+    parser.add_argument('--pages-per-shard', type=int, default=3, help='listing pages per shard')
+    parser.add_argument('--max-pages', type=int, help='listing pages per category (default: each scraper\'s own)')
+    parser.add_argument('--host-interval', type=float, default=None,
+                        help='minimum seconds between requests to one host across all workers '
+                             '(default: SCRAPER_HOST_INTERVAL or 1, scaled by SCRAPER_DELAY_SCALE)')
+    parser.add_argument('--keep-shards', action='store_true', help='keep the shard files after merging')
+    options = parser.parse_args(argv)
+
+    logs.setup('launcher')
+    tracing.start_run('launcher')
+    sites = options.site or list(SITES)
+    plan = plan_shards(sites, options.category, options.pages_per_shard, options.max_pages)
+    run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Anchored like the shard processes, which run from the project root, whatever the launcher's directory
+    staging_dir = (PROJECT_ROOT / config.raw_dir('')).resolve() / '.shards' / run_id
+
+    host_interval = options.host_interval if options.host_interval is not None else config.host_interval(1)
+    manager, throttle_env = politeness.serve(host_interval)
+    env = {**os.environ, **throttle_env}
+    logger.info("Running %d shards over %d workers (%.2fs between requests per host)", len(plan), options.workers,
+                host_interval, extra={'shards': len(plan), 'workers': options.workers})
+    try:
+        with ThreadPoolExecutor(max_workers=options.workers) as executor:
+            results = list(executor.map(lambda shard: run_shard(shard, shard_path(staging_dir, shard), env), plan))
+    finally:
+        manager.shutdown()
+
+    failed = sum(1 for returncode in results if returncode)
+    if failed:
+        logger.error("%d of %d shards failed; the run is incomplete, nothing was merged and the shards are kept "
+                     "in %s", failed, len(plan), staging_dir,
+                     extra={'failed': failed, 'shards': len(plan), 'staging_dir': str(staging_dir)})
+        return 1
+    merge(plan, staging_dir)
+    if not options.keep_shards:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Load-test harness for the scrapers.
+
+Starts the mock marketplace (`src/scraping/mock_marketplace.py`), runs the
+unmodified scraper entry points against it in subprocesses and reports, for
+each configuration, rows/s, p50/p99 fetch latency and CPU time per row.
+Sweeping the connection limit shows where throughput stops scaling:
+
+    python -m src.scraping.loadtest --site ebay --connection-limit 4,16,64 --latency lognormal:80,0.5
+
+Fetch latencies are taken from the run's trace (logs/traces), request
+statuses from its metrics dump (logs/metrics); raw CSVs go to a temporary
+directory, with their own catalog, so data/raw is left alone.
+
+With --proxies N the scrapers go through N local forward proxies, so the
+identity pool (`src/scraping/identity.py`) can be compared with a single IP
+under the mock's per-client limit:
+
+    python -m src.scraping.loadtest --site ebay --per-client-rps 5 --proxies 0,4
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from src.scraping.mock_marketplace import (BackgroundServer, ForwardProxy, add_marketplace_arguments,
+                                           marketplace_from_options)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+TRACES_DIR = PROJECT_ROOT / 'logs' / 'traces'
+METRICS_DIR = PROJECT_ROOT / 'logs' / 'metrics'
+
+SITES = ('ebay', 'flipkart', 'ubuy')
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def _newest(directory, prefix, since):
+    candidates = [path for path in Path(directory).glob(f'{prefix}_*.json') if path.stat().st_mtime >= since]
+    return max(candidates, key=lambda path: path.stat().st_mtime) if candidates else None
+
+
+def _count_rows(output_dir):
+    rows = 0
+    for path in Path(output_dir).rglob('*.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as csvfile:
+            rows += max(0, sum(1 for _ in csv.reader(csvfile)) - 1)
+    return rows
+
+
+def _request_statuses(metrics_path):
+    statuses = {}
+    if metrics_path is None:
+        return statuses
+    snapshot = json.loads(metrics_path.read_text(encoding='utf-8'))
+    for sample in snapshot.get('scraper_requests_total', {}).get('samples', []):
+        status = sample['labels']['status']
+        statuses[status] = statuses.get(status, 0) + int(sample['value'])
+    return statuses
+
+
+def run_once(site, base_url, connection_limit, concurrency, max_pages, delay_scale, proxies=()):
+    """Runs one scraper against the mock marketplace and returns its measurements."""
+    with tempfile.TemporaryDirectory(prefix=f'loadtest_{site}_') as output_dir:
+        env = {
+            **os.environ,
+            f'{site.upper()}_BASE_URL': base_url,
+            'SCRAPER_DELAY_SCALE': str(delay_scale),
+            'SCRAPER_MAX_PAGES': str(max_pages),
+            'SCRAPER_OUTPUT_DIR': output_dir,
+            'SCRAPER_ARCHIVE': '0',
+            'PIPELINE_CATALOG': os.path.join(output_dir, 'catalog.sqlite'),
+            'SCRAPER_PROXIES': ','.join(proxies),
+        }
+        if connection_limit:
+            env['SCRAPER_CONNECTION_LIMIT'] = str(connection_limit)
+        if concurrency:
+            env['SCRAPER_CONCURRENCY'] = str(concurrency)
+
+        started = time.time()
+        cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-m', f'src.scraping.{site}_scraper'], cwd=PROJECT_ROOT,
+                                   env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        wall = time.perf_counter() - start
+        cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+        rows = _count_rows(output_dir)
+
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:], file=sys.stderr)
+
+    latencies = []
+    trace_path = _newest(TRACES_DIR, f'{site}_scraper', started)
+    if trace_path is not None:
+        trace = json.loads(trace_path.read_text(encoding='utf-8'))
+        latencies = [event['dur'] / 1000 for event in trace['traceEvents'] if event.get('name') == f'{site}.fetch']
+
+    return {
+        'site': site,
+        'connection_limit': connection_limit,
+        'concurrency': concurrency,
+        'proxies': len(proxies),
+        'rows': rows,
+        'wall_s': wall,
+        'rows_per_s': rows / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 0.50),
+        'p99_ms': percentile(latencies, 0.99),
+        'cpu_ms_per_row': cpu * 1000 / rows if rows else float('nan'),
+        'requests': len(latencies),
+        'statuses': _request_statuses(_newest(METRICS_DIR, site, started)),
+        'returncode': completed.returncode,
+    }
+
+
+def print_report(results):
+    header = f"{'site':<9}{'conns':>6}{'conc':>6}{'proxies':>8}{'rows':>8}{'wall s':>9}{'rows/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'cpu ms/row':>12}  statuses"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        statuses = ' '.join(f"{status}={count}" for status, count in sorted(result['statuses'].items()))
+        print(f"{result['site']:<9}{result['connection_limit'] or '-':>6}{result['concurrency'] or '-':>6}{result['proxies'] or '-':>8}"
+              f"{result['rows']:>8}{result['wall_s']:>9.2f}{result['rows_per_s']:>9.1f}"
+              f"{result['p50_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['cpu_ms_per_row']:>12.2f}  {statuses}")
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.scraping.loadtest',
+                                     description='Measure scraper throughput against the local mock marketplace.')
+    parser.add_argument('--site', action='append', choices=SITES, help='site to run (repeatable, default: ebay)')
+    parser.add_argument('--connection-limit', type=_int_list, default=[0],
+                        help='comma separated SCRAPER_CONNECTION_LIMIT values to sweep')
+    parser.add_argument('--concurrency', type=_int_list, default=[0],
+                        help='comma separated SCRAPER_CONCURRENCY values to sweep')
+    parser.add_argument('--proxies', type=_int_list, default=[0],
+                        help='comma separated numbers of local forward proxies to route the scraper through')
+    parser.add_argument('--max-pages', type=int, default=2, help='listing pages per category for the scraper')
+    parser.add_argument('--delay-scale', type=float, default=0.0, help='SCRAPER_DELAY_SCALE for the scraper')
+    parser.add_argument('--json', type=Path, help='also write the results to this file')
+    add_marketplace_arguments(parser)
+    options = parser.parse_args(argv)
+
+    server = BackgroundServer(marketplace_from_options(options))
+    base_url = server.start()
+    print(f"Mock marketplace listening on {base_url}")
+    proxy_servers = [BackgroundServer(ForwardProxy(f'proxy{number}')) for number in range(max(options.proxies))]
+    proxy_urls = [proxy_server.start() for proxy_server in proxy_servers]
+    results = []
+    try:
+        for site in options.site or ['ebay']:
+            for connection_limit in options.connection_limit:
+                for concurrency in options.concurrency:
+                    for proxy_count in options.proxies:
+                        results.append(run_once(site, base_url, connection_limit, concurrency,
+                                                options.max_pages, options.delay_scale, proxy_urls[:proxy_count]))
+        with urllib.request.urlopen(f"{base_url}/__stats") as response:
+            served = json.load(response)
+    finally:
+        for proxy_server in proxy_servers:
+            proxy_server.stop()
+        server.stop()
+
+    print_report(results)
+    print(f"Served by the mock: {' '.join(f'{key}={value}' for key, value in sorted(served.items()))}")
+    if options.json:
+        options.json.write_text(json.dumps({'results': results, 'served': served}, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+"""Local mock of the eBay, Flipkart and Ubuy pages the scrapers read.
+
+Pages are rendered from small templates that reproduce the markup the
+extractors look for, filled with rows of the raw CSVs under data/raw as
+fixtures. Latency, server errors, 429 responses, a per-client request rate
+limit and CAPTCHA redirects can be injected to see how the scrapers behave
+under load:
+
+    python -m src.scraping.mock_marketplace --port 8080 --latency lognormal:80,0.5 --rate-limit-rate 0.02
+
+then run a scraper against it with EBAY_BASE_URL=http://127.0.0.1:8080 (see
+`src/scraping/config.py`), or let `src/scraping/loadtest.py` do both.
+
+`ForwardProxy` is a minimal HTTP forward proxy that tags the requests it
+relays with X-Forwarded-For, so the per-client limit sees each proxy as its
+own IP. It is used to test the identity pool (`src/scraping/identity.py`).
+"""
+import argparse
+import asyncio
+import csv
+import html
+import math
+import random
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import ClientSession, web
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+FIXTURES_DIR = PROJECT_ROOT / 'data' / 'raw'
+
+CATEGORIES = ('graphics_cards', 'laptops', 'monitors', 'smart_watches')
+
+# eBay search queries and the spec labels of its item pages, per category
+EBAY_QUERIES = {
+    'laptop': 'laptops',
+    'monitor': 'monitors',
+    'smart watch': 'smart_watches',
+    'graphics card': 'graphics_cards',
+}
+EBAY_SPEC_LABELS = {
+    'laptops': {'RAM': 'RAM Size', 'CPU': 'Processor', 'Model': 'Model', 'Brand': 'Brand', 'GPU': 'GPU',
+                'Screen Size': 'Screen Size', 'Storage': 'SSD Capacity'},
+    'monitors': {'Screen Size': 'Screen Size', 'Maximum Resolution': 'Resolution', 'Aspect Ratio': 'Aspect Ratio',
+                 'Refresh Rate': 'Refresh Rate', 'Response Time': 'Response Time', 'Brand': 'Brand', 'Model': 'Model'},
+    'smart_watches': {'Case Size': 'Case Size', 'Battery Capacity': 'Battery Capacity', 'Brand': 'Brand',
+                      'Model': 'Model', 'Operating System': 'Operating System',
+                      'Storage Capacity': 'Storage Capacity'},
+    'graphics_cards': {'Brand': 'Brand', 'Memory Size': 'Memory Size', 'Memory Type': 'Memory Type',
+                       'Chipset/GPU Model': 'Chipset/GPU Model', 'Connectors': 'Connectors'},
+}
+
+# Flipkart listing paths and the CSS classes of their product cards
+FLIPKART_PATHS = {
+    '/gaming-components/graphic-cards/pr': 'graphics_cards',
+    '/laptops/pr': 'laptops',
+    '/search': 'monitors',
+    '/wearable-smart-devices/smart-watches/pr': 'smart_watches',
+}
+FLIPKART_CARD_CLASSES = {
+    'graphics_cards': {'title': ('a', 'wjcEIp'), 'price': 'Nx9bqj', 'image': 'DByuf4', 'link': 'VJA3rP'},
+    'laptops': {'title': ('div', 'KzDlHZ'), 'price': 'Nx9bqj _4b5DiR', 'image': 'DByuf4', 'link': 'CGtC98'},
+    'monitors': {'title': ('div', 'KzDlHZ'), 'price': 'Nx9bqj _4b5DiR', 'image': 'DByuf4', 'link': 'CGtC98'},
+    'smart_watches': {'title': ('a', 'WKTcLC'), 'price': 'Nx9bqj', 'image': '_53J4C-', 'link': 'rPDeLR'},
+}
+
+# Ubuy listing URLs, keyed by their search query or category path
+UBUY_LISTINGS = {
+    'graphics cards': 'graphics_cards',
+    'laptops-21457': 'laptops',
+    'computer monitor': 'monitors',
+    'smart watch': 'smart_watches',
+}
+
+PLACEHOLDER_TITLES = (None, '', 'N/A', 'Data not available', 'No title')
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+{body}
+</body></html>"""
+
+
+def _escape(value):
+    return html.escape(str(value), quote=True)
+
+
+def parse_latency(spec):
+    """
+    Turns a latency spec into a function returning a delay in seconds.
+    Specs are `fixed:MS`, `uniform:MIN_MS,MAX_MS`, `lognormal:MEDIAN_MS,SIGMA` or `exp:MEAN_MS`.
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',')] if params else []
+    if kind == 'fixed':
+        return lambda: values[0] / 1000
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == 'lognormal':
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1]) / 1000
+    if kind == 'exp':
+        return lambda: random.expovariate(1 / values[0]) / 1000
+    raise ValueError(f"Unknown latency distribution {spec!r}")
+
+
+def load_fixtures(site, fixtures_dir=FIXTURES_DIR):
+    """Rows of the most recent raw CSV of every category of `site`."""
+    fixtures = {}
+    for category in CATEGORIES:
+        files = sorted((Path(fixtures_dir) / site / category).glob('*.csv'))
+        rows = []
+        if files:
+            with open(files[-1], newline='', encoding='utf-8-sig') as csvfile:
+                # Skip the placeholder rows scraped from non-product blocks
+                rows = [row for row in csv.DictReader(csvfile)
+                        if (row.get('Title') or row.get('title')) not in PLACEHOLDER_TITLES]
+        fixtures[category] = rows or [{}]
+    return fixtures
+
+
+class MockMarketplace:
+    """Builds the aiohttp application and keeps counts of what it served."""
+
+    def __init__(self, latency='fixed:0', error_rate=0.0, rate_limit_rate=0.0, captcha_rate=0.0,
+                 pages=20, items_per_page=24, fixtures_dir=FIXTURES_DIR, seed=None, per_client_rps=0.0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.captcha_rate = captcha_rate
+        self.pages = pages
+        self.items_per_page = items_per_page
+        self.random = random.Random(seed)
+        self.fixtures = {site: load_fixtures(site, fixtures_dir) for site in ('ebay', 'flipkart', 'ubuy')}
+        self.stats = Counter()
+        self.per_client_rps = per_client_rps
+        # Token buckets of the per-client limit: client -> (tokens, last refill)
+        self._buckets = {}
+
+    def _row(self, site, category, item_id):
+        rows = self.fixtures[site][category]
+        return rows[item_id % len(rows)]
+
+    def _over_client_limit(self, request):
+        if not self.per_client_rps:
+            return False
+        client = request.headers.get('X-Forwarded-For') or request.remote
+        now = time.monotonic()
+        tokens, last = self._buckets.get(client, (self.per_client_rps, now))
+        tokens = min(self.per_client_rps, tokens + (now - last) * self.per_client_rps)
+        allowed = tokens >= 1
+        self._buckets[client] = (tokens - 1 if allowed else tokens, now)
+        return not allowed
+
+    def _items(self, page):
+        first = (page - 1) * self.items_per_page
+        return range(first, first + self.items_per_page) if 1 <= page <= self.pages else range(0)
+
+    # Injection and bookkeeping shared by every page
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        site = (request.match_info.route.name or '').split('_')[0]
+        if site not in ('ebay', 'flipkart', 'ubuy'):
+            return await handler(request)
+        await asyncio.sleep(self.latency())
+        if self._over_client_limit(request):
+            self.stats[f'{site}.429'] += 1
+            return web.Response(status=429, headers={'Retry-After': '1'}, text='Too Many Requests')
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            self.stats[f'{site}.429'] += 1
+            return web.Response(status=429, headers={'Retry-After': '1'}, text='Too Many Requests')
+        roll -= self.rate_limit_rate
+        if roll < self.error_rate:
+            self.stats[f'{site}.500'] += 1
+            return web.Response(status=500, text='Internal Server Error')
+        roll -= self.error_rate
+        if roll < self.captcha_rate:
+            self.stats[f'{site}.captcha'] += 1
+            if site == 'ubuy':
+                return self._html('Security check', '<iframe src="/splashui/captcha?challenge=1"></iframe>')
+            raise web.HTTPFound(f'/splashui/captcha?ap=1&ru={request.path_qs}')
+        self.stats[f'{site}.200'] += 1
+        return await handler(request)
+
+    @staticmethod
+    def _html(title, body):
+        return web.Response(text=PAGE.format(title=_escape(title), body=body), content_type='text/html')
+
+    async def captcha(self, request):
+        return self._html('Please verify yourself', '<form id="captcha_form"><div class="g-recaptcha"></div></form>')
+
+    async def stats_page(self, request):
+        return web.json_response(dict(self.stats))
+
+    # eBay
+
+    async def ebay_search(self, request):
+        category = EBAY_QUERIES.get(request.query.get('_nkw', ''), 'laptops')
+        page = int(request.query.get('_pgn', 1))
+        cards = []
+        for item_id in self._items(page):
+            row = self._row('ebay', category, item_id)
+            cards.append(
+                f'<li class="s-item"><div class="s-item__wrapper">'
+                f'<a class="s-item__link" href="{request.url.origin()}/itm/{category}/{item_id}">'
+                f'<div class="s-item__title">{_escape(row.get("Title", ""))}</div></a>'
+                f'<span class="s-item__price">{_escape(row.get("Price", ""))}</span></div></li>'
+            )
+        return self._html(f'{category} | eBay', f'<ul class="srp-results">{"".join(cards)}</ul>')
+
+    async def ebay_item(self, request):
+        category = request.match_info['category']
+        row = self._row('ebay', category, int(request.match_info['item_id']))
+        specs = ''.join(
+            f'<div class="ux-labels-values__labels">{_escape(label)}</div>'
+            f'<div class="ux-labels-values__values">{_escape(row.get(column, ""))}</div>'
+            for column, label in EBAY_SPEC_LABELS[category].items()
+            if row.get(column) not in (None, '', 'N/A')
+        )
+        body = (f'<h1 class="x-item-title__mainTitle"><span>{_escape(row.get("Title", "N/A"))}</span></h1>'
+                f'<div class="x-price-primary"><span>{_escape(row.get("Price", "N/A"))}</span></div>'
+                f'<div class="ux-layout-section-evo">{specs}</div>')
+        return self._html(row.get('Title', 'eBay item'), body)
+
+    # Flipkart
+
+    async def flipkart_listing(self, request):
+        category = FLIPKART_PATHS[request.path]
+        classes = FLIPKART_CARD_CLASSES[category]
+        page = int(request.query.get('page', 1))
+        title_tag, title_class = classes['title']
+        cards = []
+        for item_id in self._items(page):
+            row = self._row('flipkart', category, item_id)
+            cards.append(
+                f'<div class="cPHDOP col-12-12"><div>'
+                f'<a class="{classes["link"]}" href="/p/{category}/{item_id}">'
+                f'<img class="{classes["image"]}" src="{_escape(row.get("image_url", ""))}"></a>'
+                f'<{title_tag} class="{title_class}">{_escape(row.get("title", ""))}</{title_tag}>'
+                f'<div class="{classes["price"]}">{_escape(row.get("price", ""))}</div>'
+                f'<div class="XQDdHH">{_escape(row.get("rating", ""))}</div>'
+                f'<span class="Wphh3N">{_escape(row.get("reviews", ""))} Reviews</span>'
+                f'</div></div>'
+            )
+        return self._html(f'{category} | Flipkart', ''.join(cards))
+
+    async def flipkart_product(self, request):
+        category = request.match_info['category']
+        row = self._row('flipkart', category, int(request.match_info['item_id']))
+        listing_columns = {'title', 'price', 'rating', 'reviews', 'image_url', 'product_url', 'collection_date'}
+        spec_rows = ''.join(
+            f'<tr class="WJdYP6 row"><td class="+fFi1w col col-3-12">{_escape(key)}</td>'
+            f'<td class="Izz52n col col-9-12"><ul><li>{_escape(value)}</li></ul></td></tr>'
+            for key, value in row.items()
+            if key not in listing_columns and value
+        )
+        body = (f'<h1>{_escape(row.get("title", ""))}</h1>'
+                f'<div class="_3LWZlK">{_escape(row.get("rating", ""))}</div>'
+                f'<span class="_2_R_DZ">{_escape(row.get("reviews", "0"))} Reviews</span>'
+                f'<div class="GNDEQ-"><div class="_4BJ2V+">General</div><table>{spec_rows}</table></div>')
+        return self._html(row.get('title', 'Flipkart product'), body)
+
+    # Ubuy
+
+    async def ubuy_listing(self, request):
+        key = request.match_info.get('slug') or request.query.get('q', '')
+        category = UBUY_LISTINGS.get(key, 'laptops')
+        page = int(request.query.get('page', 1))
+        cards = []
+        for item_id in self._items(page):
+            row = self._row('ubuy', category, item_id)
+            cards.append(
+                f'<div class="product-card">'
+                f'<a class="product-img" href="/en/product/{category}/{item_id}">'
+                f'<img src="{_escape(row.get("image_url", ""))}"></a>'
+                f'<h3 class="product-title">{_escape(row.get("title", ""))}</h3>'
+                f'<p class="product-price">{_escape(row.get("price", ""))}</p></div>'
+            )
+        pagination = ''
+        if page < self.pages:
+            pagination = (f'<ul class="pagination"><li class="page-item" title="{page + 1}">'
+                          f'<button class="page-link" data-pageno="{page + 1}">{page + 1}</button></li></ul>')
+        return self._html(f'{category} | Ubuy', ''.join(cards) + pagination)
+
+    async def ubuy_product(self, request):
+        category = request.match_info['category']
+        row = self._row('ubuy', category, int(request.match_info['item_id']))
+        listing_columns = {'title', 'price', 'image_url', 'product_url', 'Collection Date'}
+        spec_rows = ''.join(
+            f'<tr><td>{_escape(key)}</td><td>{_escape(value)}</td></tr>'
+            for key, value in row.items()
+            if key not in listing_columns and value
+        )
+        body = (f'<h1 class="product-title">{_escape(row.get("title", ""))}</h1>'
+                f'<div id="additional-info"><table>{spec_rows}</table></div>')
+        return self._html(row.get('title', 'Ubuy product'), body)
+
+    def app(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get('/sch/i.html', self.ebay_search, name='ebay_search')
+        app.router.add_get('/itm/{category}/{item_id}', self.ebay_item, name='ebay_item')
+        for path in FLIPKART_PATHS:
+            app.router.add_get(path, self.flipkart_listing, name=f'flipkart_listing{path.replace("/", "_").replace("-", "_")}')
+        app.router.add_get('/p/{category}/{item_id}', self.flipkart_product, name='flipkart_product')
+        app.router.add_get('/en/search/', self.ubuy_listing, name='ubuy_search')
+        app.router.add_get('/en/category/{slug}', self.ubuy_listing, name='ubuy_category')
+        app.router.add_get('/en/product/{category}/{item_id}', self.ubuy_product, name='ubuy_product')
+        app.router.add_get('/splashui/captcha', self.captcha, name='captcha')
+        app.router.add_get('/__stats', self.stats_page, name='stats')
+        return app
+
+
+class ForwardProxy:
+    """Relays absolute-form HTTP requests, counting them and tagging them with its name."""
+
+    # Hop-by-hop headers are not forwarded
+    HOP_HEADERS = {'connection', 'keep-alive', 'proxy-authorization', 'proxy-connection', 'te', 'trailer',
+                   'transfer-encoding', 'upgrade', 'host', 'content-length', 'content-encoding'}
+
+    def __init__(self, name):
+        self.name = name
+        self.stats = Counter()
+        self._session = None
+
+    async def forward(self, request):
+        if self._session is None:
+            self._session = ClientSession(auto_decompress=True)
+        target = request.raw_path if request.raw_path.startswith('http') else str(request.url)
+        headers = {key: value for key, value in request.headers.items() if key.lower() not in self.HOP_HEADERS}
+        headers['X-Forwarded-For'] = self.name
+        async with self._session.request(request.method, target, headers=headers, data=await request.read(),
+                                         allow_redirects=False) as upstream:
+            body = await upstream.read()
+            self.stats[upstream.status] += 1
+            response_headers = {key: value for key, value in upstream.headers.items()
+                                if key.lower() not in self.HOP_HEADERS}
+            return web.Response(status=upstream.status, body=body, headers=response_headers)
+
+    async def _close(self, app):
+        if self._session is not None:
+            await self._session.close()
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.forward)
+        app.on_cleanup.append(self._close)
+        return app
+
+
+class BackgroundServer:
+    """Runs a MockMarketplace or ForwardProxy on its own event loop thread, for harnesses."""
+
+    def __init__(self, service, host='127.0.0.1', port=0):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._thread = threading.Thread(target=self._loop.run_forever, name='mock-marketplace', daemon=True)
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.service.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def start(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def add_marketplace_arguments(parser):
+    parser.add_argument('--latency', default='fixed:0',
+                        help='fixed:MS, uniform:MIN,MAX, lognormal:MEDIAN,SIGMA or exp:MEAN (milliseconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of requests answered with a 429')
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help='share of requests sent to a CAPTCHA page')
+    parser.add_argument('--per-client-rps', type=float, default=0.0,
+                        help='requests per second allowed per client IP or proxy before answering 429 (0: no limit)')
+    parser.add_argument('--pages', type=int, default=20, help='listing pages per category')
+    parser.add_argument('--items-per-page', type=int, default=24)
+    parser.add_argument('--seed', type=int)
+
+
+def marketplace_from_options(options):
+    return MockMarketplace(latency=options.latency, error_rate=options.error_rate,
+                           rate_limit_rate=options.rate_limit_rate, captcha_rate=options.captcha_rate,
+                           pages=options.pages, items_per_page=options.items_per_page, seed=options.seed,
+                           per_client_rps=options.per_client_rps)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.scraping.mock_marketplace',
+                                     description='Serve mock eBay, Flipkart and Ubuy pages locally.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    add_marketplace_arguments(parser)
+    options = parser.parse_args(argv)
+    web.run_app(marketplace_from_options(options).app(), host=options.host, port=options.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Per-host request spacing shared by every scraper process.
+
+`reserve(url)` books the next request slot for the URL's host and returns how
+long the caller has to wait for it; `wait(url)` sleeps that long. Slots are at
+least SCRAPER_HOST_INTERVAL seconds apart (scaled by SCRAPER_DELAY_SCALE, 0 by
+default, so a single scraper keeps only its own random delays).
+
+When the launcher (`src/scraping/launcher.py`) runs several scraper processes,
+it serves one `HostThrottle` through a multiprocessing manager and passes its
+address in SCRAPER_THROTTLE_ADDRESS, so the spacing holds across all of them
+instead of per process.
+"""
+import os
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from urllib.parse import urlsplit
+
+from src.scraping import config
+
+
+class HostThrottle:
+    """Hands out request slots at least `interval` seconds apart per host."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, host):
+        """Books the next slot for `host` and returns the seconds until it starts."""
+        if self.interval <= 0:
+            return 0.0
+        now = time.time()
+        with self._lock:
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        return slot - now
+
+
+class ThrottleManager(BaseManager):
+    pass
+
+
+# The HostThrottle living in the manager process
+_shared_throttle = None
+
+
+def _init_shared_throttle(interval):
+    global _shared_throttle
+    _shared_throttle = HostThrottle(interval)
+
+
+def _get_shared_throttle():
+    return _shared_throttle
+
+
+ThrottleManager.register('throttle', callable=_get_shared_throttle)
+
+
+def serve(interval, address=('127.0.0.1', 0)):
+    """
+    Starts a manager process holding a HostThrottle and returns the manager and
+    the environment variables that point scraper processes at it.
+    """
+    authkey = os.urandom(16)
+    manager = ThrottleManager(address=address, authkey=authkey)
+    manager.start(_init_shared_throttle, (interval,))
+    host, port = manager.address
+    env = {
+        'SCRAPER_THROTTLE_ADDRESS': f'{host}:{port}',
+        'SCRAPER_THROTTLE_AUTHKEY': authkey.hex(),
+    }
+    return manager, env
+
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+
+def get_throttle():
+    """The shared throttle if SCRAPER_THROTTLE_ADDRESS is set, else one for this process."""
+    global _throttle
+    with _throttle_lock:
+        if _throttle is None:
+            address = os.environ.get('SCRAPER_THROTTLE_ADDRESS')
+            if address:
+                host, port = address.rsplit(':', 1)
+                manager = ThrottleManager(address=(host, int(port)),
+                                          authkey=bytes.fromhex(os.environ['SCRAPER_THROTTLE_AUTHKEY']))
+                manager.connect()
+                _throttle = manager.throttle()
+            else:
+                _throttle = HostThrottle(config.host_interval(0))
+        return _throttle
+
+
+def reserve(url):
+    return get_throttle().reserve(urlsplit(url).netloc)
+
+
+def wait(url):
+    delay = reserve(url)
+    if delay > 0:
+        time.sleep(delay)
@@ -0,0 +1,182 @@
+"""Regenerates raw CSVs from the page archive instead of re-scraping.
+
+The current extractors of each scraper are re-run over a slice of the archive
+(see `src/scraping/archive.py`) in a process pool, and one CSV is written per
+site, category and scraper run:
+
+    python -m src.scraping.reextract --site flipkart --category laptops --since 2025-02-01
+
+Output goes to data/reextracted/<site>/<category>/ by default, as
+<category>_<date>_reextract<time>.csv with the same columns as the scrapers.
+The files are not registered in the catalog, so `clean_all` does not see
+them; clean one with the cleaner of its site and category:
+
+    from src.cleaning import registry
+    registry.clean_file(registry.get('flipkart', 'laptops'),
+                        'data/reextracted/flipkart/laptops/laptops_2025_02_01_reextract101500.csv')
+
+The cleaned file goes to data/cleaned/ next to those of the scrapes.
+"""
+import argparse
+import csv
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from src.scraping import archive
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+OUTPUT_DIR = PROJECT_ROOT / 'data' / 'reextracted'
+
+# Pages each site needs to rebuild its rows; eBay rows come from item pages only
+STAGES = {
+    'ebay': ('product',),
+    'flipkart': ('listing', 'product'),
+    'ubuy': ('listing', 'product'),
+}
+
+FLIPKART_MISSING_PRODUCT = {"rating": "Data not available", "reviews": "Data not available"}
+
+
+def extract_record(task):
+    """Reads one archived page and runs the matching extractor on it (pool worker)."""
+    record, archive_dir = task
+    _, html = archive.read(record, archive_dir)
+    fetched_at = datetime.fromisoformat(record.fetched_at)
+
+    # Imported here so a slice of one site does not need the other sites' dependencies
+    if record.site == 'ebay':
+        from src.scraping.ebay_scraper import parse_product_page
+        return record, parse_product_page(html, record.category, fetched_at)
+    if record.site == 'flipkart':
+        from src.scraping import flipkart_scraper
+        if record.stage == 'listing':
+            collection_date = fetched_at.strftime("%Y-%m-%d %H:%M:%S")
+            return record, flipkart_scraper.parse_flipkart_listing(html, record.category, collection_date)
+        return record, flipkart_scraper.parse_flipkart_product(html)
+    if record.site == 'ubuy':
+        from src.scraping import ubuy_scraper
+        if record.stage == 'listing':
+            # The page number only matters for pagination, which is not replayed
+            listings, _ = ubuy_scraper.parse_ubuy_listing(html, 0)
+            return record, listings
+        return record, ubuy_scraper.parse_product_specs(html)
+    raise ValueError(f"No extractor for site {record.site!r}")
+
+
+def output_path(output_dir, site, category, run_id):
+    category_folder = category.lower().replace(' ', '_')
+    run_date, _, run_time = run_id.rpartition('_')
+    directory = Path(output_dir) / site / category_folder
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{category_folder}_{run_date}_reextract{run_time}.csv"
+
+
+def write_ebay(path, category, results):
+    from src.scraping.ebay_scraper import CATEGORY_FIELDS
+    rows = [parsed for record, parsed in results if record.stage == 'product']
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=CATEGORY_FIELDS[category])
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows)
+
+
+def write_flipkart(path, category, results):
+    specs_by_url = {archive.requested(record): parsed for record, parsed in results if record.stage == 'product'}
+    rows = []
+    for record, listings in results:
+        if record.stage != 'listing':
+            continue
+        for listing in listings:
+            product_url = listing["product_url"]
+            if product_url == "URL not available":
+                specifications = {}
+            else:
+                specifications = specs_by_url.get(product_url, FLIPKART_MISSING_PRODUCT)
+            rows.append({**listing, **specifications})
+    if rows:
+        pd.DataFrame(rows).to_csv(path, index=False, encoding='utf-8-sig')
+    return len(rows)
+
+
+def write_ubuy(path, category, results):
+    from src.scraping.ubuy_scraper import write_rows
+    specs_by_url = {archive.requested(record): parsed for record, parsed in results if record.stage == 'product'}
+    items = []
+    all_spec_keys = set()
+    run_date = None
+    for record, listings in results:
+        if record.stage != 'listing':
+            continue
+        run_date = run_date or datetime.fromisoformat(record.fetched_at).strftime("%Y_%m_%d")
+        for listing in listings:
+            specifications = specs_by_url.get(listing["product_url"], {})
+            all_spec_keys.update(specifications.keys())
+            items.append({**listing, "specifications": specifications})
+    if items:
+        write_rows(path, items, all_spec_keys, run_date)
+    return len(items)
+
+
+WRITERS = {
+    'ebay': write_ebay,
+    'flipkart': write_flipkart,
+    'ubuy': write_ubuy,
+}
+
+
+def reextract(site=None, category=None, run_id=None, since=None, until=None, workers=None,
+              output_dir=OUTPUT_DIR, archive_dir=archive.ARCHIVE_DIR):
+    """Re-extracts the selected archive slice and returns the CSV paths written."""
+    records = [
+        record
+        for record in archive.select(site=site, category=category, run_id=run_id, since=since, until=until,
+                                     archive_dir=archive_dir)
+        if record.stage in STAGES.get(record.site, ()) and (record.status is None or record.status < 400)
+    ]
+    if not records:
+        print("No archived pages match this selection.")
+        return []
+
+    print(f"Re-extracting {len(records)} archived pages...")
+    workers = workers or os.cpu_count()
+    tasks = [(record, archive_dir) for record in records]
+    groups = defaultdict(list)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Results come back in submission order, which is fetch order
+        for record, parsed in executor.map(extract_record, tasks, chunksize=max(1, len(tasks) // (workers * 4))):
+            groups[(record.site, record.category, record.run_id)].append((record, parsed))
+
+    written = []
+    for (group_site, group_category, group_run), results in sorted(groups.items()):
+        path = output_path(output_dir, group_site, group_category, group_run)
+        rows = WRITERS[group_site](path, group_category, results)
+        if rows:
+            print(f"Saved {rows} {group_site} {group_category} rows from run {group_run} to {path}")
+            written.append(path)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.scraping.reextract',
+                                     description='Re-run the site extractors over archived pages.')
+    parser.add_argument('--site', choices=sorted(STAGES))
+    parser.add_argument('--category', help='category as passed to the scraper, e.g. "Laptops" (eBay) or laptops')
+    parser.add_argument('--run', dest='run_id', help='scraper run id, e.g. 2025_02_01_101500')
+    parser.add_argument('--since', help='first fetch date/time to include (ISO format)')
+    parser.add_argument('--until', help='fetch date/time to stop at, exclusive (ISO format)')
+    parser.add_argument('--workers', type=int, help='number of worker processes (default: CPU count)')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, type=Path)
+    options = parser.parse_args(argv)
+
+    reextract(site=options.site, category=options.category, run_id=options.run_id, since=options.since,
+              until=options.until, workers=options.workers, output_dir=options.output_dir)
+
+
+if __name__ == '__main__':
+    main()
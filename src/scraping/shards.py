@@ -0,0 +1,63 @@
+"""Command-line options and partial outputs of a sharded scraper run.
+
+A shard is one site, one category and a range of listing pages. The launcher
+(`src/scraping/launcher.py`) runs each shard as a scraper process with
+`--category`, `--pages` and `--shard-output`; instead of writing the usual
+CSV, the process writes its rows as JSON lines (which keep every value and the
+column order as scraped) to the shard file, and the launcher merges the shard
+files of a category once they are all done.
+"""
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+Shard = namedtuple('Shard', ['site', 'category', 'first_page', 'last_page'])
+
+
+def page_range(value):
+    """Parses FIRST-LAST (or a single page) into a (first, last) tuple."""
+    first, _, last = value.partition('-')
+    first = int(first)
+    last = int(last) if last else first
+    if first < 1 or last < first:
+        raise ValueError(f"Invalid page range: {value}")
+    return first, last
+
+
+def add_shard_arguments(parser, categories):
+    parser.add_argument('--category', action='append', choices=list(categories),
+                        help='category to scrape (repeatable, default: all)')
+    parser.add_argument('--pages', type=page_range, help='FIRST-LAST listing pages to scrape')
+    parser.add_argument('--shard-output', type=Path,
+                        help='write the rows as JSON lines to this file instead of the CSVs (used by the launcher)')
+
+
+def selected_categories(options, categories):
+    return {name: value for name, value in categories.items() if not options.category or name in options.category}
+
+
+def run_name(name, options):
+    """Suffixes the run name with the shard, so concurrent shards get their own logs and traces."""
+    return f"{name}_{options.shard_output.stem}" if options.shard_output else name
+
+
+def write_shard(path, rows_by_category):
+    """Writes the rows of a shard, atomically so a half-written file is never merged."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for category, rows in rows_by_category.items():
+            for row in rows:
+                f.write(json.dumps({'category': category, 'row': row}, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+def read_shard(path):
+    rows_by_category = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            rows_by_category.setdefault(record['category'], []).append(record['row'])
+    return rows_by_category
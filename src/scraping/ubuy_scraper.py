@@ -1,7 +1,7 @@
 import os
 import csv
+import argparse
 import time
-import random
 import logging
 from datetime import datetime
 from selenium import webdriver
@@ -12,17 +12,25 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 from webdriver_manager.chrome import ChromeDriverManager
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 import undetected_chromedriver as uc
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from src.common import catalog
+from src.observability import logs, metrics, profiling, tracing
+from src.scraping import archive, config, politeness, shards
+from src.scraping.identity import IdentityPool
+
+# Logging is configured by logs.setup when the script runs
+logger = logging.getLogger('scraper.ubuy')
+
+# Proxy and User-Agent identities; each ChromeDriver keeps one for its lifetime
+identity_pool = IdentityPool.from_env('ubuy')
 
 # Shared Functions
-def get_driver():
-    """Initialize an undetected ChromeDriver instance."""
+def get_driver(identity=None):
+    """Initialize an undetected ChromeDriver instance, routed through `identity` if given."""
     try:
-        logging.info("Initializing ChromeDriver...")
+        logger.info("Initializing ChromeDriver...")
         options = uc.ChromeOptions()
         options.headless = False  # Set to False for debugging
         options.add_argument("--disable-gpu")
@@ -30,28 +38,22 @@ def get_driver():
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
         options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument(f"--user-agent={get_random_user_agent()}")
+        if identity is not None:
+            options.add_argument(f"--user-agent={identity.user_agent}")
+            if identity.proxy:
+                options.add_argument(f"--proxy-server={identity.proxy}")
 
         service = Service(ChromeDriverManager().install())
         driver = uc.Chrome(service=service, options=options)
-        logging.info("ChromeDriver initialized successfully!")
+        logger.info("ChromeDriver initialized successfully!")
         return driver
     except Exception as e:
-        logging.error(f"Failed to initialize ChromeDriver: {e}")
+        logger.error("Failed to initialize ChromeDriver: %s", e)
         raise
 
-def get_random_user_agent():
-    """Returns a randomly selected user-agent to avoid detection."""
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"
-    ]
-    return random.choice(user_agents)
-
 def handle_captcha(driver):
     """Pause execution and allow the user to solve CAPTCHA manually."""
-    logging.info("CAPTCHA detected. Please solve it manually.")
+    logger.info("CAPTCHA detected. Please solve it manually.")
     start_time = time.time()
     timeout = 120  # 2 minutes timeout for solving CAPTCHA
 
@@ -64,82 +66,124 @@ def handle_captcha(driver):
             WebDriverWait(driver, 5).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "iframe[src*='captcha']"))
             )
-            logging.info("CAPTCHA still present. Please solve it again.")
+            logger.info("CAPTCHA still present. Please solve it again.")
         except:
-            logging.info("CAPTCHA resolved. Resuming script execution...")
+            logger.info("CAPTCHA resolved. Resuming script execution...")
             driver.refresh()  # Refresh the page to ensure CAPTCHA is fully resolved
             time.sleep(5)  # Wait for the page to load after refresh
             break
 
         # Check if the timeout has been reached
         if time.time() - start_time > timeout:
-            logging.error("Timeout reached while solving CAPTCHA. Exiting...")
+            logger.error("Timeout reached while solving CAPTCHA. Exiting...")
             driver.quit()
             exit(1)
 
-def scrape_product_details(driver, product_url):
+def load_page(driver, url, category, stage):
+    """Loads a page in the browser and records its size and load time."""
+    politeness.wait(url)
+    start = time.perf_counter()
+    with tracing.span('ubuy.fetch', category=category, stage=stage):
+        try:
+            driver.get(url)
+        except Exception:
+            metrics.REQUESTS.labels(site='ubuy', category=category, stage=stage, status='error').inc()
+            raise
+    # The browser does not expose HTTP status codes, so loaded pages are counted as 200
+    metrics.observe_fetch('ubuy', category, stage, 200, len(driver.page_source), time.perf_counter() - start)
+
+def parse_product_specs(html):
+    """Extracts the specification tables of a product page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    specs = {}
+
+    # Extract specifications
+    spec_tables = soup.select("div#additional-info table, div#technical-info table")
+    for table in spec_tables:
+        for row in table.find_all("tr"):
+            cols = row.find_all("td")
+            if len(cols) == 2:
+                key = cols[0].text.strip()
+                value = cols[1].text.strip()
+                specs[key] = value
+
+    return specs
+
+def parse_ubuy_listing(html, current_page):
+    """
+    Extracts the product cards of a listing page as dicts with title, price,
+    image_url and product_url, plus the next page number (None on the last page).
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    listings = []
+    for product in soup.find_all('div', class_='product-card'):
+        link_element = product.find('a', class_='product-img')
+        if link_element and "href" in link_element.attrs:
+            product_url = link_element['href']
+            full_product_url = f"{config.base_url('ubuy')}{product_url}" if product_url.startswith('/') else product_url
+            title = product.find('h3', class_='product-title').text.strip() if product.find('h3', class_='product-title') else "No title"
+            price = product.find('p', class_='product-price').text.strip() if product.find('p', class_='product-price') else "No price"
+            image_url = product.find('img')['src'] if product.find('img') else "No image"
+            listings.append({
+                "title": title,
+                "price": price,
+                "image_url": image_url,
+                "product_url": full_product_url,
+            })
+
+    next_page_number = None
+    next_page_element = soup.find('li', class_='page-item', title=str(current_page + 1))
+    if next_page_element:
+        next_button = next_page_element.find('button', class_='page-link')
+        if next_button and "data-pageno" in next_button.attrs:
+            next_page_number = next_button['data-pageno']
+
+    return listings, next_page_number
+
+def report_page(identity, blocked=False):
+    """Records a page load for the driver's identity, which stays leased to the driver."""
+    if identity is not None:
+        identity_pool.report(identity, status=None if blocked else 200, blocked=blocked, release=False)
+
+def scrape_product_details(driver, product_url, category, identity=None):
     """Scrapes detailed product specifications from a product page."""
     try:
-        logging.info(f"Scraping product: {product_url}")
-        driver.get(product_url)
-        time.sleep(random.uniform(2, 5))  # Random delay
+        logger.debug("Scraping product: %s", product_url, extra={'category': category})
+        load_page(driver, product_url, category, 'product')
+        time.sleep(config.delay(2, 5))  # Random delay
 
         # Check for CAPTCHA
         try:
             WebDriverWait(driver, 5).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "iframe[src*='captcha']"))
             )
+            metrics.CAPTCHA_HITS.labels(site='ubuy', category=category, stage='product').inc()
+            report_page(identity, blocked=True)
             handle_captcha(driver)  # Pause for manual CAPTCHA solving
         except:
-            logging.info("No CAPTCHA detected. Proceeding with scraping...")
+            logger.debug("No CAPTCHA detected. Proceeding with scraping...")
 
         # Wait for the specifications table to load
         WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "div#additional-info table, div#technical-info table"))
         )
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        specs = {}
-
-        # Extract specifications
-        spec_tables = soup.select("div#additional-info table, div#technical-info table")
-        for table in spec_tables:
-            for row in table.find_all("tr"):
-                cols = row.find_all("td")
-                if len(cols) == 2:
-                    key = cols[0].text.strip()
-                    value = cols[1].text.strip()
-                    specs[key] = value
-
-        return specs
+        html = driver.page_source
+        report_page(identity)
+        archive.store(driver.current_url, html, category=category, stage='product', status=200,
+                      requested_url=product_url)
+        with tracing.span('ubuy.parse', category=category, stage='product'), \
+                metrics.parse_timer('ubuy', category, 'product'):
+            return parse_product_specs(html)
     except Exception as e:
-        logging.error(f"Error scraping {product_url}: {e}")
+        logs.summary.incr('product_errors', category)
+        logger.warning("Error scraping product: %s", e, extra={'category': category, 'url': product_url})
         return {}
+    finally:
+        metrics.QUEUE_DEPTH.labels(site='ubuy', category=category).dec()
 
-def get_next_scrape_number(output_dir, category):
-    """Determines the next scrape number for versioning output files."""
-    scrape_number = 1
-    for filename in os.listdir(output_dir):
-        if filename.startswith(f"{category}_") and filename.endswith(".csv"):
-            try:
-                current_number = int(filename.split('_scrape')[-1].split('.')[0])
-                if current_number >= scrape_number:
-                    scrape_number = current_number + 1
-            except ValueError:
-                continue
-    return scrape_number
-
-def save_to_csv(data, category, all_spec_keys):
-    """Saves scraped data to a CSV file with specifications in separate columns."""
-    # Create category-specific directory
-    output_dir = os.path.join("data/raw/ubuy", category)
-    os.makedirs(output_dir, exist_ok=True)
-
-    today_date = datetime.today().strftime("%Y_%m_%d")
-    scrape_number = get_next_scrape_number(output_dir, category)
-    filename = f"{category}_{today_date}_scrape{scrape_number}.csv"
-    filepath = os.path.join(output_dir, filename)
-
+def write_rows(filepath, data, all_spec_keys, collection_date):
+    """Writes scraped items to a CSV file with specifications in separate columns."""
     # Add "Collection Date" to the fieldnames
     fieldnames = ["title", "price", "image_url", "product_url", "Collection Date"] + list(all_spec_keys)
 
@@ -153,36 +197,52 @@ def save_to_csv(data, category, all_spec_keys):
                 "price": item["price"],
                 "image_url": item["image_url"],
                 "product_url": item["product_url"],
-                "Collection Date": today_date  # Add the collection date
+                "Collection Date": collection_date  # Add the collection date
             }
             row.update(item["specifications"])
             writer.writerow(row)
 
-    logging.info(f"Data saved to {filepath}")
+def save_to_csv(data, category, all_spec_keys):
+    """Saves scraped data to a CSV file with specifications in separate columns."""
+    output_dir = os.path.join(config.raw_dir('ubuy'), category)
+    today_date = datetime.today().strftime("%Y_%m_%d")
+
+    # The catalog gives the next scrape number and publishes the file once it is complete
+    with tracing.span('ubuy.write', category=category, rows=len(data)), \
+            catalog.new_scrape('ubuy', category, output_dir, date=today_date) as output:
+        write_rows(output.tmp_path, data, all_spec_keys, today_date)
+        output.rows = len(data)
+    filepath = str(output.path)
+
+    metrics.ROWS_WRITTEN.labels(site='ubuy', category=category).inc(len(data))
+    logger.info("Data saved to %s", filepath, extra={'category': category, 'rows': len(data), 'path': filepath})
 
 # Category-Specific Scraping Functions
-def scrape_ubuy(driver, base_url, max_pages):
-    """Scrapes product data from multiple pages on Ubuy."""
+def scrape_ubuy(driver, base_url, max_pages, category, identity=None, first_page=1):
+    """Scrapes product data from pages first_page..max_pages on Ubuy."""
     scraped_items = []
     all_spec_keys = set()
     
     try:
-        current_page = 1
-        current_url = base_url
+        current_page = first_page
+        current_url = base_url if first_page == 1 else f"{base_url}&page={first_page}"
 
         while current_page <= max_pages:
-            logging.info(f"Scraping page {current_page}: {current_url}")
-            driver.get(current_url)
-            time.sleep(random.uniform(3, 6))  # Random delay
+            logs.summary.incr('listing_pages', category)
+            logger.debug("Scraping page %d: %s", current_page, current_url, extra={'category': category, 'page': current_page})
+            load_page(driver, current_url, category, 'listing')
+            time.sleep(config.delay(3, 6))  # Random delay
 
             # Check for CAPTCHA
             try:
                 WebDriverWait(driver, 5).until(
                     EC.presence_of_element_located((By.CSS_SELECTOR, "iframe[src*='captcha']"))
                 )
+                metrics.CAPTCHA_HITS.labels(site='ubuy', category=category, stage='listing').inc()
+                report_page(identity, blocked=True)
                 handle_captcha(driver)  # Pause for manual CAPTCHA solving
             except:
-                logging.info("No CAPTCHA detected. Proceeding with scraping...")
+                logger.debug("No CAPTCHA detected. Proceeding with scraping...")
 
             # Wait for product listings
             try:
@@ -190,98 +250,116 @@ def scrape_ubuy(driver, base_url, max_pages):
                     EC.presence_of_element_located((By.CSS_SELECTOR, "div.product-card"))
                 )
             except Exception as e:
-                logging.error("No products found. Page may have changed.")
+                logger.error("No products found. Page may have changed.")
                 break
 
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            product_blocks = soup.find_all('div', class_='product-card')
-
-            if not product_blocks:
-                logging.info("No products found. Exiting scraping.")
+            html = driver.page_source
+            report_page(identity)
+            archive.store(driver.current_url, html, category=category, stage='listing', status=200,
+                          requested_url=current_url)
+            with tracing.span('ubuy.parse', category=category, stage='listing') as parse_span, \
+                    metrics.parse_timer('ubuy', category, 'listing'):
+                listings, next_page_number = parse_ubuy_listing(html, current_page)
+                parse_span.set(rows=len(listings))
+
+            if not listings:
+                logger.info("No products found. Exiting scraping.")
                 break
 
             # Collect product URLs
-            product_urls = []
-            for product in product_blocks:
-                link_element = product.find('a', class_='product-img')
-                if link_element and "href" in link_element.attrs:
-                    product_url = link_element['href']
-                    full_product_url = f"https://www.ubuy.ma{product_url}" if product_url.startswith('/') else product_url
-                    product_urls.append(full_product_url)
+            product_urls = [listing["product_url"] for listing in listings]
+            listing_by_url = {}
+            for listing in listings:
+                listing_by_url.setdefault(listing["product_url"], listing)
 
             # Scrape details concurrently
+            metrics.QUEUE_DEPTH.labels(site='ubuy', category=category).inc(len(product_urls))
             with ThreadPoolExecutor(max_workers=5) as executor:
-                future_to_url = {executor.submit(scrape_product_details, driver, url): url for url in product_urls}
-                for future in as_completed(future_to_url):
-                    url = future_to_url[future]
+                future_to_url = {executor.submit(scrape_product_details, driver, url, category, identity): url for url in product_urls}
+                # Collected in listing order, so the output does not depend on completion order
+                for future, url in future_to_url.items():
                     try:
                         specifications = future.result()
                         all_spec_keys.update(specifications.keys())
-
-                        # Find corresponding product details
-                        for product in product_blocks:
-                            link_element = product.find('a', class_='product-img')
-                            if link_element and "href" in link_element.attrs:
-                                product_url = link_element['href']
-                                full_product_url = f"https://www.ubuy.ma{product_url}" if product_url.startswith('/') else product_url
-                                if full_product_url == url:
-                                    title = product.find('h3', class_='product-title').text.strip() if product.find('h3', class_='product-title') else "No title"
-                                    price = product.find('p', class_='product-price').text.strip() if product.find('p', class_='product-price') else "No price"
-                                    image_url = product.find('img')['src'] if product.find('img') else "No image"
-
-                                    scraped_items.append({
-                                        "title": title,
-                                        "price": price,
-                                        "image_url": image_url,
-                                        "product_url": full_product_url,
-                                        "specifications": specifications
-                                    })
-                                    break
+                        scraped_items.append({**listing_by_url[url], "specifications": specifications})
+                        logs.summary.incr('products_scraped', category)
                     except Exception as e:
-                        logging.error(f"Error processing {url}: {e}")
-
-            # Find and update next page URL
-            next_page_element = soup.find('li', class_='page-item', title=str(current_page + 1))
-            if next_page_element:
-                next_button = next_page_element.find('button', class_='page-link')
-                if next_button and "data-pageno" in next_button.attrs:
-                    next_page_number = next_button['data-pageno']
-                    current_url = f"{base_url}&page={next_page_number}"
-                    current_page += 1
-                    time.sleep(random.uniform(3, 7))  # Randomized delay to prevent bot detection
-                else:
-                    logging.info("No more pages found.")
-                    break
+                        logger.warning("Error processing product: %s", e, extra={'category': category, 'url': url})
+
+            # Update next page URL
+            if next_page_number is not None:
+                current_url = f"{base_url}&page={next_page_number}"
+                current_page += 1
+                time.sleep(config.delay(3, 7))  # Randomized delay to prevent bot detection
             else:
-                logging.info("No more pages found.")
+                logger.info("No more pages found.")
                 break
 
     except Exception as e:
-        logging.error(f"Error during scraping: {e}")
+        logger.error("Error during scraping: %s", e, extra={'category': category})
     finally:
         driver.quit()
 
     return scraped_items, all_spec_keys
 
-# Main Execution
-if __name__ == "__main__":
+base_url = config.base_url('ubuy')
+CATEGORIES = {
+    "graphics_cards": (f"{base_url}/en/search/?ref_p=ser_tp&q=graphics+cards", config.max_pages(8)),
+    "laptops": (f"{base_url}/en/category/laptops-21457", config.max_pages(8)),
+    "monitors": (f"{base_url}/en/search/?q=computer%20monitor", config.max_pages(8)),
+    "smart_watches": (f"{base_url}/en/search/?ref_p=ser_tp&q=smart+watch", config.max_pages(8))
+}
+
+def category_pages(category):
+    """Number of listing pages scraped for `category`."""
+    return CATEGORIES[category][1]
+
+def merge_shards(category, rows):
+    """Writes the merged rows of a sharded run as the usual CSV."""
+    all_spec_keys = dict.fromkeys(key for row in rows for key in row["specifications"])
+    save_to_csv(rows, category, all_spec_keys)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape Ubuy listing and product pages with ChromeDriver.')
+    shards.add_shard_arguments(parser, CATEGORIES)
+    options = parser.parse_args(argv)
+
     try:
-        logging.info("Starting script...")
-        categories = {
-            "graphics_cards": ("https://www.ubuy.ma/en/search/?ref_p=ser_tp&q=graphics+cards", 8),
-            "laptops": ("https://www.ubuy.ma/en/category/laptops-21457", 8),
-            "monitors": ("https://www.ubuy.ma/en/search/?q=computer%20monitor", 8),
-            "smart_watches": ("https://www.ubuy.ma/en/search/?ref_p=ser_tp&q=smart+watch", 8)
-        }
-
-        for category, (base_url, max_pages) in categories.items():
-            logging.info(f"Scraping {category}...")
-            driver = get_driver()
-            scraped_data, all_spec_keys = scrape_ubuy(driver, base_url, max_pages)
-
-            if scraped_data:
+        run_name = shards.run_name('ubuy_scraper', options)
+        logs.setup(run_name)
+        logger.info("Starting script...")
+        metrics.start_run(shards.run_name('ubuy', options))
+        tracing.start_run(run_name)
+        profiling.start_from_env(run_name)
+        archive.start_run('ubuy')
+
+        shard_rows = {}
+        for category, (category_url, max_pages) in shards.selected_categories(options, CATEGORIES).items():
+            logger.info("Scraping %s...", category, extra={'category': category})
+            first_page, last_page = options.pages or (1, max_pages)
+            identity = identity_pool.acquire()
+            try:
+                driver = get_driver(identity)
+                with tracing.span('ubuy.category', category=category, identity=identity.name):
+                    scraped_data, all_spec_keys = scrape_ubuy(driver, category_url, last_page, category, identity,
+                                                              first_page)
+            finally:
+                identity_pool.release(identity)
+
+            if options.shard_output:
+                shard_rows[category] = scraped_data
+            elif scraped_data:
                 save_to_csv(scraped_data, category, all_spec_keys)
             else:
-                logging.info(f"No data scraped for {category}.")
+                logger.info("No data scraped for %s.", category, extra={'category': category})
+
+        if options.shard_output:
+            shards.write_shard(options.shard_output, shard_rows)
     except Exception as e:
-        logging.error(f"An error occurred: {e}")
\ No newline at end of file
+        logger.error("An error occurred: %s", e)
+        if options.shard_output:
+            raise
+
+# Main Execution
+if __name__ == "__main__":
+    main()